@@ -34,6 +34,7 @@ urlpatterns = [
     path('dashboard/charts', views_dashboard.dashboard_charts, name='dashboard_charts'),
     path('dashboard/faqs', views_dashboard.dashboard_faqs, name='dashboard_faqs'),
     path('dashboard/announcements', views_dashboard.dashboard_announcements, name='dashboard_announcements'),
+    path('dashboard/llm-cache', views_dashboard.dashboard_llm_cache, name='dashboard_llm_cache'),
     
     # ============= REPORTS ENDPOINTS (CHUNK 5) =============
     # ⚠️ DEPRECATED: These endpoints are being consolidated into unified endpoints
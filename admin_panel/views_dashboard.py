@@ -773,3 +773,43 @@ def dashboard_announcements(request):
             'details': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])  # Allow any - our decorator handles auth
+@require_any_admin
+def dashboard_llm_cache(request):
+    """
+    GET /api/admin/dashboard/llm-cache
+    
+    LLM cache effectiveness for the operations dashboard
+    Permissions: MASTER, VET, DESK
+    
+    Returns:
+        success: True/False
+        data:
+            semantic_cache: First-turn general chat near-duplicate cache (hit rate, entries, top questions)
+            response_cache: Exact-prompt response cache
+            gateway: Gemini calls executed vs coalesced onto in-flight requests
+    """
+    try:
+        from chatbot.llm_gateway import gateway_stats
+        from chatbot.semantic_cache import get_semantic_answer_cache
+        from chatbot.utils import get_response_cache
+        
+        return Response({
+            'success': True,
+            'data': {
+                'semantic_cache': get_semantic_answer_cache().stats(),
+                'response_cache': get_response_cache().stats(),
+                'gateway': gateway_stats(),
+            }
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        logger.error(f"Dashboard LLM cache stats error: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'error': 'Failed to fetch LLM cache statistics',
+            'details': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -2,14 +2,33 @@
 """
 FastAPI Backend for Smart Triage Engine
 Replaces ML model with Vector Similarity Search
+
+Also runs as the shared inference sidecar for the Django workers:
+
+    python api_backend.py --uds /run/pawpal/triage.sock
+
+One process holds the sentence transformer and embedding matrix; concurrent
+similar-symptom / embed requests are micro-batched into a single forward pass.
+Django talks to it through triage_client.py (TRIAGE_SIDECAR_SOCKET setting).
 """
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional
+import argparse
+import asyncio
+import os
 import uvicorn
-from smart_triage_engine import SmartTriageEngine
+from smart_triage_engine import SmartTriageEngine, SEMANTIC_MODEL_NAME
+from knowledge_base_versions import compute_file_hash
+
+# Same default as the Django workers (vector_similarity_django_integration.KNOWLEDGE_BASE_FILE)
+KNOWLEDGE_BASE_FILE = os.environ.get('TRIAGE_KNOWLEDGE_BASE', 'knowledge_base_enhanced.csv')
+
+# Micro-batching: wait at most this long for more requests to share a forward pass
+BATCH_MAX_WAIT_MS = float(os.environ.get('TRIAGE_BATCH_MAX_WAIT_MS', '5'))
+BATCH_MAX_SIZE = int(os.environ.get('TRIAGE_BATCH_MAX_SIZE', '64'))
 
 # ============================================================================
 # Initialize FastAPI App
@@ -30,15 +49,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ============================================================================
+# Micro-batching
+# ============================================================================
+
+class MicroBatcher:
+    """
+    Coalesces concurrent encode requests into one model forward pass.
+
+    Requests queue up for at most `max_wait_ms` (or until `max_batch_size` texts
+    are waiting); the combined batch is encoded in a worker thread and each caller
+    gets back its own slice of the result.
+    """
+
+    def __init__(self, encode_fn, max_batch_size: int = 64, max_wait_ms: float = 5):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.texts = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def encode(self, texts: List[str]):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(None, self.encode_fn, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
 # Initialize triage engine (singleton, loads once at startup)
 triage_engine = None
+encode_batcher = None
+knowledge_base_version = None
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the triage engine on startup"""
-    global triage_engine
+    global triage_engine, encode_batcher, knowledge_base_version
     try:
-        triage_engine = SmartTriageEngine('overhaul_converted.csv')
+        triage_engine = SmartTriageEngine(KNOWLEDGE_BASE_FILE)
+        knowledge_base_version = compute_file_hash(KNOWLEDGE_BASE_FILE)
+        encode_batcher = MicroBatcher(triage_engine.encode_texts, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+        encode_batcher.start()
         print("✓ Smart Triage Engine initialized successfully")
     except Exception as e:
         print(f"✗ Failed to initialize engine: {e}")
@@ -63,6 +153,16 @@ class DiagnosisRequest(BaseModel):
             }
         }
 
+class SimilarSymptomsRequest(BaseModel):
+    """Request model for batched semantic symptom matching"""
+    texts: List[str] = Field(..., description="Free-text symptom terms")
+    threshold: float = Field(0.70, description="Minimum cosine similarity", ge=0, le=1)
+    top_k: Optional[int] = Field(None, description="Maximum matches per term", ge=1)
+
+class EmbedRequest(BaseModel):
+    """Request model for the embed endpoint"""
+    texts: List[str] = Field(..., description="Texts to encode", min_items=1)
+
 class DiseaseMatch(BaseModel):
     """Model for individual disease match"""
     disease: str
@@ -169,6 +269,37 @@ async def diagnose(request: DiagnosisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/similar-symptoms")
+async def similar_symptoms(request: SimilarSymptomsRequest):
+    """
+    Batched semantic symptom matching (SmartTriageEngine.find_similar_symptoms_batch)
+
+    Returns one list of [symptom_code, score] pairs per input text, highest first
+    """
+    if not triage_engine or triage_engine.symptom_vectors is None:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+
+    positions = [i for i, text in enumerate(request.texts) if text and text.strip()]
+    matches = [[] for _ in request.texts]
+    if positions:
+        vectors = await encode_batcher.encode([request.texts[i] for i in positions])
+        for position, found in zip(positions, triage_engine.match_query_vectors(vectors, request.threshold, request.top_k)):
+            matches[position] = found
+    return {"matches": matches}
+
+@app.post("/api/embed")
+async def embed(request: EmbedRequest):
+    """Encode texts into L2-normalized sentence embeddings"""
+    if not triage_engine or triage_engine.semantic_model is None:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+
+    vectors = await encode_batcher.encode(request.texts)
+    return {
+        "model": SEMANTIC_MODEL_NAME,
+        "dim": int(vectors.shape[1]),
+        "vectors": vectors.tolist()
+    }
+
 @app.get("/api/urgency/critical-symptoms")
 async def get_critical_symptoms():
     """Get list of critical/red flag symptoms"""
@@ -195,8 +326,12 @@ async def get_stats():
     return {
         "total_diseases": total_diseases,
         "species_counts": species_counts,
-        "knowledge_base_file": "overhaul_converted.csv",
-        "engine_type": "Vector Similarity Search (Jaccard)"
+        "knowledge_base_file": KNOWLEDGE_BASE_FILE,
+        "knowledge_base_version": knowledge_base_version,
+        "engine_type": "Vector Similarity Search (Jaccard)",
+        "encode_batches": encode_batcher.batches if encode_batcher else 0,
+        "encoded_texts": encode_batcher.texts if encode_batcher else 0,
+        "phrase_cache": triage_engine.phrase_cache_stats()
     }
 
 # ============================================================================
@@ -222,17 +357,30 @@ async def internal_error_handler(request, exc):
 # ============================================================================
 
 if __name__ == "__main__":
-    print("="*70)
-    print("Starting PawPal Smart Triage API Server")
-    print("="*70)
-    print("API Documentation: http://localhost:8000/docs")
-    print("Health Check: http://localhost:8000/")
-    print("="*70)
-    
-    uvicorn.run(
-        "api_backend:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,  # Enable auto-reload during development
-        log_level="info"
-    )
+    parser = argparse.ArgumentParser(description="PawPal Smart Triage API")
+    parser.add_argument('--uds', help="Serve on this Unix socket (inference sidecar mode)")
+    args = parser.parse_args()
+
+    if args.uds:
+        print("="*70)
+        print(f"Starting PawPal triage sidecar on unix:{args.uds}")
+        print("="*70)
+        if os.path.exists(args.uds):
+            os.remove(args.uds)
+        # One process owns the model; concurrency comes from micro-batching
+        uvicorn.run(app, uds=args.uds, log_level="info")
+    else:
+        print("="*70)
+        print("Starting PawPal Smart Triage API Server")
+        print("="*70)
+        print("API Documentation: http://localhost:8000/docs")
+        print("Health Check: http://localhost:8000/")
+        print("="*70)
+        
+        uvicorn.run(
+            "api_backend:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,  # Enable auto-reload during development
+            log_level="info"
+        )
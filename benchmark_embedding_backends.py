@@ -0,0 +1,77 @@
+"""
+Startup / latency / memory benchmark for the embedding backends.
+
+Each backend runs in a fresh subprocess so import time and peak RSS are not
+shared. Run once beforehand (or let the first run do it) so the ONNX exports
+already exist in the embedding cache; export time is not what is measured.
+
+Usage:
+    python benchmark_embedding_backends.py [--backends torch onnx onnx-int8] [--runs 200]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+WORKER = r'''
+import json, resource, sys, time
+import numpy as np
+start = time.perf_counter()
+from onnx_encoder import PARITY_PROBE_PHRASES, create_encoder
+from smart_triage_engine import SEMANTIC_MODEL_NAME
+encoder, backend_used = create_encoder(SEMANTIC_MODEL_NAME, backend=sys.argv[1])
+load_seconds = time.perf_counter() - start
+
+phrases = PARITY_PROBE_PHRASES
+encoder.encode(phrases[:2])  # warm-up
+latencies = []
+for i in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    encoder.encode([phrases[i % len(phrases)]])
+    latencies.append((time.perf_counter() - t) * 1000)
+t = time.perf_counter()
+encoder.encode(phrases * 4)
+batch_ms = (time.perf_counter() - t) * 1000
+
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("RESULT " + json.dumps({
+    'backend': backend_used, 'load_s': load_seconds,
+    'p50_ms': float(np.percentile(latencies, 50)), 'p95_ms': float(np.percentile(latencies, 95)),
+    'batch_ms': batch_ms, 'batch_size': len(phrases) * 4, 'peak_rss_mb': rss_kb / 1024,
+}))
+'''
+
+
+def run_backend(backend, runs):
+    proc = subprocess.run([sys.executable, '-c', WORKER, backend, str(runs)], capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith('RESULT '):
+            return json.loads(line[len('RESULT '):])
+    print(f"❌ {backend} failed:\n{proc.stderr[-2000:]}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'onnx-int8'])
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    print("\n" + "="*78)
+    print("⏱️  EMBEDDING BACKEND BENCHMARK")
+    print("="*78)
+    print(f"{'backend':<12}{'load (s)':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'batch (ms)':>12}{'peak RSS (MB)':>16}")
+
+    for backend in args.backends:
+        result = run_backend(backend, args.runs)
+        if result is None:
+            continue
+        label = backend if result['backend'] == backend else f"{backend}->{result['backend']}"
+        print(f"{label:<12}{result['load_s']:>10.2f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['batch_ms']:>12.1f}{result['peak_rss_mb']:>16.0f}")
+
+    print("="*78)
+
+
+if __name__ == "__main__":
+    main()
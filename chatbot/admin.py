@@ -7,7 +7,8 @@ from .models import (
     DiagnosisSuggestion, 
     SOAPReport,
     SymptomLog,
-    SymptomAlert
+    SymptomAlert,
+    LLMJob
 )
 
 
@@ -126,3 +127,12 @@ class SymptomAlertAdmin(admin.ModelAdmin):
                 updated += 1
         self.message_user(request, f'{updated} alert(s) marked as acknowledged.')
     mark_as_acknowledged.short_description = 'Mark as acknowledged'
+
+
+@admin.register(LLMJob)
+class LLMJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'job_type', 'status', 'user', 'attempts', 'result_status', 'created_at', 'finished_at']
+    list_filter = ['job_type', 'status', 'created_at']
+    search_fields = ['id', 'dedup_key', 'user__username', 'error']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['id', 'created_at', 'started_at', 'finished_at']
@@ -28,6 +28,10 @@ class ChatbotConfig(AppConfig):
                 # Load the engine (singleton pattern ensures it loads only once)
                 engine = get_triage_engine()
                 
+                # Compile the symptom alias lexicon used by user_notes extraction
+                from symptom_lexicon import get_symptom_lexicon
+                get_symptom_lexicon()
+                
                 logger.info("="*60)
                 logger.info("✅ VECTOR ENGINE PRE-LOADED SUCCESSFULLY")
                 logger.info("   First user request will now be INSTANT!")
@@ -0,0 +1,369 @@
+"""
+Background job mode for LLM-heavy endpoints
+
+SOAP generation, AI diagnosis creation and symptom progression analysis spend
+seconds waiting on Gemini. When LLM_JOB_MODE_ENABLED is on and the client sends
+`Prefer: respond-async` (or `?background=true`), those endpoints queue an LLMJob
+row and answer 202 with a job id right away; `manage.py run_llm_jobs` runs the
+queue with a local thread pool and the client polls GET /api/chatbot/jobs/<id>/.
+
+The queue is the database table, so no broker is needed:
+- claiming is a compare-and-set UPDATE on the row, safe across worker processes
+- jobs with the same dedup key share one queued run
+- a handler that raises is retried with exponential backoff up to max_attempts;
+  a worker that dies mid-job loses its lease and the job is requeued
+- each job type has a concurrency cap (the gateway's LLM_MAX_CONCURRENT_CALLS
+  still bounds Gemini calls overall)
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import LLMJob
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# JOB TYPES
+# ============================================================================
+
+class JobType:
+    """
+    A kind of background job.
+
+    Args:
+        handler: fn(job) -> (response body, HTTP status). Raising means "retry".
+        max_concurrency: Jobs of this type running at once (per worker process)
+        max_attempts: Runs before the job is marked failed
+        dedup_running: Whether a running job also absorbs new submissions with its
+            dedup key (False when the running job may have read stale input)
+    """
+
+    def __init__(self, handler: Callable[[LLMJob], Tuple[dict, int]], max_concurrency: int = 4,
+                 max_attempts: int = 3, dedup_running: bool = True):
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.dedup_running = dedup_running
+
+
+def _run_ai_diagnosis(job: LLMJob):
+    from .views import _create_ai_diagnosis_for
+    return _response_body(_create_ai_diagnosis_for(job.user, job.payload))
+
+
+def _run_soap_generation(job: LLMJob):
+    from .views_diagnosis import _generate_soap_report
+    return _response_body(_generate_soap_report(job.user, job.payload))
+
+
+def _run_symptom_progression(job: LLMJob):
+    from .views_symptom_tracker import _analyze_and_record_trend
+    return _analyze_and_record_trend(job.payload['pet_id'])
+
+
+JOB_TYPES: Dict[str, JobType] = {
+    'ai_diagnosis': JobType(_run_ai_diagnosis),
+    'soap_generation': JobType(_run_soap_generation),
+    # Progression reads every recent log when it runs: a burst of logs for one pet
+    # needs one analysis, but not one that started before the newest log was saved
+    'symptom_progression': JobType(_run_symptom_progression, dedup_running=False),
+}
+
+
+def _response_body(response: Response):
+    return response.data, response.status_code
+
+
+# ============================================================================
+# ENQUEUE / POLL
+# ============================================================================
+
+def job_mode_requested(request) -> bool:
+    """True if job mode is enabled and the client asked for an asynchronous response."""
+    if not getattr(settings, 'LLM_JOB_MODE_ENABLED', False):
+        return False
+    prefer = request.META.get('HTTP_PREFER', '')
+    if 'respond-async' in [p.strip().lower() for p in prefer.split(',')]:
+        return True
+    return request.GET.get('background', '').lower() in ('1', 'true', 'yes')
+
+
+def request_payload(request) -> dict:
+    """request.data as a plain dict for the job payload (form posts arrive as a QueryDict)."""
+    data = request.data
+    return data.dict() if hasattr(data, 'dict') else dict(data)
+
+
+def payload_dedup_key(job_type: str, user, payload: dict) -> str:
+    """Dedup key for "same user submitted the same request again" (client retries)."""
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, cls=JSONEncoder).encode('utf-8')
+    ).hexdigest()[:32]
+    return f"{job_type}:{user.id}:{digest}"
+
+
+def enqueue_job(job_type: str, user, payload: dict, dedup_key: Optional[str] = None) -> LLMJob:
+    """
+    Queue a job, or return the active job that already covers it.
+
+    Args:
+        job_type: Key of JOB_TYPES
+        user: Owner of the job (only they can poll it)
+        payload: JSON-serializable request data for the handler
+        dedup_key: Jobs with the same key share one run while queued
+            (or running, if the job type allows)
+
+    Returns:
+        LLMJob: The new or existing job
+    """
+    spec = JOB_TYPES[job_type]
+    payload = json.loads(json.dumps(payload, cls=JSONEncoder))
+
+    if dedup_key:
+        active = [LLMJob.STATUS_QUEUED]
+        if spec.dedup_running:
+            active.append(LLMJob.STATUS_RUNNING)
+        existing = LLMJob.objects.filter(dedup_key=dedup_key, status__in=active).order_by('-created_at').first()
+        if existing:
+            logger.info(f"🧵 Job {job_type} deduplicated onto {existing.id} ({existing.status})")
+            return existing
+
+    try:
+        with transaction.atomic():
+            job = LLMJob.objects.create(
+                job_type=job_type,
+                user=user,
+                payload=payload,
+                dedup_key=dedup_key,
+                max_attempts=spec.max_attempts,
+            )
+    except IntegrityError:
+        # Another request queued the same dedup key between our check and insert
+        return LLMJob.objects.get(dedup_key=dedup_key, status=LLMJob.STATUS_QUEUED)
+
+    logger.info(f"🧵 Queued {job_type} job {job.id}")
+    return job
+
+
+def job_accepted_response(request, job: LLMJob, extra: Optional[dict] = None) -> Response:
+    """202 response pointing the client at the job's poll URL."""
+    poll_url = request.build_absolute_uri(f"/api/chatbot/jobs/{job.id}/")
+    body = {
+        'success': True,
+        'job_id': str(job.id),
+        'job_type': job.job_type,
+        'status': job.status,
+        'poll_url': poll_url,
+    }
+    if extra:
+        body.update(extra)
+    response = Response(body, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = poll_url
+    response['Retry-After'] = str(getattr(settings, 'LLM_JOB_POLL_AFTER_SECONDS', 2))
+    response['Preference-Applied'] = 'respond-async'
+    return response
+
+
+def serialize_job(job: LLMJob) -> dict:
+    data = {
+        'job_id': str(job.id),
+        'job_type': job.job_type,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+    if job.is_finished:
+        data['result_status'] = job.result_status
+        data['result'] = job.result
+    if job.error:
+        data['error'] = job.error
+    return data
+
+
+# ============================================================================
+# WORKER SIDE
+# ============================================================================
+
+def claim_next_job(worker_id: str, job_types=None, running_counts: Optional[Dict[str, int]] = None) -> Optional[LLMJob]:
+    """
+    Claim the oldest runnable job whose type is below its concurrency cap.
+
+    Args:
+        worker_id: Written to locked_by
+        job_types: Restrict to these types (default: all registered)
+        running_counts: Jobs per type this worker is already running
+
+    Returns:
+        LLMJob now in 'running' state, or None if nothing is runnable
+    """
+    running_counts = running_counts or {}
+    types = [
+        t for t in (job_types or JOB_TYPES)
+        if t in JOB_TYPES and running_counts.get(t, 0) < JOB_TYPES[t].max_concurrency
+    ]
+    if not types:
+        return None
+
+    now = timezone.now()
+    candidates = LLMJob.objects.filter(
+        status=LLMJob.STATUS_QUEUED, job_type__in=types, run_after__lte=now
+    ).order_by('run_after', 'created_at').values_list('id', flat=True)[:20]
+
+    for job_id in candidates:
+        claimed = LLMJob.objects.filter(id=job_id, status=LLMJob.STATUS_QUEUED).update(
+            status=LLMJob.STATUS_RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return LLMJob.objects.select_related('user').get(id=job_id)
+    return None
+
+
+def run_job(job: LLMJob) -> LLMJob:
+    """Run a claimed job and record its result, retry or failure."""
+    spec = JOB_TYPES.get(job.job_type)
+    try:
+        if spec is None:
+            raise ValueError(f"Unknown job type '{job.job_type}'")
+        body, status_code = spec.handler(job)
+    except Exception as e:
+        logger.exception(f"❌ Job {job.job_type} {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {e}")
+        if spec is not None and job.attempts < job.max_attempts:
+            backoff = getattr(settings, 'LLM_JOB_RETRY_BACKOFF_SECONDS', 5) * (2 ** (job.attempts - 1))
+            _finish(job, status=LLMJob.STATUS_QUEUED, error=str(e),
+                    run_after=timezone.now() + timedelta(seconds=backoff), locked_by='', locked_at=None)
+        else:
+            _finish(job, status=LLMJob.STATUS_FAILED, error=str(e), finished_at=timezone.now(),
+                    result={'success': False, 'error': str(e)},
+                    result_status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return job
+
+    _finish(
+        job,
+        status=LLMJob.STATUS_SUCCEEDED,
+        result=json.loads(json.dumps(body, cls=JSONEncoder)),
+        result_status=status_code,
+        error='',
+        finished_at=timezone.now(),
+    )
+    logger.info(f"✅ Job {job.job_type} {job.id} finished with HTTP {status_code}")
+    return job
+
+
+def _finish(job: LLMJob, **fields):
+    """Write the outcome, unless requeue_stale_jobs took the job back meanwhile."""
+    lease = dict(id=job.id, status=LLMJob.STATUS_RUNNING, locked_by=job.locked_by)
+    if fields.get('status') == LLMJob.STATUS_QUEUED:
+        updated, fields = _requeue(lease, job.dedup_key, fields)
+    else:
+        updated = LLMJob.objects.filter(**lease).update(**fields)
+    for name, value in fields.items():
+        setattr(job, name, value)
+    if not updated:
+        logger.warning(f"🧵 Job {job.id} lost its lease to another worker; outcome discarded")
+
+
+def _requeue(job_filter: dict, dedup_key: Optional[str], fields: dict) -> Tuple[int, dict]:
+    """
+    Put a running job back in the queue.
+
+    Only one job per dedup key may be queued. For job types with dedup_running=False
+    a newer job with the same key can already be waiting; it covers the same work
+    (with fresher input), so this job is marked failed and points at it instead.
+
+    Returns:
+        (rows updated, fields written)
+    """
+    fields = dict(fields, status=LLMJob.STATUS_QUEUED)
+    try:
+        with transaction.atomic():
+            return LLMJob.objects.filter(**job_filter).update(**fields), fields
+    except IntegrityError:
+        pass
+
+    successor = LLMJob.objects.filter(
+        dedup_key=dedup_key, status=LLMJob.STATUS_QUEUED
+    ).values_list('id', flat=True).first()
+    fields = dict(
+        status=LLMJob.STATUS_FAILED,
+        error=f"Superseded by queued job {successor}",
+        finished_at=timezone.now(),
+        locked_by='',
+        locked_at=None,
+        result={'success': False, 'error': 'Superseded by a newer job with the same input',
+                'superseded_by': str(successor)},
+        result_status=status.HTTP_409_CONFLICT,
+    )
+    updated = LLMJob.objects.filter(**job_filter).update(**fields)
+    if updated:
+        logger.info(f"🧵 Job {job_filter['id']} superseded by queued job {successor}")
+    return updated, fields
+
+
+def renew_leases(worker_id: str, job_ids) -> int:
+    """Heartbeat: refresh locked_at of jobs this worker is still running."""
+    if not job_ids:
+        return 0
+    return LLMJob.objects.filter(
+        id__in=list(job_ids), status=LLMJob.STATUS_RUNNING, locked_by=worker_id
+    ).update(locked_at=timezone.now())
+
+
+def requeue_stale_jobs(lease_seconds: Optional[float] = None) -> int:
+    """
+    Requeue running jobs whose worker stopped renewing their lease (crashed or killed).
+    run_llm_jobs renews the lease of every job it is running (see renew_leases).
+
+    Returns:
+        Number of jobs requeued, superseded or failed
+    """
+    lease_seconds = lease_seconds or getattr(settings, 'LLM_JOB_LEASE_SECONDS', 300)
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+    stale = LLMJob.objects.filter(status=LLMJob.STATUS_RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=LLMJob.STATUS_FAILED, error='Worker lease expired', finished_at=timezone.now(),
+        result={'success': False, 'error': 'Job did not finish'},
+        result_status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+
+    # One at a time: a job whose dedup key is already queued is superseded, not requeued
+    requeued = superseded = 0
+    for job_id, dedup_key in list(stale.values_list('id', 'dedup_key')):
+        updated, fields = _requeue(
+            dict(id=job_id, status=LLMJob.STATUS_RUNNING, locked_at__lt=cutoff), dedup_key,
+            dict(locked_by='', locked_at=None, run_after=timezone.now()),
+        )
+        if fields['status'] == LLMJob.STATUS_QUEUED:
+            requeued += updated
+        else:
+            superseded += updated
+
+    if failed or requeued or superseded:
+        logger.warning(f"🧵 Stale jobs: {requeued} requeued, {superseded} superseded, {failed} failed")
+    return failed + requeued + superseded
+
+
+def queue_stats() -> Dict:
+    """Job counts per type and status."""
+    counts = {}
+    for row in LLMJob.objects.values('job_type', 'status').annotate(n=Count('id')):
+        counts.setdefault(row['job_type'], {})[row['status']] = row['n']
+    return counts
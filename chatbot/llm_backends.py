@@ -0,0 +1,260 @@
+"""
+LLM backends behind the gateway (chatbot/llm_gateway.py)
+
+LLM_BACKEND selects where generate_text sends prompts:
+- 'gemini': the live Gemini API through the model registry (default)
+- 'record': Gemini, and every prompt/response pair is appended to LLM_RECORDING_PATH
+- 'replay': no network; serves responses recorded by 'record' (matched on the prompt
+  hash), or synthetic responses shaped like what each call site expects, after a
+  configurable latency. Used to load-test triage and chat on an offline machine.
+
+Each backend has a blocking generate() for the sync views and an agenerate()
+coroutine for the ASGI views (chatbot/views_async.py).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """Interface: turn a prompt into response text."""
+
+    name = 'base'
+
+    def prepare(self):
+        """Configuration checks that should fail before the call is attempted (e.g. missing API key)."""
+
+    def generate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        """
+        Args:
+            prompt: Full prompt text
+            purpose: Call site label ('chat', 'verification', ...)
+            timeout: Seconds the caller will wait for the answer
+
+        Returns:
+            Stripped response text, or None for an empty response
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        """Async generate; backends without a native async client run generate() in a thread."""
+        return await asyncio.to_thread(self.generate, prompt, purpose, timeout)
+
+    def stats(self) -> Dict:
+        return {'backend': self.name}
+
+
+class GeminiBackend(LLMBackend):
+    """Live Gemini API with model failover (current production behaviour)."""
+
+    name = 'gemini'
+
+    def prepare(self):
+        from .model_registry import model_registry
+        model_registry.configure()
+
+    def generate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        from .model_registry import model_registry
+        response = model_registry.get_model().generate_content(prompt, request_options={'timeout': timeout})
+        return self._text(response)
+
+    async def agenerate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        from .model_registry import model_registry
+        response = await model_registry.get_model().generate_content_async(prompt, request_options={'timeout': timeout})
+        return self._text(response)
+
+    @staticmethod
+    def _text(response) -> Optional[str]:
+        if not response or not hasattr(response, 'text') or not response.text:
+            return None
+        return response.text.strip()
+
+
+class RecordingBackend(LLMBackend):
+    """Wraps another backend and appends each prompt/response pair to a JSONL file."""
+
+    name = 'record'
+
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def prepare(self):
+        self.inner.prepare()
+
+    def generate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        start = time.perf_counter()
+        text = self.inner.generate(prompt, purpose, timeout)
+        self._record(prompt, purpose, text, start)
+        return text
+
+    async def agenerate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        start = time.perf_counter()
+        text = await self.inner.agenerate(prompt, purpose, timeout)
+        self._record(prompt, purpose, text, start)
+        return text
+
+    def _record(self, prompt: str, purpose: str, text: Optional[str], start: float):
+        from .llm_gateway import prompt_key
+        record = {
+            'key': prompt_key(prompt),
+            'purpose': purpose,
+            'prompt': prompt,
+            'response': text,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            'recorded_at': time.time(),
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.recorded += 1
+
+    def stats(self) -> Dict:
+        return {'backend': self.name, 'path': self.path, 'recorded': self.recorded, 'inner': self.inner.stats()}
+
+
+# Synthetic responses in the format each call site parses
+_SYNTHETIC_VERIFICATION = {
+    "agreement": True,
+    "reasoning": "Synthetic replay response. Consistent with presentation.",
+    "risk_assessment": "MODERATE",
+    "missed_red_flags": [],
+    "severity_explanation": "Based on symptom frequency, the risk is moderate.",
+    "clinical_summary": "Synthetic clinical summary generated by the replay backend.",
+    "care_advice": ["Step 1: Monitor closely.", "Step 2: Keep the pet comfortable.", "Step 3: Offer water."],
+    "symptoms_consistent": [],
+    "what_to_do_specific": "Monitor symptoms and keep the pet hydrated.",
+    "see_vet_if_specific": "Symptoms persist beyond 24 hours or worsen.",
+    "secondary_advice": [],
+    "alternative_diagnosis": {},
+}
+
+SYNTHETIC_RESPONSES = {
+    'verification': json.dumps(_SYNTHETIC_VERIFICATION),
+    'verification_with_extraction': json.dumps({**_SYNTHETIC_VERIFICATION, 'normalized_symptoms': []}),
+    'symptom_extraction': 'None',
+    'symptom_progression': json.dumps({
+        "risk_score": 40, "urgency": "Medium", "trend": "Stable",
+        "prediction": "Synthetic forecast: condition expected to remain stable.", "alert_needed": False,
+    }),
+    'title': 'Pet Health Question',
+}
+SYNTHETIC_CHAT_RESPONSE = (
+    "This is a synthetic response from the replay backend. For any urgent concern about "
+    "your pet, please consult with a veterinarian."
+)
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Offline backend: recorded responses by prompt hash, else synthetic ones.
+
+    Args:
+        path: JSONL file written by RecordingBackend (may be missing)
+        latency_ms: Mean simulated latency per call
+        jitter_ms: Uniform +/- jitter around latency_ms
+        on_miss: 'synthetic' to answer unrecorded prompts, 'error' to raise
+    """
+
+    name = 'replay'
+
+    def __init__(self, path: Optional[str] = None, latency_ms: float = 0, jitter_ms: float = 0,
+                 on_miss: str = 'synthetic'):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.on_miss = on_miss
+        self.responses = self._load(path)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _load(path: Optional[str]) -> Dict[str, Optional[str]]:
+        responses = {}
+        if not path or not os.path.exists(path):
+            return responses
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                responses[record['key']] = record.get('response')
+        logger.info(f"📼 Loaded {len(responses)} recorded LLM responses from {path}")
+        return responses
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def generate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._lookup(prompt, purpose)
+
+    async def agenerate(self, prompt: str, purpose: str, timeout: float) -> Optional[str]:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._lookup(prompt, purpose)
+
+    def _lookup(self, prompt: str, purpose: str) -> Optional[str]:
+        from .llm_gateway import prompt_key
+        key = prompt_key(prompt)
+        if key in self.responses:
+            self.hits += 1
+            return self.responses[key]
+        self.misses += 1
+        if self.on_miss == 'error':
+            raise KeyError(f"No recorded {purpose} response for prompt {key[:8]}")
+        return SYNTHETIC_RESPONSES.get(purpose, SYNTHETIC_CHAT_RESPONSE)
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.name, 'path': self.path, 'recorded_responses': len(self.responses),
+            'hits': self.hits, 'misses': self.misses, 'latency_ms': self.latency_ms, 'jitter_ms': self.jitter_ms,
+        }
+
+
+def create_backend(name: str) -> LLMBackend:
+    """Backend for an LLM_BACKEND value."""
+    path = getattr(settings, 'LLM_RECORDING_PATH', 'llm_recordings.jsonl')
+    if name == 'gemini':
+        return GeminiBackend()
+    if name == 'record':
+        return RecordingBackend(GeminiBackend(), path)
+    if name == 'replay':
+        return ReplayBackend(
+            path,
+            latency_ms=getattr(settings, 'LLM_REPLAY_LATENCY_MS', 800),
+            jitter_ms=getattr(settings, 'LLM_REPLAY_JITTER_MS', 200),
+            on_miss=getattr(settings, 'LLM_REPLAY_ON_MISS', 'synthetic'),
+        )
+    raise ValueError(f"Unknown LLM_BACKEND '{name}' (expected gemini, record or replay)")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(getattr(settings, 'LLM_BACKEND', 'gemini'))
+                if _backend.name != 'gemini':
+                    logger.warning(f"📼 LLM backend: {_backend.name}")
+    return _backend
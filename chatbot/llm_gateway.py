@@ -0,0 +1,590 @@
+"""
+LLM gateway - single entry point for Gemini text generation
+
+Concurrent requests for an identical prompt are coalesced (single-flight): the
+first caller makes the Gemini call and every caller that arrives with the same
+prompt hash while it is in flight waits for it and shares its result, or its
+exception. With use_cache=True the SQLite response cache is checked first and
+filled once by the call that actually reached Gemini.
+
+Every call is also bounded so a degraded provider cannot hold request workers:
+- a per-call deadline (per purpose, see PURPOSE_DEADLINE_SETTINGS)
+- a circuit breaker that opens after repeated failures (immediately on quota
+  errors) and rejects calls until a cooldown has passed
+- a cap on concurrent Gemini calls in this process
+- optionally, a hedged duplicate request once the call is slower than the
+  observed p95 latency; whichever returns first wins
+Rejected and timed-out calls raise LLMUnavailableError so callers fall back to
+their deterministic path right away.
+
+Where prompts actually go (live Gemini, record, offline replay) is chosen by
+LLM_BACKEND, see chatbot/llm_backends.py.
+
+agenerate_text is the same pipeline for the ASGI views: the request is awaited
+on the event loop (no thread is held while Gemini thinks), with its own
+single-flight table and in-flight cap, and the shared breaker and latency window.
+"""
+import asyncio
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+
+from .llm_backends import get_llm_backend
+from .model_registry import GeminiApiKeyError, classify_gemini_error
+from .utils import get_cached_response, save_response_to_cache
+
+logger = logging.getLogger(__name__)
+
+# Deadline settings for call sites that already have a stage deadline; others use LLM_CALL_DEADLINE
+PURPOSE_DEADLINE_SETTINGS = {
+    'symptom_extraction': 'TRIAGE_LLM_EXTRACTION_TIMEOUT',
+    'verification': 'TRIAGE_VERIFICATION_TIMEOUT',
+    'verification_with_extraction': 'TRIAGE_VERIFICATION_TIMEOUT',
+}
+
+# Latency samples needed before the p95 is trusted for hedging
+MIN_HEDGE_SAMPLES = 20
+
+
+class LLMUnavailableError(Exception):
+    """Gemini was not called or did not answer: circuit open, overloaded, quota or provider error."""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """The call did not finish within its deadline."""
+
+
+# ============================================================================
+# SINGLE-FLIGHT
+# ============================================================================
+
+class _InFlightCall:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], object]) -> Tuple[object, bool]:
+        """
+        Returns:
+            (result, shared) - shared is True if this caller waited on another's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': in_flight}
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines; calls are coalesced per event loop.
+
+    The call runs as its own task that every caller (the first one included)
+    awaits through asyncio.shield, so a caller being cancelled - a stage deadline
+    in asyncio.wait_for, a client disconnect - never cancels the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, coro_fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """
+        Returns:
+            (result, shared) - shared is True if this caller joined another's call
+        """
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        with self._lock:
+            task = self._calls.get(slot)
+            shared = task is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                task = self._calls[slot] = loop.create_task(coro_fn())
+                task.add_done_callback(functools.partial(self._forget, slot))
+                self.executed += 1
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, slot, task: asyncio.Task):
+        with self._lock:
+            if self._calls.get(slot) is task:
+                del self._calls[slot]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller had given up
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': in_flight}
+
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures (or one quota error);
+    open -> half_open once the cooldown has passed, letting a single trial call through;
+    half_open -> closed on success, back to open on failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30,
+                 quota_cooldown_seconds: float = 120):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.quota_cooldown_seconds = quota_cooldown_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (does not consume the half-open trial)."""
+        with self._lock:
+            if self._state == self.OPEN:
+                return time.monotonic() < self._open_until
+            return self._state == self.HALF_OPEN and self._trial_in_flight
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._open_until:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("✅ Gemini circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Exception, quota: bool = False):
+        with self._lock:
+            self._failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self._trial_in_flight = False
+            if quota or self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                cooldown = self.quota_cooldown_seconds if quota else self.cooldown_seconds
+                self._state = self.OPEN
+                self._open_until = time.monotonic() + cooldown
+                self.times_opened += 1
+                logger.warning(f"⚡ Gemini circuit open for {cooldown}s after {self.last_error}")
+
+    def release_trial(self):
+        """The half-open trial ended without telling us anything (e.g. a bad request)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            retry_in = max(0.0, self._open_until - time.monotonic()) if self._state == self.OPEN else 0.0
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'retry_in_seconds': round(retry_in, 1),
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+            }
+
+
+class LatencyWindow:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))]
+
+
+# ============================================================================
+# RESILIENT CALL
+# ============================================================================
+
+class ResilientCaller:
+    """
+    Runs Gemini calls on a bounded pool with a deadline, circuit breaker and optional hedging.
+
+    Args:
+        max_concurrent: Gemini calls allowed in flight in this process (hedges included);
+            further calls are rejected instead of queued
+        hedge_enabled: Send a duplicate request when the first is slower than the p95
+        hedge_min_delay: Lower bound for the hedge delay (seconds)
+        max_concurrent_async: Awaited calls (acall) allowed in flight; these hold no
+            thread, so the cap is much higher than max_concurrent
+    """
+
+    def __init__(self, breaker: CircuitBreaker, max_concurrent: int = 16,
+                 hedge_enabled: bool = False, hedge_min_delay: float = 2.0,
+                 max_concurrent_async: int = 256):
+        self.breaker = breaker
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyWindow()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='gemini-call')
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_async = max_concurrent_async
+        self._async_in_flight = 0
+        self._async_lock = threading.Lock()
+        self.timeouts = 0
+        self.overloaded = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def _submit(self, fn: Callable[[], object]):
+        """Future for fn, or None if every slot is busy."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        future = self._executor.submit(fn)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled:
+            return None
+        p95 = self.latency.percentile(95, MIN_HEDGE_SAMPLES)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def call(self, fn: Callable[[], object], deadline: float, purpose: str = 'general'):
+        """
+        Run fn (a Gemini request) with the deadline, breaker and hedging applied.
+
+        Raises:
+            LLMUnavailableError: circuit open, no free slot, quota or provider failure
+            LLMTimeoutError: no answer within the deadline
+            GeminiApiKeyError / request errors: re-raised unchanged
+        """
+        if not self.breaker.allow():
+            raise LLMUnavailableError("Gemini circuit is open; skipping call")
+
+        start = time.monotonic()
+        primary = self._submit(fn)
+        if primary is None:
+            self.overloaded += 1
+            self.breaker.release_trial()
+            raise LLMUnavailableError(f"{self.max_concurrent} Gemini calls already in flight")
+        futures = {primary}
+
+        hedge_delay = self.hedge_delay()
+        if hedge_delay is not None and hedge_delay < deadline:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                hedge = self._submit(fn)
+                if hedge is not None:
+                    self.hedges_sent += 1
+                    futures.add(hedge)
+                    logger.info(f"🪞 Hedging {purpose} Gemini call after {hedge_delay:.1f}s")
+
+        last_error = None
+        while futures:
+            remaining = deadline - (time.monotonic() - start)
+            done, futures = wait(futures, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    self.latency.record(time.monotonic() - start)
+                    self.breaker.record_success()
+                    if future is not primary:
+                        self.hedges_won += 1
+                    return future.result()
+                last_error = error
+
+        self._raise_failure(last_error, last_error is None or bool(futures), deadline, purpose)
+
+    def _raise_failure(self, last_error: Optional[BaseException], timed_out: bool, deadline: float, purpose: str):
+        """Feed the outcome of a failed call to the breaker and raise what the caller should see."""
+        if timed_out:
+            self.timeouts += 1
+            error = LLMTimeoutError(f"{purpose} Gemini call exceeded its {deadline}s deadline")
+            self.breaker.record_failure(error)
+            raise error
+
+        if isinstance(last_error, GeminiApiKeyError):
+            self.breaker.release_trial()
+            raise last_error
+        kind = classify_gemini_error(last_error)
+        if kind in ('auth', 'request'):
+            self.breaker.release_trial()
+            raise last_error
+        self.breaker.record_failure(last_error, quota=(kind == 'quota'))
+        raise LLMUnavailableError(f"Gemini {kind}: {last_error}") from last_error
+
+    def _acquire_async_slot(self) -> bool:
+        with self._async_lock:
+            if self._async_in_flight >= self.max_concurrent_async:
+                return False
+            self._async_in_flight += 1
+            return True
+
+    def _release_async_slots(self, count: int):
+        with self._async_lock:
+            self._async_in_flight -= count
+
+    async def acall(self, coro_fn: Callable[[], Awaitable], deadline: float, purpose: str = 'general'):
+        """
+        call() for coroutines: same breaker, deadline and hedging, awaited on the running loop.
+        Unlike threads, the losing hedge and timed-out requests are cancelled.
+        """
+        if not self.breaker.allow():
+            raise LLMUnavailableError("Gemini circuit is open; skipping call")
+        if not self._acquire_async_slot():
+            self.overloaded += 1
+            self.breaker.release_trial()
+            raise LLMUnavailableError(f"{self.max_concurrent_async} async Gemini calls already in flight")
+
+        start = time.monotonic()
+        slots = 1
+        primary = asyncio.ensure_future(coro_fn())
+        tasks = {primary}
+        last_error = None
+        try:
+            hedge_delay = self.hedge_delay()
+            if hedge_delay is not None and hedge_delay < deadline:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self._acquire_async_slot():
+                    slots += 1
+                    self.hedges_sent += 1
+                    tasks.add(asyncio.ensure_future(coro_fn()))
+                    logger.info(f"🪞 Hedging {purpose} Gemini call after {hedge_delay:.1f}s")
+
+            while tasks:
+                remaining = deadline - (time.monotonic() - start)
+                done, tasks = await asyncio.wait(tasks, timeout=max(0.0, remaining),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        self.latency.record(time.monotonic() - start)
+                        self.breaker.record_success()
+                        if task is not primary:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = error
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._release_async_slots(slots)
+
+        self._raise_failure(last_error, last_error is None or bool(tasks), deadline, purpose)
+
+    def stats(self) -> Dict:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            'breaker': self.breaker.stats(),
+            'max_concurrent': self.max_concurrent,
+            'max_concurrent_async': self.max_concurrent_async,
+            'async_in_flight': self._async_in_flight,
+            'timeouts': self.timeouts,
+            'overloaded': self.overloaded,
+            'hedge_enabled': self.hedge_enabled,
+            'hedges_sent': self.hedges_sent,
+            'hedges_won': self.hedges_won,
+            'latency_p50_seconds': round(p50, 3) if p50 is not None else None,
+            'latency_p95_seconds': round(p95, 3) if p95 is not None else None,
+        }
+
+
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+_resilient_caller = None
+_resilient_caller_lock = threading.Lock()
+
+
+def get_resilient_caller() -> ResilientCaller:
+    global _resilient_caller
+    if _resilient_caller is None:
+        with _resilient_caller_lock:
+            if _resilient_caller is None:
+                _resilient_caller = ResilientCaller(
+                    CircuitBreaker(
+                        failure_threshold=getattr(settings, 'LLM_BREAKER_FAILURE_THRESHOLD', 5),
+                        cooldown_seconds=getattr(settings, 'LLM_BREAKER_COOLDOWN_SECONDS', 30),
+                        quota_cooldown_seconds=getattr(settings, 'LLM_BREAKER_QUOTA_COOLDOWN_SECONDS', 120),
+                    ),
+                    max_concurrent=getattr(settings, 'LLM_MAX_CONCURRENT_CALLS', 16),
+                    hedge_enabled=getattr(settings, 'LLM_HEDGE_ENABLED', False),
+                    hedge_min_delay=getattr(settings, 'LLM_HEDGE_MIN_DELAY_SECONDS', 2.0),
+                    max_concurrent_async=getattr(settings, 'LLM_MAX_CONCURRENT_ASYNC_CALLS', 256),
+                )
+    return _resilient_caller
+
+
+def llm_available() -> bool:
+    """False while the circuit is open; callers can skip straight to their deterministic path."""
+    return not get_resilient_caller().breaker.is_open()
+
+
+def get_call_deadline(purpose: str) -> float:
+    setting_name = PURPOSE_DEADLINE_SETTINGS.get(purpose)
+    if setting_name and hasattr(settings, setting_name):
+        return float(getattr(settings, setting_name))
+    return float(getattr(settings, 'LLM_CALL_DEADLINE', 25))
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def generate_text(prompt: str, purpose: str = 'general', use_cache: bool = False,
+                  deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Generate text with the preferred healthy Gemini model.
+
+    Args:
+        prompt: Full prompt text
+        purpose: Call site label for logs and the default deadline ('chat', 'verification', ...)
+        use_cache: Read/write the persistent LLM response cache
+        deadline: Seconds to wait for Gemini (default: get_call_deadline(purpose))
+
+    Returns:
+        Stripped response text, or None if the model returned an empty response
+
+    Raises:
+        LLMUnavailableError / LLMTimeoutError: fall back to the deterministic path
+        GeminiApiKeyError or configuration errors (also re-raised to coalesced callers)
+    """
+    if use_cache:
+        cached = get_cached_response(prompt)
+        if cached:
+            return cached
+
+    if deadline is None:
+        deadline = get_call_deadline(purpose)
+    caller = get_resilient_caller()
+    backend = get_llm_backend()
+
+    def call():
+        # Configuration errors (missing key) surface here, before the breaker sees them
+        backend.prepare()
+        text = caller.call(lambda: backend.generate(prompt, purpose, deadline), deadline, purpose)
+        if use_cache and text:
+            save_response_to_cache(prompt, text)
+        return text
+
+    key = prompt_key(prompt)
+    text, shared = _single_flight.do(key, call)
+    if shared:
+        logger.info(f"🔗 Coalesced {purpose} Gemini call onto in-flight request {key[:8]}...")
+    return text
+
+
+async def agenerate_text(prompt: str, purpose: str = 'general', use_cache: bool = False,
+                         deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Async generate_text for the ASGI views; same arguments, return value and exceptions.
+    """
+    if use_cache:
+        cached = await asyncio.to_thread(get_cached_response, prompt)
+        if cached:
+            return cached
+
+    if deadline is None:
+        deadline = get_call_deadline(purpose)
+    caller = get_resilient_caller()
+    backend = get_llm_backend()
+
+    async def call():
+        await asyncio.to_thread(backend.prepare)
+        text = await caller.acall(lambda: backend.agenerate(prompt, purpose, deadline), deadline, purpose)
+        if use_cache and text:
+            await asyncio.to_thread(save_response_to_cache, prompt, text)
+        return text
+
+    key = prompt_key(prompt)
+    text, shared = await _async_single_flight.do(key, call)
+    if shared:
+        logger.info(f"🔗 Coalesced {purpose} Gemini call onto in-flight request {key[:8]}...")
+    return text
+
+
+def gateway_stats() -> Dict:
+    return {
+        'single_flight': _single_flight.stats(),
+        'async_single_flight': _async_single_flight.stats(),
+        'resilience': get_resilient_caller().stats(),
+        'backend': get_llm_backend().stats(),
+    }
@@ -0,0 +1,107 @@
+"""
+Run the background LLM job queue (job mode, see chatbot/jobs.py)
+
+Usage:
+    python manage.py run_llm_jobs
+    python manage.py run_llm_jobs --workers 8 --job-types ai_diagnosis soap_generation
+    python manage.py run_llm_jobs --once    # drain the queue and exit
+
+Several worker processes can share one database; SIGINT/SIGTERM stop claiming
+new jobs and wait for the running ones. The lease of every running job is renewed
+every LLM_JOB_LEASE_SECONDS / 3, so only jobs of a dead worker are requeued.
+"""
+import os
+import signal
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from chatbot.jobs import JOB_TYPES, claim_next_job, queue_stats, renew_leases, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued LLM jobs (job mode for diagnosis, SOAP and symptom progression endpoints)'
+
+    requeue_interval_seconds = 30
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'LLM_JOB_WORKERS', 4),
+            help='Jobs run at once by this process'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds between queue checks while idle'
+        )
+        parser.add_argument(
+            '--job-types', nargs='+', choices=sorted(JOB_TYPES),
+            help='Only run these job types'
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        self.stdout.write(self.style.SUCCESS(f"\n🧵 LLM job worker {worker_id} ({workers} workers)"))
+        self.stdout.write(f"   Queue: {queue_stats()}")
+
+        running = {}  # future -> job
+        heartbeat_interval = getattr(settings, 'LLM_JOB_LEASE_SECONDS', 300) / 3
+        last_requeue = last_heartbeat = 0.0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-job') as pool:
+            while not stop.is_set():
+                close_old_connections()
+                for future in [f for f in running if f.done()]:
+                    running.pop(future)
+
+                try:
+                    if running and time.monotonic() - last_heartbeat >= heartbeat_interval:
+                        renew_leases(worker_id, [running_job.id for running_job in running.values()])
+                        last_heartbeat = time.monotonic()
+                    if time.monotonic() - last_requeue >= self.requeue_interval_seconds:
+                        requeue_stale_jobs()
+                        last_requeue = time.monotonic()
+                except Exception as e:
+                    # Housekeeping failures must not take the worker (and its running jobs) down
+                    self.stderr.write(f"  ⚠️ Lease housekeeping failed: {e}")
+
+                claimed = 0
+                while len(running) < workers:
+                    running_counts = Counter(running_job.job_type for running_job in running.values())
+                    job = claim_next_job(worker_id, options['job_types'], running_counts)
+                    if job is None:
+                        break
+                    self.stdout.write(f"  ▶️  {job.job_type} {job.id} (attempt {job.attempts}/{job.max_attempts})")
+                    running[pool.submit(self._run, job)] = job
+                    claimed += 1
+
+                if not claimed:
+                    if running:
+                        wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    elif options['once']:
+                        break
+                    else:
+                        stop.wait(poll_interval)
+
+        self.stdout.write(self.style.SUCCESS(f"🧵 Worker stopped. Queue: {queue_stats()}"))
+
+    @staticmethod
+    def _run(job):
+        try:
+            job = run_job(job)
+        finally:
+            # Pool threads are reused: don't keep one DB connection per thread open
+            connection.close()
+        return job
@@ -0,0 +1,313 @@
+"""
+Process-wide Gemini model registry
+
+Configures the Gemini SDK once per process and keeps a priority-ordered list of
+candidate models. Model health is tracked from the outcome of real calls instead
+of a synchronous "Hi" probe: a failing model is put on cooldown and the call fails
+over to the next healthy candidate. An optional background probe (enabled with
+GEMINI_HEALTH_PROBE_INTERVAL) brings models back early once they recover.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import google.generativeai as genai
+from django.conf import settings
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # pragma: no cover - api_core ships with google-generativeai
+    google_exceptions = None
+
+
+logger = logging.getLogger(__name__)
+
+API_KEY_ERROR_MESSAGE = (
+    "Gemini API key is invalid or has been revoked. Please get a new API key from "
+    "https://aistudio.google.com/app/apikey and update your .env file."
+)
+
+# Used when the model list cannot be fetched (e.g. transient network error at startup)
+DEFAULT_MODEL_CANDIDATES = [
+    'models/gemini-1.5-pro',
+    'models/gemini-1.5-flash',
+]
+
+# Cooldowns before an unhealthy model is tried again
+UNHEALTHY_COOLDOWN_SECONDS = 60
+QUOTA_COOLDOWN_SECONDS = 300
+
+# Maximum number of models a single call may fail over through
+MAX_FAILOVER_ATTEMPTS = 3
+
+
+class GeminiApiKeyError(Exception):
+    """Raised when the configured Gemini API key is missing, invalid or revoked."""
+
+
+def get_model_priority_score(model_name: str) -> int:
+    """
+    Scoring logic to prioritize models for Thesis Defense (Accuracy > Speed).
+    Priority Order:
+    1. Gemini 1.5 PRO (Highest reasoning capability)
+    2. Gemini 1.5 FLASH (Fallback)
+    3. Others
+    """
+    name_lower = model_name.lower()
+    score = 0
+
+    # TIER 1: PRO models (The "Brain" - Critical for Medical Diagnosis)
+    if "pro" in name_lower:
+        score += 100
+
+    # TIER 2: Version 1.5 (Current Stable Standard)
+    if "1.5" in name_lower:
+        score += 50
+
+    # TIER 3: Flash (Fast, but less reasoning depth - backup only)
+    if "flash" in name_lower:
+        score += 10
+
+    # Penalize "Vision" specific models for text diagnosis
+    if "vision" in name_lower and "pro" not in name_lower:
+        score -= 10
+
+    # Penalize Experimental/Preview models (Stability Risk for Defense)
+    if "experimental" in name_lower or "preview" in name_lower:
+        score -= 20
+
+    return score
+
+
+def classify_gemini_error(error: Exception) -> str:
+    """
+    Classify a Gemini SDK error.
+
+    Returns:
+        'auth'    - API key problem; no other model will succeed
+        'request' - the request itself is bad; the model is healthy
+        'quota'   - quota / rate limit exhausted for this model
+        'unavailable' - model missing, overloaded or timing out; fail over
+    """
+    message = str(error).lower()
+    if "api key" in message or "leaked" in message:
+        return 'auth'
+    if google_exceptions is not None:
+        if isinstance(error, (google_exceptions.PermissionDenied, google_exceptions.Unauthenticated)):
+            return 'auth'
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            return 'quota'
+        if isinstance(error, google_exceptions.InvalidArgument):
+            return 'request'
+    if "403" in message or "permission" in message:
+        return 'auth'
+    if "quota" in message or "429" in message:
+        return 'quota'
+    return 'unavailable'
+
+
+class RegisteredGeminiModel:
+    """
+    Thin proxy around genai.GenerativeModel that reports call outcomes to the
+    registry and fails over to the next healthy model on provider errors.
+    """
+
+    def __init__(self, registry: 'GeminiModelRegistry', model_name: str):
+        self._registry = registry
+        self.model_name = model_name
+
+    def _failover(self, model_name: str, error: Exception, tried: List[str]) -> str:
+        """Record a failed call; returns the model to try next or re-raises."""
+        kind = classify_gemini_error(error)
+        if kind == 'auth':
+            logger.error(f"❌ API key error from {model_name}: {error}")
+            raise GeminiApiKeyError(API_KEY_ERROR_MESSAGE) from error
+        if kind == 'request':
+            raise error
+        self._registry.mark_unhealthy(model_name, error, quota=(kind == 'quota'))
+        next_name = self._registry.select_model_name(exclude=tried)
+        if next_name is None or len(tried) >= MAX_FAILOVER_ATTEMPTS:
+            raise error
+        logger.warning(f"⚠️ Gemini model {model_name} failed ({type(error).__name__}), failing over to {next_name}")
+        return next_name
+
+    def generate_content(self, *args, **kwargs):
+        model_name = self.model_name
+        tried = []
+        while True:
+            tried.append(model_name)
+            try:
+                response = self._registry.get_generative_model(model_name).generate_content(*args, **kwargs)
+            except Exception as e:
+                model_name = self._failover(model_name, e, tried)
+                continue
+            self._registry.mark_healthy(model_name)
+            self.model_name = model_name
+            return response
+
+    async def generate_content_async(self, *args, **kwargs):
+        """generate_content for the ASGI views (same failover, awaits the SDK's async client)."""
+        model_name = self.model_name
+        tried = []
+        while True:
+            tried.append(model_name)
+            try:
+                response = await self._registry.get_generative_model(model_name).generate_content_async(*args, **kwargs)
+            except Exception as e:
+                model_name = self._failover(model_name, e, tried)
+                continue
+            self._registry.mark_healthy(model_name)
+            self.model_name = model_name
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self._registry.get_generative_model(self.model_name), name)
+
+
+class GeminiModelRegistry:
+    """Configures Gemini once and tracks per-model health from real call outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured_key: Optional[str] = None
+        self._candidates: List[str] = []
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._unhealthy_until: Dict[str, float] = {}
+        self._last_errors: Dict[str, str] = {}
+        self._probe_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Configuration
+    # ------------------------------------------------------------------
+
+    def _get_api_key(self) -> str:
+        api_key = getattr(settings, 'GEMINI_API_KEY', None)
+        if not api_key:
+            raise Exception("GEMINI_API_KEY is not set in your .env file. Please add GEMINI_API_KEY=your-key-here to your .env file.")
+        api_key = api_key.strip()
+        if not api_key:
+            raise Exception("GEMINI_API_KEY is empty in your .env file. Please check your .env file and add a valid API key.")
+        return api_key
+
+    def configure(self):
+        """Configure the SDK and discover candidate models (once per API key)."""
+        api_key = self._get_api_key()
+        if api_key == self._configured_key:
+            return
+
+        with self._lock:
+            if api_key == self._configured_key:
+                return
+
+            logger.info(f"🔑 Configuring Gemini API key (length: {len(api_key)})")
+            genai.configure(api_key=api_key)
+
+            try:
+                supported = [
+                    model.name for model in genai.list_models()
+                    if 'generateContent' in model.supported_generation_methods
+                ]
+            except Exception as e:
+                if classify_gemini_error(e) == 'auth':
+                    raise GeminiApiKeyError(API_KEY_ERROR_MESSAGE) from e
+                logger.warning(f"⚠️ Could not list Gemini models ({e}); using default candidates")
+                supported = list(DEFAULT_MODEL_CANDIDATES)
+
+            if not supported:
+                raise Exception("No Gemini models found that support generateContent")
+
+            self._candidates = sorted(supported, key=lambda name: (-get_model_priority_score(name), name))
+            self._models = {}
+            self._unhealthy_until = {}
+            self._last_errors = {}
+            self._configured_key = api_key
+            logger.info(f"✅ Gemini model registry ready: {len(self._candidates)} candidates, preferred {self._candidates[0]}")
+
+        interval = getattr(settings, 'GEMINI_HEALTH_PROBE_INTERVAL', 0)
+        if interval:
+            self.start_health_probe(interval)
+
+    # ------------------------------------------------------------------
+    # Model selection and health
+    # ------------------------------------------------------------------
+
+    def get_generative_model(self, model_name: str) -> genai.GenerativeModel:
+        model = self._models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+
+    def select_model_name(self, exclude: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Highest-priority healthy model. If every model is cooling down, the one
+        that becomes available soonest is returned so callers still get an answer.
+        """
+        exclude = set(exclude or [])
+        now = time.monotonic()
+        candidates = [name for name in self._candidates if name not in exclude]
+        if not candidates:
+            return None
+        for name in candidates:
+            if self._unhealthy_until.get(name, 0) <= now:
+                return name
+        return min(candidates, key=lambda name: self._unhealthy_until.get(name, 0))
+
+    def get_model(self) -> RegisteredGeminiModel:
+        self.configure()
+        return RegisteredGeminiModel(self, self.select_model_name())
+
+    def mark_healthy(self, model_name: str):
+        if model_name in self._unhealthy_until:
+            with self._lock:
+                self._unhealthy_until.pop(model_name, None)
+                self._last_errors.pop(model_name, None)
+            logger.info(f"✅ Gemini model {model_name} marked healthy")
+
+    def mark_unhealthy(self, model_name: str, error: Exception, quota: bool = False):
+        cooldown = QUOTA_COOLDOWN_SECONDS if quota else UNHEALTHY_COOLDOWN_SECONDS
+        with self._lock:
+            self._unhealthy_until[model_name] = time.monotonic() + cooldown
+            self._last_errors[model_name] = f"{type(error).__name__}: {error}"
+        logger.warning(f"⚠️ Gemini model {model_name} marked unhealthy for {cooldown}s: {type(error).__name__}: {error}")
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            'configured': self._configured_key is not None,
+            'candidates': list(self._candidates),
+            'unhealthy': {
+                name: {'retry_in_seconds': round(until - now, 1), 'last_error': self._last_errors.get(name)}
+                for name, until in self._unhealthy_until.items() if until > now
+            },
+        }
+
+    # ------------------------------------------------------------------
+    # Optional background health probe
+    # ------------------------------------------------------------------
+
+    def start_health_probe(self, interval_seconds: float):
+        """Start a daemon thread that re-probes unhealthy models every interval."""
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(
+                target=self._probe_loop, args=(interval_seconds,), name='gemini-health-probe', daemon=True
+            )
+            self._probe_thread.start()
+        logger.info(f"🩺 Gemini health probe started (every {interval_seconds}s)")
+
+    def _probe_loop(self, interval_seconds: float):
+        while True:
+            time.sleep(interval_seconds)
+            for model_name in list(self._unhealthy_until):
+                try:
+                    response = self.get_generative_model(model_name).generate_content("Hi")
+                    if response and getattr(response, 'text', None):
+                        self.mark_healthy(model_name)
+                except Exception as e:
+                    logger.debug(f"Health probe for {model_name} still failing: {e}")
+
+
+model_registry = GeminiModelRegistry()
@@ -342,4 +342,75 @@ class PetHealthTrend(models.Model):
         verbose_name_plural = 'Pet Health Trends'
     
     def __str__(self):
-        return f"{self.pet.name} - {self.analysis_date.strftime('%Y-%m-%d')} - {self.urgency_level}"
\ No newline at end of file
+        return f"{self.pet.name} - {self.analysis_date.strftime('%Y-%m-%d')} - {self.urgency_level}"
+
+
+class LLMJob(models.Model):
+    """
+    Queued run of an LLM-heavy endpoint (background job mode, see chatbot/jobs.py).
+    
+    The table is the queue: `manage.py run_llm_jobs` claims queued rows, runs
+    them and stores the response the endpoint would have returned.
+    """
+    
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job_type = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='llm_jobs')
+    payload = models.JSONField(default=dict, help_text="Request data the job runs with")
+    dedup_key = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        help_text="Jobs with the same key share one queued run"
+    )
+    
+    # Queue state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retry backoff)")
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    # Outcome
+    result = models.JSONField(null=True, blank=True, help_text="Response body the endpoint returned")
+    result_status = models.IntegerField(null=True, blank=True, help_text="HTTP status the endpoint returned")
+    error = models.TextField(blank=True, default='')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['dedup_key', 'status']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='unique_queued_llm_job_dedup_key',
+            ),
+        ]
+        verbose_name = 'LLM Job'
+        verbose_name_plural = 'LLM Jobs'
+    
+    def __str__(self):
+        return f"{self.job_type} {self.id} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
@@ -0,0 +1,244 @@
+"""
+SQLite-backed LLM response cache
+
+Storage engine behind chatbot.utils.get_cached_response / save_response_to_cache.
+Entries live in an indexed key/value table in WAL mode, so lookups are a single
+primary-key read and several gunicorn workers can read and write concurrently.
+
+Features:
+    - TTL expiry (checked on read, purged during eviction)
+    - LRU size eviction based on last access time
+    - Hit/miss counters shared by all processes
+    - One-time import of the legacy gemini_response_cache.json file, recorded in
+      a meta row so it is never re-imported once entries expire or are evicted
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Only refresh accessed_at when it is older than this, so hot reads stay read-only
+ACCESS_TOUCH_INTERVAL_SECONDS = 60
+
+# Run TTL/LRU eviction once every N writes
+EVICTION_EVERY_N_WRITES = 100
+
+# Flush per-process hit/miss counters to the shared table every N lookups
+STATS_FLUSH_EVERY_N_LOOKUPS = 50
+
+
+class SQLiteResponseCache:
+    """
+    Key/value cache for LLM responses stored in a single SQLite file.
+
+    Args:
+        path: SQLite database file (created if missing)
+        ttl_seconds: Entry lifetime; 0 disables expiry
+        max_entries: LRU size bound; 0 disables size eviction
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 0, max_entries: int = 0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._writes = 0
+        self._schema_ready = False
+
+    # ------------------------------------------------------------------
+    # Connection management
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process (gunicorn forks after import)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        if not self._schema_ready:
+            self._create_schema(conn)
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_llm_response_cache_accessed ON llm_response_cache (accessed_at);
+            CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires ON llm_response_cache (expires_at);
+            CREATE TABLE IF NOT EXISTS llm_response_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO llm_response_cache_stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+            CREATE TABLE IF NOT EXISTS llm_response_cache_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._schema_ready = True
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, accessed_at, expires_at FROM llm_response_cache WHERE key = ?', (key,)
+        ).fetchone()
+
+        now = time.time()
+        if row is None or (row[2] is not None and row[2] <= now):
+            self._count(hit=False)
+            return None
+
+        if now - row[1] > ACCESS_TOUCH_INTERVAL_SECONDS:
+            conn.execute('UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        self._count(hit=True)
+        return row[0]
+
+    def set(self, key: str, value: str):
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        conn.execute(
+            'INSERT OR REPLACE INTO llm_response_cache (key, value, created_at, accessed_at, expires_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, value, now, now, expires_at),
+        )
+        with self._stats_lock:
+            self._writes += 1
+            run_eviction = self._writes % EVICTION_EVERY_N_WRITES == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones above max_entries."""
+        conn = self._connect()
+        removed = conn.execute(
+            'DELETE FROM llm_response_cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+        ).rowcount
+        if self.max_entries:
+            overflow = conn.execute('SELECT COUNT(*) FROM llm_response_cache').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                removed += conn.execute(
+                    'DELETE FROM llm_response_cache WHERE key IN '
+                    '(SELECT key FROM llm_response_cache ORDER BY accessed_at LIMIT ?)',
+                    (overflow,),
+                ).rowcount
+        if removed:
+            conn.execute("UPDATE llm_response_cache_stats SET value = value + ? WHERE name = 'evictions'", (removed,))
+            logger.info(f"💾 Cache eviction removed {removed} entries")
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        self._flush_counters()
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, value FROM llm_response_cache_stats').fetchall())
+        entries = conn.execute('SELECT COUNT(*) FROM llm_response_cache').fetchone()[0]
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': round(counters.get('hits', 0) / lookups, 4) if lookups else 0.0,
+        }
+
+    def import_json_file(self, json_path: str) -> int:
+        """
+        One-time migration of the legacy {prompt_hash: response} JSON cache.
+
+        The import is recorded in llm_response_cache_meta (keyed by the file's
+        absolute path), so a JSON file left on disk is not imported again after
+        its entries expired or were evicted.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        marker = f"legacy_import:{os.path.abspath(json_path)}"
+        conn = self._connect()
+        if self._meta(conn, marker) is not None:
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"⚠️ Could not import legacy cache {json_path}: {e}")
+            return 0
+
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        rows = [(key, value, now, now, expires_at) for key, value in legacy.items() if isinstance(value, str)]
+        # IMMEDIATE: one worker imports, the others wait and then see the marker
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self._meta(conn, marker) is not None:
+                conn.execute('ROLLBACK')
+                return 0
+            # A filled cache without a marker predates it: the old empty-table guard already imported the file
+            already_imported = conn.execute('SELECT 1 FROM llm_response_cache LIMIT 1').fetchone() is not None
+            if not already_imported:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO llm_response_cache (key, value, created_at, accessed_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    rows,
+                )
+            conn.execute('INSERT INTO llm_response_cache_meta (name, value) VALUES (?, ?)', (marker, str(now)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if already_imported:
+            return 0
+        logger.info(f"💾 Imported {len(rows)} entries from legacy cache {json_path}")
+        return len(rows)
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, name: str) -> Optional[str]:
+        row = conn.execute('SELECT value FROM llm_response_cache_meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self._pending_hits += 1
+            else:
+                self._pending_misses += 1
+            flush = self._pending_hits + self._pending_misses >= STATS_FLUSH_EVERY_N_LOOKUPS
+        if flush:
+            self._flush_counters()
+
+    def _flush_counters(self):
+        with self._stats_lock:
+            hits, misses = self._pending_hits, self._pending_misses
+            self._pending_hits = self._pending_misses = 0
+        if not hits and not misses:
+            return
+        conn = self._connect()
+        conn.execute("UPDATE llm_response_cache_stats SET value = value + ? WHERE name = 'hits'", (hits,))
+        conn.execute("UPDATE llm_response_cache_stats SET value = value + ? WHERE name = 'misses'", (misses,))
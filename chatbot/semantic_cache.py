@@ -0,0 +1,319 @@
+"""
+Semantic near-duplicate answer cache for first-turn general-mode chat
+
+The exact-prompt response cache misses on "how often should I bathe my dog?" vs
+"how often should i bathe my dog" because the key is a hash of the full prompt.
+This cache keys first-turn general questions by their sentence embedding (the
+triage engine's sentence transformer) and returns a stored answer when the
+cosine similarity to an earlier question is at least the threshold and the
+chat mode and species match. Turns with pet context are never cached: the prompt
+carries the pet's breed, age, weight and history, so the answer is pet-specific.
+
+Entries live in a table of the LLM cache SQLite file so all workers share them.
+Each process keeps a NumPy copy of the embeddings and refreshes it only when
+the table changes. Eviction: TTL on read/evict, then least-recently-used rows
+above max_entries.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .response_cache import ACCESS_TOUCH_INTERVAL_SECONDS, EVICTION_EVERY_N_WRITES, STATS_FLUSH_EVERY_N_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity above which two first-turn questions share an answer. Kept high on
+# purpose: case/punctuation variants and close paraphrases should clear it, questions
+# about a different topic for the same pet should not. evaluate_semantic_cache_threshold.py
+# scores labelled pairs against it (any different question at or above it fails the run);
+# SemanticThresholdEvalTests pins a case/punctuation variant above it and a different
+# question about the same species below it. Tune with SEMANTIC_CACHE_THRESHOLD.
+DEFAULT_SIMILARITY_THRESHOLD = 0.93
+
+SPECIES_KEYWORDS = {
+    'dog': ('dog', 'dogs', 'puppy', 'puppies', 'aso', 'tuta'),
+    'cat': ('cat', 'cats', 'kitten', 'kittens', 'pusa', 'kuting'),
+    'rabbit': ('rabbit', 'rabbits', 'bunny', 'bunnies', 'kuneho'),
+    'bird': ('bird', 'birds', 'parrot', 'budgie', 'ibon'),
+    'fish': ('fish', 'goldfish', 'betta', 'isda'),
+    'hamster': ('hamster', 'hamsters'),
+    'turtle': ('turtle', 'turtles', 'tortoise', 'pagong'),
+}
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def detect_species(text: str) -> str:
+    """Species named in the question ('any' if none or more than one)."""
+    words = set(_WORD_RE.findall(text.lower()))
+    found = [species for species, keywords in SPECIES_KEYWORDS.items() if words.intersection(keywords)]
+    return found[0] if len(found) == 1 else 'any'
+
+
+class SemanticAnswerCache:
+    """
+    Embedding-keyed answer store.
+
+    Args:
+        path: SQLite database file (shared with the LLM response cache)
+        threshold: Minimum cosine similarity for a hit
+        ttl_seconds: Entry lifetime; 0 disables expiry
+        max_entries: LRU size bound; 0 disables size eviction
+    """
+
+    def __init__(self, path: str, threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 ttl_seconds: int = 0, max_entries: int = 0):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._pending_row_hits: Dict[int, int] = {}
+        self._schema_ready = False
+        # (table version, ids, scopes, matrix) - replaced as a whole on refresh
+        self._snapshot = (None, np.zeros(0, dtype=np.int64), [], np.zeros((0, 0), dtype=np.float32))
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process (gunicorn forks after import)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        if not self._schema_ready:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS semantic_answer_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    mode TEXT NOT NULL,
+                    species TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    expires_at REAL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_semantic_answer_cache_accessed ON semantic_answer_cache (accessed_at);
+                CREATE TABLE IF NOT EXISTS semantic_answer_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO semantic_answer_cache_stats (name, value)
+                    VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+                """
+            )
+            self._schema_ready = True
+        return conn
+
+    def _load_snapshot(self):
+        """Embedding matrix of all rows; reloaded only when rows were added or removed."""
+        conn = self._connect()
+        version = conn.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM semantic_answer_cache').fetchone()
+        snapshot = self._snapshot
+        if snapshot[0] == version:
+            return snapshot
+
+        rows = conn.execute('SELECT id, mode, species, embedding FROM semantic_answer_cache ORDER BY id').fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        scopes = [(row[1], row[2]) for row in rows]
+        matrix = (np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+                  if rows else np.zeros((0, 0), dtype=np.float32))
+        self._snapshot = snapshot = (version, ids, scopes, matrix)
+        return snapshot
+
+    def lookup(self, question_vector: np.ndarray, mode: str, species: str) -> Optional[Tuple[str, float]]:
+        """
+        Returns:
+            (answer, similarity) of the closest stored question in the same mode/species
+            scope, or None below the threshold
+        """
+        _, ids, scopes, matrix = self._load_snapshot()
+        best = None
+        if len(ids):
+            in_scope = np.array([scope == (mode, species) for scope in scopes])
+            if in_scope.any():
+                scores = matrix[in_scope] @ np.asarray(question_vector, dtype=np.float32)
+                i = int(np.argmax(scores))
+                if scores[i] >= self.threshold:
+                    best = (int(ids[in_scope][i]), float(scores[i]))
+
+        conn = self._connect()
+        row = None
+        now = time.time()
+        if best is not None:
+            row = conn.execute(
+                'SELECT answer, accessed_at, expires_at FROM semantic_answer_cache WHERE id = ?', (best[0],)
+            ).fetchone()
+            if row is not None and row[2] is not None and row[2] <= now:
+                row = None
+
+        if row is None:
+            self._count(None)
+            return None
+        if now - row[1] > ACCESS_TOUCH_INTERVAL_SECONDS:
+            conn.execute('UPDATE semantic_answer_cache SET accessed_at = ? WHERE id = ?', (now, best[0]))
+        self._count(best[0])
+        return row[0], best[1]
+
+    def store(self, question: str, question_vector: np.ndarray, answer: str, mode: str, species: str):
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        conn.execute(
+            'INSERT INTO semantic_answer_cache '
+            '(mode, species, question, embedding, answer, created_at, accessed_at, expires_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (mode, species, question, np.asarray(question_vector, dtype=np.float32).tobytes(),
+             answer, now, now, expires_at),
+        )
+        with self._lock:
+            self._writes += 1
+            run_eviction = self._writes % EVICTION_EVERY_N_WRITES == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones above max_entries."""
+        conn = self._connect()
+        removed = conn.execute(
+            'DELETE FROM semantic_answer_cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+        ).rowcount
+        if self.max_entries:
+            overflow = conn.execute('SELECT COUNT(*) FROM semantic_answer_cache').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                removed += conn.execute(
+                    'DELETE FROM semantic_answer_cache WHERE id IN '
+                    '(SELECT id FROM semantic_answer_cache ORDER BY accessed_at LIMIT ?)',
+                    (overflow,),
+                ).rowcount
+        if removed:
+            conn.execute("UPDATE semantic_answer_cache_stats SET value = value + ? WHERE name = 'evictions'", (removed,))
+            logger.info(f"💾 Semantic cache eviction removed {removed} entries")
+        return removed
+
+    def stats(self) -> Dict:
+        self._flush_counters()
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, value FROM semantic_answer_cache_stats').fetchall())
+        entries = conn.execute('SELECT COUNT(*) FROM semantic_answer_cache').fetchone()[0]
+        top = conn.execute(
+            'SELECT question, species, hits FROM semantic_answer_cache WHERE hits > 0 ORDER BY hits DESC LIMIT 10'
+        ).fetchall()
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        return {
+            'entries': entries,
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': round(counters.get('hits', 0) / lookups, 4) if lookups else 0.0,
+            'threshold': self.threshold,
+            'top_questions': [{'question': q, 'species': s, 'hits': h} for q, s, h in top],
+        }
+
+    def _count(self, hit_id: Optional[int]):
+        """Buffer a lookup outcome (hit_id None = miss); flushed every STATS_FLUSH_EVERY_N_LOOKUPS."""
+        with self._lock:
+            if hit_id is None:
+                self._pending_misses += 1
+            else:
+                self._pending_hits += 1
+                self._pending_row_hits[hit_id] = self._pending_row_hits.get(hit_id, 0) + 1
+            flush = self._pending_hits + self._pending_misses >= STATS_FLUSH_EVERY_N_LOOKUPS
+        if flush:
+            self._flush_counters()
+
+    def _flush_counters(self):
+        with self._lock:
+            hits, misses, row_hits = self._pending_hits, self._pending_misses, self._pending_row_hits
+            self._pending_hits = self._pending_misses = 0
+            self._pending_row_hits = {}
+        if not hits and not misses:
+            return
+        conn = self._connect()
+        conn.execute("UPDATE semantic_answer_cache_stats SET value = value + ? WHERE name = 'hits'", (hits,))
+        conn.execute("UPDATE semantic_answer_cache_stats SET value = value + ? WHERE name = 'misses'", (misses,))
+        if row_hits:
+            conn.executemany(
+                'UPDATE semantic_answer_cache SET hits = hits + ? WHERE id = ?',
+                [(n, row_id) for row_id, n in row_hits.items()]
+            )
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_answer_cache() -> SemanticAnswerCache:
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticAnswerCache(
+                    path=str(settings.LLM_CACHE_PATH),
+                    threshold=getattr(settings, 'SEMANTIC_CACHE_THRESHOLD', DEFAULT_SIMILARITY_THRESHOLD),
+                    ttl_seconds=getattr(settings, 'SEMANTIC_CACHE_TTL_SECONDS', 0),
+                    max_entries=getattr(settings, 'SEMANTIC_CACHE_MAX_ENTRIES', 0),
+                )
+    return _semantic_cache
+
+
+def semantic_cache_scope(user_message, chat_mode, conversation_history=None, pet_context=None,
+                         assessment_context=None) -> Optional[str]:
+    """
+    Species scope for a cacheable chat turn, or None if the turn must not use the cache.
+
+    Only first-turn general-mode questions qualify, and only without assessment or pet
+    context: the pet context prompt carries breed, age, weight and medical details, so
+    its answers are specific to that pet.
+    """
+    if not getattr(settings, 'SEMANTIC_CACHE_ENABLED', True) or chat_mode != 'general':
+        return None
+    if not user_message or not user_message.strip() or assessment_context or pet_context:
+        return None
+    # The view saves the current message before building the prompt
+    if conversation_history is not None and len(conversation_history) > 1:
+        return None
+    return detect_species(user_message)
+
+
+def _encode_question(question: str) -> np.ndarray:
+    from vector_similarity_django_integration import get_triage_engine
+    return get_triage_engine().encode_texts([question.strip()])[0]
+
+
+def lookup_semantic_answer(user_message: str, chat_mode: str, species: str) -> Optional[str]:
+    """Stored answer for a near-duplicate earlier question, or None (errors are treated as misses)."""
+    try:
+        hit = get_semantic_answer_cache().lookup(_encode_question(user_message), chat_mode, species)
+    except Exception as e:
+        logger.warning(f"⚠️ Semantic cache lookup failed: {e}")
+        return None
+    if hit is None:
+        return None
+    logger.info(f"💾 Semantic cache HIT ({hit[1]:.3f}) for {species} question: {user_message[:60]}")
+    return hit[0]
+
+
+def store_semantic_answer(user_message: str, chat_mode: str, species: str, answer: str):
+    """Remember an answer, unless it is a log-trigger reply."""
+    if '[[TRIGGER_LOG_UI]]' in answer:
+        return
+    try:
+        get_semantic_answer_cache().store(user_message, _encode_question(user_message), answer, chat_mode, species)
+    except Exception as e:
+        logger.warning(f"⚠️ Semantic cache store failed: {e}")
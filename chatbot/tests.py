@@ -1,3 +1,1128 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from google.api_core import exceptions as google_exceptions
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from embedding_store import normalize_rows
+from evaluate_semantic_cache_threshold import pair_similarities
+from onnx_encoder import cosine_rows, create_encoder, get_export_dir
+from pets.models import Pet
+from smart_triage_engine import DiseaseKnowledgeBase, DiseaseMatched, SmartTriageEngine, normalize_phrase
+from symptom_lexicon import SymptomLexicon
+from utils.triage_rules import EMERGENCY_DISEASES, assess_symptom_urgency, prediction_urgency
+import vector_similarity_django_integration as triage_pipeline
+
+from . import llm_gateway, views_async
+from .jobs import JOB_TYPES, JobType, claim_next_job, enqueue_job, renew_leases, requeue_stale_jobs, run_job
+from .llm_backends import SYNTHETIC_CHAT_RESPONSE, SYNTHETIC_RESPONSES, LLMBackend, RecordingBackend, ReplayBackend
+from .llm_gateway import (
+    MIN_HEDGE_SAMPLES,
+    AsyncSingleFlight,
+    CircuitBreaker,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    ResilientCaller,
+    SingleFlight,
+)
+from .model_registry import (QUOTA_COOLDOWN_SECONDS, GeminiApiKeyError, GeminiModelRegistry,
+                             RegisteredGeminiModel)
+from .models import LLMJob, PetHealthTrend
+from .response_cache import ACCESS_TOUCH_INTERVAL_SECONDS, SQLiteResponseCache
+from .semantic_cache import DEFAULT_SIMILARITY_THRESHOLD, SemanticAnswerCache, semantic_cache_scope
+
+
+def _write_from_process(args):
+    """Pool worker: write and read back entries in a shared response cache from a separate process."""
+    path, worker, n = args
+    cache = SQLiteResponseCache(path)
+    for i in range(n):
+        cache.set(f'w{worker}:{i}', f'answer {worker}/{i}')
+    return sum(cache.get(f'w{worker}:{i}') == f'answer {worker}/{i}' for i in range(n))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow_call():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow_call))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()['coalesced'] < 3 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('answer', False)] + [('answer', True)] * 3)
+        self.assertEqual(flight.stats(), {'executed': 1, 'coalesced': 3, 'in_flight': 0})
+
+    def test_key_is_released_after_the_call(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('k', lambda: 1), (1, False))
+        self.assertEqual(flight.do('k', lambda: 2), (2, False))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_consecutive_failures_and_rejects_calls(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=60)
+        for _ in range(2):
+            breaker.record_failure(RuntimeError('503'))
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure(RuntimeError('503'))
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()['state'], CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure(RuntimeError('503'))
+        breaker.record_success()
+        breaker.record_failure(RuntimeError('503'))
+        self.assertEqual(breaker.stats()['state'], CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through_and_closes_on_success(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01)
+        breaker.record_failure(RuntimeError('503'))
+        time.sleep(0.02)
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.stats()['state'], CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertTrue(breaker.is_open())
+
+        breaker.record_success()
+        self.assertEqual(breaker.stats()['state'], CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_half_open_trial_reopens(self):
+        # A quota error opens at once; a failed trial reopens below the failure threshold
+        breaker = CircuitBreaker(failure_threshold=5, cooldown_seconds=60, quota_cooldown_seconds=0.01)
+        breaker.record_failure(RuntimeError('429'), quota=True)
+        time.sleep(0.02)
+
+        self.assertTrue(breaker.allow())
+        breaker.record_failure(RuntimeError('503'))
+        self.assertEqual(breaker.stats()['state'], CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+        self.assertFalse(breaker.allow())
+
+    def test_released_trial_can_be_retried(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=0.01)
+        breaker.record_failure(RuntimeError('503'))
+        time.sleep(0.02)
+
+        self.assertTrue(breaker.allow())
+        breaker.release_trial()
+        self.assertTrue(breaker.allow())
+
+
+class ResilientCallerTests(SimpleTestCase):
+
+    def _caller(self, **kwargs):
+        caller = ResilientCaller(CircuitBreaker(failure_threshold=1, cooldown_seconds=60), max_concurrent=4, **kwargs)
+        self.addCleanup(caller._executor.shutdown, wait=True)
+        return caller
+
+    @staticmethod
+    def _slow_then_fast():
+        """First call hangs for a while, later ones answer at once."""
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            if first:
+                time.sleep(0.3)
+                return 'primary'
+            return 'hedge'
+        return fn, calls
+
+    def test_slow_call_is_hedged_and_the_hedge_wins(self):
+        caller = self._caller(hedge_enabled=True, hedge_min_delay=0.02)
+        for _ in range(MIN_HEDGE_SAMPLES):
+            caller.latency.record(0.01)
+        fn, calls = self._slow_then_fast()
+
+        self.assertEqual(caller.call(fn, deadline=5), 'hedge')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((caller.hedges_sent, caller.hedges_won), (1, 1))
+
+    def test_no_hedge_without_enough_latency_samples(self):
+        caller = self._caller(hedge_enabled=True, hedge_min_delay=0.02)
+        for _ in range(MIN_HEDGE_SAMPLES - 1):
+            caller.latency.record(0.01)
+        fn, calls = self._slow_then_fast()
+
+        self.assertIsNone(caller.hedge_delay())
+        self.assertEqual(caller.call(fn, deadline=5), 'primary')
+        self.assertEqual((len(calls), caller.hedges_sent), (1, 0))
+
+    def test_async_slow_call_is_hedged(self):
+        caller = self._caller(hedge_enabled=True, hedge_min_delay=0.02)
+        for _ in range(MIN_HEDGE_SAMPLES):
+            caller.latency.record(0.01)
+        calls = []
+
+        async def coro_fn():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(0.3)
+                return 'primary'
+            return 'hedge'
+
+        self.assertEqual(asyncio.run(caller.acall(coro_fn, deadline=5)), 'hedge')
+        self.assertEqual((caller.hedges_sent, caller.hedges_won), (1, 1))
+
+    def test_deadline_timeout_opens_the_breaker(self):
+        caller = self._caller()
+
+        with self.assertRaises(LLMTimeoutError):
+            caller.call(lambda: time.sleep(0.2), deadline=0.02)
+        with self.assertRaises(LLMUnavailableError):
+            caller.call(lambda: 'never runs', deadline=5)
+        self.assertEqual(caller.timeouts, 1)
+        self.assertEqual(caller.breaker.stats()['rejected'], 1)
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+
+    def test_cancelled_leader_does_not_cancel_coalesced_waiters(self):
+        flight = AsyncSingleFlight()
+
+        async def slow_call():
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            # The leader hits a stage deadline, the waiter has none
+            leader = asyncio.ensure_future(asyncio.wait_for(flight.do('k', slow_call), 0.01))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flight.do('k', slow_call))
+            return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+        leader_result, waiter_result = asyncio.run(main())
+        self.assertIsInstance(leader_result, asyncio.TimeoutError)
+        self.assertEqual(waiter_result, ('answer', True))
+        self.assertEqual(flight.stats(), {'executed': 1, 'coalesced': 1, 'in_flight': 0})
+
+    def test_waiters_share_the_leaders_exception(self):
+        flight = AsyncSingleFlight()
+
+        async def failing_call():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        async def main():
+            return await asyncio.gather(
+                flight.do('k', failing_call), flight.do('k', failing_call), return_exceptions=True
+            )
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.stats()['executed'], 1)
+
+
+class LLMJobLeaseTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='job-owner', password='x')
+        self.flaky = JobType(self._failing_handler, dedup_running=False)
+        patcher = mock.patch.dict(JOB_TYPES, {'flaky': self.flaky})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _failing_handler(job):
+        # A newer submission with the same key arrives while this one runs
+        enqueue_job('flaky', job.user, {'n': 2}, dedup_key='flaky:pet:1')
+        raise RuntimeError('Gemini timed out')
+
+    def _claim(self, worker_id='worker-1'):
+        job = claim_next_job(worker_id, ['flaky'])
+        self.assertIsNotNone(job)
+        return job
+
+    def test_stale_job_with_a_queued_successor_is_superseded(self):
+        enqueue_job('flaky', self.user, {'n': 1}, dedup_key='flaky:pet:1')
+        stale = self._claim()
+        successor = enqueue_job('flaky', self.user, {'n': 2}, dedup_key='flaky:pet:1')
+        LLMJob.objects.filter(id=stale.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(requeue_stale_jobs(lease_seconds=60), 1)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, LLMJob.STATUS_FAILED)
+        self.assertEqual(stale.result['superseded_by'], str(successor.id))
+        self.assertEqual(LLMJob.objects.get(id=successor.id).status, LLMJob.STATUS_QUEUED)
+
+    def test_retry_with_a_queued_successor_is_superseded(self):
+        enqueue_job('flaky', self.user, {'n': 1}, dedup_key='flaky:pet:1')
+        job = run_job(self._claim())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, LLMJob.STATUS_FAILED)
+        self.assertEqual(job.result_status, 409)
+        self.assertEqual(LLMJob.objects.filter(status=LLMJob.STATUS_QUEUED).count(), 1)
+
+    def test_renewed_lease_is_not_requeued(self):
+        enqueue_job('flaky', self.user, {'n': 1})
+        job = self._claim()
+        LLMJob.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(renew_leases('worker-1', [job.id]), 1)
+        self.assertEqual(renew_leases('worker-2', [job.id]), 0)
+        self.assertEqual(requeue_stale_jobs(lease_seconds=60), 0)
+        self.assertEqual(LLMJob.objects.get(id=job.id).status, LLMJob.STATUS_RUNNING)
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'cache.sqlite3')
+        self.cache = SemanticAnswerCache(self.path, threshold=0.9)
+        self.vector = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+
+    def _stored_counters(self):
+        with sqlite3.connect(self.path) as conn:
+            return dict(conn.execute('SELECT name, value FROM semantic_answer_cache_stats').fetchall())
+
+    def test_turns_with_pet_context_are_not_cached(self):
+        pet = {'name': 'Max', 'species': 'Dog', 'breed': 'Beagle', 'age': 12}
+        self.assertIsNone(semantic_cache_scope('How often should I bathe him?', 'general', pet_context=pet))
+        self.assertEqual(semantic_cache_scope('How often should I bathe my dog?', 'general'), 'dog')
+
+    def test_lookup_counters_are_batched(self):
+        self.cache.store('how often should I bathe my dog', self.vector, 'Every month.', 'general', 'dog')
+        self.assertEqual(self.cache.lookup(self.vector, 'general', 'dog')[0], 'Every month.')
+        self.assertIsNone(self.cache.lookup(self.vector, 'general', 'cat'))
+
+        # Nothing written per lookup; stats() flushes the pending counts
+        self.assertEqual(self._stored_counters()['hits'], 0)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['top_questions'][0]['hits'], 1)
+
+
+class SemanticThresholdEvalTests(SimpleTestCase):
+    """DEFAULT_SIMILARITY_THRESHOLD against the real model (evaluate_semantic_cache_threshold.py has the full set)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from smart_triage_engine import SEMANTIC_MODEL_NAME
+        try:
+            cls.encoder, _ = create_encoder(SEMANTIC_MODEL_NAME, backend='torch')
+        except Exception as e:
+            raise unittest.SkipTest(f"sentence transformer not available: {e}")
+
+    def test_near_duplicate_clears_the_threshold(self):
+        [score] = pair_similarities(self.encoder, [("How often should I bathe my dog?", "how often should i bathe my dog")])
+        self.assertGreaterEqual(score, DEFAULT_SIMILARITY_THRESHOLD)
+
+    def test_different_question_for_the_same_species_does_not(self):
+        [score] = pair_similarities(self.encoder, [("How often should I bathe my dog?", "What vaccines does my puppy need?")])
+        self.assertLess(score, DEFAULT_SIMILARITY_THRESHOLD)
+
+
+class CompiledDiseaseIndexParityTests(SimpleTestCase):
+    """CompiledDiseaseIndex.match must rank exactly like the uncompiled DiseaseMatched.match_diseases."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.knowledge_base = DiseaseKnowledgeBase(str(settings.BASE_DIR / 'knowledge_base_enhanced.csv'))
+
+    @staticmethod
+    def _comparable(matches):
+        return [dict(m, matched_symptoms=sorted(m['matched_symptoms'])) for m in matches]
+
+    def _symptom_sets(self, rng, species_symptoms, all_symptoms):
+        yield []
+        yield ['not_a_symptom']
+        for _ in range(150):
+            picked = rng.sample(species_symptoms, rng.randint(1, min(6, len(species_symptoms))))
+            if rng.random() < 0.3:
+                picked.append(rng.choice(all_symptoms))
+            if rng.random() < 0.2:
+                picked.append('not_a_symptom')
+            # Spaces and capitals normalize to the knowledge base codes
+            yield [s.replace('_', ' ').title() if rng.random() < 0.2 else s for s in picked]
+
+    def test_species_indexes_match_the_reference_matcher(self):
+        rng = random.Random(7)
+        all_symptoms = sorted({s for d in self.knowledge_base.diseases for s in d['symptoms']})
+        self.assertTrue(self.knowledge_base.indexes_by_species)
+
+        for species, diseases in self.knowledge_base.diseases_by_species.items():
+            index = self.knowledge_base.get_index_for_species(species)
+            species_symptoms = sorted({s for d in diseases for s in d['symptoms']})
+            for symptoms in self._symptom_sets(rng, species_symptoms, all_symptoms):
+                for top_n in (1, 5, 10):
+                    with self.subTest(species=species, symptoms=symptoms, top_n=top_n):
+                        self.assertEqual(
+                            self._comparable(index.match(symptoms, top_n)),
+                            self._comparable(DiseaseMatched.match_diseases(symptoms, diseases, top_n)),
+                        )
+
+    def test_all_species_index_matches_the_reference_matcher(self):
+        rng = random.Random(11)
+        all_symptoms = sorted({s for d in self.knowledge_base.diseases for s in d['symptoms']})
+        for symptoms in self._symptom_sets(rng, all_symptoms, all_symptoms):
+            with self.subTest(symptoms=symptoms):
+                self.assertEqual(
+                    self._comparable(self.knowledge_base.all_species_index.match(symptoms, 5)),
+                    self._comparable(DiseaseMatched.match_diseases(symptoms, self.knowledge_base.diseases, 5)),
+                )
+
+
+# Reference copies of the rules before they moved to utils/triage_rules.py
+_OLD_CRITICAL_SYMPTOMS = {
+    'difficulty_breathing', 'seizures', 'tremors', 'blue_gums', 'collapse',
+    'uncontrolled_bleeding', 'unconscious', 'not_breathing',
+    'severe_trauma', 'poisoning', 'bloat', 'heatstroke',
+    'sudden_paralysis', 'respiratory_distress', 'cardiac_arrest',
+    'profuse_bleeding', 'severe_burn'
+}
+_OLD_HIGH_URGENCY_SYMPTOMS = {
+    'bloody_diarrhea', 'blood_in_vomit', 'eye_injury', 'severe_pain',
+    'distended_abdomen', 'unable_to_urinate', 'straining_to_urinate',
+    'blood_in_urine', 'severe_vomiting', 'profuse_diarrhea',
+    'broken_bone', 'deep_wound', 'bite_wound', 'labored_breathing',
+    'pale_gums', 'yellow_gums', 'high_fever', 'severe_lethargy'
+}
+_OLD_MODERATE_URGENCY_SYMPTOMS = {
+    'vomiting', 'diarrhea', 'loss_of_appetite', 'lethargy',
+    'coughing', 'sneezing', 'limping', 'ear_infection',
+    'skin_lesions', 'itching', 'discharge', 'fever', 'dehydration'
+}
+_OLD_EMERGENCY = {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening',
+                  'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'}
+_OLD_URGENCY_MAP = {
+    'critical': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE', 'recommendation': 'Seek emergency veterinary care immediately'},
+    'high': {'urgency': 'high', 'urgency_score': 8, 'timeline': 'Within 2-4 hours', 'recommendation': 'Contact veterinarian urgently'},
+    'moderate': {'urgency': 'moderate', 'urgency_score': 5, 'timeline': '24-48 hours', 'recommendation': 'Schedule veterinary appointment'},
+    'medium': {'urgency': 'moderate', 'urgency_score': 5, 'timeline': '24-48 hours', 'recommendation': 'Schedule veterinary appointment'},
+    'mild': {'urgency': 'low', 'urgency_score': 3, 'timeline': '2-7 days', 'recommendation': 'Monitor and schedule routine appointment'},
+    'low': {'urgency': 'low', 'urgency_score': 3, 'timeline': '2-7 days', 'recommendation': 'Monitor and schedule routine appointment'},
+}
+_OLD_HEAT_SYMPTOMS = {'panting', 'excessive_heat', 'collapse', 'rapid_heartbeat', 'fever'}
+
+
+def _old_assess_urgency(symptoms):
+    symptoms_set = set(s.lower().replace(' ', '_') for s in symptoms)
+    for tier, level in ((_OLD_CRITICAL_SYMPTOMS, 'CRITICAL'), (_OLD_HIGH_URGENCY_SYMPTOMS, 'HIGH'),
+                        (_OLD_MODERATE_URGENCY_SYMPTOMS, 'MODERATE')):
+        found = symptoms_set.intersection(tier)
+        if found:
+            return level, sorted(found)
+    return 'LOW', []
+
+
+def _old_prediction_urgency(disease_name, base_urgency, matching_symptoms):
+    """symptom_checker_predict's per-prediction urgency before the rule table (exact names)."""
+    emergency_names = {name for names in EMERGENCY_DISEASES.values() for name in names}
+    if disease_name in ['Heatstroke', 'Heat Stroke', 'Heat shock']:
+        override = any(sym in matching_symptoms for sym in _OLD_HEAT_SYMPTOMS)
+    else:
+        override = disease_name in emergency_names
+    if override:
+        return dict(_OLD_EMERGENCY, red_flags=['🚨 CRITICAL CONDITION - This is a life-threatening emergency']), True
+    return dict(_OLD_URGENCY_MAP.get(base_urgency.lower(), _OLD_URGENCY_MAP['moderate']), red_flags=[]), False
+
+
+class SymptomIndexRebuildTests(SimpleTestCase):
+
+    def test_phrase_caches_are_cleared_after_the_new_index_is_in_place(self):
+        engine = SmartTriageEngine(str(settings.BASE_DIR / 'knowledge_base_enhanced.csv'), load_semantic_model=False)
+        engine.semantic_model, engine.embedding_backend = mock.Mock(), 'torch'
+        new_vectors = np.eye(3, dtype=np.float32)
+        seen = []
+        with mock.patch.object(engine, 'clear_phrase_caches',
+                               side_effect=lambda: seen.append((engine.symptom_names, engine.symptom_vectors))), \
+                mock.patch('smart_triage_engine.load_or_build_embeddings', return_value=new_vectors), \
+                mock.patch('builtins.open', mock.mock_open(read_data='["vomiting", "fever", "pale_gums"]')):
+            engine.cache_symptom_vectors()
+
+        self.assertEqual(len(seen), 1)
+        self.assertEqual(seen[0][0], ['vomiting', 'fever', 'pale_gums'])
+        self.assertIs(seen[0][1], new_vectors)
+
+
+class TriageRuleEquivalenceTests(SimpleTestCase):
+    """utils/triage_rules must behave like the inline rules it replaced."""
+
+    def test_assess_symptom_urgency_matches_the_old_tiers(self):
+        rng = random.Random(3)
+        vocabulary = sorted(_OLD_CRITICAL_SYMPTOMS | _OLD_HIGH_URGENCY_SYMPTOMS | _OLD_MODERATE_URGENCY_SYMPTOMS)
+        vocabulary += ['panting', 'weight_loss', 'not_a_symptom']
+        cases = [[], ['not_a_symptom'], ['Difficulty Breathing'], ['VOMITING', 'pale gums']]
+        cases += [rng.sample(vocabulary, rng.randint(1, 5)) for _ in range(500)]
+
+        for symptoms in cases:
+            with self.subTest(symptoms=symptoms):
+                level, reason, found = assess_symptom_urgency(symptoms)
+                self.assertEqual((level, sorted(found)), _old_assess_urgency(symptoms))
+                if found:
+                    self.assertTrue(reason.endswith(', '.join(found)))
+
+    def test_prediction_urgency_matches_the_old_override_for_exact_names(self):
+        names = sorted({name for names in EMERGENCY_DISEASES.values() for name in names})
+        names += ['Kennel Cough', 'Ear Mites', 'Heatstroke', 'Heat Stroke']
+        symptom_sets = [[], ['panting'], ['vomiting', 'fever'], ['coughing']]
+
+        for name in names:
+            for base_urgency in ('Critical', 'high', 'Moderate', 'medium', 'mild', 'LOW', 'unknown'):
+                for matched in symptom_sets:
+                    with self.subTest(name=name, base_urgency=base_urgency, matched=matched):
+                        self.assertEqual(
+                            prediction_urgency(name, base_urgency, matched),
+                            _old_prediction_urgency(name, base_urgency, matched),
+                        )
+
+    def test_emergency_names_match_regardless_of_case_and_spacing(self):
+        # Deliberate change: the old dict lookup only matched the exact spelling
+        for name in ('canine parvovirus', 'CANINE PARVOVIRUS', '  Canine  Parvovirus '):
+            with self.subTest(name=name):
+                assessment, override = prediction_urgency(name, 'low')
+                self.assertTrue(override)
+                self.assertEqual(assessment['urgency'], 'critical')
+                self.assertFalse(_old_prediction_urgency(name, 'low', [])[1])
+
+        # Heat-gated names stay gated whatever the case
+        self.assertFalse(prediction_urgency('HEATSTROKE', 'low', ['coughing'])[1])
+        self.assertTrue(prediction_urgency('heat stroke', 'low', ['panting'])[1])
+        # 'Heat shock' is the turtle's unconditional 'Heat Shock' (the old code raised KeyError here)
+        self.assertTrue(prediction_urgency('Heat shock', 'low', [])[1])
+
+    def test_missing_base_urgency_defaults_to_moderate(self):
+        assessment, override = prediction_urgency('Kennel Cough', None)
+        self.assertFalse(override)
+        self.assertEqual(assessment['urgency'], 'moderate')
+
+
+class StageDeadlineTests(SimpleTestCase):
+
+    def setUp(self):
+        for counters in (triage_pipeline._abandoned_stages, triage_pipeline._cancelled_stages):
+            reset = mock.patch.dict(counters, clear=True)
+            reset.start()
+            self.addCleanup(reset.stop)
+
+    def test_timed_out_stages_are_cancelled_and_counted(self):
+        release = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        self.addCleanup(release.set)
+        running = pool.submit(release.wait, 5)
+        queued = pool.submit(lambda: 'never')
+
+        with self.assertLogs('vector_similarity_django_integration', level='WARNING'):
+            self.assertEqual(triage_pipeline._wait_for_stage(queued, 'verification', 0.01, 'default'), 'default')
+            self.assertIsNone(triage_pipeline._wait_for_stage(running, 'health_history', 0.01, None))
+
+        self.assertTrue(queued.cancelled())
+        self.assertFalse(running.cancelled())
+        self.assertEqual(triage_pipeline.triage_stage_stats(), {
+            'abandoned': 2,
+            'cancelled_before_start': 1,
+            'abandoned_by_stage': {'verification': 1, 'health_history': 1},
+        })
+
+
+class MetricsEndpointTests(SimpleTestCase):
+
+    def _get(self, **headers):
+        with mock.patch('chatbot.views_metrics._stats_sources', return_value=[]):
+            return self.client.get('/metrics', **headers)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='')
+    def test_hidden_without_a_token_in_production(self):
+        self.assertEqual(self._get().status_code, 404)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='')
+    def test_open_without_a_token_in_debug(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'pawpal_stage_duration_seconds', response.content)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='s3cret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self._get().status_code, 401)
+        self.assertEqual(self._get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self._get(HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='')
+    def test_knowledge_base_version_is_an_info_series(self):
+        knowledge_base = mock.Mock()
+        knowledge_base.stats.return_value = {'version': 'abc123', 'path': 'kb.csv', 'diseases': 3}
+        with mock.patch.object(triage_pipeline, 'loaded_knowledge_base', return_value=knowledge_base):
+            response = self._get()
+
+        self.assertIn(b'pawpal_knowledge_base_info{version="abc123"} 1\n', response.content)
+
+
+class SymptomLexiconTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.aliases_path = os.path.join(tmp.name, 'symptom_aliases.json')
+        self.symptoms_path = os.path.join(tmp.name, 'all_symptoms.json')
+        self._write(self.aliases_path, {'throwing up': 'vomiting', 'vomiting blood': 'vomiting_blood', 'blood': 'bleeding'})
+        self._write(self.symptoms_path, ['vomiting', 'vomiting_blood', 'bleeding', 'sneezing'])
+        self.lexicon = SymptomLexicon(self.aliases_path, self.symptoms_path)
+
+    @staticmethod
+    def _write(path, data, mtime=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_longest_alias_wins_at_the_leftmost_position(self):
+        self.assertEqual(self.lexicon.find_matches('He is Vomiting Blood since morning'),
+                         {'vomiting blood': 'vomiting_blood'})
+        self.assertEqual(self.lexicon.find_matches('vomiting, then blood in stool'),
+                         {'vomiting': 'vomiting', 'blood': 'bleeding'})
+        # Word-bounded: no hit inside a longer word
+        self.assertEqual(self.lexicon.find_matches('bloodhound'), {})
+
+    def test_unicode_case_variants_do_not_crash(self):
+        # re.IGNORECASE matches the long s, but 'ſ'.lower() is still 'ſ'
+        self.assertEqual(self.lexicon.find_matches('ſneezing a lot'), {'sneezing': 'sneezing'})
+        coverage = self.lexicon.analyze_coverage('ſneezing, and weird noises')
+        self.assertEqual(coverage['matches'], {'sneezing': 'sneezing'})
+        self.assertEqual(coverage['unknown_tokens'], 2)
+
+    def test_reloads_when_a_file_changes(self):
+        self.assertFalse(self.lexicon.reload_if_changed())
+        self._write(self.aliases_path, {'nagsusuka': 'vomiting'}, mtime=time.time() + 10)
+
+        self.assertTrue(self.lexicon.reload_if_changed())
+        self.assertEqual(self.lexicon.find_matches('nagsusuka siya'), {'nagsusuka': 'vomiting'})
+        self.assertEqual(self.lexicon.find_matches('throwing up'), {})
+
+    def test_broken_file_keeps_the_previous_version(self):
+        with open(self.aliases_path, 'w', encoding='utf-8') as f:
+            f.write('{not json')
+        os.utime(self.aliases_path, (time.time() + 10, time.time() + 10))
+
+        with self.assertLogs('symptom_lexicon', level='ERROR'):
+            self.assertFalse(self.lexicon.reload_if_changed())
+        self.assertEqual(self.lexicon.find_matches('throwing up'), {'throwing up': 'vomiting'})
+
+
+class AsyncLogDailySymptomsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.pet = Pet.objects.create(owner=self.user, name='Rex', animal_type='dog', age=3, sex='male')
+        auth = mock.patch.object(views_async, 'check_user_or_admin', return_value=('pet_owner', self.user, None))
+        auth.start()
+        self.addCleanup(auth.stop)
+
+    async def _post(self, **extra):
+        body = {'pet_id': self.pet.id, 'symptoms': ['vomiting'], 'severity_map': {'vomiting': 2}}
+        request = RequestFactory().post(
+            '/api/chatbot/symptom-tracker/log-daily/', json.dumps(body), content_type='application/json', **extra
+        )
+        return await views_async.log_daily_symptoms(request)
+
+    @override_settings(LLM_JOB_MODE_ENABLED=True)
+    async def test_job_mode_queues_the_progression_analysis(self):
+        with mock.patch.object(views_async, 'aanalyze_symptom_progression') as analyze:
+            response = await self._post(HTTP_PREFER='respond-async')
+
+        analyze.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        job = await LLMJob.objects.aget(job_type='symptom_progression')
+        self.assertIn(str(job.id), response['Location'])
+        self.assertEqual(json.loads(response.content)['log']['symptoms'], ['vomiting'])
+        self.assertFalse(await PetHealthTrend.objects.aexists())
+
+    async def test_inline_mode_records_the_trend(self):
+        result = {'risk_score': 40, 'urgency': 'medium', 'trend': 'stable', 'prediction': 'ok', 'alert_needed': False}
+        with mock.patch.object(views_async, 'aanalyze_symptom_progression', mock.AsyncMock(return_value=result)):
+            response = await self._post()
+
+        self.assertEqual(response.status_code, 201)
+        trend = await PetHealthTrend.objects.aget(pet=self.pet)
+        self.assertEqual(trend.trend_analysis, 'Trend: stable')
+        self.assertFalse(await LLMJob.objects.aexists())
+
+
+class SQLiteResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(tmp.name, 'responses.sqlite3')
+        self.now = 1_000_000.0
+        clock = mock.patch('chatbot.response_cache.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = SQLiteResponseCache(self.path, ttl_seconds=60)
+        cache.set('k', 'answer')
+        self.now += 59
+        self.assertEqual(cache.get('k'), 'answer')
+        self.now += 1
+        self.assertIsNone(cache.get('k'))
+
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_eviction_drops_the_least_recently_used_entries(self):
+        cache = SQLiteResponseCache(self.path, max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            self.now += 1
+        # Read 'a' late enough to refresh its access time
+        self.now += ACCESS_TOUCH_INTERVAL_SECONDS + 1
+        cache.get('a')
+
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual([cache.get(key) for key in ('a', 'b', 'c')], ['a', None, 'c'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_hit_and_miss_counters(self):
+        cache = SQLiteResponseCache(self.path)
+        cache.set('k', 'answer')
+        cache.get('k')
+        cache.get('k')
+        cache.get('missing')
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (2, 1, 0.6667))
+        # Counters live in the file, so every process sees the same totals
+        self.assertEqual(SQLiteResponseCache(self.path).stats()['hits'], 2)
+
+    def test_writes_from_several_processes(self):
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            read_back = pool.map(_write_from_process, [(self.path, worker, 25) for worker in range(4)])
+
+        self.assertEqual(read_back, [25] * 4)
+        self.assertEqual(SQLiteResponseCache(self.path).stats()['entries'], 100)
+
+    def test_legacy_json_is_imported_once(self):
+        json_path = os.path.join(self.dir, 'legacy.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'a': 'old answer', 'b': 'other answer', 'bad': 3}, f)
+        cache = SQLiteResponseCache(self.path)
+
+        self.assertEqual(cache.import_json_file(json_path), 2)
+        cache._connect().execute('DELETE FROM llm_response_cache')
+        self.assertEqual(cache.import_json_file(json_path), 0)
+        self.assertEqual(SQLiteResponseCache(self.path).import_json_file(json_path), 0)
+        self.assertIsNone(cache.get('a'))
+
+
+def _write_onnx_export(export_dir, table, vocab):
+    """A tiny export in export_onnx_model's layout: embedding lookup as the 'transformer'."""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(export_dir, 'tokenizer.json'))
+
+    graph = helper.make_graph(
+        [helper.make_node('Gather', ['table', 'input_ids'], ['last_hidden_state'], axis=0)],
+        'tiny_encoder',
+        [helper.make_tensor_value_info('input_ids', TensorProto.INT64, ['batch', 'sequence']),
+         helper.make_tensor_value_info('attention_mask', TensorProto.INT64, ['batch', 'sequence'])],
+        [helper.make_tensor_value_info('last_hidden_state', TensorProto.FLOAT, ['batch', 'sequence', table.shape[1]])],
+        [numpy_helper.from_array(table, 'table')],
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)]),
+              os.path.join(export_dir, 'model.onnx'))
+    with open(os.path.join(export_dir, 'encoder_config.json'), 'w', encoding='utf-8') as f:
+        json.dump({'max_seq_length': 128, 'pad_token_id': 0, 'pad_token': '[PAD]'}, f)
+
+
+@unittest.skipUnless(
+    all(importlib.util.find_spec(name) for name in ('onnxruntime', 'tokenizers', 'onnx')),
+    'onnxruntime, tokenizers and onnx are needed (requirements-onnx.txt)'
+)
+class OnnxEncoderTests(SimpleTestCase):
+    MODEL = 'tiny/encoder'
+    VOCAB = {'[PAD]': 0, '[UNK]': 1, 'vomiting': 2, 'pale': 3, 'gums': 4}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+        export_dir = get_export_dir(self.MODEL, quantize=False, cache_dir=self.cache_dir)
+        os.makedirs(export_dir)
+        self.table = np.random.default_rng(0).normal(size=(len(self.VOCAB), 4)).astype(np.float32)
+        _write_onnx_export(export_dir, self.table, self.VOCAB)
+        # Parity as recorded by create_encoder after a real export
+        with open(os.path.join(export_dir, 'parity.json'), 'w', encoding='utf-8') as f:
+            json.dump({'min_cosine': 0.995, 'probe_phrases': 12}, f)
+
+    def _create(self, tolerance):
+        return create_encoder(self.MODEL, backend='onnx', cache_dir=self.cache_dir, tolerance=tolerance)
+
+    def test_export_within_tolerance_is_used_and_mean_pools_real_tokens(self):
+        encoder, backend = self._create(tolerance=0.99)
+        self.assertEqual(backend, 'onnx')
+
+        # 'vomiting' is padded to the length of 'pale gums'; padding must not count
+        vectors = encoder.encode(['vomiting', 'pale gums'])
+        np.testing.assert_allclose(vectors[0], self.table[2], rtol=1e-6)
+        np.testing.assert_allclose(vectors[1], self.table[[3, 4]].mean(axis=0), rtol=1e-6)
+        np.testing.assert_allclose(encoder.encode('vomiting'), self.table[2], rtol=1e-6)
+
+    def test_export_below_tolerance_falls_back_to_torch(self):
+        with mock.patch('sentence_transformers.SentenceTransformer', return_value='torch model') as torch_model, \
+                self.assertLogs('onnx_encoder', level='WARNING'):
+            self.assertEqual(self._create(tolerance=0.999), ('torch model', 'torch'))
+        torch_model.assert_called_once_with(self.MODEL)
+
+    def test_cosine_rows(self):
+        a = np.array([[1.0, 0.0], [1.0, 1.0]])
+        b = np.array([[2.0, 0.0], [-1.0, -1.0]])
+        np.testing.assert_allclose(cosine_rows(a, b), [1.0, -1.0])
+
+
+class GeminiModelRegistryTests(SimpleTestCase):
+    PRO, FLASH, OTHER = 'models/gemini-1.5-pro', 'models/gemini-1.5-flash', 'models/gemini-other'
+
+    def setUp(self):
+        self.registry = GeminiModelRegistry()
+        self.registry._candidates = [self.PRO, self.FLASH, self.OTHER]
+        self.models = {name: mock.Mock(name=name) for name in self.registry._candidates}
+        self.registry._models = dict(self.models)
+
+    def test_failover_marks_the_failing_model_unhealthy(self):
+        self.models[self.PRO].generate_content.side_effect = google_exceptions.ServiceUnavailable('overloaded')
+        self.models[self.FLASH].generate_content.return_value = 'flash answer'
+        model = RegisteredGeminiModel(self.registry, self.registry.select_model_name())
+
+        with self.assertLogs('chatbot.model_registry', level='WARNING'):
+            self.assertEqual(model.generate_content('prompt'), 'flash answer')
+
+        self.assertEqual(model.model_name, self.FLASH)
+        self.assertEqual(list(self.registry.stats()['unhealthy']), [self.PRO])
+        # Later calls start on the healthy model until the cooldown ends
+        self.assertEqual(self.registry.select_model_name(), self.FLASH)
+        self.registry.mark_healthy(self.PRO)
+        self.assertEqual(self.registry.select_model_name(), self.PRO)
+
+    def test_quota_errors_use_the_longer_cooldown(self):
+        self.models[self.PRO].generate_content.side_effect = google_exceptions.ResourceExhausted('quota')
+        model = RegisteredGeminiModel(self.registry, self.PRO)
+
+        with self.assertLogs('chatbot.model_registry', level='WARNING'):
+            model.generate_content('prompt')
+
+        retry_in = self.registry.stats()['unhealthy'][self.PRO]['retry_in_seconds']
+        self.assertGreater(retry_in, QUOTA_COOLDOWN_SECONDS - 5)
+
+    def test_failover_stops_after_every_model_failed(self):
+        for name in self.registry._candidates:
+            self.models[name].generate_content.side_effect = TimeoutError(f"{name} timed out")
+        model = RegisteredGeminiModel(self.registry, self.PRO)
+
+        with self.assertLogs('chatbot.model_registry', level='WARNING'), self.assertRaises(TimeoutError):
+            model.generate_content('prompt')
+        self.assertEqual(set(self.registry.stats()['unhealthy']), {self.PRO, self.FLASH, self.OTHER})
+        # All cooling down: the one that recovers first is still returned
+        self.assertEqual(self.registry.select_model_name(), self.PRO)
+
+    def test_api_key_errors_are_not_failed_over(self):
+        self.models[self.PRO].generate_content.side_effect = Exception('API key not valid')
+        model = RegisteredGeminiModel(self.registry, self.PRO)
+
+        with self.assertLogs('chatbot.model_registry', level='ERROR'), self.assertRaises(GeminiApiKeyError):
+            model.generate_content('prompt')
+        self.models[self.FLASH].generate_content.assert_not_called()
+        self.assertEqual(self.registry.stats()['unhealthy'], {})
+
+    def test_async_calls_fail_over_too(self):
+        self.models[self.PRO].generate_content_async = mock.AsyncMock(side_effect=TimeoutError('slow'))
+        self.models[self.FLASH].generate_content_async = mock.AsyncMock(return_value='flash answer')
+        model = RegisteredGeminiModel(self.registry, self.PRO)
+
+        with self.assertLogs('chatbot.model_registry', level='WARNING'):
+            self.assertEqual(asyncio.run(model.generate_content_async('prompt')), 'flash answer')
+        self.assertIn(self.PRO, self.registry.stats()['unhealthy'])
+
+
+class TieredExtractionTests(SimpleTestCase):
+    COVERED = "My dog is vomiting and has diarrhea."
+    UNCOVERED = "He keeps doing a weird honking noise at night"
+
+    def _extract(self, notes, engine_matches=(), gemini_output='reverse sneezing'):
+        engine = mock.Mock()
+        engine.find_similar_symptoms_batch.side_effect = lambda phrases, threshold: [list(engine_matches)] * len(phrases)
+        with mock.patch.object(triage_pipeline, 'get_triage_engine', return_value=engine), \
+                mock.patch.object(triage_pipeline, 'generate_text', return_value=gemini_output) as gemini:
+            result = triage_pipeline.extract_symptoms_from_text(notes)
+        return result, engine, gemini
+
+    def test_fully_covered_notes_are_answered_by_the_lexicon(self):
+        result, engine, gemini = self._extract(self.COVERED)
+
+        self.assertEqual(result['extraction_tier'], 'deterministic')
+        self.assertEqual(sorted(result['extracted_symptoms']), ['diarrhea', 'vomiting'])
+        engine.find_similar_symptoms_batch.assert_not_called()
+        gemini.assert_not_called()
+
+    def test_uncovered_notes_resolved_by_embeddings_skip_gemini(self):
+        result, engine, gemini = self._extract(self.UNCOVERED, engine_matches=[('coughing', 0.9)])
+
+        self.assertEqual(result['extraction_tier'], 'embedding')
+        self.assertEqual(result['semantic_matches'], {'coughing': 0.9})
+        engine.find_similar_symptoms_batch.assert_called_once_with(
+            ['he keeps doing a weird honking noise'], threshold=0.82
+        )
+        gemini.assert_not_called()
+
+    def test_uncovered_notes_fall_through_to_gemini(self):
+        result, engine, gemini = self._extract(self.UNCOVERED)
+
+        self.assertEqual(result['extraction_tier'], 'llm')
+        self.assertEqual(result['gemini_normalized'], 'reverse sneezing')
+        gemini.assert_called_once()
+
+    @override_settings(TRIAGE_TIERED_EXTRACTION=False)
+    def test_tiers_can_be_switched_off(self):
+        result, engine, gemini = self._extract(self.COVERED)
+
+        self.assertEqual(result['extraction_tier'], 'llm')
+        gemini.assert_called_once()
+        # The engine only maps Gemini's terms, it is not asked to cover the notes
+        engine.find_similar_symptoms_batch.assert_called_once_with(['reverse sneezing'], threshold=0.82)
+
+
+class BatchSymptomMatchingTests(SimpleTestCase):
+    """find_similar_symptoms_batch must give each term what a single per-term search gives it."""
+    NAMES = [f'symptom_{i}' for i in range(40)]
+    TERMS = ['near 3', 'Near  3 ', '', 'between 5 and 6', 'noise a', 'noise b', 'near 3', 'near 10', '   ']
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.vectors = normalize_rows(rng.normal(size=(len(self.NAMES), 16)).astype(np.float32))
+        self.term_vectors = {
+            'near 3': self.vectors[3] + 0.1 * rng.normal(size=16),
+            'between 5 and 6': self.vectors[5] + self.vectors[6],
+            'noise a': rng.normal(size=16),
+            'noise b': rng.normal(size=16),
+            'near 10': self.vectors[10] + 0.3 * rng.normal(size=16),
+        }
+        encoder = mock.Mock()
+        encoder.encode.side_effect = lambda texts, **kwargs: np.array(
+            [self.term_vectors[normalize_phrase(text)] for text in texts], dtype=np.float32
+        )
+        self.engine = SmartTriageEngine(str(settings.BASE_DIR / 'knowledge_base_enhanced.csv'), load_semantic_model=False)
+        self.engine.semantic_model = encoder
+        self.engine.symptom_names = list(self.NAMES)
+        self.engine.symptom_vectors = self.vectors
+
+    def _reference(self, text, threshold):
+        """The pre-batching per-term search: encode one text, score every symptom, sort by score."""
+        if not text.strip():
+            return []
+        query = normalize_rows(np.atleast_2d(self.term_vectors[normalize_phrase(text)]).astype(np.float32))[0]
+        matches = [(name, float(score)) for name, score in zip(self.NAMES, self.vectors @ query) if score >= threshold]
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def _assertSameMatches(self, actual, expected):
+        self.assertEqual([name for name, _ in actual], [name for name, _ in expected])
+        for (_, a), (_, b) in zip(actual, expected):
+            self.assertAlmostEqual(a, b, places=5)
+
+    def test_batch_matches_per_term_search(self):
+        for threshold in (0.3, 0.7, 0.9):
+            self.engine.clear_phrase_caches()
+            batch = self.engine.find_similar_symptoms_batch(self.TERMS, threshold=threshold)
+            self.engine.clear_phrase_caches()
+            single = [self.engine.find_similar_symptoms(term, threshold=threshold) for term in self.TERMS]
+
+            self.assertEqual(len(batch), len(self.TERMS))
+            for term, batch_matches, single_matches in zip(self.TERMS, batch, single):
+                with self.subTest(threshold=threshold, term=term):
+                    self._assertSameMatches(batch_matches, self._reference(term, threshold))
+                    self._assertSameMatches(single_matches, self._reference(term, threshold))
+        self.assertTrue(any(self.engine.find_similar_symptoms_batch(self.TERMS, threshold=0.9)))
+
+    def test_top_k_keeps_the_best_matches(self):
+        batch = self.engine.find_similar_symptoms_batch(self.TERMS, threshold=0.0, top_k=2)
+        for term, matches in zip(self.TERMS, batch):
+            with self.subTest(term=term):
+                self._assertSameMatches(matches, self._reference(term, 0.0)[:2])
+
+    def test_one_encode_call_for_the_uncached_terms(self):
+        self.engine.find_similar_symptoms_batch(self.TERMS, threshold=0.7)
+        self.engine.find_similar_symptoms_batch(self.TERMS, threshold=0.7)
+
+        self.assertEqual(self.engine.semantic_model.encode.call_count, 1)
+        encoded = self.engine.semantic_model.encode.call_args[0][0]
+        self.assertEqual(sorted(normalize_phrase(text) for text in encoded), sorted(self.term_vectors))
+
+
+class GenerateTextCoalescingTests(SimpleTestCase):
+    """Identical concurrent prompts share one backend call through generate_text / agenerate_text."""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.backend = mock.Mock()
+        self.backend.generate.side_effect = self._generate
+        caller = ResilientCaller(CircuitBreaker(failure_threshold=5, cooldown_seconds=60), max_concurrent=4)
+        self.addCleanup(caller._executor.shutdown, wait=True)
+        self.flight = SingleFlight()
+        for name, value in (('get_llm_backend', lambda: self.backend), ('get_resilient_caller', lambda: caller),
+                            ('_single_flight', self.flight), ('_async_single_flight', AsyncSingleFlight())):
+            patcher = mock.patch.object(llm_gateway, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _generate(self, prompt, purpose, deadline):
+        self.release.wait(5)
+        return f"answer to {prompt}"
+
+    def _concurrent(self, prompts):
+        results = {}
+
+        def run(i, prompt):
+            try:
+                results[i] = llm_gateway.generate_text(prompt, 'chat')
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i, prompt)) for i, prompt in enumerate(prompts)]
+        for thread in threads:
+            thread.start()
+        # Release the backend once every caller is either running or waiting on a call
+        deadline = time.monotonic() + 5
+        while (self.flight.stats()['coalesced'] + self.flight.stats()['executed'] < len(prompts)
+               and time.monotonic() < deadline):
+            time.sleep(0.005)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return [results[i] for i in range(len(prompts))]
+
+    def test_identical_prompts_share_one_backend_call(self):
+        with self.assertLogs('chatbot.llm_gateway', level='INFO'):
+            results = self._concurrent(['same prompt'] * 4)
+
+        self.assertEqual(results, ['answer to same prompt'] * 4)
+        self.assertEqual(self.backend.generate.call_count, 1)
+        self.assertEqual(self.flight.stats(), {'executed': 1, 'coalesced': 3, 'in_flight': 0})
+
+    def test_different_prompts_are_not_coalesced(self):
+        results = self._concurrent(['first prompt', 'second prompt'])
+
+        self.assertEqual(results, ['answer to first prompt', 'answer to second prompt'])
+        self.assertEqual(self.backend.generate.call_count, 2)
+
+    def test_errors_reach_every_coalesced_caller(self):
+        def prepare():
+            self.release.wait(5)
+            raise GeminiApiKeyError('bad key')
+        self.backend.prepare.side_effect = prepare
+        results = self._concurrent(['same prompt'] * 3)
+
+        self.assertTrue(all(isinstance(result, GeminiApiKeyError) for result in results))
+        self.backend.generate.assert_not_called()
+        self.assertEqual(self.backend.prepare.call_count, 1)
+
+    def test_async_identical_prompts_share_one_backend_call(self):
+        async def agenerate(prompt, purpose, deadline):
+            await asyncio.sleep(0.05)
+            return f"answer to {prompt}"
+        self.backend.agenerate = mock.Mock(side_effect=agenerate)
+
+        async def ask():
+            return await asyncio.gather(*(llm_gateway.agenerate_text('same prompt', 'chat') for _ in range(4)))
+
+        self.assertEqual(asyncio.run(ask()), ['answer to same prompt'] * 4)
+        self.assertEqual(self.backend.agenerate.call_count, 1)
+
+
+class RecordReplayTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'recordings.jsonl')
+        self.live = mock.Mock(spec=LLMBackend)
+        self.live.generate.side_effect = lambda prompt, purpose, timeout: f"live answer to {prompt}"
+        self.live.agenerate = mock.AsyncMock(side_effect=lambda prompt, purpose, timeout: 'async answer ✓')
+
+    def test_recorded_responses_replay_by_prompt(self):
+        recorder = RecordingBackend(self.live, self.path)
+        recorder.generate('How often should I bathe my dog?', 'chat', 5)
+        asyncio.run(recorder.agenerate('Pusa ko ay nagsusuka', 'symptom_extraction', 5))
+        self.live.generate.side_effect = lambda prompt, purpose, timeout: None
+        recorder.generate('empty answer', 'title', 5)
+
+        replay = ReplayBackend(self.path)
+        self.assertEqual(replay.generate('How often should I bathe my dog?', 'chat', 5),
+                         'live answer to How often should I bathe my dog?')
+        self.assertEqual(asyncio.run(replay.agenerate('Pusa ko ay nagsusuka', 'symptom_extraction', 5)),
+                         'async answer ✓')
+        self.assertIsNone(replay.generate('empty answer', 'title', 5))
+        self.assertEqual((recorder.recorded, replay.hits, replay.misses), (3, 3, 0))
+
+    def test_unrecorded_prompts_get_synthetic_answers(self):
+        replay = ReplayBackend(self.path)
+
+        self.assertEqual(replay.generate('new question', 'chat', 5), SYNTHETIC_CHAT_RESPONSE)
+        self.assertEqual(replay.generate('new notes', 'symptom_progression', 5),
+                         SYNTHETIC_RESPONSES['symptom_progression'])
+        self.assertEqual(replay.misses, 2)
+
+    def test_on_miss_error_raises_for_unrecorded_prompts(self):
+        RecordingBackend(self.live, self.path).generate('recorded', 'chat', 5)
+        replay = ReplayBackend(self.path, on_miss='error')
+
+        self.assertEqual(replay.generate('recorded', 'chat', 5), 'live answer to recorded')
+        with self.assertRaises(KeyError):
+            replay.generate('not recorded', 'chat', 5)
+        with self.assertRaises(KeyError):
+            asyncio.run(replay.agenerate('not recorded', 'chat', 5))
+        self.assertEqual((replay.hits, replay.misses), (1, 2))
@@ -1,20 +1,31 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from . import views_symptom_tracker
 from . import views_diagnosis
+from . import views_jobs
 from .views_symptom_tracker import SymptomTrackerViewSet
 
 # Create router for symptom tracker
 router = DefaultRouter()
 router.register(r'symptom-tracker', SymptomTrackerViewSet, basename='symptom-tracker')
 
+# LLM-bound endpoints: async versions when served under ASGI
+if settings.ASYNC_LLM_VIEWS:
+    from . import views_async
+    llm_views = views_async
+    log_daily_symptoms_view = views_async.log_daily_symptoms
+else:
+    llm_views = views
+    log_daily_symptoms_view = views_symptom_tracker.log_daily_symptoms
+
 urlpatterns = [
     # Template-based URL
     path('', views.chat_view, name='chat'),
    
     # Chat API endpoints
-    path('chat/', views.chat, name='chat_api'),
+    path('chat/', llm_views.chat, name='chat_api'),
     
    #TEST VIEW
 
@@ -39,17 +50,20 @@ urlpatterns = [
     # Pet integration
     path('get-user-pets/', views.get_user_pets, name='get_user_pets'),
     path('start-conversation-with-pet/', views.start_conversation_with_pet, name='start_conversation_with_pet'),
-    path('analyze-symptom-with-image/', views.analyze_symptom_with_image, name='analyze_symptom_with_image'),
+    path('analyze-symptom-with-image/', llm_views.analyze_symptom_with_image, name='analyze_symptom_with_image'),
     
     # Symptom checker endpoints
-    path('symptom-checker/predict/', views.symptom_checker_predict, name='symptom_checker_predict'),
+    path('symptom-checker/predict/', llm_views.symptom_checker_predict, name='symptom_checker_predict'),
     path('symptom-tracker/<int:pk>/remove-log/', views_symptom_tracker.remove_symptom_log, name='remove-log'),
     path('symptom-tracker/clear-pet-symptoms/', views_symptom_tracker.clear_all_pet_symptoms, name='clear-pet-symptoms'),
         
     # Symptom Tracker endpoints (AI-powered)
-    path('symptom-tracker/log-daily/', views_symptom_tracker.log_daily_symptoms, name='log_symptoms'),
+    path('symptom-tracker/log-daily/', log_daily_symptoms_view, name='log_symptoms'),
     path('symptom-tracker/health-timeline/', views_symptom_tracker.get_pet_health_timeline, name='symptom_timeline'),
    
+    # Background jobs (job mode for LLM-heavy endpoints)
+    path('jobs/<uuid:job_id>/', views_jobs.get_llm_job, name='llm_job_status'),
+   
     # Debug endpoints
     path('debug/', views.debug_gemini, name='debug_gemini'),
     path('debug/openai/', views.debug_openai, name='debug_openai'),  # Legacy endpoint (uses Gemini)
@@ -6,21 +6,40 @@ from datetime import datetime
 from typing import List, Dict, Any, Optional
 from django.utils import timezone
 from django.conf import settings
-import google.generativeai as genai
 import logging
 import json
 import hashlib
 import os
+import threading
 
+from .model_registry import model_registry
+from .response_cache import SQLiteResponseCache
 
-logger = logging.getLogger(__name__)
 
-# Cache for Gemini model name to avoid re-scanning on every call
-CACHED_GEMINI_MODEL_NAME = None
+logger = logging.getLogger(__name__)
 
-# Persistent response cache file path
+# Legacy JSON cache file (imported once into the SQLite cache)
 CACHE_FILE = os.path.join(settings.BASE_DIR, 'gemini_response_cache.json')
 
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SQLiteResponseCache:
+    """Process-wide SQLite response cache (see chatbot.response_cache)."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                cache = SQLiteResponseCache(
+                    path=str(getattr(settings, 'LLM_CACHE_PATH', os.path.join(settings.BASE_DIR, 'gemini_response_cache.sqlite3'))),
+                    ttl_seconds=getattr(settings, 'LLM_CACHE_TTL_SECONDS', 0),
+                    max_entries=getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 0),
+                )
+                cache.import_json_file(CACHE_FILE)
+                _response_cache = cache
+    return _response_cache
+
 
 def get_cached_response(prompt_text: str) -> Optional[str]:
     """
@@ -33,20 +52,13 @@ def get_cached_response(prompt_text: str) -> Optional[str]:
         Cached response text if found, None otherwise
     """
     try:
-        if not os.path.exists(CACHE_FILE):
-            return None
-        
         # Create hash of prompt for lookup
         prompt_hash = hashlib.md5(prompt_text.encode('utf-8')).hexdigest()
         
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            cache = json.load(f)
-        
-        if prompt_hash in cache:
+        cached = get_response_cache().get(prompt_hash)
+        if cached is not None:
             logger.info(f"💾 Cache HIT for prompt hash: {prompt_hash[:8]}...")
-            return cache[prompt_hash]
-        
-        return None
+        return cached
         
     except Exception as e:
         logger.warning(f"⚠️ Error reading cache: {e}")
@@ -68,21 +80,7 @@ def save_response_to_cache(prompt_text: str, response_text: str) -> bool:
         # Create hash of prompt
         prompt_hash = hashlib.md5(prompt_text.encode('utf-8')).hexdigest()
         
-        # Load existing cache or create new
-        cache = {}
-        if os.path.exists(CACHE_FILE):
-            try:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                cache = {}
-        
-        # Add new entry
-        cache[prompt_hash] = response_text
-        
-        # Save cache
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
+        get_response_cache().set(prompt_hash, response_text)
         
         logger.info(f"💾 Cache SAVED for prompt hash: {prompt_hash[:8]}...")
         return True
@@ -393,177 +391,24 @@ def determine_severity_level_from_urgency(urgency: str) -> str:
 
 def get_gemini_client():
     """
-    Configure and return Gemini model with caching for performance
+    Return the preferred healthy Gemini model from the process-wide registry
     
     Returns:
-        GenerativeModel: Configured Gemini model instance
+        RegisteredGeminiModel: Proxy exposing generate_content() like GenerativeModel
     
     Raises:
-        Exception: If API key is invalid or all models fail
+        Exception: If the API key is missing/invalid or no models are available
     
     Notes:
-        - Uses cached model name to avoid re-scanning on every call
-        - Tries multiple models with fallbacks
-        - Handles quota limits gracefully
-        - Tests each model before returning
+        - genai.configure() and model discovery run once per process (see chatbot.model_registry)
+        - No test call is made here; model health comes from real call outcomes
+        - Failed calls put the model on cooldown and fail over to the next candidate
     """
-    global CACHED_GEMINI_MODEL_NAME
-    
     try:
-        # Check if API key is set
-        api_key = getattr(settings, 'GEMINI_API_KEY', None)
-        if not api_key:
-            raise Exception("GEMINI_API_KEY is not set in your .env file. Please add GEMINI_API_KEY=your-key-here to your .env file.")
-        
-        # Strip whitespace in case there are spaces
-        api_key = api_key.strip()
-        if not api_key:
-            raise Exception("GEMINI_API_KEY is empty in your .env file. Please check your .env file and add a valid API key.")
-        
-        logger.info(f"🔑 Using Gemini API key (length: {len(api_key)})")
-        genai.configure(api_key=api_key)
-        
-        # Step 1: Try cached model first (if available)
-        if CACHED_GEMINI_MODEL_NAME:
-            try:
-                print(f"=== USING CACHED MODEL: {CACHED_GEMINI_MODEL_NAME} ===")
-                cached_model = genai.GenerativeModel(CACHED_GEMINI_MODEL_NAME)
-                
-                # Quick test to ensure it still works
-                test_response = cached_model.generate_content("Hi")
-                if test_response and hasattr(test_response, 'text') and test_response.text:
-                    logger.info(f"✅ Using cached Gemini model: {CACHED_GEMINI_MODEL_NAME}")
-                    return cached_model
-                else:
-                    print(f"⚠️ Cached model {CACHED_GEMINI_MODEL_NAME} returned empty response, re-scanning...")
-                    CACHED_GEMINI_MODEL_NAME = None  # Clear cache if it fails
-            except Exception as e:
-                error_str = str(e).lower()
-                # If it's an API key error, don't try other models
-                if "403" in str(e) or "leaked" in error_str or "invalid" in error_str or "permission" in error_str:
-                    print(f"❌ API key error with cached model: {e}")
-                    raise Exception("Gemini API key is invalid or has been revoked. Please get a new API key from https://aistudio.google.com/app/apikey and update your .env file.")
-                # For other errors (quota, 404, etc.), clear cache and continue to dynamic search
-                print(f"⚠️ Cached model {CACHED_GEMINI_MODEL_NAME} failed: {type(e).__name__}: {e}, re-scanning...")
-                CACHED_GEMINI_MODEL_NAME = None
-        
-        # Step 2: Dynamic search (only if cache is empty or failed)
-        print("=== CHECKING GEMINI API CONNECTION (DYNAMIC SEARCH) ===")
-        
-        # Get all available models
-        try:
-            available_models = list(genai.list_models())
-            print(f"Found {len(available_models)} available models")
-        except Exception as list_error:
-            error_str = str(list_error)
-            print(f"❌ Could not list models: {list_error}")
-            
-            # Check for API key issues
-            if "403" in error_str or "leaked" in error_str.lower() or "invalid" in error_str.lower() or "permission" in error_str.lower():
-                raise Exception("Gemini API key is invalid or has been revoked. Please get a new API key from https://aistudio.google.com/app/apikey and update your .env file.")
-            raise Exception(f"Failed to list Gemini models: {list_error}")
-        
-        # Filter models that support generateContent
-        supported_models = []
-        for model in available_models:
-            if 'generateContent' in model.supported_generation_methods:
-                supported_models.append(model.name)  # model.name already includes 'models/' prefix
-        
-        if not supported_models:
-            raise Exception("No Gemini models found that support generateContent")
-        
-        print(f"Found {len(supported_models)} models supporting generateContent")
-        
-        # Sort models: prioritize PRO models for Thesis Defense (Accuracy > Speed)
-        def get_priority_score(model_name):
-            """
-            Scoring logic to prioritize models for Thesis Defense (Accuracy > Speed).
-            Priority Order:
-            1. Gemini 1.5 PRO (Highest reasoning capability)
-            2. Gemini 1.5 FLASH (Fallback)
-            3. Others
-            """
-            name_lower = model_name.lower()
-            score = 0
-            
-            # --- POSITIVE SCORING ---
-            
-            # TIER 1: PRO models (The "Brain" - Critical for Medical Diagnosis)
-            if "pro" in name_lower:
-                score += 100
-            
-            # TIER 2: Version 1.5 (Current Stable Standard)
-            if "1.5" in name_lower:
-                score += 50
-                
-            # TIER 3: Flash (Fast, but less reasoning depth - backup only)
-            if "flash" in name_lower:
-                score += 10  # Give it points, but much less than Pro
-                
-            # --- NEGATIVE SCORING ---
-            
-            # Penalize "Vision" specific models if we are doing text diagnosis (optional)
-            if "vision" in name_lower and "pro" not in name_lower:
-                score -= 10
-
-            # Penalize Experimental/Preview models (Stability Risk for Defense)
-            if "experimental" in name_lower or "preview" in name_lower:
-                score -= 20
-                
-            return score
-        
-        # Sort by priority (highest first), then alphabetically
-        sorted_models = sorted(supported_models, key=lambda x: (-get_priority_score(x), x))
-        
-        print(f"\n=== TRYING MODELS (PRIORITIZING PRO FOR ACCURACY) ===")
-        for i, model_name in enumerate(sorted_models, 1):
-            priority_info = ""
-            if "pro" in model_name.lower():
-                priority_info = " [PRO - HIGHEST PRIORITY]"
-            elif "1.5" in model_name.lower() and "flash" in model_name.lower():
-                priority_info = " [FLASH - FALLBACK]"
-            
-            print(f"[{i}/{len(sorted_models)}] Trying model: {model_name}{priority_info}")
-            
-            try:
-                # Create the model
-                test_model = genai.GenerativeModel(model_name)
-                
-                # Test with a very simple prompt
-                test_response = test_model.generate_content("Hi")
-                
-                if test_response and hasattr(test_response, 'text') and test_response.text:
-                    print(f"✅ Found high-quota model: {model_name}")
-                    logger.info(f"✅ Selected Gemini model: {model_name}")
-                    
-                    # Step 3: Cache the successful model name
-                    CACHED_GEMINI_MODEL_NAME = model_name
-                    print(f"💾 Cached model name for future requests: {CACHED_GEMINI_MODEL_NAME}")
-                    
-                    return test_model
-                else:
-                    print(f"⚠️ Model {model_name} returned empty response, trying next...")
-                    continue
-                    
-            except Exception as e:
-                # Handle ALL errors gracefully - continue to next model
-                error_str = str(e).lower()
-                
-                # Check for API key issues (these should stop the loop)
-                if "403" in str(e) or "leaked" in error_str or "invalid" in error_str or "permission" in error_str:
-                    print(f"❌ API key error for {model_name}: {e}")
-                    raise Exception("Gemini API key is invalid or has been revoked. Please get a new API key from https://aistudio.google.com/app/apikey and update your .env file.")
-                
-                # For all other errors (quota, 404, 400, etc.), just continue
-                print(f"⚠️ Model {model_name} failed: {type(e).__name__}: {e}")
-                continue
-        
-        # If we get here, all models failed
-        raise Exception("All Gemini models failed. Please check your API quota or try again later.")
-        
+        return model_registry.get_model()
     except Exception as e:
         print(f"❌ Gemini configuration error: {e}")
-        raise e
+        raise
 
 
 def analyze_symptom_progression(pet_id: int) -> Dict[str, Any]:
@@ -586,94 +431,161 @@ def analyze_symptom_progression(pet_id: int) -> Dict[str, Any]:
             "alert_needed": bool
         }
     """
+    try:
+        early_result, analysis_input = _prepare_progression_analysis(pet_id)
+        if early_result is not None:
+            return early_result
+        prompt, deterministic_score, logs_data = analysis_input
+        
+        # Call Gemini (cached; identical concurrent prompts share one call)
+        from .llm_gateway import LLMUnavailableError, generate_text
+        try:
+            logger.info(f"🤖 Analyzing symptom progression for pet {pet_id} using Gemini...")
+            
+            response_text = generate_text(prompt, 'symptom_progression', use_cache=True)
+            return _parse_progression_response(response_text, deterministic_score, logs_data)
+        
+        except LLMUnavailableError as e:
+            logger.warning(f"⚡ Gemini unavailable, using deterministic score: {e}")
+            return _fallback_to_deterministic(deterministic_score, logs_data)
+        except Exception as e:
+            logger.error(f"✗ Gemini analysis failed: {e}")
+            logger.exception(e)
+            # Fallback to deterministic score
+            return _fallback_to_deterministic(deterministic_score, logs_data)
+    
+    except Exception as e:
+        logger.error(f"✗ Symptom progression analysis failed: {e}")
+        logger.exception(e)
+        return _default_health_analysis()
+
+
+async def aanalyze_symptom_progression(pet_id: int) -> Dict[str, Any]:
+    """
+    analyze_symptom_progression for the async views: the log query runs in a
+    thread (sync_to_async) and the Gemini call is awaited.
+    """
+    from asgiref.sync import sync_to_async
+    from .llm_gateway import LLMUnavailableError, agenerate_text
+    
+    try:
+        early_result, analysis_input = await sync_to_async(_prepare_progression_analysis)(pet_id)
+        if early_result is not None:
+            return early_result
+        prompt, deterministic_score, logs_data = analysis_input
+        try:
+            logger.info(f"🤖 Analyzing symptom progression for pet {pet_id} using Gemini...")
+            response_text = await agenerate_text(prompt, 'symptom_progression', use_cache=True)
+            return _parse_progression_response(response_text, deterministic_score, logs_data)
+        except LLMUnavailableError as e:
+            logger.warning(f"⚡ Gemini unavailable, using deterministic score: {e}")
+            return _fallback_to_deterministic(deterministic_score, logs_data)
+        except Exception as e:
+            logger.error(f"✗ Gemini analysis failed: {e}")
+            logger.exception(e)
+            return _fallback_to_deterministic(deterministic_score, logs_data)
+    
+    except Exception as e:
+        logger.error(f"✗ Symptom progression analysis failed: {e}")
+        logger.exception(e)
+        return _default_health_analysis()
+
+
+def _prepare_progression_analysis(pet_id: int):
+    """
+    Load the last 7 days of logs and build the progression prompt.
+    
+    Returns:
+        (result, None) when there is nothing to analyze, else
+        (None, (prompt, deterministic_score, logs_data))
+    """
     from datetime import timedelta
     from django.utils import timezone
     from pets.models import Pet
     from .models import SymptomLog
     
+    # Get pet
     try:
-        # Get pet
-        try:
-            pet = Pet.objects.get(id=pet_id)
-        except Pet.DoesNotExist:
-            logger.error(f"Pet with id {pet_id} not found")
-            return {
-                "risk_score": 0,
-                "urgency": "Low",
-                "trend": "No data",
-                "prediction": "No symptom logs available for analysis.",
-                "alert_needed": False
-            }
-        
-        # Fetch last 7 days of logs
-        seven_days_ago = timezone.now().date() - timedelta(days=7)
-        logs = SymptomLog.objects.filter(
-            pet=pet,
-            symptom_date__gte=seven_days_ago
-        ).order_by('symptom_date')
-        
-        # If no logs, return default structure
-        if not logs.exists():
-            logger.info(f"No symptom logs found for pet {pet_id} in last 7 days")
-            return {
-                "risk_score": 0,
-                "urgency": "Low",
-                "trend": "No data",
-                "prediction": "No symptom logs available for analysis. Please log symptoms to get AI insights.",
-                "alert_needed": False
-            }
-        
-        # Format logs for Gemini and calculate deterministic score
-        logs_data = []
-        all_severity_scores = []  # Collect all severity scores for deterministic calculation
-        
-        for log in logs:
-            log_entry = {
-                "date": log.symptom_date.strftime("%Y-%m-%d"),
-                "symptoms": log.symptoms if isinstance(log.symptoms, list) else [],
-                "severity": log.overall_severity if hasattr(log, 'overall_severity') else "moderate",
-                "notes": log.notes or ""
-            }
-            
-            # Add severity scores if available (from symptom_details or create from symptoms)
-            if hasattr(log, 'symptom_details') and log.symptom_details:
-                log_entry["severity_scores"] = log.symptom_details
-                # Collect severity scores for deterministic calculation
-                severity_values = [v for v in log.symptom_details.values() if isinstance(v, (int, float))]
-                all_severity_scores.extend(severity_values)
-            else:
-                # Create default severity scores (5/10) for each symptom
-                log_entry["severity_scores"] = {
-                    symptom: 5 for symptom in log_entry["symptoms"]
-                }
-                # Add default scores to collection
-                all_severity_scores.extend([5] * len(log_entry["symptoms"]))
-            
-            logs_data.append(log_entry)
+        pet = Pet.objects.get(id=pet_id)
+    except Pet.DoesNotExist:
+        logger.error(f"Pet with id {pet_id} not found")
+        return {
+            "risk_score": 0,
+            "urgency": "Low",
+            "trend": "No data",
+            "prediction": "No symptom logs available for analysis.",
+            "alert_needed": False
+        }, None
+    
+    # Fetch last 7 days of logs
+    seven_days_ago = timezone.now().date() - timedelta(days=7)
+    logs = SymptomLog.objects.filter(
+        pet=pet,
+        symptom_date__gte=seven_days_ago
+    ).order_by('symptom_date')
+    
+    # If no logs, return default structure
+    if not logs.exists():
+        logger.info(f"No symptom logs found for pet {pet_id} in last 7 days")
+        return {
+            "risk_score": 0,
+            "urgency": "Low",
+            "trend": "No data",
+            "prediction": "No symptom logs available for analysis. Please log symptoms to get AI insights.",
+            "alert_needed": False
+        }, None
+    
+    # Format logs for Gemini and calculate deterministic score
+    logs_data = []
+    all_severity_scores = []  # Collect all severity scores for deterministic calculation
+    
+    for log in logs:
+        log_entry = {
+            "date": log.symptom_date.strftime("%Y-%m-%d"),
+            "symptoms": log.symptoms if isinstance(log.symptoms, list) else [],
+            "severity": log.overall_severity if hasattr(log, 'overall_severity') else "moderate",
+            "notes": log.notes or ""
+        }
         
-        # Calculate deterministic score: Average Severity * 10
-        deterministic_score = 0
-        if all_severity_scores:
-            avg_severity = sum(all_severity_scores) / len(all_severity_scores)
-            deterministic_score = int(avg_severity * 10)
-            deterministic_score = max(0, min(100, deterministic_score))  # Clamp to 0-100
+        # Add severity scores if available (from symptom_details or create from symptoms)
+        if hasattr(log, 'symptom_details') and log.symptom_details:
+            log_entry["severity_scores"] = log.symptom_details
+            # Collect severity scores for deterministic calculation
+            severity_values = [v for v in log.symptom_details.values() if isinstance(v, (int, float))]
+            all_severity_scores.extend(severity_values)
         else:
-            # Fallback if no severity scores
-            deterministic_score = 50
-        
-        # Build Gemini prompt
-        species = pet.animal_type or "Unknown"
-        pet_name = pet.name or "Pet"
-        
-        logs_text = "\n".join([
-            f"Date: {log['date']}\n"
-            f"Symptoms: {', '.join(log['symptoms'])}\n"
-            f"Severity Scores: {log['severity_scores']}\n"
-            f"Notes: {log['notes']}\n"
-            for log in logs_data
-        ])
+            # Create default severity scores (5/10) for each symptom
+            log_entry["severity_scores"] = {
+                symptom: 5 for symptom in log_entry["symptoms"]
+            }
+            # Add default scores to collection
+            all_severity_scores.extend([5] * len(log_entry["symptoms"]))
         
-        prompt = f"""You are a Veterinary Data Analyst. Review this 7-day symptom log for a {species} named {pet_name}.
+        logs_data.append(log_entry)
+    
+    # Calculate deterministic score: Average Severity * 10
+    deterministic_score = 0
+    if all_severity_scores:
+        avg_severity = sum(all_severity_scores) / len(all_severity_scores)
+        deterministic_score = int(avg_severity * 10)
+        deterministic_score = max(0, min(100, deterministic_score))  # Clamp to 0-100
+    else:
+        # Fallback if no severity scores
+        deterministic_score = 50
+    
+    # Build Gemini prompt
+    species = pet.animal_type or "Unknown"
+    pet_name = pet.name or "Pet"
+    
+    logs_text = "\n".join([
+        f"Date: {log['date']}\n"
+        f"Symptoms: {', '.join(log['symptoms'])}\n"
+        f"Severity Scores: {log['severity_scores']}\n"
+        f"Notes: {log['notes']}\n"
+        for log in logs_data
+    ])
+    
+    prompt = f"""You are a Veterinary Data Analyst. Review this 7-day symptom log for a {species} named {pet_name}.
 
 SYMPTOM LOG DATA:
 {logs_text}
@@ -694,59 +606,34 @@ OUTPUT JSON ONLY (no markdown, no explanation outside JSON):
 }}
 
 JSON Response:"""
+    
+    return None, (prompt, deterministic_score, logs_data)
+
+
+def _parse_progression_response(response_text: Optional[str], deterministic_score: int,
+                                logs_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if not response_text:
+        logger.warning("⚠️ Gemini returned empty response for symptom analysis")
+        return _fallback_to_deterministic(deterministic_score, logs_data)
+    
+    # Extract JSON from response
+    logger.info(f"📋 Gemini analysis response: {response_text[:200]}...")
+    
+    # Try to extract JSON (handle markdown code blocks)
+    json_text = _extract_json_from_text(response_text)
+    
+    try:
+        analysis_result = json.loads(json_text)
+        logger.info("✓ Successfully parsed Gemini analysis response")
         
-        # Call Gemini (with caching)
-        try:
-            # Check cache first
-            cached_response = get_cached_response(prompt)
-            if cached_response:
-                logger.info(f"💾 Using cached response for pet {pet_id} symptom analysis")
-                response_text = cached_response
-            else:
-                # No cache hit - call Gemini
-                model = get_gemini_client()
-                logger.info(f"🤖 Analyzing symptom progression for pet {pet_id} using Gemini...")
-                
-                response = model.generate_content(prompt)
-                
-                if not response or not hasattr(response, 'text') or not response.text:
-                    logger.warning("⚠️ Gemini returned empty response for symptom analysis")
-                    return _fallback_to_deterministic(deterministic_score, logs_data)
-                
-                response_text = response.text.strip()
-                
-                # Save to cache for future requests
-                save_response_to_cache(prompt, response_text)
-            
-            # Extract JSON from response
-            logger.info(f"📋 Gemini analysis response: {response_text[:200]}...")
-            
-            # Try to extract JSON (handle markdown code blocks)
-            json_text = _extract_json_from_text(response_text)
-            
-            try:
-                analysis_result = json.loads(json_text)
-                logger.info("✓ Successfully parsed Gemini analysis response")
-                
-                # Validate and normalize with safety guardrails
-                return _normalize_health_analysis(analysis_result, deterministic_score, logs_data)
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"✗ Failed to parse Gemini JSON response: {e}")
-                logger.error(f"   Response text: {response_text}")
-                # Fallback to deterministic score
-                return _fallback_to_deterministic(deterministic_score, logs_data)
+        # Validate and normalize with safety guardrails
+        return _normalize_health_analysis(analysis_result, deterministic_score, logs_data)
         
-        except Exception as e:
-            logger.error(f"✗ Gemini analysis failed: {e}")
-            logger.exception(e)
-            # Fallback to deterministic score
-            return _fallback_to_deterministic(deterministic_score, logs_data)
-    
-    except Exception as e:
-        logger.error(f"✗ Symptom progression analysis failed: {e}")
-        logger.exception(e)
-        return _default_health_analysis()
+    except json.JSONDecodeError as e:
+        logger.error(f"✗ Failed to parse Gemini JSON response: {e}")
+        logger.error(f"   Response text: {response_text}")
+        # Fallback to deterministic score
+        return _fallback_to_deterministic(deterministic_score, logs_data)
 
 
 def _extract_json_from_text(text: str) -> str:
@@ -24,12 +24,18 @@ from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.core.cache import cache
 from pets.models import Pet
 from .models import Conversation, Message, AIDiagnosis, SOAPReport, DiagnosisSuggestion
 # Note: image_classifier is now lazily loaded via analyze_pet_image when needed
 import logging
-from .utils import get_gemini_client, get_cached_response, save_response_to_cache
+from .llm_gateway import LLMUnavailableError, generate_text
+from .model_registry import GeminiApiKeyError
+from .jobs import enqueue_job, job_accepted_response, job_mode_requested, payload_dedup_key, request_payload
+from .semantic_cache import lookup_semantic_answer, semantic_cache_scope, store_semantic_answer
+from utils.rate_limiter import hit_rate_limit
+from utils.timing import timed
+from utils.triage_rules import (EMERGENCY_SCREEN_RULES, dynamic_urgency_level, has_blood_symptom,
+                                prediction_urgency)
 logger = logging.getLogger(__name__)
 
 PAWPAL_MODEL = None
@@ -142,21 +148,11 @@ def load_pawpal_lightgbm():
         raise
 
 def _rate_limit_symptom_checker(user_id: int, max_requests: int = 10, window_seconds: int = 60) -> bool:
-    """Simple per-user rate limit: returns True if user is over limit."""
+    """Per-user sliding-window rate limit (shared across workers): returns True if user is over limit."""
     if not user_id:
         return False
-    cache_key = f"symptom_checker_rl_{user_id}"
-    now_ts = datetime.now().timestamp()
-    attempts = cache.get(cache_key, [])
-    # keep attempts within window
-    threshold = now_ts - window_seconds
-    attempts = [ts for ts in attempts if ts >= threshold]
-    if len(attempts) >= max_requests:
-        cache.set(cache_key, attempts, timeout=window_seconds + 5)
-        return True
-    attempts.append(now_ts)
-    cache.set(cache_key, attempts, timeout=window_seconds + 5)
-    return False
+    allowed, _ = hit_rate_limit('symptom_checker', user_id, max_requests, window_seconds)
+    return not allowed
 
 
 def _build_feature_row_from_payload(payload: dict) -> dict:
@@ -353,9 +349,6 @@ def _validate_symptom_checker_payload(data: dict) -> tuple[bool, dict | None, Re
     return True, data, None
 
 
-# Note: get_gemini_client() is now imported from chatbot.utils
-
-
 def get_gemini_response(user_message, conversation_history=None, chat_mode='general'):
     """Generate AI response using Google Gemini with different modes"""
     try:
@@ -428,48 +421,30 @@ def get_gemini_response(user_message, conversation_history=None, chat_mode='gene
        
         print(f"Using chat mode: {chat_mode}")
        
-        # Check cache first
-        cached_response = get_cached_response(conversation_text)
-        if cached_response:
-            logger.info("💾 Using cached response for chat")
-            return cached_response
+        # First-turn general questions: reuse the answer to a near-duplicate earlier question
+        semantic_scope = semantic_cache_scope(user_message, chat_mode, conversation_history)
+        if semantic_scope:
+            cached_answer = lookup_semantic_answer(user_message, chat_mode, semantic_scope)
+            if cached_answer:
+                return cached_answer
        
-        # No cache hit - call Gemini
-        model = get_gemini_client()
-        response = model.generate_content(conversation_text)
+        # Cached; identical concurrent prompts (e.g. the same opener) share one Gemini call
+        response_text = generate_text(conversation_text, 'chat', use_cache=True)
        
-        if response and hasattr(response, 'text') and response.text:
-            response_text = response.text.strip()
-            # Save to cache
-            save_response_to_cache(conversation_text, response_text)
+        if response_text:
+            if semantic_scope:
+                store_semantic_answer(user_message, chat_mode, semantic_scope, response_text)
             return response_text
         else:
             return "I'm having trouble responding right now. Could you please try again?"
        
     except Exception as e:
-        error_str = str(e)
-        error_type = type(e).__name__
-        logger.error(f"Gemini Error ({error_type}): {error_str}")
-        print(f"❌ Gemini Error ({error_type}): {error_str}")
-        
-        # Provide more specific error messages
-        if "GEMINI_API_KEY is not set" in error_str or "GEMINI_API_KEY is empty" in error_str:
-            logger.error("API key configuration issue detected")
-            return f"I'm currently unavailable due to API configuration issues. {error_str} For immediate pet health concerns, please consult with a veterinarian."
-        elif "API key" in error_str or "invalid" in error_str.lower() or "revoked" in error_str.lower() or "403" in error_str:
-            logger.error("API key validation failed")
-            return f"I'm currently unavailable due to API configuration issues. {error_str} Please check your .env file and ensure GEMINI_API_KEY is set correctly. For immediate pet health concerns, please consult with a veterinarian."
-        elif "quota" in error_str.lower():
-            logger.warning("API quota exceeded")
-            return "I'm experiencing high demand right now. Please try again in a few minutes or consult with a veterinarian for immediate concerns."
-        else:
-            logger.error(f"Unexpected Gemini error: {error_str}")
-            return f"I'm experiencing technical difficulties: {error_str}. Please try again or consult with a veterinarian for immediate concerns."
+        return _chat_error_reply(e)
 
-def get_gemini_response_with_pet_context(user_message, conversation_history=None, chat_mode='general', pet_context=None, assessment_context=None):
-    """Generate AI response using Google Gemini with pet context"""
-    try:
-        CLINIC_CONTEXT = """
+
+def _build_pet_context_prompt(user_message, conversation_history=None, chat_mode='general', pet_context=None, assessment_context=None):
+    """Chat prompt: system prompt for the mode, pet and assessment context, last 6 messages."""
+    CLINIC_CONTEXT = """
         IMPORTANT CONTEXT:
         You are the official AI assistant for 'SouthValley Veterinary Clinic'.
         
@@ -481,9 +456,9 @@ def get_gemini_response_with_pet_context(user_message, conversation_history=None
         2. Remind them the clinic is OPEN 24/7.
         3. Contact: 0928 960 7250.
         """
-        # Different system prompts based on mode
-        if chat_mode == 'symptom_checker':
-            system_prompt = """You are PawPal's Symptom Checker, an AI veterinary diagnostic assistant for SouthValley Veterinary Clinic located in A. Gomez, National Highway, Balibago, Sta. Rosa, Laguna, Sta. Rosa, Philippines.
+    # Different system prompts based on mode
+    if chat_mode == 'symptom_checker':
+        system_prompt = """You are PawPal's Symptom Checker, an AI veterinary diagnostic assistant for SouthValley Veterinary Clinic located in A. Gomez, National Highway, Balibago, Sta. Rosa, Laguna, Sta. Rosa, Philippines.
             Open 24/7 and the Contact number is: 0928 960 7250
             You help pet owners understand possible causes of their pet's symptoms and guide them on urgency levels.
             
@@ -511,8 +486,8 @@ def get_gemini_response_with_pet_context(user_message, conversation_history=None
             
             Instead, respond empathetically and end your message with this exact tag: `[[TRIGGER_LOG_UI]]`.
             """
-        else:  # general mode
-            system_prompt = """You are PawPal, a friendly AI veterinary assistant for SouthValley Veterinary Clinic located in A. Gomez, National Highway, Balibago, Sta. Rosa, Laguna, Sta. Rosa, Philippines.
+    else:  # general mode
+        system_prompt = """You are PawPal, a friendly AI veterinary assistant for SouthValley Veterinary Clinic located in A. Gomez, National Highway, Balibago, Sta. Rosa, Laguna, Sta. Rosa, Philippines.
             Open 24/7 and the Contact number is: 0928 960 7250 focused on general pet health education.
             You help pet owners understand normal pet behaviors, proper care, and maintenance.
            
@@ -529,13 +504,13 @@ def get_gemini_response_with_pet_context(user_message, conversation_history=None
             
             Instead, respond empathetically and end your message with this exact tag: `[[TRIGGER_LOG_UI]]`.
             """
-       
-        # Build conversation context
-        conversation_text = system_prompt + "\n\n"
-       
-        # Add pet context if available
-        if pet_context:
-            conversation_text += f"""Pet Information:
+   
+    # Build conversation context
+    conversation_text = system_prompt + "\n\n"
+   
+    # Add pet context if available
+    if pet_context:
+        conversation_text += f"""Pet Information:
 Name: {pet_context['name']}
 Species: {pet_context['species']}
 Breed: {pet_context['breed']}
@@ -549,95 +524,107 @@ Chronic Conditions: {pet_context['chronic_diseases']}
 You already know about {pet_context['name']}, so don't ask for basic information again. Provide advice specific to this {pet_context['species']}.
 
 """
+   
+    # Add mode context
+    if chat_mode == 'symptom_checker':
+        conversation_text += "Mode: Symptom Analysis\n"
+    else:
+        conversation_text += "Mode: General Pet Health Education\n"
+   
+    # Add assessment context if available (for follow-up questions)
+    if assessment_context and isinstance(assessment_context, dict):
+        conversation_text += "\nPrevious Assessment Context:\n"
+        if assessment_context.get('pet_name'):
+            conversation_text += f"Pet: {assessment_context['pet_name']}\n"
+        if assessment_context.get('predictions'):
+            conversation_text += "Recent diagnosis predictions:\n"
+            for i, pred in enumerate(assessment_context['predictions'][:3], 1):
+                disease = pred.get('disease') or pred.get('label', 'Unknown')
+                confidence = pred.get('confidence') or pred.get('likelihood', 0)
+                conversation_text += f"{i}. {disease} ({confidence*100:.0f}% confidence)\n"
+        if assessment_context.get('overall_recommendation'):
+            conversation_text += f"Recommendation: {assessment_context['overall_recommendation']}\n"
+        conversation_text += "Use this context to answer follow-up questions about the assessment.\n\n"
+   
+    # Add conversation history if provided (a queryset or a list of messages)
+    recent_messages = list(conversation_history)[-6:] if conversation_history is not None else []
+    if recent_messages:
+        conversation_text += "Previous conversation:\n"
        
-        # Add mode context
-        if chat_mode == 'symptom_checker':
-            conversation_text += "Mode: Symptom Analysis\n"
-        else:
-            conversation_text += "Mode: General Pet Health Education\n"
-       
-        # Add assessment context if available (for follow-up questions)
-        if assessment_context and isinstance(assessment_context, dict):
-            conversation_text += "\nPrevious Assessment Context:\n"
-            if assessment_context.get('pet_name'):
-                conversation_text += f"Pet: {assessment_context['pet_name']}\n"
-            if assessment_context.get('predictions'):
-                conversation_text += "Recent diagnosis predictions:\n"
-                for i, pred in enumerate(assessment_context['predictions'][:3], 1):
-                    disease = pred.get('disease') or pred.get('label', 'Unknown')
-                    confidence = pred.get('confidence') or pred.get('likelihood', 0)
-                    conversation_text += f"{i}. {disease} ({confidence*100:.0f}% confidence)\n"
-            if assessment_context.get('overall_recommendation'):
-                conversation_text += f"Recommendation: {assessment_context['overall_recommendation']}\n"
-            conversation_text += "Use this context to answer follow-up questions about the assessment.\n\n"
-       
-        # Add conversation history if provided
-        if conversation_history and conversation_history.exists():
-            conversation_text += "Previous conversation:\n"
-            recent_messages = list(conversation_history)[-6:]
-           
-            for msg in recent_messages:
-                role = "User" if msg.is_user else "PawPal"
-                conversation_text += f"{role}: {msg.content}\n"
-       
-        # Add current user message
-        conversation_text += f"\nUser: {user_message}\nPawPal:"
+        for msg in recent_messages:
+            role = "User" if msg.is_user else "PawPal"
+            conversation_text += f"{role}: {msg.content}\n"
+   
+    # Add current user message
+    conversation_text += f"\nUser: {user_message}\nPawPal:"
+    return conversation_text
+
+
+def get_gemini_response_with_pet_context(user_message, conversation_history=None, chat_mode='general', pet_context=None, assessment_context=None):
+    """Generate AI response using Google Gemini with pet context"""
+    try:
+        conversation_text = _build_pet_context_prompt(
+            user_message, conversation_history, chat_mode, pet_context, assessment_context
+        )
        
         print(f"Using chat mode: {chat_mode}")
         if pet_context:
             print(f"Pet context: {pet_context['name']} ({pet_context['species']})")
        
-        # Check cache first
-        cached_response = get_cached_response(conversation_text)
-        if cached_response:
-            logger.info("💾 Using cached response for chat with pet context")
-            return cached_response
+        # First-turn general questions: reuse the answer to a near-duplicate earlier question
+        semantic_scope = semantic_cache_scope(
+            user_message, chat_mode, conversation_history, pet_context, assessment_context
+        )
+        if semantic_scope:
+            cached_answer = lookup_semantic_answer(user_message, chat_mode, semantic_scope)
+            if cached_answer:
+                return cached_answer
        
-        # No cache hit - call Gemini
-        model = get_gemini_client()
-        response = model.generate_content(conversation_text)
+        # Cached; identical concurrent prompts share one Gemini call
+        response_text = generate_text(conversation_text, 'chat_with_pet_context', use_cache=True)
        
-        if response and hasattr(response, 'text') and response.text:
-            response_text = response.text.strip()
-            # Save to cache
-            save_response_to_cache(conversation_text, response_text)
+        if response_text:
+            if semantic_scope:
+                store_semantic_answer(user_message, chat_mode, semantic_scope, response_text)
             return response_text
         else:
             return "I'm having trouble responding right now. Could you please try again?"
        
     except Exception as e:
-        error_str = str(e)
-        error_type = type(e).__name__
-        logger.error(f"Gemini Error ({error_type}): {error_str}")
-        print(f"❌ Gemini Error ({error_type}): {error_str}")
-        
-        # Provide more specific error messages
-        if "GEMINI_API_KEY is not set" in error_str or "GEMINI_API_KEY is empty" in error_str:
-            logger.error("API key configuration issue detected")
-            return f"I'm currently unavailable due to API configuration issues. {error_str} For immediate pet health concerns, please consult with a veterinarian."
-        elif "API key" in error_str or "invalid" in error_str.lower() or "revoked" in error_str.lower() or "403" in error_str:
-            logger.error("API key validation failed")
-            return f"I'm currently unavailable due to API configuration issues. {error_str} Please check your .env file and ensure GEMINI_API_KEY is set correctly. For immediate pet health concerns, please consult with a veterinarian."
-        elif "quota" in error_str.lower():
-            logger.warning("API quota exceeded")
-            return "I'm experiencing high demand right now. Please try again in a few minutes or consult with a veterinarian for immediate concerns."
-        else:
-            logger.error(f"Unexpected Gemini error: {error_str}")
-            return f"I'm experiencing technical difficulties: {error_str}. Please try again or consult with a veterinarian for immediate concerns."
+        return _chat_error_reply(e)
+
+
+def _chat_error_reply(e):
+    """Reply shown to the owner when the chat Gemini call failed."""
+    if isinstance(e, LLMUnavailableError):
+        # Circuit open, deadline exceeded, quota or provider outage - answer immediately
+        logger.warning(f"Gemini unavailable ({type(e).__name__}): {e}")
+        return "I'm experiencing high demand right now. Please try again in a few minutes or consult with a veterinarian for immediate concerns."
+    if isinstance(e, GeminiApiKeyError):
+        logger.error("API key validation failed")
+        return f"I'm currently unavailable due to API configuration issues. {e} Please check your .env file and ensure GEMINI_API_KEY is set correctly. For immediate pet health concerns, please consult with a veterinarian."
+    error_str = str(e)
+    error_type = type(e).__name__
+    logger.error(f"Gemini Error ({error_type}): {error_str}")
+    print(f"❌ Gemini Error ({error_type}): {error_str}")
+    
+    # Provide more specific error messages
+    if "GEMINI_API_KEY is not set" in error_str or "GEMINI_API_KEY is empty" in error_str:
+        logger.error("API key configuration issue detected")
+        return f"I'm currently unavailable due to API configuration issues. {error_str} For immediate pet health concerns, please consult with a veterinarian."
+    else:
+        logger.error(f"Unexpected Gemini error: {error_str}")
+        return f"I'm experiencing technical difficulties: {error_str}. Please try again or consult with a veterinarian for immediate concerns."
 
 
-def generate_conversation_title(first_message, ai_response=None, pet_name=None):
-    """Generate a conversation title using Gemini"""
-    try:
-        model = get_gemini_client()
-        
-        context_str = f"User: {first_message}\n"
-        if ai_response:
-            context_str += f"AI: {ai_response}\n"
-        if pet_name:
-            context_str += f"Subject: {pet_name}\n"
+def _build_title_prompt(first_message, ai_response=None, pet_name=None):
+    context_str = f"User: {first_message}\n"
+    if ai_response:
+        context_str += f"AI: {ai_response}\n"
+    if pet_name:
+        context_str += f"Subject: {pet_name}\n"
 
-        prompt = f"""Based on this pet health conversation, generate a short, descriptive title (max 5-6 words).
+    return f"""Based on this pet health conversation, generate a short, descriptive title (max 5-6 words).
 
 {context_str}
 
@@ -647,16 +634,24 @@ Guidelines:
 - Do NOT include dates or IDs.
 
 Title:"""
-       
-        response = model.generate_content(prompt)
-        title = response.text.strip().replace('"', '').replace("Title:", "").strip()
-       
-        # Fallback if title is too long or empty
-        if len(title) > 50 or not title:
-            words = first_message.split()[:4]
-            title = " ".join(words).title()
-       
-        return title
+
+
+def _clean_title(response_text, first_message):
+    title = (response_text or '').replace('"', '').replace("Title:", "").strip()
+   
+    # Fallback if title is too long or empty
+    if len(title) > 50 or not title:
+        words = first_message.split()[:4]
+        title = " ".join(words).title()
+   
+    return title
+
+
+def generate_conversation_title(first_message, ai_response=None, pet_name=None):
+    """Generate a conversation title using Gemini"""
+    try:
+        prompt = _build_title_prompt(first_message, ai_response, pet_name)
+        return _clean_title(generate_text(prompt, 'title', deadline=5), first_message)
        
     except Exception as e:
         print(f"Error generating title: {e}")
@@ -789,20 +784,7 @@ def chat(request):
         conversation_history = conversation.messages.all().order_by('created_at')
        
         # Get pet context if this conversation is linked to a pet
-        pet_context = None
-        if hasattr(conversation, 'pet') and conversation.pet:
-            pet = conversation.pet
-            pet_context = {
-                'name': pet.name,
-                'species': getattr(pet, 'animal_type', 'Unknown'),
-                'breed': getattr(pet, 'breed', 'Unknown'),
-                'age': getattr(pet, 'age', 'Unknown'),
-                'sex': getattr(pet, 'sex', 'Unknown'),
-                'weight': getattr(pet, 'weight', 'Unknown'),
-                'medical_notes': getattr(pet, 'medical_notes', ''),
-                'allergies': getattr(pet, 'allergies', ''),
-                'chronic_diseases': getattr(pet, 'chronic_diseases', ''),
-            }
+        pet_context = _pet_chat_context(getattr(conversation, 'pet', None))
        
         # Generate AI response using Gemini with pet context
         ai_response = get_gemini_response_with_pet_context(
@@ -2185,24 +2167,13 @@ def calculate_dynamic_urgency(user_input, predicted_disease, metadata):
     emergency_screen = emergency_data.get('emergencyScreen', {}) if emergency_data else {}
     
     # Check emergency screening results
-    perfusion = emergency_screen.get('perfusion', '')
-    if perfusion in ['pale_white', 'blue_purple']:
-        urgency_score += 3
-        red_flags.append("Pale/blue gums - possible shock or blood loss")
-    
-    respiration = emergency_screen.get('respiration', '')
-    if respiration in ['gasping', 'not_breathing', 'open_mouth_breathing']:
-        urgency_score += 3
-        red_flags.append("Respiratory distress")
-    
-    alertness = emergency_screen.get('alertness', '')
-    if alertness in ['unresponsive', 'disoriented']:
-        urgency_score += 3
-        red_flags.append("Altered consciousness")
+    for field, alarming_values, points, red_flag in EMERGENCY_SCREEN_RULES:
+        if emergency_screen.get(field, '') in alarming_values:
+            urgency_score += points
+            red_flags.append(red_flag)
     
     # Check for blood-related symptoms
-    blood_symptoms = ['blood_in_urine', 'bloody_stool', 'vomiting_blood', 'hemoptysis']
-    if any(s in symptoms for s in blood_symptoms):
+    if has_blood_symptom(symptoms):
         urgency_score += 2
         red_flags.append("Blood in vomit/stool/urine")
     
@@ -2220,22 +2191,7 @@ def calculate_dynamic_urgency(user_input, predicted_disease, metadata):
         red_flags.append("Rapid onset")
     
     # Map score to urgency level
-    if urgency_score >= 7:
-        urgency = "critical"
-        recommendation = "⚠️ URGENT: This appears to be a medical emergency. Seek immediate veterinary care. Contact your emergency vet or nearest 24-hour clinic immediately."
-        timeline = "Immediate - do not wait"
-    elif urgency_score >= 5:
-        urgency = "high"
-        recommendation = "HIGH URGENCY: These symptoms require prompt veterinary attention. Contact your vet today or visit an emergency clinic if after hours."
-        timeline = "Within 2-6 hours"
-    elif urgency_score >= 3:
-        urgency = "moderate"
-        recommendation = "Schedule a vet visit within 24-48 hours. Monitor closely for worsening symptoms."
-        timeline = "Within 24-48 hours"
-    else:
-        urgency = "low"
-        recommendation = "Monitor at home. Schedule routine vet visit if symptoms persist or worsen."
-        timeline = "Within 3-7 days or as needed"
+    urgency, recommendation, timeline = dynamic_urgency_level(urgency_score)
     
     return {
         'urgency': urgency,
@@ -2247,6 +2203,348 @@ def calculate_dynamic_urgency(user_input, predicted_disease, metadata):
     }
 
 
+def _authenticate_symptom_checker(request):
+    """
+    Pet-owner authentication and per-user rate limit for the symptom checker.
+
+    Returns:
+        (user_obj, None) or (None, error Response)
+    """
+    from utils.unified_permissions import check_user_or_admin
+    from django.contrib.auth.models import AnonymousUser
+
+    # Authenticate user (pet owner only)
+    if isinstance(request.user, AnonymousUser) or not getattr(request.user, 'id', None):
+        user_type, user_obj, error_response = check_user_or_admin(request)
+        if error_response:
+            return None, error_response
+        if user_type != 'pet_owner':
+            return None, Response(
+                {
+                    'success': False,
+                    'error': 'Only pet owners can use the symptom checker prediction',
+                },
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        request.user = user_obj
+    else:
+        user_obj = request.user
+
+    # Rate limiting per user
+    if _rate_limit_symptom_checker(user_obj.id, max_requests=10, window_seconds=60):
+        return None, Response(
+            {
+                'success': False,
+                'error': 'Too many symptom checker requests. Please try again in a minute.',
+            },
+            status=429,
+        )
+
+    return user_obj, None
+
+
+@timed('validation')
+def _prepare_symptom_checker_payload(payload, user_obj):
+    """
+    Validate a symptom checker payload and add the pet's signalment.
+
+    Dog, Cat and Rabbit go through question-tree validation; other species
+    (Bird, Fish, Reptile, Turtle, Amphibian) run in dynamic mode on user_notes alone.
+
+    Returns:
+        (cleaned, None) or (None, error Response)
+    """
+    # Check species early to determine if we should bypass question-tree validation
+    species = str(payload.get('species', '')).strip().capitalize()
+    is_standard_species = species in ['Dog', 'Cat', 'Rabbit']
+
+    if not is_standard_species:
+        logger.info(f"🔄 Dynamic mode detected for species: {species}. Bypassing question-tree validation.")
+        
+        # Get minimal required fields
+        pet_id = payload.get('pet_id')
+        pet_name = payload.get('pet_name', 'Unknown Pet')
+        user_notes = payload.get('user_notes', '')
+        
+        if not user_notes or not user_notes.strip():
+            return None, Response(
+                {
+                    'success': False,
+                    'error': 'user_notes is required for dynamic mode species.',
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        # Verify pet ownership if pet_id provided
+        cleaned = {}
+        pet = None
+        if pet_id:
+            try:
+                pet = Pet.objects.get(id=pet_id, owner=user_obj)
+                
+                # Rule #3 & #8: Age-Aware Framing & Data Realism
+                # Convert 0 to a clinical label so the AI understands it's a kitten/puppy
+                cleaned['age'] = "Kitten/Puppy (Under 1 year)" if pet.age == 0 else f"{pet.age} years"
+                
+                # Rule #8: Sanitize Breed (Avoid "Breed: Cat")
+                cleaned['breed'] = pet.breed if (pet.breed and pet.breed.lower() != 'cat') else "Mixed Breed"
+                
+                cleaned['pet_name'] = pet.name
+                
+                # Rule #8: Omit Blood Type unless it's specifically known (Owners usually don't know it)
+                if pet.blood_type and pet.blood_type.lower() not in ['unknown', 'n/a', '']:
+                    cleaned['blood_type'] = pet.blood_type
+            except Pet.DoesNotExist:
+                return None, Response(
+                    {
+                        'success': False,
+                        'error': 'Pet not found or not owned by the current user.',
+                    },
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        
+        # Prepare minimal payload for vector similarity
+        minimal_payload = {
+            'pet_id': pet_id,
+            'pet_name': pet_name,
+            'species': species,
+            'breed': getattr(pet, 'breed', 'Unknown'), 
+            'age': getattr(pet, 'age', 'Unknown'),
+            'user_notes': user_notes.strip(),
+            'symptoms_list': [],  # Empty - will be extracted from user_notes
+            'urgency': 'moderate',  # Default
+            'duration_days': None,
+        }
+        return minimal_payload, None
+
+    # Standard validation for Dog, Cat, Rabbit
+    is_valid, cleaned, error_response = _validate_symptom_checker_payload(payload)
+    if not is_valid:
+        logger.error(f"Symptom checker payload validation failed. Payload: {payload}")
+        return None, error_response
+
+    pet_id = cleaned.get('pet_id')
+    pet = None
+    if pet_id:
+        try:
+            pet = Pet.objects.get(id=pet_id, owner=user_obj)
+            cleaned['age'] = pet.age
+            cleaned['breed'] = pet.breed
+            cleaned['sex'] = pet.sex    
+            cleaned['pet_name'] = pet.name
+        except Pet.DoesNotExist:
+            return None, Response(
+                {
+                    'success': False,
+                    'error': 'Pet not found or not owned by the current user.',
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+    return cleaned, None
+
+
+def _log_symptom_checker_input(cleaned):
+    # Debug logging
+    pet_name_debug = cleaned.get('pet_name', 'Unknown Pet')
+    logger.info(f"{'='*60}")
+    logger.info(f"🔍 VECTOR SIMILARITY PREDICTION FOR {pet_name_debug}")
+    logger.info(f"{'='*60}")
+    logger.info(f"Species: {cleaned.get('species')}")
+    logger.info(f"Input symptoms: {cleaned.get('symptoms_list', [])}")
+    logger.info(f"Severity: {cleaned.get('severity')}")
+    logger.info(f"Progression: {cleaned.get('progression')}")
+    
+    # HYBRID TRIAGE: Log user_notes if present
+    user_notes = cleaned.get('user_notes', '')
+    if user_notes:
+        logger.info(f"🔍 HYBRID TRIAGE: User-typed symptoms: '{user_notes}'")
+
+
+def _convert_vector_predictions(vector_result):
+    """Vector similarity predictions in the symptom checker format, with emergency overrides applied."""
+    if not vector_result.get('success'):
+        raise Exception(vector_result.get('error', 'Prediction failed'))
+    
+    # Convert vector similarity results to existing prediction format
+    predictions = []
+    
+    for match in vector_result['predictions']:
+        disease_name = match['disease']
+        conf = match.get('internal_probability', match.get('probability', 0.0))
+
+        # Also capture our new match label for the UI
+        match_level = match.get('match_level', 'Possible consideration')
+        
+        logger.info(f"Processing disease {disease_name} with finding: {match_level}")
+        
+        # Build prediction object in existing format
+        matching_symptoms = match.get('matched_symptoms', [])
+        
+        # Determine urgency (vector similarity provides base urgency)
+        base_urgency = match.get('urgency', 'moderate')
+        contagious = match.get('contagious', False)
+        
+        # ============================================================
+        # 🚨 CRITICAL SAFETY OVERRIDE - EMERGENCY DISEASES
+        # ============================================================
+        # Life-threatening diseases are ALWAYS marked as EMERGENCY regardless
+        # of confidence or symptom matching (rules in utils/triage_rules.py)
+        dynamic_urgency, emergency_override = prediction_urgency(
+            disease_name, base_urgency, matching_symptoms
+        )
+        if emergency_override:
+            logger.warning(f"🚨 SAFETY OVERRIDE: {disease_name} forced to EMERGENCY urgency")
+
+        prediction_obj = {
+            'disease': disease_name,
+            'confidence': conf,
+            'confidence_pct': f"{conf*100:.0f}%",
+            'urgency': dynamic_urgency['urgency'],
+            'urgency_score': dynamic_urgency['urgency_score'],
+            'red_flags': dynamic_urgency['red_flags'],
+            'recommendation': dynamic_urgency['recommendation'],
+            'timeline': dynamic_urgency['timeline'],
+            'contagious': contagious,
+            'matching_symptoms': matching_symptoms,
+            'common_symptoms': matching_symptoms,  # Vector similarity shows matched symptoms
+            'care_guidelines': match.get('care_guidelines') or match.get('match_explanation', ''),
+            'when_to_see_vet': match.get('when_to_see_vet') or dynamic_urgency['recommendation'],
+            'match_explanation': match.get('match_explanation', ''),  # NEW: Explainability
+            'user_coverage': match.get('user_coverage', 0),  # NEW: % of user symptoms matched
+        }
+        
+        predictions.append(prediction_obj)
+    
+    logger.info(f"Vector similarity returned {len(predictions)} predictions")
+    return predictions
+
+
+@timed('soap_format')
+def _build_symptom_checker_response(cleaned, vector_result, predictions):
+    """Triage assessment, SOAP data and recommendation for a symptom checker prediction."""
+    logger.info(f"After filtering and sorting: {len(predictions)} predictions collected")
+    for i, pred in enumerate(predictions):
+        logger.info(f"  Prediction {i+1}: {pred.get('disease')} - confidence: {pred.get('confidence'):.4f}")
+
+    if predictions:
+        highest_urgency = max((p.get('urgency') or 'moderate') for p in predictions)
+    else:
+        highest_urgency = cleaned.get('urgency', 'moderate')
+
+    urgency_level = highest_urgency
+    should_see_vet_immediately = any(
+        str(p.get('urgency', '')).lower() in {'high', 'severe', 'immediate'} for p in predictions
+    )
+
+    pet_name = cleaned.get('pet_name')
+    
+    # === FIX START: Handle User Notes and Text ===
+    user_notes = cleaned.get('user_notes', '')
+    symptoms_text = cleaned.get('symptoms_text', '')
+    
+    # Combine into one robust text for downstream use (SOAP generation)
+    full_symptoms_text = symptoms_text
+    if user_notes:
+        if full_symptoms_text:
+            full_symptoms_text = f"{symptoms_text}. Owner Notes: {user_notes}"
+        else:
+            full_symptoms_text = f"Owner Notes: {user_notes}"
+    # === FIX END ===
+    duration_days = float(cleaned.get('duration_days') or 0)
+    if duration_days <= 0.5:
+        duration_str = 'less than 24 hours'
+    elif duration_days <= 3:
+        duration_str = '1-3 days'
+    elif duration_days <= 7:
+        duration_str = '3-7 days'
+    else:
+        duration_str = 'more than a week'
+
+    top_names = [p['disease'] for p in predictions[:3]] if predictions else []
+
+    # Get emergency data and progression for enhanced triage
+    emergency_data = cleaned.get('emergency_data')
+    progression = cleaned.get('progression')
+    severity = cleaned.get('severity', 'moderate')
+    
+    # === SAFETY OVERRIDE: Use vector_result triage if safety override is active ===
+    # Check if vector similarity prediction included a safety override
+    vector_triage = vector_result.get('triage_assessment')
+    has_safety_override = vector_triage and vector_triage.get('safety_override_applied', False)
+    
+    if has_safety_override:
+        # CRITICAL: Use the triage_assessment from vector_result (contains safety override)
+        triage_assessment = vector_triage
+        logger.warning(f"🚨 SAFETY OVERRIDE DETECTED - Using triage_assessment from vector_result")
+        logger.warning(f"   Overall urgency: {triage_assessment.get('overall_urgency')}")
+        logger.warning(f"   Red flags: {triage_assessment.get('red_flags')}")
+    else:
+        # Normal flow: Calculate comprehensive triage assessment
+        triage_assessment = _calculate_triage_assessment(
+            emergency_data=emergency_data,
+            severity=severity,
+            progression=progression,
+            predictions=predictions
+        )
+    
+    # Build comprehensive SOAP report with emergency screening
+    soap_data = _build_comprehensive_soap_report(
+        cleaned=cleaned,
+        emergency_data=emergency_data,
+        progression=progression,
+        severity=severity,
+        predictions=predictions,
+        triage_assessment=triage_assessment,
+        user_notes=user_notes
+    )
+    
+    # === SAFETY OVERRIDE: Use vector_result recommendation if safety override is active ===
+    # Update overall recommendation based on triage (UNLESS safety override is active)
+    if has_safety_override:
+        # CRITICAL: Use the recommendation from vector_result (contains specific symptom details)
+        overall_recommendation = vector_result.get('overall_recommendation') or triage_assessment.get('urgency_reasoning', [''])[0]
+        logger.warning(f"🚨 SAFETY OVERRIDE - Using recommendation from vector_result")
+        logger.warning(f"   Recommendation: '{overall_recommendation}'")
+    elif triage_assessment.get('requires_immediate_care'):
+        overall_recommendation = (
+            "⚠️ URGENT: This appears to be a medical emergency. "
+            "Seek immediate veterinary care. Contact your emergency vet or nearest 24-hour clinic immediately."
+        )
+    elif triage_assessment.get('overall_urgency') == 'urgent':
+        overall_recommendation = (
+            "Based on the assessment, veterinary care is recommended within 12-24 hours. "
+            "Monitor closely for any worsening symptoms and seek immediate care if condition deteriorates."
+        )
+    elif triage_assessment.get('overall_urgency') == 'moderate':
+        overall_recommendation = (
+            "Based on the current severity and symptom pattern, we recommend scheduling a vet visit within 24-48 hours. "
+            "Monitor for worsening symptoms such as persistent vomiting, severe lethargy, or signs of dehydration."
+        )
+    else:
+        overall_recommendation = (
+            "Continue monitoring your pet's condition. Schedule a routine veterinary appointment within a few days. "
+            "Seek care sooner if symptoms worsen or new concerning signs develop."
+        )
+
+    response_payload = {
+        'success': True,
+        'pet_name': pet_name,
+        'assessment_date': timezone.now().isoformat(),
+        'predictions': predictions,
+        'overall_recommendation': overall_recommendation,
+        'urgency_level': vector_result.get('urgency_level') or triage_assessment.get('overall_urgency', urgency_level),
+        'should_see_vet_immediately': triage_assessment.get('requires_immediate_care', should_see_vet_immediately),
+        'triage_assessment': triage_assessment,
+        'soap_data': soap_data,
+        'symptoms_text': full_symptoms_text,
+        'knowledge_base_version': vector_result.get('knowledge_base_version'),
+    }
+    
+    logger.info(f"Symptom checker predict returning {len(predictions)} predictions: {[p.get('disease') for p in predictions]}")
+    return response_payload
+
+
 @api_view(['POST'])
 @authentication_classes([])  # Custom auth via check_user_or_admin
 @permission_classes([AllowAny])
@@ -2298,323 +2596,29 @@ def symptom_checker_predict(request):
       }
     }
     """
-    from utils.unified_permissions import check_user_or_admin
-    from django.contrib.auth.models import AnonymousUser
-
-    # Authenticate user (pet owner only)
-    if isinstance(request.user, AnonymousUser) or not getattr(request.user, 'id', None):
-        user_type, user_obj, error_response = check_user_or_admin(request)
-        if error_response:
-            return error_response
-        if user_type != 'pet_owner':
-            return Response(
-                {
-                    'success': False,
-                    'error': 'Only pet owners can use the symptom checker prediction',
-                },
-                status=status.HTTP_403_FORBIDDEN,
-            )
-        request.user = user_obj
-    else:
-        user_obj = request.user
-
-    # Rate limiting per user
-    if _rate_limit_symptom_checker(user_obj.id, max_requests=10, window_seconds=60):
-        return Response(
-            {
-                'success': False,
-                'error': 'Too many symptom checker requests. Please try again in a minute.',
-            },
-            status=429,
-        )
+    user_obj, error_response = _authenticate_symptom_checker(request)
+    if error_response is not None:
+        return error_response
 
     try:
         payload = request.data or {}
         logger.info(f"Symptom checker predict received payload: {payload}")
         
-        # Check species early to determine if we should bypass question-tree validation
-        species = str(payload.get('species', '')).strip().capitalize()
-        is_standard_species = species in ['Dog', 'Cat', 'Rabbit']
-        vector_result = None  # Will be set in either branch
+        cleaned, error_response = _prepare_symptom_checker_payload(payload, user_obj)
+        if error_response is not None:
+            return error_response
         
-        # For non-standard species (Bird, Fish, Reptile, Turtle, Amphibian), bypass validation
-        # and use vector similarity directly with user_notes
-        if not is_standard_species:
-            logger.info(f"🔄 Dynamic mode detected for species: {species}. Bypassing question-tree validation.")
-            
-            # Get minimal required fields
-            pet_id = payload.get('pet_id')
-            pet_name = payload.get('pet_name', 'Unknown Pet')
-            user_notes = payload.get('user_notes', '')
-            
-            if not user_notes or not user_notes.strip():
-                return Response(
-                    {
-                        'success': False,
-                        'error': 'user_notes is required for dynamic mode species.',
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            
-            # Verify pet ownership if pet_id provided
-            pet_id = cleaned.get('pet_id')
-            pet = None
-            if pet_id:
-                try:
-                    pet = Pet.objects.get(id=pet_id, owner=user_obj)
-                    
-                    # Rule #3 & #8: Age-Aware Framing & Data Realism
-                    # Convert 0 to a clinical label so the AI understands it's a kitten/puppy
-                    cleaned['age'] = "Kitten/Puppy (Under 1 year)" if pet.age == 0 else f"{pet.age} years"
-                    
-                    # Rule #8: Sanitize Breed (Avoid "Breed: Cat")
-                    cleaned['breed'] = pet.breed if (pet.breed and pet.breed.lower() != 'cat') else "Mixed Breed"
-                    
-                    cleaned['pet_name'] = pet.name
-                    
-                    # Rule #8: Omit Blood Type unless it's specifically known (Owners usually don't know it)
-                    if pet.blood_type and pet.blood_type.lower() not in ['unknown', 'n/a', '']:
-                        cleaned['blood_type'] = pet.blood_type
-                except Pet.DoesNotExist:
-                    return Response(
-                        {
-                            'success': False,
-                            'error': 'Pet not found or not owned by the current user.',
-                        },
-                        status=status.HTTP_404_NOT_FOUND,
-                    )
-            
-            # Prepare minimal payload for vector similarity
-            minimal_payload = {
-                'pet_id': pet_id,
-                'pet_name': pet_name,
-                'species': species,
-                'breed': getattr(pet, 'breed', 'Unknown'), 
-                'age': getattr(pet, 'age', 'Unknown'),
-                'user_notes': user_notes.strip(),
-                'symptoms_list': [],  # Empty - will be extracted from user_notes
-                'urgency': 'moderate',  # Default
-                'duration_days': None,
-            }
-            
-            # Call vector similarity directly
-            from vector_similarity_django_integration import predict_with_vector_similarity
-            
-            logger.info(f"🔍 VECTOR SIMILARITY PREDICTION (Dynamic Mode) FOR {pet_name}")
-            logger.info(f"Species: {species}")
-            logger.info(f"User notes: '{user_notes[:200]}...'")
-            
-            vector_result = predict_with_vector_similarity(minimal_payload)
-            
-            if not vector_result.get('success'):
-                raise Exception(vector_result.get('error', 'Prediction failed'))
-            
-            # Set cleaned for use in rest of processing
-            cleaned = minimal_payload
-            # Skip to processing section - vector_result is already obtained
-        else:
-            # Standard validation for Dog, Cat, Rabbit
-            is_valid, cleaned, error_response = _validate_symptom_checker_payload(payload)
-            if not is_valid:
-                logger.error(f"Symptom checker payload validation failed. Payload: {payload}")
-                return error_response
-
-            pet_id = cleaned.get('pet_id')
-            pet = None
-            if pet_id:
-                try:
-                    pet = Pet.objects.get(id=pet_id, owner=user_obj)
-                    cleaned['age'] = pet.age
-                    cleaned['breed'] = pet.breed
-                    cleaned['sex'] = pet.sex    
-                    cleaned['pet_name'] = pet.name
-                except Pet.DoesNotExist:
-                    return Response(
-                        {
-                            'success': False,
-                            'error': 'Pet not found or not owned by the current user.',
-                        },
-                        status=status.HTTP_404_NOT_FOUND,
-                    )
-
-            # ============================================================
-            # VECTOR SIMILARITY PREDICTION (Replaces LightGBM)
-            # ============================================================
-            from vector_similarity_django_integration import predict_with_vector_similarity
+        # ============================================================
+        # VECTOR SIMILARITY PREDICTION (Replaces LightGBM)
+        # ============================================================
+        from vector_similarity_django_integration import predict_with_vector_similarity
         
         try:
-            # Debug logging
-            pet_name_debug = cleaned.get('pet_name', 'Unknown Pet')
-            logger.info(f"{'='*60}")
-            logger.info(f"🔍 VECTOR SIMILARITY PREDICTION FOR {pet_name_debug}")
-            logger.info(f"{'='*60}")
-            logger.info(f"Species: {cleaned.get('species')}")
-            logger.info(f"Input symptoms: {cleaned.get('symptoms_list', [])}")
-            logger.info(f"Severity: {cleaned.get('severity')}")
-            logger.info(f"Progression: {cleaned.get('progression')}")
-            
-            # HYBRID TRIAGE: Log user_notes if present
-            user_notes = cleaned.get('user_notes', '')
-            if user_notes:
-                logger.info(f"🔍 HYBRID TRIAGE: User-typed symptoms: '{user_notes}'")
+            _log_symptom_checker_input(cleaned)
             
             # Run vector similarity prediction (includes user_notes extraction)
-            # Note: For dynamic mode, vector_result is already set above
-            if vector_result is None:
-                # Run vector similarity prediction for standard species
-                vector_result = predict_with_vector_similarity(cleaned)
-            
-            if not vector_result.get('success'):
-                raise Exception(vector_result.get('error', 'Prediction failed'))
-            
-            # Convert vector similarity results to existing prediction format
-            predictions = []
-            symptoms_list = list(cleaned.get('symptoms_list') or [])
-            
-            for match in vector_result['predictions']:
-                disease_name = match['disease']
-                conf = match.get('internal_probability', match.get('probability', 0.0))
-    
-                # Also capture our new match label for the UI
-                match_level = match.get('match_level', 'Possible consideration')
-                
-                logger.info(f"Processing disease {disease_name} with finding: {match_level}")
-                
-                # Build prediction object in existing format
-                matching_symptoms = match.get('matched_symptoms', [])
-                
-                # Determine urgency (vector similarity provides base urgency)
-                base_urgency = match.get('urgency', 'moderate')
-                contagious = match.get('contagious', False)
-                
-                # ============================================================
-                # 🚨 CRITICAL SAFETY OVERRIDE - EMERGENCY DISEASES
-                # ============================================================
-                # These diseases MUST ALWAYS be marked as EMERGENCY regardless
-                # of confidence or symptom matching to prevent dangerous
-                # misclassification (e.g., Canine Parvovirus as LOW urgency)
-                EMERGENCY_DISEASES = {
-                    # Dogs
-                    'Gastric Dilation (Bloat)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Bloat/GDV': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Bloat/Gastric Dilation': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Canine Parvovirus': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Heatstroke': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Heat Stroke': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Drowning/Hypothermia': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Urethral Obstruction': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Urinary Obstruction': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Urinary Blockage': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Pyometra': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Breathing Difficulties': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Rabies': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Infectious Canine Hepatitis': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Pancreatitis (Acute)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                # Cats
-                'Feline Panleukopenia Virus': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Urinary Blockage': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Feline Infectious Peritonitis (Wet form)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                # Rabbits
-                'Rabbit Hemorrhagic Disease Virus': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Heat Stress': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Flystrike (Myiasis)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Dystocia (Egg Binding equivalent)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                # Hamsters
-                'Wet Tail (Proliferative Ileitis)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Wet Tail': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                # Turtles
-                'Heat Shock': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Cold Water Shock': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Shell Injuries/Trauma (Severe)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Prolapse (Cloacal/Vent)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Dystocia (Egg Binding)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                # Fish
-                'Ammonia Poisoning': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Nitrate Poisoning (Severe)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'pH Shock': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Oxygen Deprivation': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Hemorrhagic Septicemia': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                '(Hemorrhagic Septicemia / Ulcerative Syndromes)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Dropsy (Advanced)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Koi Herpes Virus': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                # Birds
-                'Avian Influenza': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Newcastle Disease': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Psittacosis (Chlamydiosis, Severe)': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                "Pacheco's Disease": {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Egg Binding': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Dystocia': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Heavy Metal Poisoning': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Vent Prolapse': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                'Cloacal Prolapse': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                
-                    # General
-                    'Internal Bleeding': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                    'Respiratory Distress Syndrome': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                    'Toxicity': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                    'Seizures': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY'},
-                }
-                
-                # 🚨 SAFETY OVERRIDE: Check if this is an emergency disease
-                # Special case: Heatstroke only if heat-related symptoms present
-                should_override = False
-                if disease_name in ['Heatstroke', 'Heat Stroke', 'Heat shock']:
-                    # Only trigger if actual heat symptoms present
-                    heat_symptoms = {'panting', 'excessive_heat', 'collapse', 'rapid_heartbeat', 'fever'}
-                    if any(sym in matching_symptoms for sym in heat_symptoms):
-                        should_override = True
-                        logger.warning(f"🚨 SAFETY OVERRIDE: {disease_name} with heat symptoms detected")
-                elif disease_name in EMERGENCY_DISEASES:
-                    should_override = True
-                    logger.warning(f"🚨 SAFETY OVERRIDE: {disease_name} forced to EMERGENCY urgency")
-                
-                if should_override:
-                    emergency_override = EMERGENCY_DISEASES[disease_name].copy()
-                    emergency_override['red_flags'] = ['🚨 CRITICAL CONDITION - This is a life-threatening emergency']
-                    dynamic_urgency = emergency_override
-                else:
-                    # Use vector similarity urgency or calculate dynamic urgency
-                    # Map vector similarity urgency levels to urgency scores
-                    urgency_map = {
-                        'critical': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE', 'recommendation': 'Seek emergency veterinary care immediately'},
-                        'high': {'urgency': 'high', 'urgency_score': 8, 'timeline': 'Within 2-4 hours', 'recommendation': 'Contact veterinarian urgently'},
-                        'moderate': {'urgency': 'moderate', 'urgency_score': 5, 'timeline': '24-48 hours', 'recommendation': 'Schedule veterinary appointment'},
-                        'medium': {'urgency': 'moderate', 'urgency_score': 5, 'timeline': '24-48 hours', 'recommendation': 'Schedule veterinary appointment'},
-                        'mild': {'urgency': 'low', 'urgency_score': 3, 'timeline': '2-7 days', 'recommendation': 'Monitor and schedule routine appointment'},
-                        'low': {'urgency': 'low', 'urgency_score': 3, 'timeline': '2-7 days', 'recommendation': 'Monitor and schedule routine appointment'},
-                    }
-                    dynamic_urgency = urgency_map.get(base_urgency.lower(), urgency_map['moderate']).copy()
-                    dynamic_urgency['red_flags'] = []
-
-                prediction_obj = {
-                    'disease': disease_name,
-                    'confidence': conf,
-                    'confidence_pct': f"{conf*100:.0f}%",
-                    'urgency': dynamic_urgency['urgency'],
-                    'urgency_score': dynamic_urgency['urgency_score'],
-                    'red_flags': dynamic_urgency['red_flags'],
-                    'recommendation': dynamic_urgency['recommendation'],
-                    'timeline': dynamic_urgency['timeline'],
-                    'contagious': contagious,
-                    'matching_symptoms': matching_symptoms,
-                    'common_symptoms': matching_symptoms,  # Vector similarity shows matched symptoms
-                    'care_guidelines': match.get('care_guidelines') or match.get('match_explanation', ''),
-                    'when_to_see_vet': match.get('when_to_see_vet') or dynamic_urgency['recommendation'],
-                    'match_explanation': match.get('match_explanation', ''),  # NEW: Explainability
-                    'user_coverage': match.get('user_coverage', 0),  # NEW: % of user symptoms matched
-                }
-                
-                predictions.append(prediction_obj)
-
-            #predictions.sort(key=lambda x: x['confidence'], reverse=True)
-            
-            logger.info(f"Vector similarity returned {len(predictions)} predictions")
+            vector_result = predict_with_vector_similarity(cleaned)
+            predictions = _convert_vector_predictions(vector_result)
             
         except Exception as e:
             logger.exception('Error during vector similarity prediction: %s', e)
@@ -2627,123 +2631,7 @@ def symptom_checker_predict(request):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
         
-        logger.info(f"After filtering and sorting: {len(predictions)} predictions collected")
-        for i, pred in enumerate(predictions):
-            logger.info(f"  Prediction {i+1}: {pred.get('disease')} - confidence: {pred.get('confidence'):.4f}")
-
-        if predictions:
-            highest_urgency = max((p.get('urgency') or 'moderate') for p in predictions)
-        else:
-            highest_urgency = cleaned.get('urgency', 'moderate')
-
-        urgency_level = highest_urgency
-        should_see_vet_immediately = any(
-            str(p.get('urgency', '')).lower() in {'high', 'severe', 'immediate'} for p in predictions
-        )
-
-        pet_name = cleaned.get('pet_name')
-        
-        # === FIX START: Handle User Notes and Text ===
-        user_notes = cleaned.get('user_notes', '')
-        symptoms_text = cleaned.get('symptoms_text', '')
-        
-        # Combine into one robust text for downstream use (SOAP generation)
-        full_symptoms_text = symptoms_text
-        if user_notes:
-            if full_symptoms_text:
-                full_symptoms_text = f"{symptoms_text}. Owner Notes: {user_notes}"
-            else:
-                full_symptoms_text = f"Owner Notes: {user_notes}"
-        # === FIX END ===
-        duration_days = float(cleaned.get('duration_days') or 0)
-        if duration_days <= 0.5:
-            duration_str = 'less than 24 hours'
-        elif duration_days <= 3:
-            duration_str = '1-3 days'
-        elif duration_days <= 7:
-            duration_str = '3-7 days'
-        else:
-            duration_str = 'more than a week'
-
-        top_names = [p['disease'] for p in predictions[:3]] if predictions else []
-
-        # Get emergency data and progression for enhanced triage
-        emergency_data = cleaned.get('emergency_data')
-        progression = cleaned.get('progression')
-        severity = cleaned.get('severity', 'moderate')
-        
-        # === SAFETY OVERRIDE: Use vector_result triage if safety override is active ===
-        # Check if vector similarity prediction included a safety override
-        vector_triage = vector_result.get('triage_assessment')
-        has_safety_override = vector_triage and vector_triage.get('safety_override_applied', False)
-        
-        if has_safety_override:
-            # CRITICAL: Use the triage_assessment from vector_result (contains safety override)
-            triage_assessment = vector_triage
-            logger.warning(f"🚨 SAFETY OVERRIDE DETECTED - Using triage_assessment from vector_result")
-            logger.warning(f"   Overall urgency: {triage_assessment.get('overall_urgency')}")
-            logger.warning(f"   Red flags: {triage_assessment.get('red_flags')}")
-        else:
-            # Normal flow: Calculate comprehensive triage assessment
-            triage_assessment = _calculate_triage_assessment(
-                emergency_data=emergency_data,
-                severity=severity,
-                progression=progression,
-                predictions=predictions
-            )
-        
-        # Build comprehensive SOAP report with emergency screening
-        soap_data = _build_comprehensive_soap_report(
-            cleaned=cleaned,
-            emergency_data=emergency_data,
-            progression=progression,
-            severity=severity,
-            predictions=predictions,
-            triage_assessment=triage_assessment,
-            user_notes=user_notes
-        )
-        
-        # === SAFETY OVERRIDE: Use vector_result recommendation if safety override is active ===
-        # Update overall recommendation based on triage (UNLESS safety override is active)
-        if has_safety_override:
-            # CRITICAL: Use the recommendation from vector_result (contains specific symptom details)
-            overall_recommendation = vector_result.get('overall_recommendation') or triage_assessment.get('urgency_reasoning', [''])[0]
-            logger.warning(f"🚨 SAFETY OVERRIDE - Using recommendation from vector_result")
-            logger.warning(f"   Recommendation: '{overall_recommendation}'")
-        elif triage_assessment.get('requires_immediate_care'):
-            overall_recommendation = (
-                "⚠️ URGENT: This appears to be a medical emergency. "
-                "Seek immediate veterinary care. Contact your emergency vet or nearest 24-hour clinic immediately."
-            )
-        elif triage_assessment.get('overall_urgency') == 'urgent':
-            overall_recommendation = (
-                "Based on the assessment, veterinary care is recommended within 12-24 hours. "
-                "Monitor closely for any worsening symptoms and seek immediate care if condition deteriorates."
-            )
-        elif triage_assessment.get('overall_urgency') == 'moderate':
-            overall_recommendation = (
-                "Based on the current severity and symptom pattern, we recommend scheduling a vet visit within 24-48 hours. "
-                "Monitor for worsening symptoms such as persistent vomiting, severe lethargy, or signs of dehydration."
-            )
-        else:
-            overall_recommendation = (
-                "Continue monitoring your pet's condition. Schedule a routine veterinary appointment within a few days. "
-                "Seek care sooner if symptoms worsen or new concerning signs develop."
-            )
-
-        response_payload = {
-            'success': True,
-            'pet_name': pet_name,
-            'assessment_date': timezone.now().isoformat(),
-            'predictions': predictions,
-            'overall_recommendation': overall_recommendation,
-            'urgency_level': vector_result.get('urgency_level') or triage_assessment.get('overall_urgency', urgency_level),
-            'should_see_vet_immediately': triage_assessment.get('requires_immediate_care', should_see_vet_immediately),
-            'triage_assessment': triage_assessment,
-            'soap_data': soap_data,
-            'symptoms_text': full_symptoms_text,
-        }
-        
+        response_payload = _build_symptom_checker_response(cleaned, vector_result, predictions)
         logger.info(f"Symptom checker predict returning {len(predictions)} predictions: {[p.get('disease') for p in predictions]}")
 
         return Response(response_payload)
@@ -2782,10 +2670,23 @@ def create_ai_diagnosis(request):
             'error': 'Only pet owners can create AI diagnoses'
         }, status=status.HTTP_403_FORBIDDEN)
     
+    # Job mode: queue it and let the client poll for the report
+    if job_mode_requested(request):
+        payload = request_payload(request)
+        job = enqueue_job(
+            'ai_diagnosis', user_obj, payload,
+            dedup_key=payload_dedup_key('ai_diagnosis', user_obj, payload)
+        )
+        return job_accepted_response(request, job)
+    
+    return _create_ai_diagnosis_for(user_obj, request.data)
+
+
+def _create_ai_diagnosis_for(user_obj, data):
+    """Build and store the AI diagnosis + SOAP report (inline or from an LLMJob)."""
     try:
         from pets.models import Pet
         
-        data = request.data
         pet_id = data.get('pet_id')
         symptoms_text = data.get('symptoms', '')
         assessment_data = data.get('assessment_data', {})
@@ -3335,6 +3236,104 @@ def start_conversation_with_pet(request):
             'error': f'Failed to start conversation: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _analyze_uploaded_image(uploaded_image, pet):
+    """Run the trained image classifier on an uploaded photo ({} when no image was sent)."""
+    image_analysis = {}
+    if uploaded_image:
+        try:
+            # Use your trained image classifier
+            from ml.imageClassifier import analyze_pet_image
+                
+            # Save uploaded image temporarily
+            import tempfile
+            import os
+                
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
+                for chunk in uploaded_image.chunks():
+                    temp_file.write(chunk)
+                temp_file_path = temp_file.name
+                
+            # Analyze the image with your trained models
+            pet_species = getattr(pet, 'animal_type', 'dog') if pet else 'dog'
+            classification_result = analyze_pet_image(temp_file_path, pet_species)
+                
+            # Clean up temp file
+            os.unlink(temp_file_path)
+                
+            # Use the analysis results
+            if classification_result and classification_result.get('analysis_successful'):
+                image_analysis = {
+                    'analysis_successful': True,
+                    'model_used': classification_result.get('model_used'),
+                    'detected_condition': classification_result.get('detected_condition'),
+                    'confidence_score': classification_result.get('confidence_score'),
+                    'top_predictions': classification_result.get('top_predictions'),
+                    'urgency_level': classification_result.get('urgency_level'),
+                    'recommendations': classification_result.get('recommendations')
+                }
+            else:
+                image_analysis = {
+                    'analysis_successful': False,
+                    'error': 'Could not analyze image with trained models'
+                }
+                
+        except Exception as e:
+            print(f"Image analysis error: {e}")
+            image_analysis = {
+                'analysis_successful': False,
+                'error': f'Image analysis failed: {str(e)}'
+            }
+    return image_analysis
+
+
+def _build_image_symptom_prompt(pet, symptoms_text, image_analysis, image_uploaded):
+    """Symptom checker prompt with the owner's description and the image classifier findings."""
+    prompt_parts = [
+        f"Pet Information: {pet.name} ({getattr(pet, 'animal_type', 'pet')})" if pet else "Pet information not available",
+        f"Symptoms described by owner: {symptoms_text}",
+    ]
+        
+    if image_analysis.get('analysis_successful'):
+        prompt_parts.append("🔬 COMPUTER VISION ANALYSIS RESULTS:")
+        prompt_parts.append(f"Model used: {image_analysis.get('model_used')}")
+        prompt_parts.append(f"Primary condition detected: {image_analysis.get('detected_condition')}")
+        prompt_parts.append(f"Confidence score: {image_analysis.get('confidence_score'):.1%}")
+        prompt_parts.append(f"Urgency level: {image_analysis.get('urgency_level')}")
+            
+        if image_analysis.get('top_predictions'):
+            prompt_parts.append("Top predictions:")
+            for pred in image_analysis['top_predictions']:
+                prompt_parts.append(f"  • {pred['condition']}: {pred['percentage']}%")
+            
+        if image_analysis.get('recommendations'):
+            prompt_parts.append("AI recommendations:")
+            for rec in image_analysis['recommendations']:
+                prompt_parts.append(f"  • {rec}")
+            
+    elif image_uploaded:
+        prompt_parts.append("📷 Image was uploaded but computer vision analysis failed.")
+        prompt_parts.append("Please provide detailed description of what you observe in the image.")
+        
+    return "\n".join(prompt_parts)
+
+
+def _pet_chat_context(pet):
+    """Pet details included in chat prompts (None without a pet)."""
+    if not pet:
+        return None
+    return {
+        'name': pet.name,
+        'species': getattr(pet, 'animal_type', 'Unknown'),
+        'breed': getattr(pet, 'breed', 'Unknown'),
+        'age': getattr(pet, 'age', 'Unknown'),
+        'sex': getattr(pet, 'sex', 'Unknown'),
+        'weight': getattr(pet, 'weight', 'Unknown'),
+        'medical_notes': getattr(pet, 'medical_notes', ''),
+        'allergies': getattr(pet, 'allergies', ''),
+        'chronic_diseases': getattr(pet, 'chronic_diseases', ''),
+    }
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_symptom_with_image(request):
@@ -3362,95 +3361,13 @@ def analyze_symptom_with_image(request):
         )
         
         # Analyze image if provided
-        image_analysis = {}
-        if uploaded_image:
-            try:
-                # Use your trained image classifier
-                from ml.imageClassifier import analyze_pet_image
-                
-                # Save uploaded image temporarily
-                import tempfile
-                import os
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                    for chunk in uploaded_image.chunks():
-                        temp_file.write(chunk)
-                    temp_file_path = temp_file.name
-                
-                # Analyze the image with your trained models
-                pet_species = getattr(pet, 'animal_type', 'dog') if pet else 'dog'
-                classification_result = analyze_pet_image(temp_file_path, pet_species)
-                
-                # Clean up temp file
-                os.unlink(temp_file_path)
-                
-                # Use the analysis results
-                if classification_result and classification_result.get('analysis_successful'):
-                    image_analysis = {
-                        'analysis_successful': True,
-                        'model_used': classification_result.get('model_used'),
-                        'detected_condition': classification_result.get('detected_condition'),
-                        'confidence_score': classification_result.get('confidence_score'),
-                        'top_predictions': classification_result.get('top_predictions'),
-                        'urgency_level': classification_result.get('urgency_level'),
-                        'recommendations': classification_result.get('recommendations')
-                    }
-                else:
-                    image_analysis = {
-                        'analysis_successful': False,
-                        'error': 'Could not analyze image with trained models'
-                    }
-                
-            except Exception as e:
-                print(f"Image analysis error: {e}")
-                image_analysis = {
-                    'analysis_successful': False,
-                    'error': f'Image analysis failed: {str(e)}'
-                }
+        image_analysis = _analyze_uploaded_image(uploaded_image, pet)
         
         # Build comprehensive prompt for Gemini with detailed image analysis
-        prompt_parts = [
-            f"Pet Information: {pet.name} ({getattr(pet, 'animal_type', 'pet')})" if pet else "Pet information not available",
-            f"Symptoms described by owner: {symptoms_text}",
-        ]
-        
-        if image_analysis.get('analysis_successful'):
-            prompt_parts.append("🔬 COMPUTER VISION ANALYSIS RESULTS:")
-            prompt_parts.append(f"Model used: {image_analysis.get('model_used')}")
-            prompt_parts.append(f"Primary condition detected: {image_analysis.get('detected_condition')}")
-            prompt_parts.append(f"Confidence score: {image_analysis.get('confidence_score'):.1%}")
-            prompt_parts.append(f"Urgency level: {image_analysis.get('urgency_level')}")
-            
-            if image_analysis.get('top_predictions'):
-                prompt_parts.append("Top predictions:")
-                for pred in image_analysis['top_predictions']:
-                    prompt_parts.append(f"  • {pred['condition']}: {pred['percentage']}%")
-            
-            if image_analysis.get('recommendations'):
-                prompt_parts.append("AI recommendations:")
-                for rec in image_analysis['recommendations']:
-                    prompt_parts.append(f"  • {rec}")
-            
-        elif uploaded_image:
-            prompt_parts.append("📷 Image was uploaded but computer vision analysis failed.")
-            prompt_parts.append("Please provide detailed description of what you observe in the image.")
-        
-        full_prompt = "\n".join(prompt_parts)
+        full_prompt = _build_image_symptom_prompt(pet, symptoms_text, image_analysis, bool(uploaded_image))
         
         # Get pet context
-        pet_context = None
-        if pet:
-            pet_context = {
-                'name': pet.name,
-                'species': getattr(pet, 'animal_type', 'Unknown'),
-                'breed': getattr(pet, 'breed', 'Unknown'),
-                'age': getattr(pet, 'age', 'Unknown'),
-                'sex': getattr(pet, 'sex', 'Unknown'),
-                'weight': getattr(pet, 'weight', 'Unknown'),
-                'medical_notes': getattr(pet, 'medical_notes', ''),
-                'allergies': getattr(pet, 'allergies', ''),
-                'chronic_diseases': getattr(pet, 'chronic_diseases', ''),
-            }
+        pet_context = _pet_chat_context(pet)
         
         # Get AI response using symptom checker mode with image analysis
         ai_response = get_gemini_response_with_pet_context(
@@ -0,0 +1,437 @@
+"""
+Async (ASGI) versions of the LLM-bound chatbot endpoints
+
+Under an ASGI server (vet_app/asgi.py with uvicorn) these views do not hold a
+worker thread while Gemini answers: LLM calls are awaited through
+llm_gateway.agenerate_text, models are read and written with Django's async ORM,
+and CPU-bound work (triage ranking, embeddings, image classification) runs in
+thread pools. chatbot/urls.py routes the regular paths here when ASYNC_LLM_VIEWS
+is enabled; request and response formats are the same as the sync views.
+
+DRF's @api_view has no async support, so these are plain Django async views that
+parse the body themselves and return JsonResponse. Prompt building, validation and
+response shaping are the helpers shared with chatbot/views.py.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from pets.models import Pet
+from utils.unified_permissions import check_user_or_admin
+from .jobs import enqueue_job, job_accepted_response, job_mode_requested
+from .llm_gateway import agenerate_text
+from .models import Conversation, Message, SymptomLog
+from .semantic_cache import lookup_semantic_answer, semantic_cache_scope, store_semantic_answer
+from .utils import aanalyze_symptom_progression
+from .views import (
+    _analyze_uploaded_image,
+    _authenticate_symptom_checker,
+    _build_image_symptom_prompt,
+    _build_pet_context_prompt,
+    _build_symptom_checker_response,
+    _build_title_prompt,
+    _chat_error_reply,
+    _clean_title,
+    _convert_vector_predictions,
+    _log_symptom_checker_input,
+    _pet_chat_context,
+    _prepare_symptom_checker_payload,
+)
+from .views_symptom_tracker import _arecord_health_trend, _daily_log_response, _overall_severity, _symptom_log_data
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# REQUEST / RESPONSE HELPERS
+# ============================================================================
+
+def _json(data, status_code=status.HTTP_200_OK):
+    """JsonResponse encoded like DRF's renderer (dates, decimals, UUIDs)."""
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+def _from_drf(response):
+    """Error Response returned by a helper shared with the sync views."""
+    return _json(response.data, response.status_code)
+
+
+def _job_accepted(request, job, extra=None):
+    """jobs.job_accepted_response as a JsonResponse (same body, Location/Retry-After headers)."""
+    accepted = job_accepted_response(request, job, extra)
+    response = _json(accepted.data, accepted.status_code)
+    for header in ('Location', 'Retry-After', 'Preference-Applied'):
+        response[header] = accepted[header]
+    return response
+
+
+def _request_data(request):
+    """
+    Request body as DRF's request.data would parse it.
+
+    Returns:
+        dict-like body (JSON object or form fields), or None if the JSON is malformed
+    """
+    if request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        return request.POST
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        return None
+
+
+def _parse_error():
+    return _json({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+
+
+def _authenticate_drf_user(request):
+    """DRF's default authentication (Token, Session), for views that used IsAuthenticated."""
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user and user.is_authenticated else None
+
+
+# ============================================================================
+# CHAT
+# ============================================================================
+
+async def aget_gemini_response_with_pet_context(user_message, conversation_history=None, chat_mode='general', pet_context=None, assessment_context=None):
+    """Async get_gemini_response_with_pet_context (conversation_history must be a list)."""
+    try:
+        conversation_text = _build_pet_context_prompt(
+            user_message, conversation_history, chat_mode, pet_context, assessment_context
+        )
+
+        semantic_scope = semantic_cache_scope(
+            user_message, chat_mode, conversation_history, pet_context, assessment_context
+        )
+        if semantic_scope:
+            # Embedding + DB lookup: off the event loop
+            cached_answer = await asyncio.to_thread(lookup_semantic_answer, user_message, chat_mode, semantic_scope)
+            if cached_answer:
+                return cached_answer
+
+        response_text = await agenerate_text(conversation_text, 'chat_with_pet_context', use_cache=True)
+
+        if response_text:
+            if semantic_scope:
+                await asyncio.to_thread(store_semantic_answer, user_message, chat_mode, semantic_scope, response_text)
+            return response_text
+        else:
+            return "I'm having trouble responding right now. Could you please try again?"
+
+    except Exception as e:
+        return _chat_error_reply(e)
+
+
+async def agenerate_conversation_title(first_message, ai_response=None, pet_name=None):
+    """Async generate_conversation_title"""
+    try:
+        prompt = _build_title_prompt(first_message, ai_response, pet_name)
+        return _clean_title(await agenerate_text(prompt, 'title', deadline=5), first_message)
+    except Exception as e:
+        print(f"Error generating title: {e}")
+        return _clean_title(None, first_message)
+
+
+@csrf_exempt
+@require_POST
+async def chat(request):
+    """Async chat API endpoint (same contract as views.chat)"""
+    user_type, user_obj, error_response = await sync_to_async(check_user_or_admin)(request)
+    if error_response:
+        return _from_drf(error_response)
+
+    if user_type != 'pet_owner':
+        return _json({
+            'success': False,
+            'error': 'Only pet owners can use the chat'
+        }, status.HTTP_403_FORBIDDEN)
+
+    data = _request_data(request)
+    if data is None:
+        return _parse_error()
+
+    try:
+        user_message = data.get('message')
+        conversation_id = data.get('conversation_id')
+        chat_mode = data.get('chat_mode', 'general')
+        assessment_context = data.get('assessment_context')
+
+        if not user_message:
+            return _json({'error': 'Message is required'}, status.HTTP_400_BAD_REQUEST)
+
+        print(f"Received message: {user_message} (Mode: {chat_mode})")
+
+        conversation = None
+        if conversation_id:
+            conversation = await Conversation.objects.select_related('pet').filter(
+                id=conversation_id, user=user_obj
+            ).afirst()
+        if conversation is None:
+            conversation = await Conversation.objects.acreate(user=user_obj, title="New Conversation")
+
+        pet_id = data.get('pet_id')
+        if not pet_id:
+            pet_context = data.get('pet_context')
+            if pet_context and isinstance(pet_context, dict):
+                pet_id = pet_context.get('id')
+
+        if pet_id and not conversation.pet:
+            try:
+                pet = await Pet.objects.aget(id=pet_id, owner=user_obj)
+                conversation.pet = pet
+                await conversation.asave()
+                print(f"✅ Linked pet {pet.name} (ID: {pet.id}) to conversation {conversation.id}")
+            except Pet.DoesNotExist:
+                print(f"⚠️ Pet with ID {pet_id} not found or not owned by user")
+            except Exception as e:
+                print(f"⚠️ Error linking pet to conversation: {str(e)}")
+
+        await Message.objects.acreate(
+            conversation=conversation,
+            content=user_message,
+            is_user=True
+        )
+
+        conversation_history = [m async for m in conversation.messages.order_by('created_at')]
+        pet_context = _pet_chat_context(conversation.pet)
+
+        ai_response = await aget_gemini_response_with_pet_context(
+            user_message,
+            conversation_history,
+            chat_mode,
+            pet_context,
+            assessment_context
+        )
+
+        ai_msg = await Message.objects.acreate(
+            conversation=conversation,
+            content=ai_response,
+            is_user=False
+        )
+
+        # Generate title if this is the first exchange
+        if await conversation.messages.acount() <= 3:
+            pet_name = pet_context.get('name') if pet_context else None
+            dynamic_title = await agenerate_conversation_title(user_message, ai_response, pet_name)
+            prefix = "Symptom Check: " if chat_mode == 'symptom_checker' else "Pet Care: "
+            conversation.title = f"{prefix}{dynamic_title}"
+
+        conversation.updated_at = timezone.now()
+        await conversation.asave()
+
+        return _json({
+            'response': ai_response,
+            'conversation_id': conversation.id,
+            'conversation_title': conversation.title,
+            'message_id': ai_msg.id,
+            'chat_mode': chat_mode,
+            'pet_context': pet_context
+        })
+
+    except Exception as e:
+        print(f"Chat API error: {e}")
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def analyze_symptom_with_image(request):
+    """Async analyze_symptom_with_image (Token/Session authentication, like IsAuthenticated)"""
+    user = await sync_to_async(_authenticate_drf_user)(request)
+    if user is None:
+        return _json({'detail': 'Authentication credentials were not provided.'}, status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        data = _request_data(request)
+        if data is None:
+            return _parse_error()
+        conversation_id = data.get('conversation_id')
+        pet_id = data.get('pet_id')
+        symptoms_text = data.get('symptoms')
+        uploaded_image = request.FILES.get('image')
+
+        if not conversation_id:
+            return _json({
+                'success': False,
+                'error': 'Conversation ID is required'
+            }, status.HTTP_400_BAD_REQUEST)
+
+        conversation = await Conversation.objects.aget(id=conversation_id, user=user)
+        pet = await Pet.objects.aget(id=pet_id, owner=user) if pet_id else None
+
+        await Message.objects.acreate(
+            conversation=conversation,
+            content=symptoms_text,
+            is_user=True
+        )
+
+        # Image model inference is CPU-bound
+        image_analysis = await sync_to_async(_analyze_uploaded_image, thread_sensitive=False)(uploaded_image, pet)
+
+        full_prompt = _build_image_symptom_prompt(pet, symptoms_text, image_analysis, bool(uploaded_image))
+        pet_context = _pet_chat_context(pet)
+
+        ai_response = await aget_gemini_response_with_pet_context(
+            full_prompt,
+            [m async for m in conversation.messages.order_by('created_at')],
+            'symptom_checker',
+            pet_context
+        )
+
+        await Message.objects.acreate(
+            conversation=conversation,
+            content=ai_response,
+            is_user=False
+        )
+
+        conversation.updated_at = timezone.now()
+        await conversation.asave()
+
+        return _json({
+            'success': True,
+            'ai_response': ai_response,
+            'image_analysis': image_analysis,
+            'conversation_id': conversation.id
+        })
+
+    except Exception as e:
+        print(f"Error in analyze_symptom_with_image: {e}")
+        return _json({
+            'success': False,
+            'error': f'Failed to analyze symptoms: {str(e)}'
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ============================================================================
+# SYMPTOM CHECKER / TRACKER
+# ============================================================================
+
+@csrf_exempt
+@require_POST
+async def symptom_checker_predict(request):
+    """Async symptom_checker_predict: triage runs through apredict_with_vector_similarity."""
+    from vector_similarity_django_integration import apredict_with_vector_similarity
+
+    user_obj, error_response = await sync_to_async(_authenticate_symptom_checker)(request)
+    if error_response is not None:
+        return _from_drf(error_response)
+
+    payload = _request_data(request)
+    if payload is None:
+        return _parse_error()
+
+    try:
+        payload = payload or {}
+        logger.info(f"Symptom checker predict received payload: {payload}")
+
+        cleaned, error_response = await sync_to_async(_prepare_symptom_checker_payload)(payload, user_obj)
+        if error_response is not None:
+            return _from_drf(error_response)
+
+        try:
+            _log_symptom_checker_input(cleaned)
+            vector_result = await apredict_with_vector_similarity(cleaned)
+            predictions = _convert_vector_predictions(vector_result)
+        except Exception as e:
+            logger.exception('Error during vector similarity prediction: %s', e)
+            return _json(
+                {
+                    'success': False,
+                    'error': 'Disease prediction failed. Please try again later.',
+                    'details': str(e),
+                },
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        response_payload = _build_symptom_checker_response(cleaned, vector_result, predictions)
+        logger.info(f"Symptom checker predict returning {len(predictions)} predictions: {[p.get('disease') for p in predictions]}")
+
+        return _json(response_payload)
+    except Exception as e:
+        logger.exception('Unhandled error in symptom_checker_predict: %s', e)
+        return _json(
+            {
+                'success': False,
+                'error': 'Internal server error while processing symptom checker prediction.',
+                'details': str(e),
+            },
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@csrf_exempt
+@require_POST
+async def log_daily_symptoms(request):
+    """Async log_daily_symptoms: the progression analysis awaits Gemini instead of blocking."""
+    user_type, user_obj, error_response = await sync_to_async(check_user_or_admin)(request)
+    if error_response:
+        return _from_drf(error_response)
+
+    data = _request_data(request)
+    if data is None:
+        return _parse_error()
+
+    pet_id = data.get('pet_id')
+    symptoms = data.get('symptoms', [])
+    severity_map = data.get('severity_map', {})
+    notes = data.get('notes', '')
+
+    if not pet_id:
+        return _json({'error': 'pet_id is required'}, status.HTTP_400_BAD_REQUEST)
+
+    if not symptoms or not isinstance(symptoms, list):
+        return _json({'error': 'symptoms must be a non-empty list'}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        pet = await Pet.objects.aget(id=pet_id, owner=user_obj)
+    except Pet.DoesNotExist:
+        return _json({'error': 'Pet not found or access denied'}, status.HTTP_404_NOT_FOUND)
+
+    overall_severity = _overall_severity(severity_map)
+
+    try:
+        symptom_log = await SymptomLog.objects.acreate(
+            user=user_obj,
+            pet=pet,
+            symptom_date=timezone.now().date(),
+            symptoms=symptoms,
+            overall_severity=overall_severity,
+            symptom_details=severity_map,
+            notes=notes
+        )
+
+        # Job mode: as the sync view, one queued progression analysis per pet
+        if job_mode_requested(request):
+            job = await sync_to_async(enqueue_job)(
+                'symptom_progression', user_obj, {'pet_id': pet.id},
+                dedup_key=f"symptom_progression:pet:{pet.id}"
+            )
+            return _job_accepted(request, job, extra={'log': _symptom_log_data(symptom_log, pet)})
+
+        analysis_result = await aanalyze_symptom_progression(pet_id)
+        health_trend = await _arecord_health_trend(pet, analysis_result)
+
+        return _json(_daily_log_response(symptom_log, pet, health_trend), status.HTTP_201_CREATED)
+
+    except Exception as e:
+        logger.error(f"Error logging symptoms: {e}")
+        return _json({'error': f'Failed to log symptoms: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -10,6 +10,7 @@ from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.db.models import Q
+from django.http import HttpRequest
 from django.utils import timezone
 import json
 
@@ -29,6 +30,7 @@ from .utils import (
     validate_symptoms_input,
     format_soap_report_response
 )
+from .jobs import enqueue_job, job_accepted_response, job_mode_requested, payload_dedup_key
 from pets.models import Pet
 from utils.unified_permissions import require_user_or_admin, filter_by_ownership
 
@@ -85,8 +87,46 @@ def generate_diagnosis(request):
         
         validated_data = serializer.validated_data
         
+        # Job mode: queue it and let the client poll for the report (uploads always run inline)
+        if job_mode_requested(request) and not validated_data.get('image'):
+            job = enqueue_job(
+                'soap_generation', request.user, dict(validated_data),
+                dedup_key=payload_dedup_key('soap_generation', request.user, dict(validated_data))
+            )
+            return job_accepted_response(request, job)
+        
+        return _generate_soap_report(request.user, validated_data, request._request)
+    
+    except Exception as e:
+        logger.error(f"Error generating diagnosis: {str(e)}", exc_info=True)
+        return Response({
+            'success': False,
+            'error': 'An error occurred while generating the diagnosis',
+            'code': 'INTERNAL_ERROR',
+            'details': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _generate_soap_report(user, validated_data, http_request=None):
+    """
+    ML prediction + SOAP report for validated generate_diagnosis input (inline or from an LLMJob)
+    
+    Args:
+        user: Owner of the pet
+        validated_data: DiagnosisGenerateSerializer output
+        http_request: Request the ML prediction runs under (a bare one carrying user for jobs)
+    
+    Returns:
+        Response: 201 with the SOAP report, or the error response
+    """
+    if http_request is None:
+        http_request = HttpRequest()
+        http_request.method = 'POST'
+        http_request.user = user
+    
+    try:
         # Get pet
-        pet = get_object_or_404(Pet, id=validated_data['pet_id'], owner=request.user)
+        pet = get_object_or_404(Pet, id=validated_data['pet_id'], owner=user)
         
         # Get conversation if provided
         conversation = None
@@ -94,7 +134,7 @@ def generate_diagnosis(request):
             try:
                 conversation = Conversation.objects.get(
                     id=validated_data['chat_conversation_id'],
-                    user=request.user
+                    user=user
                 )
             except Conversation.DoesNotExist:
                 logger.warning(f"Conversation {validated_data['chat_conversation_id']} not found")
@@ -121,7 +161,7 @@ def generate_diagnosis(request):
         from rest_framework.request import Request
         from django.http import QueryDict
         
-        temp_request = Request(request._request)
+        temp_request = Request(http_request)
         temp_request._full_data = ml_request_data
         
         # Import and call existing ML prediction view
@@ -0,0 +1,52 @@
+"""
+Background job polling (job mode for LLM-heavy endpoints, see chatbot/jobs.py)
+"""
+from django.conf import settings
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework import status
+
+from .jobs import serialize_job
+from .models import LLMJob
+from utils.unified_permissions import check_user_or_admin
+
+
+@api_view(['GET'])
+@authentication_classes([])  # Disable DRF authentication - our custom function handles it
+@permission_classes([AllowAny])  # Allow any - our custom function handles auth
+def get_llm_job(request, job_id):
+    """
+    GET /api/chatbot/jobs/<job_id>/
+    
+    Poll a job queued by an endpoint called with `Prefer: respond-async`.
+    
+    Returns:
+        - job.status: queued | running | succeeded | failed
+        - job.result / job.result_status: the response the endpoint returned (once finished)
+    
+    Status Codes:
+        - 200: Job found (check job.status)
+        - 404: No such job for this user
+    """
+    user_type, user_obj, error_response = check_user_or_admin(request)
+    if error_response:
+        return error_response
+    
+    try:
+        job = LLMJob.objects.get(id=job_id)
+    except LLMJob.DoesNotExist:
+        job = None
+    
+    # Pet owners only see their own jobs; admins see all
+    if job is None or (user_type != 'admin' and job.user_id != user_obj.id):
+        return Response({
+            'success': False,
+            'error': 'Job not found',
+            'code': 'JOB_NOT_FOUND'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    response = Response({'success': True, 'job': serialize_job(job)})
+    if not job.is_finished:
+        response['Retry-After'] = str(getattr(settings, 'LLM_JOB_POLL_AFTER_SECONDS', 2))
+    return response
@@ -0,0 +1,88 @@
+"""
+Prometheus metrics endpoint (per-stage triage timings, see utils/timing.py)
+"""
+import hmac
+import logging
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from utils.timing import render_info, render_stats_gauges, stage_metrics
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _stats_sources():
+    """(metric prefix, fn() -> stats dict) for the caches and queues worth graphing next to the stage timings."""
+    from chatbot.jobs import queue_stats
+    from chatbot.llm_gateway import gateway_stats
+    from chatbot.semantic_cache import get_semantic_answer_cache
+    from chatbot.utils import get_response_cache
+    from vector_similarity_django_integration import loaded_knowledge_base, triage_stage_stats
+
+    sources = [
+        ('pawpal_llm_gateway', gateway_stats),
+        ('pawpal_semantic_cache', lambda: get_semantic_answer_cache().stats()),
+        ('pawpal_response_cache', lambda: get_response_cache().stats()),
+        ('pawpal_llm_jobs', queue_stats),
+        ('pawpal_triage_stages', triage_stage_stats),
+    ]
+    # Only once a request has loaded it: a scrape must not pay for the model load
+    knowledge_base = loaded_knowledge_base()
+    if knowledge_base is not None:
+        sources.append(('pawpal_knowledge_base', knowledge_base.stats))
+        sources.append(('pawpal_phrase_cache', lambda: knowledge_base.current().engine.phrase_cache_stats()))
+    return sources
+
+
+def _info_sources():
+    """(metric name, fn() -> labels dict) for string state, exported as `<metric>{...} 1` info series."""
+    from vector_similarity_django_integration import loaded_knowledge_base
+
+    knowledge_base = loaded_knowledge_base()
+    if knowledge_base is None:
+        return []
+    return [('pawpal_knowledge_base_info', lambda: {'version': knowledge_base.stats()['version']})]
+
+
+def _render_sources(sources, render):
+    parts = []
+    for name, collect in sources:
+        try:
+            parts.append(render(name, collect()))
+        except Exception as e:
+            # One broken source should not fail the whole scrape
+            logger.warning(f"⚠️ Metrics source {name} failed: {e}")
+    return parts
+
+
+@require_GET
+def metrics(request):
+    """
+    GET /metrics
+
+    Prometheus text exposition: pawpal_stage_duration_seconds histograms per triage
+    stage, plus gauges flattened from the LLM gateway, cache, job queue, abandoned
+    stage and knowledge base stats, and a pawpal_knowledge_base_info{version=...}
+    series for the active knowledge base. Values are for this worker process.
+
+    The scraper must send `Authorization: Bearer <METRICS_TOKEN>`. Without a
+    METRICS_TOKEN the endpoint only exists when DEBUG is on (404 otherwise), so a
+    production deploy never exposes internal stats by accident.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            raise Http404()
+    else:
+        auth = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(auth.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+
+    parts = [stage_metrics.render_prometheus()]
+    parts += _render_sources(_stats_sources(), render_stats_gauges)
+    parts += _render_sources(_info_sources(), render_info)
+    return HttpResponse(''.join(parts), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -23,6 +23,7 @@ from .serializers import (
 )
 from utils.risk_calculator import calculate_risk_score, should_create_alert
 from .utils import analyze_symptom_progression
+from .jobs import enqueue_job, job_accepted_response, job_mode_requested
 
 logger = logging.getLogger(__name__)
 
@@ -613,6 +614,85 @@ class SymptomTrackerViewSet(viewsets.ModelViewSet):
         })
 
 
+def _overall_severity(severity_map):
+    """Overall severity label from a {symptom: 1-10} map (moderate when empty)."""
+    if not severity_map:
+        return 'moderate'  # Default
+    avg_severity = sum(severity_map.values()) / len(severity_map)
+    if avg_severity >= 7:
+        return 'severe'
+    elif avg_severity >= 4:
+        return 'moderate'
+    return 'mild'
+
+
+def _symptom_log_data(symptom_log, pet):
+    return {
+        'id': symptom_log.id,
+        'pet_id': pet.id,
+        'log_date': symptom_log.symptom_date,
+        'symptoms': symptom_log.symptoms,
+        'severity_scores': symptom_log.symptom_details,
+        'notes': symptom_log.notes,
+        'created_at': symptom_log.logged_date
+    }
+
+
+def _daily_log_response(symptom_log, pet, health_trend):
+    return {
+        'success': True,
+        'message': 'Symptoms logged and analyzed successfully',
+        'log': _symptom_log_data(symptom_log, pet),
+        'analysis': {
+            'id': health_trend.id,
+            'analysis_date': health_trend.analysis_date,
+            'risk_score': health_trend.risk_score,
+            'urgency_level': health_trend.urgency_level,
+            'trend_analysis': health_trend.trend_analysis,
+            'prediction': health_trend.prediction,
+            'alert_needed': health_trend.alert_needed
+        }
+    }
+
+
+def _health_trend_fields(analysis_result):
+    """PetHealthTrend fields for an analyze_symptom_progression result."""
+    # Use trend_analysis from result if available, otherwise construct from trend
+    trend_analysis_text = analysis_result.get('trend_analysis') or f"Trend: {analysis_result['trend']}"
+    
+    return {
+        'risk_score': analysis_result['risk_score'],
+        'urgency_level': analysis_result['urgency'],
+        'trend_analysis': trend_analysis_text,
+        'prediction': analysis_result['prediction'],
+        'alert_needed': analysis_result['alert_needed'],
+    }
+
+
+def _record_health_trend(pet, analysis_result):
+    """Store an analyze_symptom_progression result as the pet's latest PetHealthTrend."""
+    return PetHealthTrend.objects.create(pet=pet, **_health_trend_fields(analysis_result))
+
+
+async def _arecord_health_trend(pet, analysis_result):
+    """Async _record_health_trend (no thread hop on the ASGI path)."""
+    return await PetHealthTrend.objects.acreate(pet=pet, **_health_trend_fields(analysis_result))
+
+
+def _analyze_and_record_trend(pet_id):
+    """
+    Progression analysis for a pet's latest daily log (the 'symptom_progression' LLMJob).
+    
+    Returns:
+        (response body, HTTP status) as log_daily_symptoms would have returned them
+    """
+    symptom_log = SymptomLog.objects.select_related('pet').filter(pet_id=pet_id).order_by('-logged_date').first()
+    if symptom_log is None:
+        return {'error': 'No symptom logs for this pet'}, status.HTTP_404_NOT_FOUND
+    health_trend = _record_health_trend(symptom_log.pet, analyze_symptom_progression(pet_id))
+    return _daily_log_response(symptom_log, symptom_log.pet, health_trend), status.HTTP_201_CREATED
+
+
 @api_view(['POST'])
 @authentication_classes([])  # Disable DRF authentication - our custom function handles it
 @permission_classes([AllowAny])  # Allow any - our custom function handles auth
@@ -672,16 +752,7 @@ def log_daily_symptoms(request):
         )
     
     # Determine overall severity from severity_map
-    if severity_map:
-        avg_severity = sum(severity_map.values()) / len(severity_map)
-        if avg_severity >= 7:
-            overall_severity = 'severe'
-        elif avg_severity >= 4:
-            overall_severity = 'moderate'
-        else:
-            overall_severity = 'mild'
-    else:
-        overall_severity = 'moderate'  # Default
+    overall_severity = _overall_severity(severity_map)
     
     # Create symptom log
     try:
@@ -695,44 +766,22 @@ def log_daily_symptoms(request):
             notes=notes
         )
         
-        # Trigger AI analysis (can be async in production)
+        # Job mode: the log is saved now, the AI analysis runs in the job queue.
+        # One queued analysis per pet covers a burst of logs (it reads all recent logs).
+        if job_mode_requested(request):
+            job = enqueue_job(
+                'symptom_progression', user_obj, {'pet_id': pet.id},
+                dedup_key=f"symptom_progression:pet:{pet.id}"
+            )
+            return job_accepted_response(request, job, extra={'log': _symptom_log_data(symptom_log, pet)})
+        
+        # Trigger AI analysis
         analysis_result = analyze_symptom_progression(pet_id)
         
         # Create PetHealthTrend from analysis
-        # Use trend_analysis from result if available, otherwise construct from trend
-        trend_analysis_text = analysis_result.get('trend_analysis') or f"Trend: {analysis_result['trend']}"
+        health_trend = _record_health_trend(pet, analysis_result)
         
-        health_trend = PetHealthTrend.objects.create(
-            pet=pet,
-            risk_score=analysis_result['risk_score'],
-            urgency_level=analysis_result['urgency'],
-            trend_analysis=trend_analysis_text,
-            prediction=analysis_result['prediction'],
-            alert_needed=analysis_result['alert_needed']
-        )
-        
-        return Response({
-            'success': True,
-            'message': 'Symptoms logged and analyzed successfully',
-            'log': {
-                'id': symptom_log.id,
-                'pet_id': pet.id,
-                'log_date': symptom_log.symptom_date,
-                'symptoms': symptom_log.symptoms,
-                'severity_scores': symptom_log.symptom_details,
-                'notes': symptom_log.notes,
-                'created_at': symptom_log.logged_date
-            },
-            'analysis': {
-                'id': health_trend.id,
-                'analysis_date': health_trend.analysis_date,
-                'risk_score': health_trend.risk_score,
-                'urgency_level': health_trend.urgency_level,
-                'trend_analysis': health_trend.trend_analysis,
-                'prediction': health_trend.prediction,
-                'alert_needed': health_trend.alert_needed
-            }
-        }, status=status.HTTP_201_CREATED)
+        return Response(_daily_log_response(symptom_log, pet, health_trend), status=status.HTTP_201_CREATED)
     
     except Exception as e:
         logger.error(f"Error logging symptoms: {e}")
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Embedding Store - Persistent on-disk cache for symptom embedding matrices
+
+The symptom vocabulary is encoded once and saved as a float32 .npy file whose
+name is derived from a hash of the model name and the vocabulary. Every process
+(e.g. each gunicorn worker) then memory-maps the same file read-only, so startup
+skips the encode step and the matrix lives once in the OS page cache.
+
+The index can optionally be stored quantized (EMBEDDING_QUANTIZATION=float16 or
+int8 with a per-row scale) to cut its memory 2-4x; validate_embedding_quantization.py
+checks that matches at the production thresholds stay the same as float32.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+from decouple import config
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: rely on atomic os.replace only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = config('EMBEDDING_CACHE_DIR', default=os.path.join(BASE_DIR, '.embedding_cache'))
+
+# Bump when the on-disk layout or normalization changes
+CACHE_FORMAT_VERSION = 1
+
+QUANTIZATION_MODES = ('float32', 'float16', 'int8')
+DEFAULT_QUANTIZATION = config('EMBEDDING_QUANTIZATION', default='float32')
+
+# Rows de-quantized per block during search (bounds the temporary float32 copy)
+SEARCH_BLOCK_ROWS = 4096
+
+
+def compute_cache_key(model_name: str, vocabulary: List[str]) -> str:
+    """Hash of the model name and the ordered vocabulary."""
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_FORMAT_VERSION}\n{model_name}\n".encode('utf-8'))
+    for entry in vocabulary:
+        digest.update(entry.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32 so cosine similarity becomes a dot product."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class QuantizedEmbeddingIndex:
+    """
+    Reduced-precision copy of a normalized embedding matrix.
+
+    float16: values stored as float16.
+    int8:    values = round(row / scale) with scale = max(|row|) / 127 per row.
+
+    Attributes:
+        mode: 'float16' or 'int8'
+        values: (rows, dim) float16 / int8 array (may be a memmap)
+        scales: (rows,) float32 per-row scale (int8 only)
+    """
+
+    def __init__(self, mode: str, values: np.ndarray, scales: Optional[np.ndarray] = None):
+        if mode not in ('float16', 'int8'):
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+        self.mode = mode
+        self.values = values
+        self.scales = scales
+
+    @classmethod
+    def from_float32(cls, matrix: np.ndarray, mode: str) -> 'QuantizedEmbeddingIndex':
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if mode == 'float16':
+            return cls(mode, matrix.astype(np.float16))
+        max_abs = np.abs(matrix).max(axis=1)
+        max_abs[max_abs == 0] = 1.0
+        scales = (max_abs / 127.0).astype(np.float32)
+        values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return cls(mode, values, scales)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def similarities(self, query_vectors: np.ndarray) -> np.ndarray:
+        """Dot products of normalized queries against every row, as float32 (queries, rows)."""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        out = np.empty((queries.shape[0], self.values.shape[0]), dtype=np.float32)
+        for start in range(0, self.values.shape[0], SEARCH_BLOCK_ROWS):
+            block = self.values[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+            scores = queries @ block.T
+            if self.scales is not None:
+                scores *= self.scales[start:start + SEARCH_BLOCK_ROWS]
+            out[:, start:start + block.shape[0]] = scores
+        return out
+
+
+EmbeddingIndex = Union[np.ndarray, QuantizedEmbeddingIndex]
+
+
+def similarity_matrix(index: EmbeddingIndex, query_vectors: np.ndarray) -> np.ndarray:
+    """Cosine similarities (normalized inputs) of queries against a float32 or quantized index."""
+    if isinstance(index, QuantizedEmbeddingIndex):
+        return index.similarities(query_vectors)
+    return np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)) @ index.T
+
+
+def load_or_build_embeddings(
+    model_name: str,
+    vocabulary: List[str],
+    encode_fn: Callable[[List[str]], np.ndarray],
+    cache_dir: Optional[str] = None,
+    quantization: Optional[str] = None,
+    name: str = 'symptom_vectors',
+) -> EmbeddingIndex:
+    """
+    Return the normalized embedding matrix for `vocabulary`, memory-mapped read-only.
+
+    Args:
+        model_name: Embedding model identifier (part of the cache key)
+        vocabulary: Texts to encode, in row order
+        encode_fn: Called with the vocabulary only on a cache miss
+        cache_dir: Where .npy files are kept (defaults to EMBEDDING_CACHE_DIR)
+        quantization: 'float32' (default, EMBEDDING_QUANTIZATION), 'float16' or 'int8'
+        name: File name prefix of the cached matrix
+
+    Returns:
+        np.memmap of shape (len(vocabulary), dim), dtype float32, rows L2-normalized,
+        or a QuantizedEmbeddingIndex over memory-mapped quantized files
+    """
+    quantization = quantization or DEFAULT_QUANTIZATION
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"EMBEDDING_QUANTIZATION must be one of {QUANTIZATION_MODES}, got {quantization!r}")
+
+    matrix = _load_or_build_float32(model_name, vocabulary, encode_fn, cache_dir or DEFAULT_CACHE_DIR, name)
+    if quantization == 'float32':
+        return matrix
+    return _load_or_build_quantized(matrix, quantization)
+
+
+def _load_or_build_float32(model_name, vocabulary, encode_fn, cache_dir, name) -> np.ndarray:
+    os.makedirs(cache_dir, exist_ok=True)
+    key = compute_cache_key(model_name, vocabulary)
+    path = os.path.join(cache_dir, f"{name}_{key[:16]}.npy")
+
+    vectors = _load_if_valid(path, len(vocabulary))
+    if vectors is not None:
+        print(f"✅ Loaded {len(vocabulary)} vectors from embedding cache ({os.path.basename(path)})")
+        return vectors
+
+    # Only one worker encodes; the others wait on the lock and then map its file
+    with file_lock(path + '.lock'):
+        vectors = _load_if_valid(path, len(vocabulary))
+        if vectors is not None:
+            return vectors
+
+        _save_atomic(path, normalize_rows(encode_fn(vocabulary)))
+        logger.info(f"💾 Embedding cache written: {path}")
+        print(f"💾 Vectors saved to embedding cache ({os.path.basename(path)})")
+
+    return np.load(path, mmap_mode='r')
+
+
+def _load_or_build_quantized(matrix: np.memmap, mode: str) -> QuantizedEmbeddingIndex:
+    """Quantized copy stored next to the float32 file it was derived from."""
+    base = matrix.filename[:-len('.npy')]
+    values_path = f"{base}.{mode}.npy"
+    scales_path = f"{base}.{mode}.scale.npy"
+
+    with file_lock(base + '.lock'):
+        if not os.path.exists(values_path) or (mode == 'int8' and not os.path.exists(scales_path)):
+            index = QuantizedEmbeddingIndex.from_float32(matrix, mode)
+            if index.scales is not None:
+                _save_atomic(scales_path, index.scales)
+            _save_atomic(values_path, index.values)
+            logger.info(f"💾 Quantized ({mode}) embedding cache written: {values_path}")
+
+    values = np.load(values_path, mmap_mode='r')
+    scales = np.load(scales_path, mmap_mode='r') if mode == 'int8' else None
+    if values.shape != matrix.shape or (scales is not None and scales.shape[0] != matrix.shape[0]):
+        raise ValueError(f"Quantized embedding cache {values_path} does not match {matrix.filename}")
+
+    index = QuantizedEmbeddingIndex(mode, values, scales)
+    print(f"✅ Using {mode} vectors ({index.nbytes / 1024:.0f} KB vs {matrix.nbytes / 1024:.0f} KB float32)")
+    return index
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _load_if_valid(path: str, expected_rows: int) -> Optional[np.ndarray]:
+    if not os.path.exists(path):
+        return None
+    try:
+        vectors = np.load(path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Ignoring unreadable embedding cache {path}: {e}")
+        return None
+    if vectors.ndim != 2 or vectors.shape[0] != expected_rows or vectors.dtype != np.float32:
+        logger.warning(f"⚠️ Ignoring embedding cache {path}: unexpected shape {vectors.shape} / {vectors.dtype}")
+        return None
+    return vectors
+
+
+class file_lock:
+    """Exclusive file lock (no-op where fcntl is unavailable)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        return False
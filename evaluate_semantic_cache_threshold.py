@@ -0,0 +1,79 @@
+"""
+Evaluation behind chatbot.semantic_cache.DEFAULT_SIMILARITY_THRESHOLD.
+
+Encodes labelled first-turn question pairs with the triage engine's sentence
+transformer and prints each pair's cosine similarity, then whether the threshold
+separates them. A different question scoring at or above the threshold would be
+served another question's answer, so any such pair fails the run (exit code 1);
+near-duplicates below it only cost a Gemini call and are reported as recall.
+
+Usage:
+    python evaluate_semantic_cache_threshold.py [--threshold 0.93] [--backend torch]
+"""
+import argparse
+import sys
+from typing import List, Tuple
+
+import numpy as np
+
+from embedding_store import normalize_rows
+
+# Same question, so the cached answer is correct for both
+NEAR_DUPLICATES = [
+    ("How often should I bathe my dog?", "how often should i bathe my dog"),
+    ("What can I feed my cat?", "What can I feed my cat"),
+    ("Is chocolate toxic to dogs?", "is chocolate toxic to dogs?"),
+    ("How often should I bathe my dog?", "How frequently should I bathe my dog?"),
+    ("What vaccines does my puppy need?", "Which vaccines does my puppy need?"),
+    ("How much should I feed my kitten?", "How much food should I give my kitten?"),
+]
+
+# Different question (often same species and wording), so a shared answer would be wrong
+DIFFERENT_QUESTIONS = [
+    ("How often should I bathe my dog?", "What vaccines does my puppy need?"),
+    ("How often should I bathe my dog?", "How often should I walk my dog?"),
+    ("What can I feed my cat?", "Why is my cat not eating?"),
+    ("Is chocolate toxic to dogs?", "Are grapes toxic to dogs?"),
+    ("How much should I feed my kitten?", "How much should I feed my puppy?"),
+    ("How do I trim my rabbit's nails?", "How do I trim my dog's nails?"),
+]
+
+
+def pair_similarities(encoder, pairs: List[Tuple[str, str]]) -> List[float]:
+    """Cosine similarity of each (question, question) pair, as the cache scores them."""
+    firsts = normalize_rows(encoder.encode([a for a, _ in pairs], convert_to_numpy=True))
+    seconds = normalize_rows(encoder.encode([b for _, b in pairs], convert_to_numpy=True))
+    return [float(score) for score in np.sum(firsts * seconds, axis=1)]
+
+
+def main():
+    from chatbot.semantic_cache import DEFAULT_SIMILARITY_THRESHOLD
+    from onnx_encoder import create_encoder
+    from smart_triage_engine import SEMANTIC_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD)
+    parser.add_argument('--backend', default=None, help='torch, onnx or onnx-int8 (default: EMBEDDING_BACKEND)')
+    args = parser.parse_args()
+
+    encoder, backend_used = create_encoder(SEMANTIC_MODEL_NAME, backend=args.backend)
+    print(f"Model: {SEMANTIC_MODEL_NAME} ({backend_used}), threshold {args.threshold}")
+
+    duplicate_scores = pair_similarities(encoder, NEAR_DUPLICATES)
+    different_scores = pair_similarities(encoder, DIFFERENT_QUESTIONS)
+    for label, pairs, scores in (('near-duplicate', NEAR_DUPLICATES, duplicate_scores),
+                                 ('different', DIFFERENT_QUESTIONS, different_scores)):
+        print(f"\n{label} pairs:")
+        for (a, b), score in zip(pairs, scores):
+            print(f"  {score:.4f}  {a!r} vs {b!r}")
+
+    false_hits = [pair for pair, score in zip(DIFFERENT_QUESTIONS, different_scores) if score >= args.threshold]
+    reused = sum(score >= args.threshold for score in duplicate_scores)
+    print(f"\nLowest near-duplicate: {min(duplicate_scores):.4f}   highest different: {max(different_scores):.4f}")
+    print(f"Near-duplicates served from cache: {reused}/{len(NEAR_DUPLICATES)}")
+    print(f"Different questions served a wrong answer: {len(false_hits)}/{len(DIFFERENT_QUESTIONS)}")
+    return 1 if false_hits else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Knowledge Base Versions - Hot reload of the disease knowledge base CSV
+
+The CSV is identified by a hash of its contents. When the file changes, the new
+version (compiled disease indexes, per-species lists, verifier disease names) is
+built in a background thread while the current version keeps serving; the
+finished build then replaces the active version with a single reference swap.
+A request grabs the active version once and uses it to the end, so in-flight
+requests finish on the version they started with.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the CSV (0 disables hot reload)
+DEFAULT_CHECK_INTERVAL = 30
+
+
+def compute_file_hash(path: str) -> str:
+    """Short content hash used as the knowledge base version id."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class KnowledgeBaseVersion:
+    """
+    One fully built knowledge base; never mutated after it becomes active.
+
+    Attributes:
+        version: Content hash of the CSV it was built from
+        engine: SmartTriageEngine (or SidecarTriageEngine) over this CSV
+        verifier: DiagnosisVerifier over this CSV (None if it failed to load)
+    """
+
+    def __init__(self, version: str, path: str, engine, verifier):
+        self.version = version
+        self.path = path
+        self.engine = engine
+        self.verifier = verifier
+        self.loaded_at = time.time()
+
+
+# build_fn(path, previous_version_or_None) -> (engine, verifier)
+BuildFn = Callable[[str, Optional[KnowledgeBaseVersion]], Tuple[object, object]]
+
+
+class VersionedKnowledgeBase:
+    """
+    Holds the active KnowledgeBaseVersion and rebuilds it when the CSV changes.
+
+    Args:
+        path: Knowledge base CSV
+        build_fn: Builds (engine, verifier) for the CSV; receives the previous version
+            so expensive shared state (the sentence transformer) can be reused
+        check_interval: Seconds between change checks, done lazily from current()
+    """
+
+    def __init__(self, path: str, build_fn: BuildFn, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.path = path
+        self.build_fn = build_fn
+        self.check_interval = check_interval
+        self._active: Optional[KnowledgeBaseVersion] = None
+        self._lock = threading.Lock()
+        self._building = False
+        self._last_check = 0.0
+        self._file_stat = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+
+    def current(self) -> KnowledgeBaseVersion:
+        """Active version; the first call builds it synchronously."""
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._build(compute_file_hash(self.path), None)
+                    self._file_stat = self._stat()
+                    self._last_check = time.monotonic()
+            return self._active
+
+        if self.check_interval and time.monotonic() - self._last_check >= self.check_interval:
+            self._start_background_check()
+        return active
+
+    def _stat(self) -> Optional[Tuple[float, int]]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime, st.st_size)
+        except OSError:
+            return None
+
+    def _start_background_check(self):
+        with self._lock:
+            if self._building:
+                return
+            self._last_check = time.monotonic()
+            stat = self._stat()
+            if stat is None or stat == self._file_stat:
+                return
+            self._building = True
+        threading.Thread(target=self.reload, name='knowledge-base-reload', daemon=True).start()
+
+    def reload(self) -> bool:
+        """
+        Rebuild if the CSV content changed, then swap the new version in.
+
+        Returns:
+            True if a new version became active. On failure the previous version stays active.
+        """
+        try:
+            stat = self._stat()
+            version = compute_file_hash(self.path)
+            previous = self._active
+            if previous is not None and version == previous.version:
+                self._file_stat = stat
+                return False
+
+            logger.info(f"🔄 Building knowledge base version {version} from {self.path}...")
+            new_version = self._build(version, previous)
+
+            # The file changed again while we were building: let the next check pick it up
+            if compute_file_hash(self.path) != version:
+                logger.warning(f"⚠️ {self.path} changed during rebuild of {version}; will retry")
+                return False
+
+            self._active = new_version
+            self._file_stat = stat
+            self.reloads += 1
+            self.last_error = None
+            logger.info(
+                f"✅ Knowledge base {previous.version if previous else None} -> {version} "
+                f"({len(new_version.engine.knowledge_base.diseases)} diseases)"
+            )
+            return True
+        except Exception as e:
+            self.failed_reloads += 1
+            self.last_error = str(e)
+            logger.error(f"✗ Knowledge base reload failed, keeping the active version: {e}")
+            return False
+        finally:
+            self._building = False
+
+    def _build(self, version: str, previous: Optional[KnowledgeBaseVersion]) -> KnowledgeBaseVersion:
+        engine, verifier = self.build_fn(self.path, previous)
+        return KnowledgeBaseVersion(version, self.path, engine, verifier)
+
+    def stats(self) -> Dict:
+        active = self._active
+        return {
+            'version': active.version if active else None,
+            'path': self.path,
+            'loaded_at': active.loaded_at if active else None,
+            'diseases': len(active.engine.knowledge_base.diseases) if active else 0,
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'last_error': self.last_error,
+            'check_interval': self.check_interval,
+        }
@@ -2,12 +2,14 @@
 Rate limiting middleware for OTP and password reset endpoints
 Prevents abuse by limiting request frequency
 """
-from django.core.cache import cache
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import JsonResponse
-from datetime import datetime
 from typing import Optional
+import json
 import logging
 
+from utils.rate_limiter import hit_rate_limit
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,8 +25,17 @@ class RateLimitMiddleware:
         rate_limit_paths: List of paths to apply rate limiting to
         max_requests: Maximum requests allowed per time window
         time_window_seconds: Time window in seconds (default: 3600 = 1 hour)
+
+    Counting uses the shared sliding-window limiter (utils/rate_limiter.py), so the
+    limit holds across worker processes. Paths match with or without the trailing slash.
+
+    Sync and async capable: under ASGI only the rate-limited paths touch the
+    limiter in a thread, every other request passes straight through.
     """
     
+    sync_capable = True
+    async_capable = True
+    
     rate_limit_paths = [
         '/api/auth/send-otp/',
         '/api/auth/request-password-reset/',
@@ -42,6 +53,9 @@ class RateLimitMiddleware:
             get_response: Django's get_response callable
         """
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
     
     def __call__(self, request):
         """
@@ -53,31 +67,65 @@ class RateLimitMiddleware:
         Returns:
             JsonResponse if rate limit exceeded, otherwise continues to next middleware
         """
+        if self.async_mode:
+            return self.__acall__(request)
+        
+        limited_response = self._check_rate_limit(request)
+        if limited_response:
+            return limited_response
+        
+        # Continue to next middleware/view
+        response = self.get_response(request)
+        return response
+    
+    async def __acall__(self, request):
+        """Async variant of __call__ for the ASGI handler"""
+        if self._is_rate_limited_path(request.path):
+            limited_response = await sync_to_async(self._check_rate_limit)(request)
+            if limited_response:
+                return limited_response
+        
+        return await self.get_response(request)
+    
+    def _is_rate_limited_path(self, path: str) -> bool:
+        return path.rstrip('/') in {p.rstrip('/') for p in self.rate_limit_paths}
+    
+    def _check_rate_limit(self, request) -> Optional[JsonResponse]:
+        """
+        Check and record an attempt on a rate-limited path
+        
+        Args:
+            request: HTTP request object
+        
+        Returns:
+            429 JsonResponse if rate limit exceeded, otherwise None
+        """
         # Check if this path should be rate limited
-        if request.path in self.rate_limit_paths:
+        if self._is_rate_limited_path(request.path):
             email = self._extract_email(request)
             
             if email:
-                if self._is_rate_limited(email):
+                # Counts this attempt unless it is over the limit
+                allowed, retry_after = hit_rate_limit(
+                    'otp_middleware', email, self.max_requests, self.time_window_seconds
+                )
+                if not allowed:
                     logger.warning(
                         f"Rate limit exceeded for {request.path} from email: {email}"
                     )
-                    return JsonResponse(
+                    response = JsonResponse(
                         {
                             "success": False,
                             "error": f"Too many requests. Please try again in 1 hour.",
                             "code": "RATE_LIMIT_EXCEEDED",
-                            "retry_after": self.time_window_seconds
+                            "retry_after": retry_after
                         },
                         status=429  # Too Many Requests
                     )
-                
-                # Record this attempt
-                self._record_attempt(email)
+                    response['Retry-After'] = str(retry_after)
+                    return response
         
-        # Continue to next middleware/view
-        response = self.get_response(request)
-        return response
+        return None
     
     def _extract_email(self, request) -> Optional[str]:
         """
@@ -93,9 +141,14 @@ class RateLimitMiddleware:
         
         # Try POST data
         if request.method == 'POST':
-            if hasattr(request, 'data'):
-                # DRF request with parsed JSON
-                email = request.data.get('email')
+            if request.content_type == 'application/json':
+                # Parsed here too; the view re-reads the cached body
+                try:
+                    body = json.loads(request.body or b'{}')
+                except (ValueError, UnicodeDecodeError):
+                    body = None
+                if isinstance(body, dict):
+                    email = body.get('email')
             elif request.POST:
                 # Standard Django POST
                 email = request.POST.get('email')
@@ -105,65 +158,9 @@ class RateLimitMiddleware:
             email = request.GET.get('email')
         
         # Normalize email (lowercase, strip)
-        if email:
+        if email and isinstance(email, str):
             email = email.lower().strip()
+        else:
+            email = None
         
         return email
-    
-    def _is_rate_limited(self, email: str) -> bool:
-        """
-        Check if email has exceeded rate limit
-        
-        Args:
-            email: Email address to check
-        
-        Returns:
-            True if rate limited, False otherwise
-        """
-        cache_key = f'rate_limit_otp_{email}'
-        attempts = cache.get(cache_key, [])
-        
-        if not attempts:
-            return False
-        
-        # Filter attempts within time window
-        now = datetime.now().timestamp()
-        time_threshold = now - self.time_window_seconds
-        
-        recent_attempts = [
-            timestamp for timestamp in attempts
-            if timestamp >= time_threshold
-        ]
-        
-        # Check if limit exceeded
-        return len(recent_attempts) >= self.max_requests
-    
-    def _record_attempt(self, email: str):
-        """
-        Record an attempt for rate limiting
-        
-        Args:
-            email: Email address to record attempt for
-        """
-        cache_key = f'rate_limit_otp_{email}'
-        attempts = cache.get(cache_key, [])
-        
-        # Add current attempt timestamp
-        now = datetime.now().timestamp()
-        attempts.append(now)
-        
-        # Filter out old attempts (outside time window)
-        time_threshold = now - self.time_window_seconds
-        attempts = [
-            timestamp for timestamp in attempts
-            if timestamp >= time_threshold
-        ]
-        
-        # Store in cache (expire after time window)
-        cache.set(cache_key, attempts, timeout=self.time_window_seconds + 60)
-        
-        logger.debug(
-            f"Rate limit attempt recorded for {email} "
-            f"({len(attempts)}/{self.max_requests} in last hour)"
-        )
-
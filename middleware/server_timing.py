@@ -0,0 +1,56 @@
+"""
+Server-Timing middleware
+Reports the per-stage spans recorded while handling a request (utils.timing)
+in a Server-Timing response header
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from utils.timing import begin_request_timings, end_request_timings
+
+
+class ServerTimingMiddleware:
+    """
+    Collect utils.timing spans per request and add a Server-Timing header
+
+    The header is only added when at least one span ran (triage endpoints), so
+    other responses are unchanged. Disable with SERVER_TIMING_HEADER = False;
+    spans still feed the /metrics histograms either way.
+
+    Sync and async capable: the span collector lives in a contextvar, which is
+    visible to async views and to sync code run through sync_to_async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timings, token = begin_request_timings()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request_timings(token)
+        return self._add_header(response, timings)
+
+    async def __acall__(self, request):
+        """Async variant of __call__ for the ASGI handler"""
+        timings, token = begin_request_timings()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request_timings(token)
+        return self._add_header(response, timings)
+
+    def _add_header(self, response, timings):
+        if getattr(settings, 'SERVER_TIMING_HEADER', True) and timings.spans():
+            response['Server-Timing'] = timings.server_timing_header()
+        return response
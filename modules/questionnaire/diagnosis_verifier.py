@@ -9,11 +9,50 @@ import csv
 import json
 import os
 import logging
-from typing import List, Dict, Any, Optional
-from chatbot.utils import get_gemini_client
+from typing import List, Dict, Any, Optional, Tuple
+from chatbot.llm_gateway import LLMUnavailableError, agenerate_text, generate_text
+from utils.timing import timed
 
 logger = logging.getLogger(__name__)
 
+# Prompt size budgeting (tokens are estimated at ~4 characters each)
+CHARS_PER_TOKEN = 4
+DEFAULT_PROMPT_TOKEN_BUDGET = 2500
+# Database conditions listed in the prompt: the top-k candidates plus their nearest
+# neighbours in symptom space, instead of every disease for the species
+CANDIDATE_TOP_K = 5
+NEIGHBOURS_PER_CANDIDATE = 2
+MAX_PROMPT_SYMPTOMS = 40
+# Caps for free text; whatever the fixed instructions leave of the budget is shared out below these
+MAX_NOTES_TOKENS = 400
+MAX_HISTORY_TOKENS = 150
+MIN_CONTEXT_TOKENS = 60
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting and logging (no tokenizer needed)."""
+    return (len(text or '') + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shorten free text to roughly max_tokens, keeping its beginning and end
+    (owners usually open with the complaint and end with the latest change).
+    """
+    text = ' '.join((text or '').split())
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    head = text[:int(max_chars * 0.6)].rsplit(' ', 1)[0]
+    tail = text[-int(max_chars * 0.4):].split(' ', 1)[-1]
+    return f"{head} [...] {tail}"
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
 
 class DiagnosisVerifier:
         """
@@ -22,16 +61,21 @@ class DiagnosisVerifier:
         2. Out-of-Domain (OOD) diseases not in the knowledge base
         """
         
-        def __init__(self, knowledge_base_path: str = 'knowledge_base_enhanced.csv'):
+        def __init__(self, knowledge_base_path: str = 'knowledge_base_enhanced.csv',
+                     prompt_token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET):
             """
             Initialize the verifier with a knowledge base of valid diseases.
             
             Args:
                 knowledge_base_path: Path to the CSV file containing verified diseases
+                prompt_token_budget: Estimated token budget for the verification prompt
             """
             self.knowledge_base_path = knowledge_base_path
+            self.prompt_token_budget = prompt_token_budget
             self.valid_diseases = set()
             self.diseases_by_species = {}
+            # (species, disease) -> symptom codes, for nearest-neighbour candidates
+            self.disease_symptoms = {}
             self._load_valid_diseases()
             logger.info(f"✓ DiagnosisVerifier initialized with {len(self.valid_diseases)} valid diseases")
         
@@ -63,6 +107,9 @@ class DiagnosisVerifier:
                             if species not in self.diseases_by_species:
                                 self.diseases_by_species[species] = []
                             self.diseases_by_species[species].append(disease_name)
+                            self.disease_symptoms[(species, disease_name)] = frozenset(
+                                symptom.strip() for symptom in (row.get('symptoms') or '').split(',') if symptom.strip()
+                            )
                 
                 logger.info(f"✓ Loaded {len(self.valid_diseases)} unique diseases from knowledge base")
                 logger.info(f"✓ Diseases by species: {dict((k, len(v)) for k, v in self.diseases_by_species.items())}")
@@ -71,6 +118,7 @@ class DiagnosisVerifier:
                 logger.error(f"✗ Failed to load knowledge base: {e}")
                 logger.warning("⚠️ Continuing with empty disease set - OOD detection may be less accurate")
         
+        @timed('verification')
         def verify_diagnosis(
             self,
             user_symptoms: List[str],
@@ -83,73 +131,263 @@ class DiagnosisVerifier:
             Verify diagnosis predictions using Gemini AI.
             """
             try:
-                # Get valid diseases for this species (or all if species not found)
-                valid_diseases_list = self.diseases_by_species.get(species, [])
-                if not valid_diseases_list:
-                    # Fallback to all diseases
-                    valid_diseases_list = list(set().union(*self.diseases_by_species.values())) if self.diseases_by_species else []
-                
-                # Format predictions for prompt
-                predictions_text = self._format_predictions(system_predictions)
+                prompt = self._prepare_verification_prompt(
+                    user_symptoms, system_predictions, species, user_notes, context_data
+                )
                 
-                # Prepare context data
-                if context_data is None:
-                    context_data = {}
-                if not user_notes and context_data.get('user_notes'):
-                    user_notes = context_data.get('user_notes', '')
+                # Call Gemini (identical concurrent prompts share one call)
+                logger.info(f"🤖 Sending diagnosis verification request to Gemini (~{estimate_tokens(prompt)} prompt tokens)...")
                 
-                # Build the verification prompt
-                prompt = self._build_verification_prompt(
-                    user_symptoms=user_symptoms,
-                    predictions_text=predictions_text,
-                    valid_diseases=valid_diseases_list,
-                    species=species,
-                    user_notes=user_notes,
-                    context_data=context_data
+                response_text = generate_text(prompt, 'verification')
+                return self._parse_verification_response(response_text)
+            
+            except LLMUnavailableError as e:
+                logger.warning(f"⚡ Gemini unavailable, skipping verification: {e}")
+                return self._default_verification_result()
+            except Exception as e:
+                logger.error(f"✗ Diagnosis verification failed: {e}")
+                logger.exception(e)
+                return self._default_verification_result()
+        
+        @timed('verification')
+        async def averify_diagnosis(
+            self,
+            user_symptoms: List[str],
+            system_predictions: List[Dict[str, Any]],
+            species: str = "Dog",
+            user_notes: str = "",
+            context_data: Optional[Dict[str, Any]] = None
+        ) -> Dict[str, Any]:
+            """
+            verify_diagnosis for the async triage path (awaits the Gemini call).
+            """
+            try:
+                prompt = self._prepare_verification_prompt(
+                    user_symptoms, system_predictions, species, user_notes, context_data
                 )
+                logger.info(f"🤖 Sending diagnosis verification request to Gemini (~{estimate_tokens(prompt)} prompt tokens)...")
                 
-                # Call Gemini
-                model = get_gemini_client()
-                logger.info("🤖 Sending diagnosis verification request to Gemini...")
+                response_text = await agenerate_text(prompt, 'verification')
+                return self._parse_verification_response(response_text)
+            
+            except LLMUnavailableError as e:
+                logger.warning(f"⚡ Gemini unavailable, skipping verification: {e}")
+                return self._default_verification_result()
+            except Exception as e:
+                logger.error(f"✗ Diagnosis verification failed: {e}")
+                logger.exception(e)
+                return self._default_verification_result()
+        
+        def _parse_verification_response(self, response_text: Optional[str]) -> Dict[str, Any]:
+            if not response_text:
+                logger.warning("⚠️ Gemini returned empty response, using default verification")
+                return self._default_verification_result()
+            
+            # Parse Gemini's JSON response
+            logger.info(f"📋 Gemini verification response: {response_text[:200]}...")
+            
+            # Try to extract JSON from response (handle markdown code blocks)
+            json_text = self._extract_json_from_response(response_text)
+            
+            try:
+                verification_result = json.loads(json_text)
+                logger.info("✓ Successfully parsed Gemini verification response")
                 
-                response = model.generate_content(prompt)
+                # Force print to console for visibility
+                print(f"\n🧠 [HYBRID AI BRAIN] Verification Result:")
+                print(f"   - Agreement: {verification_result.get('agreement')}")
+                print(f"   - Reasoning: {verification_result.get('reasoning')}")
+                print(f"   - Risk: {verification_result.get('risk_assessment')}")
+                if not verification_result.get('agreement'):
+                    print(f"   - ⚠️  CORRECTION: {verification_result.get('alternative_diagnosis')}")
+                print("-" * 50 + "\n")
                 
-                if not response or not hasattr(response, 'text') or not response.text:
-                    logger.warning("⚠️ Gemini returned empty response, using default verification")
-                    return self._default_verification_result()
+                # Validate and normalize the response
+                return self._normalize_verification_result(verification_result)
                 
-                # Parse Gemini's JSON response
-                response_text = response.text.strip()
-                logger.info(f"📋 Gemini verification response: {response_text[:200]}...")
+            except json.JSONDecodeError as e:
+                logger.error(f"✗ Failed to parse Gemini JSON response: {e}")
+                logger.error(f"   Response text: {response_text}")
+                return self._default_verification_result()
+        
+        @timed('verification')
+        def verify_with_extraction(
+            self,
+            user_symptoms: List[str],
+            system_predictions: List[Dict[str, Any]],
+            species: str = "Dog",
+            user_notes: str = "",
+            context_data: Optional[Dict[str, Any]] = None
+        ) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+            """
+            Single Gemini call that returns the normalized symptom terms from the
+            user's notes together with the verification JSON.
+            
+            Args:
+                user_symptoms: Symptoms found so far (checkboxes + regex extraction)
+                system_predictions: Engine candidates ranked from user_symptoms
+            
+            Returns:
+                (normalized_symptom_terms, verification_result), or None if the call or
+                parsing failed so the caller can fall back to the two-call path.
+            """
+            try:
+                prompt = self._prepare_verification_prompt(
+                    user_symptoms, system_predictions, species, user_notes, context_data
+                ) + self._build_extraction_addendum(species)
                 
-                # Try to extract JSON from response (handle markdown code blocks)
-                json_text = self._extract_json_from_response(response_text)
+                logger.info(f"🤖 Sending combined extraction + verification request to Gemini (~{estimate_tokens(prompt)} prompt tokens)...")
+                response_text = generate_text(prompt, 'verification_with_extraction')
+            except LLMUnavailableError as e:
+                logger.warning(f"⚡ Gemini unavailable for combined extraction + verification: {e}")
+                return None
+            except Exception as e:
+                logger.error(f"✗ Combined extraction + verification failed: {e}")
+                return None
+            return self._parse_combined_response(response_text)
+        
+        @timed('verification')
+        async def averify_with_extraction(
+            self,
+            user_symptoms: List[str],
+            system_predictions: List[Dict[str, Any]],
+            species: str = "Dog",
+            user_notes: str = "",
+            context_data: Optional[Dict[str, Any]] = None
+        ) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+            """verify_with_extraction for the async triage path (awaits the Gemini call)."""
+            try:
+                prompt = self._prepare_verification_prompt(
+                    user_symptoms, system_predictions, species, user_notes, context_data
+                ) + self._build_extraction_addendum(species)
                 
-                try:
-                    verification_result = json.loads(json_text)
-                    logger.info("✓ Successfully parsed Gemini verification response")
-                    
-                    # Force print to console for visibility
-                    print(f"\n🧠 [HYBRID AI BRAIN] Verification Result:")
-                    print(f"   - Agreement: {verification_result.get('agreement')}")
-                    print(f"   - Reasoning: {verification_result.get('reasoning')}")
-                    print(f"   - Risk: {verification_result.get('risk_assessment')}")
-                    if not verification_result.get('agreement'):
-                        print(f"   - ⚠️  CORRECTION: {verification_result.get('alternative_diagnosis')}")
-                    print("-" * 50 + "\n")
-                    
-                    # Validate and normalize the response
-                    return self._normalize_verification_result(verification_result)
-                    
-                except json.JSONDecodeError as e:
-                    logger.error(f"✗ Failed to parse Gemini JSON response: {e}")
-                    logger.error(f"   Response text: {response_text}")
-                    return self._default_verification_result()
-            
+                logger.info(f"🤖 Sending combined extraction + verification request to Gemini (~{estimate_tokens(prompt)} prompt tokens)...")
+                response_text = await agenerate_text(prompt, 'verification_with_extraction')
+            except LLMUnavailableError as e:
+                logger.warning(f"⚡ Gemini unavailable for combined extraction + verification: {e}")
+                return None
             except Exception as e:
-                logger.error(f"✗ Diagnosis verification failed: {e}")
-                logger.exception(e)
-                return self._default_verification_result()
+                logger.error(f"✗ Combined extraction + verification failed: {e}")
+                return None
+            return self._parse_combined_response(response_text)
+        
+        def _parse_combined_response(self, response_text: Optional[str]) -> Optional[Tuple[List[str], Dict[str, Any]]]:
+            if not response_text:
+                logger.warning("⚠️ Gemini returned empty combined response")
+                return None
+            try:
+                result = json.loads(self._extract_json_from_response(response_text))
+            except Exception as e:
+                logger.error(f"✗ Combined extraction + verification failed: {e}")
+                return None
+            if not isinstance(result, dict):
+                return None
+            
+            raw_terms = result.get("normalized_symptoms") or []
+            if isinstance(raw_terms, str):
+                raw_terms = [] if raw_terms.strip().lower() in ('none', 'n/a', '') else raw_terms.split(',')
+            normalized_terms = [str(term).strip() for term in raw_terms if str(term).strip()]
+            
+            logger.info(f"✓ Combined call: {len(normalized_terms)} normalized symptoms, agreement={result.get('agreement')}")
+            return normalized_terms, self._normalize_verification_result(result)
+        
+        def _prepare_verification_prompt(
+            self,
+            user_symptoms: List[str],
+            system_predictions: List[Dict[str, Any]],
+            species: str,
+            user_notes: str,
+            context_data: Optional[Dict[str, Any]]
+        ) -> str:
+            """
+            Build the verification prompt within prompt_token_budget: only the candidate
+            diseases and their neighbours are listed, and long notes/history are truncated
+            to whatever the fixed instructions leave of the budget.
+            """
+            valid_diseases_list = self._candidate_diseases(species, system_predictions)
+            predictions_text = self._format_predictions(system_predictions)
+            user_symptoms = list(user_symptoms)[:MAX_PROMPT_SYMPTOMS]
+            
+            # Prepare context data
+            if context_data is None:
+                context_data = {}
+            if not user_notes and context_data.get('user_notes'):
+                user_notes = context_data.get('user_notes', '')
+            medical_history = context_data.get('medical_history', '') or ''
+            
+            def build(notes, history):
+                return self._build_verification_prompt(
+                    user_symptoms=user_symptoms,
+                    predictions_text=predictions_text,
+                    valid_diseases=valid_diseases_list,
+                    species=species,
+                    user_notes=notes,
+                    context_data={**context_data, 'medical_history': history}
+                )
+            
+            fixed_tokens = estimate_tokens(build('None', ''))
+            available = max(2 * MIN_CONTEXT_TOKENS, self.prompt_token_budget - fixed_tokens)
+            notes_tokens = min(MAX_NOTES_TOKENS, max(MIN_CONTEXT_TOKENS, available * 2 // 3))
+            notes = truncate_to_tokens(user_notes, notes_tokens)
+            history_tokens = min(MAX_HISTORY_TOKENS, max(MIN_CONTEXT_TOKENS, available - estimate_tokens(notes)))
+            history = truncate_to_tokens(medical_history, history_tokens)
+            
+            prompt = build(notes, history)
+            logger.info(
+                f"📏 Verification prompt ~{estimate_tokens(prompt)} tokens (budget {self.prompt_token_budget}; "
+                f"{len(valid_diseases_list)} listed conditions, notes {estimate_tokens(user_notes)}->{estimate_tokens(notes)}, "
+                f"history {estimate_tokens(medical_history)}->{estimate_tokens(history)})"
+            )
+            return prompt
+        
+        def _candidate_diseases(self, species: str, predictions: List[Dict[str, Any]]) -> List[str]:
+            """
+            Top-k predicted diseases plus their nearest neighbours by symptom overlap.
+            
+            Neighbours come from the same species, or from every species when the
+            species is not in the knowledge base.
+            """
+            pool = [key for key in self.disease_symptoms if key[0] == species] or list(self.disease_symptoms)
+            by_name = {}
+            for key in pool:
+                by_name.setdefault(key[1].lower(), key)
+            
+            candidates = []
+            for pred in predictions[:CANDIDATE_TOP_K]:
+                name = pred.get('disease')
+                if not name or name in candidates:
+                    continue
+                candidates.append(name)
+                key = by_name.get(name.lower())
+                if key is None:
+                    continue
+                symptoms = self.disease_symptoms[key]
+                neighbours = sorted(
+                    (other for other in pool if other[1].lower() != name.lower()),
+                    key=lambda other: _jaccard(symptoms, self.disease_symptoms[other]),
+                    reverse=True
+                )
+                added = 0
+                for other in neighbours:
+                    if added >= NEIGHBOURS_PER_CANDIDATE or _jaccard(symptoms, self.disease_symptoms[other]) == 0:
+                        break
+                    if other[1] not in candidates:
+                        candidates.append(other[1])
+                        added += 1
+            return candidates
+        
+        def _build_extraction_addendum(self, species: str) -> str:
+            """Extra instructions that fold the terminologist extraction into the verification call."""
+            return f"""
+            *** SYMPTOM EXTRACTION (COMBINED MODE) ***
+            Also act as a senior veterinary terminologist with expertise in {species} medicine.
+            1. Translate the User's Typed Notes to English if in Tagalog/Taglish.
+            2. Identify specific symptoms for a {species}. (Example for exotics: "floating sideways" -> "swimming_sideways", "heavy breathing" -> "tail_bobbing").
+            3. Convert them to standard medical terms.
+            Add them to the JSON above as an extra field:
+                "normalized_symptoms": ["term 1", "term 2"]
+            Use an empty list if there are none. Return ONE JSON object only.
+            """
         
         def _format_predictions(self, predictions: List[Dict[str, Any]]) -> str:
             """Format predictions for the prompt."""
@@ -200,6 +438,7 @@ class DiagnosisVerifier:
             - User's Typed Notes: "{user_notes_text}"
             - Checkbox Symptoms: {symptoms_str}
             - Database Predictions: {preds_str}
+            - Database Conditions (candidates and similar): {', '.join(valid_diseases) if valid_diseases else 'None'}
             {f"- History: {medical_history}" if medical_history else ""}
 
             *** CLINICAL REASONING INSTRUCTIONS ***
@@ -350,6 +589,13 @@ class DiagnosisVerifier:
             if not global_consistent and specific_matched:
                 global_consistent = specific_matched
 
+            # The prompt lists only candidate conditions, so database membership is checked locally
+            alt_name = alt_diag_data.get("name")
+            if self.valid_diseases and isinstance(alt_name, str) and alt_name.strip():
+                is_in_database = alt_name.strip().lower() in self.valid_diseases
+            else:
+                is_in_database = bool(alt_diag_data.get("is_in_database", False))
+
             normalized = {
                 "agreement": bool(raw_agreement),
                 "reasoning": result.get("reasoning", "No specific reasoning provided."),
@@ -367,8 +613,8 @@ class DiagnosisVerifier:
                 "secondary_advice": result.get("secondary_advice", []),
 
                 "alternative_diagnosis": {
-                    "name": alt_diag_data.get("name"),
-                    "is_in_database": bool(alt_diag_data.get("is_in_database", False)),
+                    "name": alt_name,
+                    "is_in_database": is_in_database,
                     "confidence": max(0.0, min(1.0, float(alt_diag_data.get("confidence") or 0.0))),
                     "matched_symptoms": specific_matched
                 }
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+ONNX Encoder - onnxruntime CPU backend for the sentence-transformer
+
+Drop-in replacement for SentenceTransformer.encode used by SmartTriageEngine
+when EMBEDDING_BACKEND is 'onnx' or 'onnx-int8'. The transformer is exported to
+ONNX once (optionally with dynamic int8 weight quantization) and stored under
+the embedding cache directory; later processes only need onnxruntime, the
+`tokenizers` package and NumPy (requirements-onnx.txt), so PyTorch is never
+imported at runtime.
+
+The export is accepted only if its embeddings stay within ONNX_COSINE_TOLERANCE
+(minimum cosine similarity) of the PyTorch model on a set of probe phrases;
+otherwise create_encoder falls back to PyTorch.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import List, Union
+
+import numpy as np
+from decouple import config
+
+from embedding_store import DEFAULT_CACHE_DIR, file_lock
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+DEFAULT_BACKEND = config('EMBEDDING_BACKEND', default='torch')
+
+# Minimum cosine similarity between ONNX and PyTorch embeddings on the probe set
+DEFAULT_COSINE_TOLERANCE = config('ONNX_COSINE_TOLERANCE', default=0.99, cast=float)
+
+# paraphrase-multilingual-MiniLM-L12-v2 is configured with max_seq_length=128
+MAX_SEQ_LENGTH = 128
+ENCODE_BATCH_SIZE = 32
+ONNX_OPSET = 17
+
+PARITY_PROBE_PHRASES = [
+    "vomiting", "pale gums", "difficulty breathing", "not eating",
+    "nagsusuka", "nagtatae at matamlay", "may sipon at ubo",
+    "my dog keeps scratching his ears", "the cat is drinking a lot of water",
+    "floating sideways", "heavy breathing", "bloody diarrhea since yesterday",
+]
+
+
+def get_export_dir(model_name: str, quantize: bool, cache_dir: str = None) -> str:
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'onnx', slug + ('-int8' if quantize else ''))
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Mean pooling over non-padding tokens (same as the model's sentence-transformers Pooling layer)."""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+# ============================================================================
+# EXPORT (needs PyTorch + transformers; runs once per model/backend)
+# ============================================================================
+
+def export_onnx_model(model_name: str, export_dir: str, quantize: bool = False) -> str:
+    """
+    Export the Hugging Face transformer behind `model_name` to ONNX.
+
+    Returns:
+        Path of the exported (and optionally int8-quantized) model.onnx
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(export_dir, exist_ok=True)
+    print(f"🔄 Exporting {model_name} to ONNX ({'int8' if quantize else 'fp32'})...")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors='pt')
+
+    fp32_path = os.path.join(export_dir, 'model_fp32.onnx' if quantize else 'model.onnx')
+    dynamic_axes = {
+        'input_ids': {0: 'batch', 1: 'sequence'},
+        'attention_mask': {0: 'batch', 1: 'sequence'},
+        'last_hidden_state': {0: 'batch', 1: 'sequence'},
+    }
+    export_kwargs = dict(
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['last_hidden_state'],
+        dynamic_axes=dynamic_axes,
+        opset_version=ONNX_OPSET,
+    )
+    with torch.no_grad():
+        try:
+            torch.onnx.export(model, (sample['input_ids'], sample['attention_mask']), fp32_path,
+                              dynamo=False, **export_kwargs)
+        except TypeError:  # older torch without the dynamo switch
+            torch.onnx.export(model, (sample['input_ids'], sample['attention_mask']), fp32_path, **export_kwargs)
+
+    model_path = os.path.join(export_dir, 'model.onnx')
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+    tokenizer.save_pretrained(export_dir)
+    with open(os.path.join(export_dir, 'encoder_config.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'model_name': model_name,
+            'quantized': quantize,
+            'max_seq_length': MAX_SEQ_LENGTH,
+            'pad_token_id': tokenizer.pad_token_id,
+            'pad_token': tokenizer.pad_token,
+        }, f, indent=2)
+    return model_path
+
+
+def check_parity(onnx_encoder: 'OnnxSentenceEncoder', torch_model, phrases: List[str] = None) -> float:
+    """Minimum cosine similarity between ONNX and PyTorch embeddings on the probe phrases."""
+    phrases = phrases or PARITY_PROBE_PHRASES
+    expected = np.asarray(torch_model.encode(phrases, convert_to_numpy=True), dtype=np.float32)
+    actual = onnx_encoder.encode(phrases)
+    return float(cosine_rows(expected, actual).min())
+
+
+# ============================================================================
+# RUNTIME (onnxruntime + tokenizers only)
+# ============================================================================
+
+class OnnxSentenceEncoder:
+    """
+    Mean-pooled sentence embeddings from an exported ONNX transformer.
+
+    Args:
+        export_dir: Directory produced by export_onnx_model
+        num_threads: onnxruntime intra-op threads (0 = onnxruntime default)
+    """
+
+    def __init__(self, export_dir: str, num_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(export_dir, 'encoder_config.json'), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(export_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(export_dir, 'model.onnx'), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.export_dir = export_dir
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = ENCODE_BATCH_SIZE,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Same call shape as SentenceTransformer.encode (NumPy output only)."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            hidden = self.session.run(
+                ['last_hidden_state'], {'input_ids': input_ids, 'attention_mask': attention_mask}
+            )[0]
+            chunks.append(mean_pool(hidden, attention_mask))
+
+        embeddings = np.concatenate(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def create_encoder(model_name: str, backend: str = None, cache_dir: str = None,
+                   tolerance: float = None):
+    """
+    Build the sentence encoder for SmartTriageEngine.
+
+    Args:
+        model_name: Sentence-transformers model id
+        backend: 'torch', 'onnx' or 'onnx-int8' (defaults to EMBEDDING_BACKEND)
+        tolerance: Minimum probe cosine similarity for the ONNX export (ONNX_COSINE_TOLERANCE)
+
+    Returns:
+        (encoder, backend_used) - falls back to ('torch') if the ONNX path fails
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND must be one of {EMBEDDING_BACKENDS}, got {backend!r}")
+
+    if backend != 'torch':
+        quantize = backend == 'onnx-int8'
+        tolerance = DEFAULT_COSINE_TOLERANCE if tolerance is None else tolerance
+        export_dir = get_export_dir(model_name, quantize, cache_dir)
+        marker = os.path.join(export_dir, 'parity.json')
+        try:
+            os.makedirs(export_dir, exist_ok=True)
+            with file_lock(os.path.join(export_dir, '.lock')):
+                if not os.path.exists(marker):
+                    export_onnx_model(model_name, export_dir, quantize)
+                    from sentence_transformers import SentenceTransformer
+                    min_cosine = check_parity(OnnxSentenceEncoder(export_dir), SentenceTransformer(model_name))
+                    with open(marker, 'w', encoding='utf-8') as f:
+                        json.dump({'min_cosine': min_cosine, 'probe_phrases': len(PARITY_PROBE_PHRASES)}, f)
+
+            with open(marker, 'r', encoding='utf-8') as f:
+                min_cosine = json.load(f)['min_cosine']
+            if min_cosine < tolerance:
+                raise ValueError(f"ONNX parity {min_cosine:.5f} below tolerance {tolerance}")
+
+            print(f"✅ Using ONNX Runtime encoder ({backend}, probe cosine >= {min_cosine:.5f})")
+            return OnnxSentenceEncoder(export_dir), backend
+        except Exception as e:
+            logger.warning(f"⚠️ ONNX encoder unavailable ({e}); falling back to PyTorch")
+            print(f"⚠️  ONNX encoder unavailable ({e}); falling back to PyTorch")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name), 'torch'
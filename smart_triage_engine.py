@@ -5,46 +5,129 @@ Smart Triage Engine - Vector Similarity Search for Pet Disease Diagnosis
 
 import csv
 import json
+import threading
 import numpy as np
-from typing import List, Dict, Set, Tuple
-from collections import defaultdict
-from sentence_transformers import SentenceTransformer, util
+from decouple import config
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+from collections import OrderedDict, defaultdict
+from embedding_store import load_or_build_embeddings, normalize_rows, similarity_matrix
+from onnx_encoder import create_encoder
+from utils.timing import timed
+from utils.triage_rules import (CRITICAL_SYMPTOMS, HIGH_URGENCY_SYMPTOMS, MODERATE_URGENCY_SYMPTOMS,
+                                assess_symptom_urgency)
+
+SEMANTIC_MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# Dense retrieval: minimum cosine similarity between the notes and a disease profile
+# (reported as match_percentage, so 0.50 lines up with build_predictions' 50% floor)
+DENSE_RETRIEVAL_MIN_SIMILARITY = 0.50
+
+# Entries per phrase cache (phrase -> embedding, phrase -> matches); 0 disables caching
+PHRASE_CACHE_SIZE = config('PHRASE_CACHE_SIZE', default=4096, cast=int)
 
 # ============================================================================
 # LAYER 1: RED FLAG SYMPTOMS (Clinical Triage Standards)
 # ============================================================================
 
-CRITICAL_SYMPTOMS = {
-    'difficulty_breathing', 'seizures', 'tremors', 'blue_gums', 'collapse', 
-    'uncontrolled_bleeding', 'unconscious', 'not_breathing',
-    'severe_trauma', 'poisoning', 'bloat', 'heatstroke',
-    'sudden_paralysis', 'respiratory_distress', 'cardiac_arrest',
-    'profuse_bleeding', 'severe_burn'
-}
-
-HIGH_URGENCY_SYMPTOMS = {
-    'bloody_diarrhea', 'blood_in_vomit', 'eye_injury', 'severe_pain',
-    'distended_abdomen', 'unable_to_urinate', 'straining_to_urinate',
-    'blood_in_urine', 'severe_vomiting', 'profuse_diarrhea',
-    'broken_bone', 'deep_wound', 'bite_wound', 'labored_breathing',
-    'pale_gums', 'yellow_gums', 'high_fever', 'severe_lethargy'
-}
-
-MODERATE_URGENCY_SYMPTOMS = {
-    'vomiting', 'diarrhea', 'loss_of_appetite', 'lethargy',
-    'coughing', 'sneezing', 'limping', 'ear_infection',
-    'skin_lesions', 'itching', 'discharge', 'fever', 'dehydration'
-}
+# CRITICAL_SYMPTOMS / HIGH_URGENCY_SYMPTOMS / MODERATE_URGENCY_SYMPTOMS are defined in the
+# shared rule table (utils/triage_rules.py) and re-exported from this module
 
 # ============================================================================
 # LAYER 2: KNOWLEDGE BASE LOADER
 # ============================================================================
 
+def normalize_symptom_code(symptom: str) -> str:
+    """Canonical form used for symptom matching (lowercase, underscores)."""
+    return symptom.lower().replace(' ', '_')
+
+
+class CompiledDiseaseIndex:
+    """
+    Symptom-vocabulary x disease incidence matrix for a list of disease profiles.
+
+    Compiled once when the knowledge base loads. The matrix is stored column-major
+    (CSC): for every vocabulary symptom we keep the row ids of the diseases that list
+    it. Scoring a request is a sparse mat-vec - gather the columns of the user's
+    symptoms and bincount them into per-disease match counts - followed by an
+    argpartition for the top-n, instead of a Python loop over every disease.
+    """
+
+    def __init__(self, diseases: List[Dict]):
+        self.diseases = diseases
+        self.vocabulary: Dict[str, int] = {}
+        self.disease_symptom_sets: List[frozenset] = []
+
+        column_rows = []
+        for row, disease in enumerate(diseases):
+            codes = frozenset(normalize_symptom_code(s) for s in disease['symptoms'])
+            self.disease_symptom_sets.append(codes)
+            for code in codes:
+                column = self.vocabulary.setdefault(code, len(self.vocabulary))
+                if column == len(column_rows):
+                    column_rows.append([])
+                column_rows[column].append(row)
+
+        self.indptr = np.zeros(len(column_rows) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(rows) for rows in column_rows])
+        self.indices = np.fromiter(
+            (row for rows in column_rows for row in rows), dtype=np.int32, count=int(self.indptr[-1])
+        )
+        self.disease_sizes = np.array([len(codes) for codes in self.disease_symptom_sets], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.diseases)
+
+    def match(self, user_symptoms: List[str], top_n: int = 5) -> List[Dict]:
+        """
+        Same 70/30 user/disease coverage score as DiseaseMatched.match_diseases,
+        ordered by rounded match percentage with ties kept in knowledge-base order.
+        """
+        user_symptom_set = set(normalize_symptom_code(s) for s in user_symptoms)
+        if not user_symptom_set or not self.diseases or top_n <= 0:
+            return []
+
+        columns = [self.vocabulary[code] for code in user_symptom_set if code in self.vocabulary]
+        if not columns:
+            return []
+
+        hits = np.concatenate([self.indices[self.indptr[c]:self.indptr[c + 1]] for c in columns])
+        matched_counts = np.bincount(hits, minlength=len(self.diseases))
+
+        rows = np.flatnonzero(matched_counts)
+        matched = matched_counts[rows].astype(np.float64)
+        user_coverage = matched / len(user_symptom_set)
+        disease_coverage = matched / self.disease_sizes[rows]
+        scores = (0.7 * user_coverage) + (0.3 * disease_coverage)
+        percentages = np.round(scores * 100, 1)
+
+        if len(rows) > top_n:
+            kth = np.partition(percentages, len(percentages) - top_n)[len(percentages) - top_n]
+            keep = percentages >= kth
+            rows, scores, user_coverage, percentages = rows[keep], scores[keep], user_coverage[keep], percentages[keep]
+
+        order = np.lexsort((rows, -percentages))[:top_n]
+
+        results = []
+        for i in order:
+            disease = self.diseases[rows[i]]
+            results.append({
+                'disease': disease['disease_name'],
+                'match_percentage': round(float(scores[i]) * 100, 1),
+                'matched_symptoms': list(user_symptom_set & self.disease_symptom_sets[rows[i]]),
+                'user_coverage': round(float(user_coverage[i]) * 100, 1),
+                'base_urgency': disease['base_urgency'],
+                'contagious': disease['contagious'],
+                'total_disease_symptoms': len(disease['symptoms'])
+            })
+        return results
+
+
 class DiseaseKnowledgeBase:
     def __init__(self, csv_path='knowledge_base_enhanced.csv'):
         self.diseases = []
         self.diseases_by_species = defaultdict(list)
         self.load_knowledge_base(csv_path)
+        self.compile_indexes()
     
     def load_knowledge_base(self, csv_file: str):
         try:
@@ -68,9 +151,20 @@ class DiseaseKnowledgeBase:
         except FileNotFoundError:
             print(f"Error: {csv_file} not found. Using empty knowledge base.")
     
+    def compile_indexes(self):
+        """Compile one sparse symptom x disease index per species, plus one across all species."""
+        self.indexes_by_species = {
+            species: CompiledDiseaseIndex(diseases)
+            for species, diseases in self.diseases_by_species.items()
+        }
+        self.all_species_index = CompiledDiseaseIndex(self.diseases)
+
     def get_diseases_for_species(self, species: str) -> List[Dict]:
         return self.diseases_by_species.get(species, [])
 
+    def get_index_for_species(self, species: str) -> 'CompiledDiseaseIndex':
+        return self.indexes_by_species.get(species)
+
 # ============================================================================
 # LAYER 3: URGENCY DETECTOR
 # ============================================================================
@@ -78,21 +172,7 @@ class DiseaseKnowledgeBase:
 class UrgencyDetector:
     @staticmethod
     def assess_urgency(symptoms: List[str]) -> Tuple[str, str, List[str]]:
-        symptoms_set = set(s.lower().replace(' ', '_') for s in symptoms)
-        
-        critical_found = symptoms_set.intersection(CRITICAL_SYMPTOMS)
-        if critical_found:
-            return ("CRITICAL", f"Life-threatening symptoms detected: {', '.join(critical_found)}", list(critical_found))
-        
-        high_found = symptoms_set.intersection(HIGH_URGENCY_SYMPTOMS)
-        if high_found:
-            return ("HIGH", f"Urgent symptoms detected: {', '.join(high_found)}", list(high_found))
-        
-        moderate_found = symptoms_set.intersection(MODERATE_URGENCY_SYMPTOMS)
-        if moderate_found:
-            return ("MODERATE", f"Symptoms require veterinary attention: {', '.join(moderate_found)}", list(moderate_found))
-        
-        return ("LOW", "Routine symptoms - monitor and consult vet if worsens", [])
+        return assess_symptom_urgency(symptoms)
 
 # ============================================================================
 # LAYER 4: DISEASE MATCHER
@@ -121,6 +201,8 @@ class DiseaseMatched:
     
     @staticmethod
     def match_diseases(user_symptoms: List[str], diseases: List[Dict], top_n: int = 5) -> List[Dict]:
+        # Uncompiled reference path for ad-hoc disease lists. Knowledge-base lookups
+        # go through DiseaseKnowledgeBase's CompiledDiseaseIndex instead.
         user_symptom_set = set(s.lower().replace(' ', '_') for s in user_symptoms)
         results = []
         
@@ -146,35 +228,135 @@ class DiseaseMatched:
 # LAYER 5: SMART TRIAGE ENGINE (Main Orchestrator)
 # ============================================================================
 
+def normalize_phrase(text: str) -> str:
+    """Cache key for a user/LLM phrase: lowercased, whitespace collapsed."""
+    return ' '.join(text.lower().split())
+
+
+class PhraseLRUCache:
+    """
+    Thread-safe bounded LRU mapping with hit/miss counters.
+
+    Args:
+        max_entries: Size bound; 0 disables the cache (every lookup is a miss)
+    """
+
+    def __init__(self, max_entries: int = PHRASE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
 class SmartTriageEngine:
-    def __init__(self, knowledge_base_file: str):
+    def __init__(self, knowledge_base_file: str, load_semantic_model: bool = True):
+        """
+        Args:
+            knowledge_base_file: Disease knowledge base CSV
+            load_semantic_model: Set False for a lightweight engine (diagnose only) when
+                semantic matching is served by the triage sidecar; call
+                load_semantic_model() later to enable it in-process.
+        """
         self.knowledge_base = DiseaseKnowledgeBase(knowledge_base_file)
         self.urgency_detector = UrgencyDetector()
         self.disease_matcher = DiseaseMatched()
         
-        # === HYBRID EXTRACTION: Sentence Transformer for semantic matching ===
-        print("🔄 Loading multilingual sentence transformer for semantic symptom matching...")
-        from sentence_transformers import SentenceTransformer
-        self.semantic_model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+        self.semantic_model = None
+        self.embedding_backend = None
         
-        # Cache for symptom embeddings (computed once at startup)
+        # Cache for symptom embeddings (normalized, memory-mapped from the on-disk cache;
+        # float32 or quantized per EMBEDDING_QUANTIZATION)
         self.symptom_vectors = None
         self.symptom_names = []
         
+        # Disease profile embeddings for dense retrieval (rows follow knowledge_base.diseases)
+        self.disease_profile_vectors = None
+        self._profile_rows_by_species = {}
+        
+        # Repeat phrases ("nagsusuka", "not eating") skip the forward pass / similarity search.
+        # Both caches are cleared whenever the symptom vector index is (re)built.
+        self.embedding_cache = PhraseLRUCache()
+        self.match_cache = PhraseLRUCache()
+        
+        if load_semantic_model:
+            self.load_semantic_model()
+    
+    def load_semantic_model(self):
+        """Load the sentence transformer and the cached symptom vectors."""
+        # === HYBRID EXTRACTION: Sentence Transformer for semantic matching ===
+        # PyTorch or ONNX Runtime, per EMBEDDING_BACKEND
+        print("🔄 Loading multilingual sentence transformer for semantic symptom matching...")
+        self.semantic_model, self.embedding_backend = create_encoder(SEMANTIC_MODEL_NAME)
+        
         # Load and cache symptom vectors
         self.cache_symptom_vectors()
+        self.cache_disease_profile_vectors()
+    
+    def with_knowledge_base(self, knowledge_base_file: str) -> 'SmartTriageEngine':
+        """
+        New engine over another knowledge base CSV that shares this engine's sentence
+        transformer, symptom vectors and phrase caches (they depend on the symptom
+        vocabulary, not the diseases), so only the disease indexes and profiles are built.
+        """
+        engine = SmartTriageEngine(knowledge_base_file, load_semantic_model=False)
+        engine.semantic_model = self.semantic_model
+        engine.embedding_backend = self.embedding_backend
+        engine.symptom_vectors = self.symptom_vectors
+        engine.symptom_names = self.symptom_names
+        engine.embedding_cache = self.embedding_cache
+        engine.match_cache = self.match_cache
+        if engine.semantic_model is not None:
+            engine.cache_disease_profile_vectors()
+        return engine
     
+    @timed('diagnose')
     def diagnose(self, species: str, symptoms: List[str], top_n: int = 5) -> Dict:
         # Step 1: Assess urgency
         urgency_level, urgency_reason, red_flags = self.urgency_detector.assess_urgency(symptoms)
         
-        # Step 2: Filter diseases
-        relevant_diseases = self.knowledge_base.get_diseases_for_species(species)
+        # Step 2: Filter diseases (compiled per-species index)
+        species_index = self.knowledge_base.get_index_for_species(species)
         
         # Step 3: Match diseases
         disease_matches = []
-        if relevant_diseases:
-            disease_matches = self.disease_matcher.match_diseases(symptoms, relevant_diseases, top_n)
+        if species_index:
+            disease_matches = species_index.match(symptoms, top_n)
         
         # Step 4: Construct Response
         recommendations = {
@@ -211,11 +393,13 @@ class SmartTriageEngine:
         """
         Pre-compute embeddings for all symptoms in all_symptoms.json.
         This allows fast semantic matching at runtime.
+        
+        The matrix is persisted by embedding_store and only re-encoded when the
+        model name or the symptom vocabulary changes.
         """
         if self.semantic_model is None:
             print("🔄 Lazy loading multilingual sentence transformer...")
-            from sentence_transformers import SentenceTransformer
-            self.semantic_model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+            self.semantic_model, self.embedding_backend = create_encoder(SEMANTIC_MODEL_NAME)
         # ======================
         try:
             with open('all_symptoms.json', 'r', encoding='utf-8') as f:
@@ -224,12 +408,12 @@ class SmartTriageEngine:
             # FIX: Handle both list and dict formats
             if isinstance(all_symptoms_data, list):
                 # It's already a list of symptom codes (e.g., ["vomiting", "fever", "pale_gums"])
-                self.symptom_names = all_symptoms_data
-                print(f"📋 Loaded {len(self.symptom_names)} symptoms from list format")
+                symptom_names = all_symptoms_data
+                print(f"📋 Loaded {len(symptom_names)} symptoms from list format")
             elif isinstance(all_symptoms_data, dict):
                 # It's a dictionary, extract the keys
-                self.symptom_names = list(all_symptoms_data.keys())
-                print(f"📋 Loaded {len(self.symptom_names)} symptoms from dictionary format")
+                symptom_names = list(all_symptoms_data.keys())
+                print(f"📋 Loaded {len(symptom_names)} symptoms from dictionary format")
             else:
                 print(f"❌ ERROR: Unknown format for all_symptoms.json: {type(all_symptoms_data)}")
                 print(f"   Expected: list or dict, Got: {type(all_symptoms_data)}")
@@ -238,18 +422,26 @@ class SmartTriageEngine:
             
             # Create human-readable descriptions for better semantic matching
             symptom_descriptions = []
-            for code in self.symptom_names:
+            for code in symptom_names:
                 # Use the code as description (e.g., "vomiting", "pale_gums")
                 # Convert underscores to spaces for better semantic matching
                 desc = code.replace('_', ' ')
                 symptom_descriptions.append(desc)
             
-            print(f"🔄 Encoding {len(symptom_descriptions)} symptoms for semantic search...")
-            self.symptom_vectors = self.semantic_model.encode(
-                symptom_descriptions, 
-                convert_to_tensor=True,
-                show_progress_bar=True
+            def encode_descriptions(texts):
+                print(f"🔄 Encoding {len(texts)} symptoms for semantic search...")
+                return self.semantic_model.encode(
+                    texts,
+                    convert_to_numpy=True,
+                    show_progress_bar=True
+                )
+            
+            symptom_vectors = load_or_build_embeddings(
+                self._embedding_cache_model_name(), symptom_descriptions, encode_descriptions
             )
+            # Swap names and rows in together, so a lookup never pairs new names with old rows
+            self.symptom_names = symptom_names
+            self.symptom_vectors = symptom_vectors
             print(f"✅ Symptom vectors cached successfully")
             
         except FileNotFoundError:
@@ -258,6 +450,112 @@ class SmartTriageEngine:
         except Exception as e:
             print(f"⚠️  Error caching symptom vectors: {e}")
             self.symptom_vectors = None
+        finally:
+            # After the new index is in place: matches cached against the old one while
+            # this ran are dropped too
+            self.clear_phrase_caches()
+    
+    def _embedding_cache_model_name(self) -> str:
+        # ONNX embeddings differ slightly from PyTorch, so each backend gets its own cache file
+        if self.embedding_backend != 'torch':
+            return f"{SEMANTIC_MODEL_NAME}@{self.embedding_backend}"
+        return SEMANTIC_MODEL_NAME
+    
+    @staticmethod
+    def disease_profile_text(disease: Dict) -> str:
+        """Text embedded for dense retrieval, e.g. "Canine Influenza: coughing, fever, nasal discharge"."""
+        symptoms = ', '.join(s.replace('_', ' ') for s in disease['symptoms'])
+        return f"{disease['disease_name']}: {symptoms}"
+    
+    def cache_disease_profile_vectors(self, encode_fn=None, cache_model_name: str = None):
+        """
+        Embed every knowledge-base disease profile (name + symptom list) once, so raw
+        notes can be ranked against diseases without an LLM extraction step.
+        Persisted through embedding_store like the symptom vectors.
+        
+        Args:
+            encode_fn: texts -> vectors; defaults to the in-process model (the sidecar
+                engine passes its remote encoder)
+            cache_model_name: Embedding cache key for vectors from encode_fn
+        """
+        diseases = self.knowledge_base.diseases
+        if encode_fn is None and self.semantic_model is not None:
+            encode_fn = lambda texts: self.semantic_model.encode(texts, convert_to_numpy=True)
+            cache_model_name = self._embedding_cache_model_name()
+        if encode_fn is None or not diseases:
+            self.disease_profile_vectors = None
+            return
+        
+        self._profile_rows_by_species = defaultdict(list)
+        for row, disease in enumerate(diseases):
+            self._profile_rows_by_species[disease['species']].append(row)
+        
+        try:
+            self.disease_profile_vectors = load_or_build_embeddings(
+                cache_model_name,
+                [self.disease_profile_text(d) for d in diseases],
+                encode_fn,
+                name='disease_profiles'
+            )
+            print(f"✅ Disease profile vectors cached ({len(diseases)} profiles)")
+        except Exception as e:
+            print(f"⚠️  Error caching disease profile vectors: {e}")
+            self.disease_profile_vectors = None
+    
+    def retrieve_diseases(self, species: str, text: str, top_n: int = 5,
+                          user_symptoms: List[str] = None,
+                          min_similarity: float = DENSE_RETRIEVAL_MIN_SIMILARITY) -> List[Dict]:
+        """
+        Dense retrieval: rank the species' disease profiles by cosine similarity to raw notes.
+        
+        Species without knowledge-base entries are ranked against every profile.
+        
+        Args:
+            species: Pet species
+            text: Free-text notes (e.g. "floating sideways, not eating")
+            top_n: Number of diseases to return
+            user_symptoms: Already-extracted symptom codes, used for matched_symptoms
+            min_similarity: Drop profiles below this cosine similarity
+        
+        Returns:
+            Match dicts shaped like CompiledDiseaseIndex.match, plus 'retrieval_score'
+        """
+        if self.disease_profile_vectors is None or not text or not text.strip():
+            return []
+        return self.match_disease_profiles(
+            species, self.encode_texts([text])[0], top_n, user_symptoms, min_similarity
+        )
+    
+    def match_disease_profiles(self, species: str, query_vector: np.ndarray, top_n: int = 5,
+                               user_symptoms: List[str] = None,
+                               min_similarity: float = DENSE_RETRIEVAL_MIN_SIMILARITY) -> List[Dict]:
+        """retrieve_diseases for an already-encoded, normalized query vector."""
+        rows = self._profile_rows_by_species.get(species) or range(len(self.knowledge_base.diseases))
+        rows = np.asarray(rows, dtype=np.int64)
+        similarities = similarity_matrix(self.disease_profile_vectors, query_vector)[0][rows]
+        
+        order = np.lexsort((rows, -similarities))[:top_n]
+        user_symptom_set = set(normalize_symptom_code(s) for s in (user_symptoms or []))
+        
+        results = []
+        for i in order:
+            score = float(similarities[i])
+            if score < min_similarity:
+                break
+            disease = self.knowledge_base.diseases[rows[i]]
+            disease_codes = set(normalize_symptom_code(s) for s in disease['symptoms'])
+            matched = list(user_symptom_set & disease_codes)
+            results.append({
+                'disease': disease['disease_name'],
+                'match_percentage': round(score * 100, 1),
+                'matched_symptoms': matched,
+                'user_coverage': round(len(matched) / len(user_symptom_set) * 100, 1) if user_symptom_set else 0.0,
+                'base_urgency': disease['base_urgency'],
+                'contagious': disease['contagious'],
+                'total_disease_symptoms': len(disease['symptoms']),
+                'retrieval_score': round(score, 4)
+            })
+        return results
     
     def find_similar_symptoms(self, text: str, threshold: float = 0.70) -> List[Tuple[str, float]]:
         """
@@ -270,36 +568,118 @@ class SmartTriageEngine:
         Returns:
             List of tuples: [(symptom_code, similarity_score), ...]
         """
-        if not text.strip() or self.symptom_vectors is None:
-            return []
-
+        return self.find_similar_symptoms_batch([text], threshold=threshold)[0]
+    
+    def find_similar_symptoms_batch(self, texts: List[str], threshold: float = 0.70,
+                                    top_k: int = None) -> List[List[Tuple[str, float]]]:
+        """
+        Batched version of find_similar_symptoms: one encode call for all texts and
+        a single similarity matrix against the cached symptom vectors.
         
-
+        Args:
+            texts: Candidate terms (e.g. every term Gemini returned)
+            threshold: Minimum similarity score (0-1)
+            top_k: Keep at most this many matches per text (None = all above threshold)
         
+        Returns:
+            One list of (symptom_code, similarity_score) per input text, highest first
+        """
+        results = [[] for _ in texts]
+        if self.symptom_vectors is None:
+            return results
+        
+        # Serve repeat phrases from the match cache; the rest are searched together
+        misses = defaultdict(list)
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            cache_key = (normalize_phrase(text), threshold, top_k)
+            cached = self.match_cache.get(cache_key)
+            if cached is not None:
+                results[i] = list(cached)
+            else:
+                misses[cache_key].append(i)
+        if not misses:
+            return results
         
         try:
-            # Encode user text
-            text_embedding = self.semantic_model.encode(text, convert_to_tensor=True)
-            
-            # Compute cosine similarity with all cached symptom vectors
-            similarities = util.cos_sim(text_embedding, self.symptom_vectors)[0]
-            
-            # Filter by threshold and convert to list of tuples
-            matches = []
-            for idx, score in enumerate(similarities):
-                score_float = float(score)
-                if score_float >= threshold:
-                    symptom_code = self.symptom_names[idx]
-                    matches.append((symptom_code, score_float))
-            
-            # Sort by similarity score (highest first)
-            matches.sort(key=lambda x: x[1], reverse=True)
-            
-            return matches
+            # One forward pass for every uncached term
+            cache_keys = list(misses)
+            query_vectors = self.encode_texts([texts[misses[key][0]] for key in cache_keys])
+            for cache_key, matches in zip(cache_keys, self.match_query_vectors(query_vectors, threshold, top_k)):
+                self.match_cache.put(cache_key, tuple(matches))
+                for position in misses[cache_key]:
+                    results[position] = list(matches)
+            return results
             
         except Exception as e:
             print(f"⚠️  Error in semantic matching: {e}")
-            return []
+            return [[] for _ in texts]
+    
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into L2-normalized float32 vectors (one row per text).
+        
+        Phrases seen before come from the embedding cache; only new ones are encoded.
+        """
+        keys = [normalize_phrase(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self.embedding_cache.get(key) for key in keys]
+        
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing:
+            first_text = {}
+            for key, text in zip(keys, texts):
+                first_text.setdefault(key, text)
+            encoded = normalize_rows(self.semantic_model.encode(
+                [first_text[key] for key in missing], convert_to_numpy=True
+            ))
+            fresh = {}
+            for key, vector in zip(missing, encoded):
+                vector.setflags(write=False)
+                fresh[key] = vector
+                self.embedding_cache.put(key, vector)
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        
+        if not vectors:
+            return normalize_rows(self.semantic_model.encode(texts, convert_to_numpy=True))
+        return np.stack(vectors)
+    
+    def clear_phrase_caches(self):
+        """Drop cached phrase embeddings and matches (called when the symptom index is rebuilt)."""
+        self.embedding_cache.clear()
+        self.match_cache.clear()
+    
+    def phrase_cache_stats(self) -> Dict:
+        return {
+            'embeddings': self.embedding_cache.stats(),
+            'matches': self.match_cache.stats(),
+        }
+    
+    def match_query_vectors(self, query_vectors: np.ndarray, threshold: float = 0.70,
+                            top_k: int = None) -> List[List[Tuple[str, float]]]:
+        """
+        Symptom matches for already-encoded, normalized query vectors.
+        
+        Returns:
+            One list of (symptom_code, similarity_score) per row, highest first
+        """
+        similarities = similarity_matrix(self.symptom_vectors, query_vectors)
+        
+        n_symptoms = similarities.shape[1]
+        if top_k is not None and top_k < n_symptoms:
+            candidates = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+        else:
+            candidates = np.broadcast_to(np.arange(n_symptoms), similarities.shape)
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        
+        results = []
+        for row in range(similarities.shape[0]):
+            keep = candidate_scores[row] >= threshold
+            idx = candidates[row][keep]
+            scores = candidate_scores[row][keep]
+            # Highest score first; ties keep vocabulary order
+            order = np.lexsort((idx, -scores))
+            results.append([(self.symptom_names[idx[j]], float(scores[j])) for j in order])
+        return results
 
 if __name__ == "__main__":
     # Quick test
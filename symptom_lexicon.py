@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Symptom Lexicon - Compiled alias matcher for free-text symptom extraction
+
+Every alias in symptom_aliases.json and every canonical code in all_symptoms.json
+is compiled once into a single trie-backed regex, so user notes are scanned in one
+pass instead of one re.search per phrase. The lexicon is rebuilt only when one of
+the JSON files changes on disk (mtime check).
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ALIASES_PATH = os.path.join(BASE_DIR, 'symptom_aliases.json')
+DEFAULT_SYMPTOMS_PATH = os.path.join(BASE_DIR, 'all_symptoms.json')
+
+_TRIE_END = ''
+
+# Clause boundaries used for coverage checks (English + common Tagalog connectors)
+CLAUSE_SPLIT_RE = re.compile(r',|\b(?:and|at|tapos|then|also|plus|but|with|saka)\b', re.IGNORECASE)
+TOKEN_RE = re.compile(r"[a-z0-9']+", re.IGNORECASE)
+
+# Words that carry no symptom information; ignored when counting unknown tokens
+FILLER_WORDS = frozenset({
+    # English
+    'a', 'an', 'the', 'my', 'our', 'his', 'her', 'its', 'it', 'he', 'she', 'they', 'i', 'we',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'has', 'have', 'had', 'having',
+    'does', 'did', 'do', 'seems', 'seem', 'looks', 'look', 'keeps', 'keep', 'started', 'starting',
+    'very', 'really', 'so', 'too', 'bit', 'little', 'lot', 'lots', 'much', 'some', 'lately', 'again',
+    'since', 'for', 'from', 'of', 'in', 'on', 'to', 'at', 'today', 'yesterday', 'last', 'night',
+    'morning', 'day', 'days', 'week', 'weeks', 'hour', 'hours', 'now', 'ago', 'times', 'time',
+    'pet', 'dog', 'puppy', 'cat', 'kitten', 'rabbit', 'bunny', 'hamster', 'bird', 'fish', 'turtle',
+    # Tagalog / Taglish
+    'ang', 'ng', 'sa', 'si', 'ni', 'ko', 'akin', 'aking', 'yung', 'ung', 'po', 'na', 'pa', 'lang',
+    'siya', 'niya', 'nya', 'sya', 'mga', 'din', 'rin', 'kasi', 'aso', 'pusa', 'kanina', 'kahapon',
+    'ngayon', 'araw', 'palagi', 'lagi', 'medyo', 'sobrang', 'talaga', 'parang', 'may', 'meron',
+})
+
+
+def _build_trie(phrases: List[str]) -> Dict:
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_TRIE_END] = True
+    return trie
+
+
+def _trie_to_regex(node: Dict) -> str:
+    """
+    Convert a character trie into a regex. Optional tails are greedy, so at any
+    position the longest phrase is tried first and shorter ones only on backtrack.
+    """
+    branches = [
+        re.escape(char) + _trie_to_regex(child)
+        for char, child in sorted(node.items())
+        if char != _TRIE_END
+    ]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if _TRIE_END in node:
+        body = '(?:' + body + ')?'
+    return body
+
+
+class SymptomLexicon:
+    """
+    Phrase -> symptom code lookup compiled into one word-bounded regex.
+
+    Attributes:
+        search_dict: Lowercased phrase (alias, code, or code with spaces) -> symptom code
+        all_symptoms: Canonical symptom codes from all_symptoms.json
+    """
+
+    def __init__(self, aliases_path: str = DEFAULT_ALIASES_PATH, symptoms_path: str = DEFAULT_SYMPTOMS_PATH):
+        self.aliases_path = aliases_path
+        self.symptoms_path = symptoms_path
+        self._compiled: Optional[Tuple[Dict[str, str], List[str], re.Pattern, Dict[str, str]]] = None
+        self._mtimes: Optional[Tuple[float, float]] = None
+        self._lock = threading.Lock()
+        self.reload_if_changed()
+
+    def _current_mtimes(self) -> Tuple[float, float]:
+        return (os.path.getmtime(self.aliases_path), os.path.getmtime(self.symptoms_path))
+
+    def reload_if_changed(self) -> bool:
+        """
+        Rebuild the lexicon if either JSON file changed since the last build.
+
+        Returns:
+            True if a rebuild happened. If a rebuild fails and an older version is
+            loaded, the older version stays active; on the very first load the error
+            is raised to the caller.
+        """
+        try:
+            mtimes = self._current_mtimes()
+        except OSError as e:
+            if self._compiled is None:
+                raise
+            logger.warning(f"⚠️ Symptom lexicon files unavailable, keeping previous version: {e}")
+            return False
+        if mtimes == self._mtimes:
+            return False
+
+        with self._lock:
+            if mtimes == self._mtimes:
+                return False
+            try:
+                with open(self.aliases_path, 'r', encoding='utf-8') as f:
+                    symptom_aliases = json.load(f)
+                with open(self.symptoms_path, 'r', encoding='utf-8') as f:
+                    all_symptoms = json.load(f)
+                if isinstance(all_symptoms, dict):
+                    all_symptoms = list(all_symptoms.keys())
+
+                search_dict = {phrase.lower(): code for phrase, code in symptom_aliases.items()}
+                for symptom in all_symptoms:
+                    search_dict[symptom.lower()] = symptom
+                    search_dict[symptom.replace('_', ' ').lower()] = symptom
+                search_dict.pop('', None)
+
+                pattern = re.compile(r'\b(?:' + _trie_to_regex(_build_trie(search_dict.keys())) + r')\b', re.IGNORECASE)
+                # IGNORECASE matches Unicode case variants ('ſneezing') that .lower() does not
+                # map back to a key, so hits are resolved through their casefold
+                folded_phrases = {phrase.casefold(): phrase for phrase in search_dict}
+            except Exception as e:
+                if self._compiled is None:
+                    raise
+                logger.error(f"✗ Failed to reload symptom lexicon, keeping previous version: {e}")
+                return False
+
+            # Publish the new version in one step so concurrent readers never see a mix
+            self._compiled = (search_dict, all_symptoms, pattern, folded_phrases)
+            self._mtimes = mtimes
+            logger.info(f"✓ Symptom lexicon compiled: {len(search_dict)} phrases")
+            return True
+
+    @property
+    def search_dict(self) -> Dict[str, str]:
+        return self._compiled[0]
+
+    @property
+    def all_symptoms(self) -> List[str]:
+        return self._compiled[1]
+
+    def _scan(self, text: str) -> Tuple[Dict[str, str], List[Tuple[int, int]]]:
+        """(matched phrase -> symptom code, spans of the hits) in order of appearance"""
+        search_dict, _, pattern, folded_phrases = self._compiled
+        matches = {}
+        spans = []
+        for match in pattern.finditer(text):
+            phrase = folded_phrases.get(match.group(0).casefold())
+            if phrase is None:
+                continue
+            matches[phrase] = search_dict[phrase]
+            spans.append(match.span())
+        return matches, spans
+
+    def find_matches(self, text: str) -> Dict[str, str]:
+        """
+        Scan text once and return every longest-match hit.
+
+        Returns:
+            Dict of matched phrase -> symptom code, in order of appearance
+        """
+        return self._scan(text)[0]
+
+    def analyze_coverage(self, text: str) -> Dict:
+        """
+        Describe how completely the lexicon explains the text, clause by clause.
+
+        A token is "unknown" when it is outside every alias hit, is not a filler
+        word and is not a number.
+
+        Returns:
+            Dict with 'matches' (as find_matches), 'clauses' (list of
+            {'text', 'matched', 'unknown_tokens'}), 'content_tokens' and 'unknown_tokens'
+        """
+        matches, spans = self._scan(text)
+
+        clauses = []
+        content_tokens = 0
+        unknown_tokens = 0
+        clause_start = 0
+        boundaries = [m.span() for m in CLAUSE_SPLIT_RE.finditer(text)] + [(len(text), len(text))]
+        for boundary_start, boundary_end in boundaries:
+            start, end = clause_start, boundary_start
+            clause_start = boundary_end
+            clause_text = text[start:end].strip()
+            if not clause_text:
+                continue
+
+            matched = any(s < end and e > start for s, e in spans)
+            unknown = []
+            for token in TOKEN_RE.finditer(text, start, end):
+                word = token.group(0).lower()
+                if word in FILLER_WORDS or word.isdigit():
+                    continue
+                content_tokens += 1
+                if not any(s <= token.start() and token.end() <= e for s, e in spans):
+                    unknown.append(word)
+            if not matched and not unknown:
+                continue
+            unknown_tokens += len(unknown)
+            clauses.append({'text': clause_text, 'matched': matched, 'unknown_tokens': unknown})
+
+        return {
+            'matches': matches,
+            'clauses': clauses,
+            'content_tokens': content_tokens,
+            'unknown_tokens': unknown_tokens,
+        }
+
+
+_symptom_lexicon = None
+_symptom_lexicon_lock = threading.Lock()
+
+
+def get_symptom_lexicon() -> SymptomLexicon:
+    """Process-wide lexicon; reloads transparently when the JSON files change."""
+    global _symptom_lexicon
+    if _symptom_lexicon is None:
+        with _symptom_lexicon_lock:
+            if _symptom_lexicon is None:
+                _symptom_lexicon = SymptomLexicon()
+        return _symptom_lexicon
+    _symptom_lexicon.reload_if_changed()
+    return _symptom_lexicon
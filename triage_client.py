@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Triage Sidecar Client - Pooled Unix-socket client for the api_backend.py sidecar
+
+Django workers use this instead of loading their own sentence transformer:
+semantic matching and embedding go to the shared sidecar process, while the
+cheap compiled knowledge-base lookups (diagnose, dense retrieval ranking) stay
+in-process, so they always use the worker's own knowledge base version. If the sidecar
+is unreachable the engine transparently loads the model in-process and retries
+the sidecar again after a cooldown.
+"""
+
+import http.client
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from smart_triage_engine import DENSE_RETRIEVAL_MIN_SIMILARITY, SEMANTIC_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+# After a failed call, stay on the in-process fallback for this long
+SIDECAR_RETRY_INTERVAL_SECONDS = 30
+
+# Texts per embed request when building the disease profile vectors
+PROFILE_ENCODE_CHUNK = 32
+
+
+class SidecarUnavailable(Exception):
+    """Raised when the triage sidecar cannot be reached or returns an error."""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over an AF_UNIX socket."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class TriageSidecarClient:
+    """
+    Keep-alive connection pool to the triage sidecar.
+
+    Args:
+        socket_path: Unix socket the sidecar listens on (api_backend.py --uds)
+        timeout: Per-request socket timeout in seconds
+        pool_size: Maximum idle connections kept per process
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 2.0, pool_size: int = 8):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+
+        try:
+            conn, reused = self._pool.get_nowait(), True
+        except queue.Empty:
+            conn, reused = UnixHTTPConnection(self.socket_path, self.timeout), False
+
+        while True:
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused:
+                    # Idle keep-alive connection was closed by the sidecar; retry once on a fresh one
+                    conn, reused = UnixHTTPConnection(self.socket_path, self.timeout), False
+                    continue
+                raise SidecarUnavailable(f"{method} {path} failed: {e}") from e
+
+        if response.status != 200:
+            conn.close()
+            raise SidecarUnavailable(f"{method} {path} returned HTTP {response.status}: {data[:200]!r}")
+
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return json.loads(data)
+
+    def health(self) -> dict:
+        return self._request('GET', '/')
+
+    def diagnose(self, species: str, symptoms: List[str], top_n: int = 5) -> dict:
+        return self._request('POST', '/api/diagnose', {'species': species, 'symptoms': symptoms, 'top_n': top_n})
+
+    def find_similar_symptoms_batch(self, texts: List[str], threshold: float = 0.70,
+                                    top_k: int = None) -> List[List[Tuple[str, float]]]:
+        data = self._request('POST', '/api/similar-symptoms', {'texts': texts, 'threshold': threshold, 'top_k': top_k})
+        return [[(code, score) for code, score in matches] for matches in data['matches']]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        data = self._request('POST', '/api/embed', {'texts': texts})
+        return np.asarray(data['vectors'], dtype=np.float32)
+
+
+class SidecarTriageEngine:
+    """
+    Drop-in SmartTriageEngine for Django workers.
+
+    Wraps a lightweight SmartTriageEngine (built with load_semantic_model=False)
+    for knowledge-base work and routes semantic matching through the sidecar,
+    falling back to loading the model in-process when the sidecar is down.
+    """
+
+    def __init__(self, engine, client: TriageSidecarClient):
+        self._engine = engine
+        self.client = client
+        self._fallback_lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._sidecar_down_until = 0.0
+
+    def __getattr__(self, name):
+        # diagnose, knowledge_base, urgency_detector, ... come from the local engine
+        return getattr(self._engine, name)
+
+    def with_knowledge_base(self, knowledge_base_file: str) -> 'SidecarTriageEngine':
+        return SidecarTriageEngine(self._engine.with_knowledge_base(knowledge_base_file), self.client)
+
+    def _local_engine(self):
+        if self._engine.semantic_model is None:
+            with self._fallback_lock:
+                if self._engine.semantic_model is None:
+                    logger.warning("⚠️ Triage sidecar unavailable - loading semantic model in-process")
+                    self._engine.load_semantic_model()
+        return self._engine
+
+    def _sidecar_call(self, client_method: str, engine_method: str, *args, **kwargs):
+        if time.monotonic() < self._sidecar_down_until:
+            return getattr(self._local_engine(), engine_method)(*args, **kwargs)
+        try:
+            return getattr(self.client, client_method)(*args, **kwargs)
+        except SidecarUnavailable as e:
+            logger.warning(f"⚠️ Triage sidecar call failed, using in-process fallback: {e}")
+            self._sidecar_down_until = time.monotonic() + SIDECAR_RETRY_INTERVAL_SECONDS
+            return getattr(self._local_engine(), engine_method)(*args, **kwargs)
+
+    def find_similar_symptoms_batch(self, texts: List[str], threshold: float = 0.70,
+                                    top_k: int = None) -> List[List[Tuple[str, float]]]:
+        return self._sidecar_call(
+            'find_similar_symptoms_batch', 'find_similar_symptoms_batch', texts, threshold=threshold, top_k=top_k
+        )
+
+    def find_similar_symptoms(self, text: str, threshold: float = 0.70) -> List[Tuple[str, float]]:
+        return self.find_similar_symptoms_batch([text], threshold=threshold)[0]
+
+    def retrieve_diseases(self, species: str, text: str, top_n: int = 5,
+                          user_symptoms: List[str] = None,
+                          min_similarity: float = DENSE_RETRIEVAL_MIN_SIMILARITY) -> List[dict]:
+        # Ranked against this worker's pinned knowledge base version; the sidecar (which
+        # has its own, possibly different, knowledge base) only embeds the notes
+        if not text or not text.strip() or not self._ensure_profile_vectors():
+            return []
+        return self._engine.match_disease_profiles(
+            species, self.encode_texts([text])[0], top_n, user_symptoms, min_similarity
+        )
+
+    def _ensure_profile_vectors(self) -> bool:
+        """Disease profile vectors of the local knowledge base, embedded through the sidecar once."""
+        if self._engine.disease_profile_vectors is None:
+            with self._profile_lock:
+                if self._engine.disease_profile_vectors is None:
+                    self._engine.cache_disease_profile_vectors(
+                        encode_fn=self._encode_in_chunks, cache_model_name=f"{SEMANTIC_MODEL_NAME}@sidecar"
+                    )
+        return self._engine.disease_profile_vectors is not None
+
+    def _encode_in_chunks(self, texts: List[str]) -> np.ndarray:
+        # Small requests so a cold build stays within the client's socket timeout
+        return np.concatenate([
+            self.encode_texts(texts[i:i + PROFILE_ENCODE_CHUNK]) for i in range(0, len(texts), PROFILE_ENCODE_CHUNK)
+        ])
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        return self._sidecar_call('embed', 'encode_texts', texts)
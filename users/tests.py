@@ -1,3 +1,135 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from middleware.rate_limit import RateLimitMiddleware
+from utils import rate_limiter
+from utils.rate_limiter import (
+    CacheRateLimitBackend,
+    RateLimiter,
+    SQLiteRateLimitBackend,
+    _estimate,
+    _retry_after,
+    _window_position,
+)
+
+WINDOW = 60
+# Halfway through a window, so repeated hits never cross into the next one
+NOW = WINDOW * 1000 + WINDOW / 2
+
+
+def _hit_from_process(args):
+    """Pool worker: hit a shared SQLite limiter from a separate process."""
+    path, attempts, limit = args
+    backend = SQLiteRateLimitBackend(path)
+    return sum(backend.hit('shared', limit, WINDOW, NOW)[0] for _ in range(attempts))
+
+
+class SlidingWindowMathTests(SimpleTestCase):
+
+    def test_estimate_weights_the_previous_window_by_what_is_left_of_it(self):
+        self.assertEqual(_estimate(10, 5, 0.5), 10.0)
+        self.assertEqual(_estimate(10, 5, 0.0), 15.0)
+        self.assertEqual(_estimate(10, 5, 1.0), 5.0)
+        self.assertEqual(_window_position(WINDOW, NOW), (1000, 0.5))
+
+    def test_retry_after_within_the_current_window(self):
+        # 10 * (1 - f) + 5 <= 9 once f >= 0.6, i.e. 6s after f = 0.5
+        self.assertEqual(_retry_after(10, 5, 10, WINDOW, 0.5), 6)
+
+    def test_retry_after_when_only_the_next_window_helps(self):
+        # Current window full: 30s to its end, then 10 * (1 - f) <= 9 at f = 0.1 (6s)
+        self.assertEqual(_retry_after(10, 10, 10, WINDOW, 0.5), 36)
+        self.assertEqual(_retry_after(0, 3, 3, WINDOW, 0.5), 50)
+        self.assertEqual(_retry_after(0, 0, 1, WINDOW, 0.999), 1)
+
+
+class RateLimitBackendTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'rate_limits.sqlite3')
+
+    def _hits(self, backend, n, limit=3):
+        return [backend.hit('k', limit, WINDOW, NOW) for _ in range(n)]
+
+    def test_sqlite_denied_hits_are_not_counted(self):
+        backend = SQLiteRateLimitBackend(self.path)
+        results = self._hits(backend, 5)
+
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False, False])
+        self.assertEqual(results[-1][1], 50)
+        with sqlite3.connect(self.path) as conn:
+            self.assertEqual(conn.execute('SELECT count FROM rate_limit_counters').fetchone()[0], 3)
+
+    def test_cache_denied_hits_are_not_counted(self):
+        cache = LocMemCache('rate-limit-tests', {})
+        results = self._hits(CacheRateLimitBackend(cache), 5)
+
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False, False])
+        self.assertEqual(cache.get('rl:k:1000'), 3)
+
+    def test_sqlite_limit_is_shared_across_processes(self):
+        with multiprocessing.get_context('fork').Pool(4) as pool:
+            allowed = pool.map(_hit_from_process, [(self.path, 20, 50)] * 4)
+
+        self.assertEqual(sum(allowed), 50)
+
+    def test_backend_errors_fail_open(self):
+        backend = mock.Mock(spec=['hit', 'name'])
+        backend.name = 'broken'
+        backend.hit.side_effect = sqlite3.OperationalError('database is locked')
+
+        with self.assertLogs('utils.rate_limiter', level='WARNING'):
+            self.assertEqual(RateLimiter(backend).hit('scope', 'k', 1, WINDOW), (True, 0))
+
+
+class RateLimitMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(
+            RATE_LIMIT_BACKEND='sqlite', RATE_LIMIT_DB_PATH=os.path.join(tmp.name, 'rate_limits.sqlite3')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Fresh limiter on the temporary file
+        limiter_reset = mock.patch.object(rate_limiter, '_rate_limiter', None)
+        limiter_reset.start()
+        self.addCleanup(limiter_reset.stop)
+
+        self.middleware = RateLimitMiddleware(lambda request: HttpResponse('ok'))
+        self.factory = RequestFactory()
+
+    def _post(self, path, email='owner@example.com'):
+        return self.middleware(self.factory.post(path, {'email': email}, content_type='application/json'))
+
+    def test_paths_match_with_and_without_trailing_slash(self):
+        paths = ['/api/auth/request-password-reset/', '/api/auth/request-password-reset',
+                 '/api/admin/request-password-reset/']
+        for path in paths:
+            self.assertEqual(self._post(path, email=path).status_code, 200)
+            self.assertEqual(self._post(path.rstrip('/'), email=path).status_code, 200)
+            self.assertEqual(self._post(path, email=path).status_code, 200)
+            self.assertEqual(self._post(path.rstrip('/') + '/', email=path).status_code, 429)
+
+    def test_limit_counts_per_email_and_sets_retry_after(self):
+        for _ in range(3):
+            self._post('/api/auth/send-otp', email='Owner@Example.com ')
+        response = self._post('/api/auth/send-otp/')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self._post('/api/auth/send-otp/', email='other@example.com').status_code, 200)
+
+    def test_other_paths_are_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(self._post('/api/auth/login/').status_code, 200)
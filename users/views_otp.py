@@ -23,6 +23,7 @@ from .serializers import (
     LoginSerializer,
 )
 from .utils import generate_jwt_token
+from utils.rate_limiter import hit_rate_limit
 
 
 def send_via_brevo(to_email, subject, html_content):
@@ -45,9 +46,9 @@ def _generate_otp_code() -> str:
 
 
 def _rate_limit_ok(email: str, purpose: str) -> bool:
-    one_hour_ago = timezone.now() - timezone.timedelta(hours=1)
-    count = OTP.objects.filter(email=email, purpose=purpose, created_at__gte=one_hour_ago).count()
-    return count < 3
+    """3 OTP requests per email and purpose per hour (shared sliding-window limiter)."""
+    allowed, _ = hit_rate_limit(f'otp_{purpose}', email.lower().strip(), 3, 3600)
+    return allowed
 
 
 @api_view(['POST'])
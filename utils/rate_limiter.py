@@ -0,0 +1,259 @@
+"""
+PawPal Rate Limiter
+===================
+One sliding-window rate limiter for every caller (symptom checker, OTP and
+password reset endpoints, RateLimitMiddleware).
+
+Algorithm: sliding-window counter. Each (scope, key) has one counter per fixed
+window; a hit is allowed while
+
+    previous_window_count * (1 - elapsed_fraction) + current_window_count < limit
+
+Two integers per key and a constant amount of work per check, however many
+requests the window holds (the old per-user timestamp lists grew with traffic).
+
+Backends (RATE_LIMIT_BACKEND):
+- 'cache': the default Django cache with atomic add/incr. Only shared across
+  workers when the cache is (Redis, Memcached).
+- 'sqlite': a SQLite file (RATE_LIMIT_DB_PATH) updated inside BEGIN IMMEDIATE,
+  so every worker process on the host enforces the same limit without Redis.
+- 'auto' (default): 'cache' when the default cache is Redis or Memcached,
+  otherwise 'sqlite' (LocMemCache is per process; the file and database caches
+  implement incr as get + set, which is not atomic across processes).
+
+Keys are hashed before storage, so emails never end up in the cache or the file.
+A backend error fails open (request allowed) and is logged.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Delete expired counters every N hits on the SQLite backend
+PRUNE_EVERY_N_HITS = 500
+
+# Cache backends (matched in the BACKEND path) whose incr is atomic and shared by all workers
+ATOMIC_CACHE_BACKEND_MARKERS = ('redis', 'memcached')
+
+
+# ============================================================
+# SLIDING WINDOW MATH
+# ============================================================
+
+def _window_position(window_seconds: int, now: float) -> Tuple[int, float]:
+    """(index of the current fixed window, fraction of it already elapsed)"""
+    index = int(now // window_seconds)
+    return index, (now - index * window_seconds) / window_seconds
+
+
+def _estimate(previous: int, current: int, elapsed_fraction: float) -> float:
+    return previous * (1.0 - elapsed_fraction) + current
+
+
+def _retry_after(previous: int, current: int, limit: int, window_seconds: int, elapsed_fraction: float) -> int:
+    """Seconds until a denied key gets one request through again."""
+    remaining_in_window = (1.0 - elapsed_fraction) * window_seconds
+    if current >= limit or previous == 0:
+        # Only the next window helps; its estimate starts at current * (1 - f)
+        if current == 0:
+            return max(1, math.ceil(remaining_in_window))
+        fraction = max(0.0, 1.0 - (limit - 1) / current)
+        return max(1, math.ceil(remaining_in_window + fraction * window_seconds))
+    # Within this window: previous * (1 - f) + current <= limit - 1
+    target_fraction = 1.0 - (limit - 1 - current) / previous
+    return max(1, math.ceil((target_fraction - elapsed_fraction) * window_seconds))
+
+
+def _storage_key(scope: str, key) -> str:
+    digest = hashlib.sha256(str(key).encode('utf-8')).hexdigest()[:32]
+    return f"{scope}:{digest}"
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class CacheRateLimitBackend:
+    """Counters in the Django cache; atomic when the cache's incr is (Redis, Memcached)."""
+
+    name = 'cache'
+
+    def __init__(self, cache=None):
+        if cache is None:
+            from django.core.cache import cache
+        self.cache = cache
+
+    def hit(self, key: str, limit: int, window_seconds: int, now: float) -> Tuple[bool, int]:
+        index, elapsed = _window_position(window_seconds, now)
+        current_key = f"rl:{key}:{index}"
+        previous = self.cache.get(f"rl:{key}:{index - 1}", 0)
+
+        # Count first, then check: concurrent hits each see every hit before them
+        timeout = window_seconds * 2 + 1
+        self.cache.add(current_key, 0, timeout=timeout)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.add(current_key, 1, timeout=timeout)
+            current = 1
+
+        if _estimate(previous, current, elapsed) > limit:
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return False, _retry_after(previous, current - 1, limit, window_seconds, elapsed)
+        return True, 0
+
+
+class SQLiteRateLimitBackend:
+    """
+    Counters in a SQLite file shared by all worker processes on the host.
+
+    Args:
+        path: SQLite database file
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process (gunicorn forks after import)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        if not self._schema_ready:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limit_counters (
+                    key TEXT NOT NULL,
+                    window INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (key, window)
+                );
+                CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires ON rate_limit_counters (expires_at);
+                """
+            )
+            self._schema_ready = True
+        return conn
+
+    def hit(self, key: str, limit: int, window_seconds: int, now: float) -> Tuple[bool, int]:
+        index, elapsed = _window_position(window_seconds, now)
+        conn = self._connect()
+        # Write lock up front: read-check-increment is one step for every process
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(conn.execute(
+                'SELECT window, count FROM rate_limit_counters WHERE key = ? AND window IN (?, ?)',
+                (key, index - 1, index)
+            ).fetchall())
+            previous, current = counts.get(index - 1, 0), counts.get(index, 0)
+
+            if _estimate(previous, current + 1, elapsed) > limit:
+                conn.execute('COMMIT')
+                return False, _retry_after(previous, current, limit, window_seconds, elapsed)
+
+            conn.execute(
+                """
+                INSERT INTO rate_limit_counters (key, window, count, expires_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT (key, window) DO UPDATE SET count = count + 1
+                """,
+                (key, index, (index + 2) * window_seconds)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._maybe_prune(conn, now)
+        return True, 0
+
+    def _maybe_prune(self, conn: sqlite3.Connection, now: float):
+        with self._lock:
+            self._hits += 1
+            if self._hits % PRUNE_EVERY_N_HITS:
+                return
+        conn.execute('DELETE FROM rate_limit_counters WHERE expires_at < ?', (now,))
+
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+
+class RateLimiter:
+    """Sliding-window limiter over a backend (see module docstring)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, scope: str, key, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        """
+        Record one request for `key` unless it is over the limit.
+
+        Args:
+            scope: Limit name, e.g. 'symptom_checker' (separates counters of different limits)
+            key: Who is limited (user id, email, ...)
+            limit: Requests allowed per window
+            window_seconds: Window length
+
+        Returns:
+            (allowed, retry_after_seconds) - denied requests are not counted
+        """
+        try:
+            return self.backend.hit(_storage_key(scope, key), limit, int(window_seconds), time.time())
+        except Exception as e:
+            logger.warning(f"⚠️ Rate limiter backend '{self.backend.name}' failed, allowing request: {e}")
+            return True, 0
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _create_backend():
+    backend = getattr(settings, 'RATE_LIMIT_BACKEND', 'auto')
+    if backend == 'auto':
+        cache_backend = settings.CACHES.get('default', {}).get('BACKEND', '').lower()
+        backend = 'cache' if any(marker in cache_backend for marker in ATOMIC_CACHE_BACKEND_MARKERS) else 'sqlite'
+    if backend == 'sqlite':
+        return SQLiteRateLimitBackend(str(settings.RATE_LIMIT_DB_PATH))
+    if backend == 'cache':
+        return CacheRateLimitBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{backend}' (expected auto, cache or sqlite)")
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(_create_backend())
+                logger.info(f"🚦 Rate limiter using {_rate_limiter.backend.name} backend")
+    return _rate_limiter
+
+
+def hit_rate_limit(scope: str, key, limit: int, window_seconds: int) -> Tuple[bool, int]:
+    """Shortcut for get_rate_limiter().hit(...); see RateLimiter.hit."""
+    return get_rate_limiter().hit(scope, key, limit, window_seconds)
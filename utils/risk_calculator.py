@@ -13,6 +13,15 @@ Risk scoring weights are based on:
 
 from datetime import datetime, timedelta
 
+try:
+    from utils.triage_rules import (RISK_WEIGHTS_CRITICAL, RISK_WEIGHTS_HIGH, RISK_WEIGHTS_LOW,
+                                    RISK_WEIGHTS_MODERATE, RISK_WEIGHTS_SPECIES_SPECIFIC, is_risk_critical,
+                                    risk_weight)
+except ImportError:  # run as a script from utils/ (test_risk_calculator.py)
+    from triage_rules import (RISK_WEIGHTS_CRITICAL, RISK_WEIGHTS_HIGH, RISK_WEIGHTS_LOW,
+                              RISK_WEIGHTS_MODERATE, RISK_WEIGHTS_SPECIES_SPECIFIC, is_risk_critical,
+                              risk_weight)
+
 
 # ============================================================
 # CANONICAL SYMPTOMS - MUST MATCH train_model.py EXACTLY
@@ -71,114 +80,16 @@ CANONICAL_SYMPTOMS = [
 # ============================================================
 # RISK WEIGHTS - Based on veterinary triage severity
 # ============================================================
+# Declared in the shared rule table (triage_rules.py); the names below are kept for
+# existing imports. get_symptom_risk_weight is a single lookup in the compiled table.
 
-# CRITICAL SYMPTOMS (life-threatening)
-CRITICAL_SYMPTOMS = {
-    'seizures': 30,
-    'difficulty_breathing': 25,
-    'respiratory_distress': 28,
-    'paralysis': 30,
-    'cloudy_eyes': 25,  # Can indicate glaucoma emergency
-    'blood_in_urine': 20,
-    'straining_to_urinate': 22,  # Urinary blockage
-    'bloating': 25,  # Can indicate bloat/GDV
-}
-
-# HIGH CONCERN SYMPTOMS
-HIGH_CONCERN_SYMPTOMS = {
-    'vomiting': 10,
-    'diarrhea': 10,
-    'fever': 12,
-    'dehydration': 15,
-    'weakness': 12,
-    'loss_of_appetite': 8,
-    'lethargy': 8,
-    'weight_loss': 10,
-    'labored_breathing': 15,
-    'coughing': 8,
-    'wheezing': 12,
-    'nasal_congestion': 7,
-    'confusion': 15,
-    'aggression': 10,
-    'limping': 10,
-    'lameness': 10,
-    'difficulty_walking': 12,
-    'stiffness': 8,
-    'reluctance_to_move': 10,
-    'eye_discharge': 8,
-    'ear_discharge': 8,
-    'swollen_gums': 10,
-    'red_gums': 10,
-    'mouth_pain': 10,
-}
+CRITICAL_SYMPTOMS = RISK_WEIGHTS_CRITICAL
+HIGH_CONCERN_SYMPTOMS = RISK_WEIGHTS_HIGH
+MODERATE_SYMPTOMS = RISK_WEIGHTS_MODERATE
+SPECIES_SPECIFIC_SYMPTOMS = RISK_WEIGHTS_SPECIES_SPECIFIC
+LOW_CONCERN_SYMPTOMS = RISK_WEIGHTS_LOW
 
-# MODERATE CONCERN SYMPTOMS
-MODERATE_SYMPTOMS = {
-    'sneezing': 3,
-    'itching': 3,
-    'scratching': 3,
-    'hair_loss': 5,
-    'rash': 5,
-    'scabs': 5,
-    'dandruff': 2,
-    'watery_eyes': 4,
-    'red_eyes': 5,
-    'squinting': 5,
-    'ear_scratching': 4,
-    'head_shaking': 4,
-    'constipation': 6,
-    'gas': 3,
-    'bad_breath': 4,
-    'drooling': 5,
-    'restlessness': 5,
-    'hiding': 5,
-    'frequent_urination': 6,
-    'dark_urine': 7,
-    'cloudy_urine': 6,
-    'difficulty_eating': 7,
-    'circling': 8,
-    'bald_patches': 4,
-    'red_skin': 5,
-    'irritated_skin': 5,
-    'skin_lesions': 6,
-    'nasal_discharge': 5,
-}
-
-# SPECIES-SPECIFIC SYMPTOMS (context-dependent)
-SPECIES_SPECIFIC_SYMPTOMS = {
-    # Bird
-    'drooping_wing': 12,
-    'feather_loss': 6,
-    'wing_droop': 12,
-    'fluffed_feathers': 8,
-    'tail_bobbing': 10,
-    
-    # Fish
-    'white_spots': 8,
-    'fin_rot': 10,
-    'swimming_upside_down': 15,
-    'gasping_at_surface': 15,
-    'clamped_fins': 8,
-    'rubbing_against_objects': 7,
-    
-    # Rabbit
-    'head_tilt': 15,
-    'rolling': 15,
-    'loss_of_balance': 15,
-    'dental_issues': 10,
-    
-    # Small mammal
-    'wet_tail': 18,  # Very serious in hamsters
-    'lumps': 10,
-    'bumps': 8,
-    'overgrown_teeth': 10,
-}
-
-# LOW CONCERN (monitoring symptoms)
-LOW_CONCERN_SYMPTOMS = {
-    'not_eating': 5,  # Same as loss_of_appetite but less severe
-    'excessive_eating': 4,
-}
+_CANONICAL_SYMPTOM_SET = frozenset(CANONICAL_SYMPTOMS)
 
 
 def get_symptom_risk_weight(symptom):
@@ -191,18 +102,7 @@ def get_symptom_risk_weight(symptom):
     Returns:
         int: Risk weight (0-30)
     """
-    if symptom in CRITICAL_SYMPTOMS:
-        return CRITICAL_SYMPTOMS[symptom]
-    elif symptom in HIGH_CONCERN_SYMPTOMS:
-        return HIGH_CONCERN_SYMPTOMS[symptom]
-    elif symptom in MODERATE_SYMPTOMS:
-        return MODERATE_SYMPTOMS[symptom]
-    elif symptom in SPECIES_SPECIFIC_SYMPTOMS:
-        return SPECIES_SPECIFIC_SYMPTOMS[symptom]
-    elif symptom in LOW_CONCERN_SYMPTOMS:
-        return LOW_CONCERN_SYMPTOMS[symptom]
-    else:
-        return 3  # Default low weight for unmapped symptoms
+    return risk_weight(symptom)
 
 
 def calculate_exotic_risk_modifier(species, symptoms):
@@ -261,7 +161,7 @@ def calculate_risk_score(symptom_log, previous_logs=None, pet=None):
     severity = symptom_log.overall_severity
     
     # Validate symptoms are from canonical list
-    valid_symptoms = [s for s in symptoms if s in CANONICAL_SYMPTOMS]
+    valid_symptoms = [s for s in symptoms if s in _CANONICAL_SYMPTOM_SET]
     if len(valid_symptoms) < len(symptoms):
         invalid = set(symptoms) - set(valid_symptoms)
         print(f"⚠️  Warning: Invalid symptoms detected: {invalid}")
@@ -530,7 +430,7 @@ def should_create_alert(symptom_log, previous_logs=None, risk_result=None):
     
     # NEW CRITICAL SYMPTOM
     symptoms = symptom_log.symptoms if isinstance(symptom_log.symptoms, list) else []
-    critical_present = [s for s in symptoms if s in CRITICAL_SYMPTOMS]
+    critical_present = [s for s in symptoms if is_risk_critical(s)]
     
     if critical_present and previous_logs:
         # Check if this is a new critical symptom
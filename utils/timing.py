@@ -0,0 +1,281 @@
+"""
+PawPal Stage Timing
+===================
+Lightweight spans for the triage pipeline:
+
+    with span('regex_extraction'):
+        coverage = lexicon.analyze_coverage(text)
+
+    @timed('diagnose')
+    def diagnose(self, ...): ...
+
+Every finished span is observed into a process-wide histogram per stage, exposed
+in Prometheus text format at /metrics. Inside a request wrapped by
+middleware.server_timing.ServerTimingMiddleware the span is also recorded for that
+request and reported in its Server-Timing header.
+
+The current request is tracked in a contextvar, so spans work the same in sync
+views, async views and coroutines awaited by them. ThreadPoolExecutor.submit and
+loop.run_in_executor do NOT copy contextvars: wrap the callable with in_context()
+so spans in pool threads reach the request that submitted the work.
+
+Pure Python (no Django imports) so the triage engine can use it too. Histograms
+are per process: behind several workers each /metrics scrape sees one worker.
+"""
+
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Seconds; spans range from sub-millisecond lexicon lookups to multi-second Gemini calls
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# ============================================================
+# PROCESS-WIDE HISTOGRAMS (/metrics)
+# ============================================================
+
+class StageHistogram:
+    """Thread-safe fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[Tuple[float, int]], float, int]:
+        """
+        Returns:
+            ([(upper_bound, cumulative_count), ...] ending with +Inf, sum, count)
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            running += n
+            cumulative.append((bound, running))
+        return cumulative, total, count
+
+
+class StageMetrics:
+    """Histograms keyed by stage name, created on first observation."""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[str, StageHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, StageHistogram(self.buckets))
+        histogram.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Tuple[List[Tuple[float, int]], float, int]]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {stage: histograms[stage].snapshot() for stage in sorted(histograms)}
+
+    def render_prometheus(self, metric: str = 'pawpal_stage_duration_seconds') -> str:
+        """Histograms in Prometheus text exposition format (one series per stage)."""
+        lines = [
+            f"# HELP {metric} Time spent in each triage pipeline stage.",
+            f"# TYPE {metric} histogram",
+        ]
+        for stage, (cumulative, total, count) in self.snapshot().items():
+            label = _escape_label(stage)
+            for bound, n in cumulative:
+                le = '+Inf' if bound == math.inf else repr(float(bound))
+                lines.append(f'{metric}_bucket{{stage="{label}",le="{le}"}} {n}')
+            lines.append(f'{metric}_sum{{stage="{label}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{stage="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+stage_metrics = StageMetrics()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_stats_gauges(prefix: str, stats: Dict) -> str:
+    """
+    Flatten a nested stats dict (cache/gateway/queue stats) into Prometheus gauges.
+
+    Numbers and booleans become `<prefix>_<key>_<subkey> value`; strings, lists
+    and None are skipped.
+
+    Args:
+        prefix: Metric name prefix, e.g. 'pawpal_llm_gateway'
+        stats: Dict as returned by the various .stats() helpers
+    """
+    lines = []
+
+    def walk(name, value):
+        if isinstance(value, dict):
+            for key, sub in value.items():
+                walk(f"{name}_{_metric_name(str(key))}", sub)
+        elif isinstance(value, bool):
+            lines.append(f"{name} {int(value)}")
+        elif isinstance(value, (int, float)) and math.isfinite(value):
+            lines.append(f"{name} {value}")
+
+    walk(prefix, stats)
+    if not lines:
+        return ''
+    return '\n'.join(lines) + '\n'
+
+
+def render_info(metric: str, labels: Dict) -> str:
+    """
+    A Prometheus info series, `<metric>{label="value",...} 1`, for string state
+    such as a version hash that render_stats_gauges cannot carry.
+
+    Args:
+        metric: Full metric name, e.g. 'pawpal_knowledge_base_info'
+        labels: Label name -> value; None values are skipped
+    """
+    pairs = [
+        f'{_metric_name(str(key))}="{_escape_label(str(value))}"'
+        for key, value in labels.items() if value is not None
+    ]
+    if not pairs:
+        return ''
+    return (
+        f"# TYPE {metric} gauge\n"
+        f"{metric}{{{','.join(pairs)}}} 1\n"
+    )
+
+
+def _metric_name(key: str) -> str:
+    return ''.join(c if c.isalnum() or c == '_' else '_' for c in key).strip('_').lower() or 'value'
+
+
+# ============================================================
+# PER-REQUEST SPANS (Server-Timing)
+# ============================================================
+
+class RequestTimings:
+    """Span totals of one request; spans with the same name are summed."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._spans: 'OrderedDict[str, List]' = OrderedDict()  # name -> [seconds, count]
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self._spans.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def spans(self) -> List[Tuple[str, float, int]]:
+        with self._lock:
+            return [(name, seconds, count) for name, (seconds, count) in self._spans.items()]
+
+    def server_timing_header(self) -> str:
+        """
+        Server-Timing value: one metric per stage in milliseconds plus the total.
+
+        Stages that ran in parallel overlap, so their durations can add up to more
+        than `total`.
+        """
+        parts = []
+        for name, seconds, count in self.spans():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="x{count}"'
+            parts.append(entry)
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ', '.join(parts)
+
+
+_current_timings: contextvars.ContextVar = contextvars.ContextVar('pawpal_request_timings', default=None)
+
+
+def begin_request_timings() -> Tuple[RequestTimings, contextvars.Token]:
+    """Start collecting spans for the current request (see ServerTimingMiddleware)."""
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def end_request_timings(token: contextvars.Token):
+    _current_timings.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def record_span(name: str, seconds: float):
+    """Record an already measured duration (histogram + current request)."""
+    stage_metrics.observe(name, seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as stage `name`. Works around awaits too."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """Decorator form of span() for sync functions and coroutine functions."""
+    def decorator(func: Callable):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_context(func: Callable, *args, **kwargs) -> Callable:
+    """
+    `func` bound to the caller's contextvars, for executor.submit / run_in_executor.
+
+    Each call takes its own copy of the context, so the returned callable can run
+    concurrently with other submissions from the same request.
+    """
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
@@ -0,0 +1,405 @@
+"""
+PawPal Triage Rules
+===================
+Single declarative table for every urgency rule: emergency diseases, urgency
+levels, red-flag symptom tiers and the symptom log risk weights.
+
+The declarations below are compiled once at import into:
+- normalized-name lookup tables (case/whitespace-insensitive disease and urgency names)
+- one bit per symptom and a bitmask per symptom tier, so "does this request contain a
+  critical symptom" is a single AND instead of a set intersection per tier
+
+Used by symptom_checker_predict and calculate_dynamic_urgency (chatbot/views.py), the
+triage engine's UrgencyDetector, the red-flag safety interceptor and utils/risk_calculator.
+"""
+
+from types import MappingProxyType
+
+
+# ============================================================
+# DECLARATIONS
+# ============================================================
+
+# Diseases that are always escalated to EMERGENCY, whatever the confidence or symptom
+# match, to prevent dangerous misclassification (e.g. Canine Parvovirus as LOW urgency)
+EMERGENCY_DISEASES = {
+    'Dog': [
+        'Gastric Dilation (Bloat)', 'Bloat/GDV', 'Bloat/Gastric Dilation', 'Canine Parvovirus',
+        'Heatstroke', 'Heat Stroke', 'Drowning/Hypothermia', 'Urethral Obstruction',
+        'Urinary Obstruction', 'Urinary Blockage', 'Pyometra', 'Breathing Difficulties', 'Rabies',
+        'Infectious Canine Hepatitis', 'Pancreatitis (Acute)',
+    ],
+    'Cat': [
+        'Feline Panleukopenia Virus', 'Urinary Blockage', 'Feline Infectious Peritonitis (Wet form)',
+    ],
+    'Rabbit': [
+        'Rabbit Hemorrhagic Disease Virus', 'Heat Stress', 'Flystrike (Myiasis)',
+        'Dystocia (Egg Binding equivalent)',
+    ],
+    'Hamster': [
+        'Wet Tail (Proliferative Ileitis)', 'Wet Tail',
+    ],
+    'Turtle': [
+        'Heat Shock', 'Cold Water Shock', 'Shell Injuries/Trauma (Severe)', 'Prolapse (Cloacal/Vent)',
+        'Dystocia (Egg Binding)',
+    ],
+    'Fish': [
+        'Ammonia Poisoning', 'Nitrate Poisoning (Severe)', 'pH Shock', 'Oxygen Deprivation',
+        'Hemorrhagic Septicemia', '(Hemorrhagic Septicemia / Ulcerative Syndromes)', 'Dropsy (Advanced)',
+        'Koi Herpes Virus',
+    ],
+    'Bird': [
+        'Avian Influenza', 'Newcastle Disease', 'Psittacosis (Chlamydiosis, Severe)', "Pacheco's Disease",
+        'Egg Binding', 'Dystocia', 'Heavy Metal Poisoning', 'Vent Prolapse', 'Cloacal Prolapse',
+    ],
+    'General': [
+        'Internal Bleeding', 'Respiratory Distress Syndrome', 'Toxicity', 'Seizures',
+    ],
+}
+
+# Emergency diseases that only escalate when one of these symptoms was matched
+HEAT_SYMPTOMS = {'panting', 'excessive_heat', 'collapse', 'rapid_heartbeat', 'fever'}
+EMERGENCY_REQUIRED_SYMPTOMS = {
+    'Heatstroke': HEAT_SYMPTOMS,
+    'Heat Stroke': HEAT_SYMPTOMS,
+}
+
+EMERGENCY_ASSESSMENT = {
+    'urgency': 'critical', 'urgency_score': 10,
+    'timeline': 'IMMEDIATE - Life threatening', 'recommendation': 'SEEK EMERGENCY VET CARE IMMEDIATELY',
+}
+EMERGENCY_RED_FLAG = '🚨 CRITICAL CONDITION - This is a life-threatening emergency'
+
+# Knowledge base urgency label -> per-prediction assessment
+URGENCY_LEVELS = {
+    'critical': {'urgency': 'critical', 'urgency_score': 10, 'timeline': 'IMMEDIATE', 'recommendation': 'Seek emergency veterinary care immediately'},
+    'high': {'urgency': 'high', 'urgency_score': 8, 'timeline': 'Within 2-4 hours', 'recommendation': 'Contact veterinarian urgently'},
+    'moderate': {'urgency': 'moderate', 'urgency_score': 5, 'timeline': '24-48 hours', 'recommendation': 'Schedule veterinary appointment'},
+    'low': {'urgency': 'low', 'urgency_score': 3, 'timeline': '2-7 days', 'recommendation': 'Monitor and schedule routine appointment'},
+}
+URGENCY_ALIASES = {'medium': 'moderate', 'mild': 'low'}
+DEFAULT_URGENCY = 'moderate'
+
+# Symptom tiers for the triage engine (first tier present wins)
+CRITICAL_SYMPTOMS = frozenset({
+    'difficulty_breathing', 'seizures', 'tremors', 'blue_gums', 'collapse',
+    'uncontrolled_bleeding', 'unconscious', 'not_breathing',
+    'severe_trauma', 'poisoning', 'bloat', 'heatstroke',
+    'sudden_paralysis', 'respiratory_distress', 'cardiac_arrest',
+    'profuse_bleeding', 'severe_burn'
+})
+
+HIGH_URGENCY_SYMPTOMS = frozenset({
+    'bloody_diarrhea', 'blood_in_vomit', 'eye_injury', 'severe_pain',
+    'distended_abdomen', 'unable_to_urinate', 'straining_to_urinate',
+    'blood_in_urine', 'severe_vomiting', 'profuse_diarrhea',
+    'broken_bone', 'deep_wound', 'bite_wound', 'labored_breathing',
+    'pale_gums', 'yellow_gums', 'high_fever', 'severe_lethargy'
+})
+
+MODERATE_URGENCY_SYMPTOMS = frozenset({
+    'vomiting', 'diarrhea', 'loss_of_appetite', 'lethargy',
+    'coughing', 'sneezing', 'limping', 'ear_infection',
+    'skin_lesions', 'itching', 'discharge', 'fever', 'dehydration'
+})
+
+# Extracted from free text -> safety interceptor forces CRITICAL
+RED_FLAG_SYMPTOMS = frozenset({
+    'seizures', 'tremors', 'collapse', 'unconscious', 'respiratory_distress',
+    'difficulty_breathing', 'pale_gums', 'blue_gums', 'cyanosis',
+    'bleeding', 'blood_in_urine', 'bloody_diarrhea', 'paralysis',
+    'shock', 'severe_dehydration', 'unresponsive', 'convulsions'
+})
+
+# calculate_dynamic_urgency: questionnaire answers -> urgency points
+BLOOD_SYMPTOMS = frozenset({'blood_in_urine', 'bloody_stool', 'vomiting_blood', 'hemoptysis'})
+EMERGENCY_SCREEN_RULES = [
+    # (emergencyScreen field, alarming values, points, red flag)
+    ('perfusion', {'pale_white', 'blue_purple'}, 3, "Pale/blue gums - possible shock or blood loss"),
+    ('respiration', {'gasping', 'not_breathing', 'open_mouth_breathing'}, 3, "Respiratory distress"),
+    ('alertness', {'unresponsive', 'disoriented'}, 3, "Altered consciousness"),
+]
+DYNAMIC_URGENCY_LEVELS = [
+    # (minimum score, urgency, recommendation, timeline)
+    (7, 'critical', "⚠️ URGENT: This appears to be a medical emergency. Seek immediate veterinary care. Contact your emergency vet or nearest 24-hour clinic immediately.", "Immediate - do not wait"),
+    (5, 'high', "HIGH URGENCY: These symptoms require prompt veterinary attention. Contact your vet today or visit an emergency clinic if after hours.", "Within 2-6 hours"),
+    (3, 'moderate', "Schedule a vet visit within 24-48 hours. Monitor closely for worsening symptoms.", "Within 24-48 hours"),
+    (0, 'low', "Monitor at home. Schedule routine vet visit if symptoms persist or worsen.", "Within 3-7 days or as needed"),
+]
+
+# Symptom log risk weights (utils/risk_calculator). Checked in this order; unlisted symptoms weigh 3.
+RISK_WEIGHTS_CRITICAL = {
+    'seizures': 30,
+    'difficulty_breathing': 25,
+    'respiratory_distress': 28,
+    'paralysis': 30,
+    'cloudy_eyes': 25,  # Can indicate glaucoma emergency
+    'blood_in_urine': 20,
+    'straining_to_urinate': 22,  # Urinary blockage
+    'bloating': 25,  # Can indicate bloat/GDV
+}
+
+RISK_WEIGHTS_HIGH = {
+    'vomiting': 10,
+    'diarrhea': 10,
+    'fever': 12,
+    'dehydration': 15,
+    'weakness': 12,
+    'loss_of_appetite': 8,
+    'lethargy': 8,
+    'weight_loss': 10,
+    'labored_breathing': 15,
+    'coughing': 8,
+    'wheezing': 12,
+    'nasal_congestion': 7,
+    'confusion': 15,
+    'aggression': 10,
+    'limping': 10,
+    'lameness': 10,
+    'difficulty_walking': 12,
+    'stiffness': 8,
+    'reluctance_to_move': 10,
+    'eye_discharge': 8,
+    'ear_discharge': 8,
+    'swollen_gums': 10,
+    'red_gums': 10,
+    'mouth_pain': 10,
+}
+
+RISK_WEIGHTS_MODERATE = {
+    'sneezing': 3,
+    'itching': 3,
+    'scratching': 3,
+    'hair_loss': 5,
+    'rash': 5,
+    'scabs': 5,
+    'dandruff': 2,
+    'watery_eyes': 4,
+    'red_eyes': 5,
+    'squinting': 5,
+    'ear_scratching': 4,
+    'head_shaking': 4,
+    'constipation': 6,
+    'gas': 3,
+    'bad_breath': 4,
+    'drooling': 5,
+    'restlessness': 5,
+    'hiding': 5,
+    'frequent_urination': 6,
+    'dark_urine': 7,
+    'cloudy_urine': 6,
+    'difficulty_eating': 7,
+    'circling': 8,
+    'bald_patches': 4,
+    'red_skin': 5,
+    'irritated_skin': 5,
+    'skin_lesions': 6,
+    'nasal_discharge': 5,
+}
+
+RISK_WEIGHTS_SPECIES_SPECIFIC = {
+    # Bird
+    'drooping_wing': 12,
+    'feather_loss': 6,
+    'wing_droop': 12,
+    'fluffed_feathers': 8,
+    'tail_bobbing': 10,
+
+    # Fish
+    'white_spots': 8,
+    'fin_rot': 10,
+    'swimming_upside_down': 15,
+    'gasping_at_surface': 15,
+    'clamped_fins': 8,
+    'rubbing_against_objects': 7,
+
+    # Rabbit
+    'head_tilt': 15,
+    'rolling': 15,
+    'loss_of_balance': 15,
+    'dental_issues': 10,
+
+    # Small mammal
+    'wet_tail': 18,  # Very serious in hamsters
+    'lumps': 10,
+    'bumps': 8,
+    'overgrown_teeth': 10,
+}
+
+RISK_WEIGHTS_LOW = {
+    'not_eating': 5,  # Same as loss_of_appetite but less severe
+    'excessive_eating': 4,
+}
+
+DEFAULT_RISK_WEIGHT = 3
+
+
+# ============================================================
+# COMPILED TABLES
+# ============================================================
+
+def normalize_name(name):
+    """
+    Lookup key for disease and urgency names: case- and whitespace-insensitive.
+
+    Behaviour change from the per-request EMERGENCY_DISEASES dict this replaced, which
+    matched exact names only: 'canine parvovirus' or 'Canine  Parvovirus' (as Gemini or a
+    hand-edited knowledge base may spell them) now also force EMERGENCY. 'Heat shock'
+    (old code: heat-symptom check, then a KeyError when it passed) is now the same
+    unconditional emergency as the turtle's 'Heat Shock'.
+    """
+    return ' '.join(str(name).split()).casefold()
+
+
+def normalize_symptom(symptom):
+    return str(symptom).strip().lower().replace(' ', '_')
+
+
+# normalized disease name -> symptoms of which one must be matched (None = unconditional)
+_EMERGENCY_LOOKUP = {}
+for _names in EMERGENCY_DISEASES.values():
+    for _name in _names:
+        _required = EMERGENCY_REQUIRED_SYMPTOMS.get(_name)
+        _EMERGENCY_LOOKUP[normalize_name(_name)] = frozenset(_required) if _required else None
+
+_EMERGENCY_ASSESSMENT = MappingProxyType(dict(EMERGENCY_ASSESSMENT))
+
+_URGENCY_LOOKUP = {normalize_name(label): MappingProxyType(dict(level)) for label, level in URGENCY_LEVELS.items()}
+for _alias, _label in URGENCY_ALIASES.items():
+    _URGENCY_LOOKUP[normalize_name(_alias)] = _URGENCY_LOOKUP[_label]
+
+_RISK_WEIGHTS = {}
+for _table in (RISK_WEIGHTS_LOW, RISK_WEIGHTS_SPECIES_SPECIFIC, RISK_WEIGHTS_MODERATE,
+               RISK_WEIGHTS_HIGH, RISK_WEIGHTS_CRITICAL):
+    _RISK_WEIGHTS.update(_table)  # later (more severe) tables win, as in the original if/elif chain
+
+# One bit per known symptom
+SYMPTOM_BITS = {}
+for _tier in (CRITICAL_SYMPTOMS, HIGH_URGENCY_SYMPTOMS, MODERATE_URGENCY_SYMPTOMS, RED_FLAG_SYMPTOMS,
+              BLOOD_SYMPTOMS, HEAT_SYMPTOMS, _RISK_WEIGHTS):
+    for _symptom in sorted(_tier):
+        SYMPTOM_BITS.setdefault(_symptom, 1 << len(SYMPTOM_BITS))
+_SYMPTOMS_BY_BIT = {bit: symptom for symptom, bit in SYMPTOM_BITS.items()}
+
+
+def _mask_of(symptoms):
+    mask = 0
+    for symptom in symptoms:
+        mask |= SYMPTOM_BITS.get(symptom, 0)
+    return mask
+
+
+CRITICAL_MASK = _mask_of(CRITICAL_SYMPTOMS)
+HIGH_URGENCY_MASK = _mask_of(HIGH_URGENCY_SYMPTOMS)
+MODERATE_URGENCY_MASK = _mask_of(MODERATE_URGENCY_SYMPTOMS)
+RED_FLAG_MASK = _mask_of(RED_FLAG_SYMPTOMS)
+BLOOD_MASK = _mask_of(BLOOD_SYMPTOMS)
+RISK_CRITICAL_MASK = _mask_of(RISK_WEIGHTS_CRITICAL)
+
+_URGENCY_TIERS = [
+    (CRITICAL_MASK, 'CRITICAL', "Life-threatening symptoms detected"),
+    (HIGH_URGENCY_MASK, 'HIGH', "Urgent symptoms detected"),
+    (MODERATE_URGENCY_MASK, 'MODERATE', "Symptoms require veterinary attention"),
+]
+
+
+# ============================================================
+# RULE EVALUATION
+# ============================================================
+
+def symptom_mask(symptoms, normalize=False):
+    """Bitmask of the known symptoms in an iterable of symptom codes (unknown codes are ignored)."""
+    if normalize:
+        symptoms = (normalize_symptom(s) for s in symptoms)
+    return _mask_of(symptoms)
+
+
+def symptoms_in(mask):
+    """Symptom codes set in a mask."""
+    found = []
+    while mask:
+        bit = mask & -mask
+        found.append(_SYMPTOMS_BY_BIT[bit])
+        mask ^= bit
+    return found
+
+
+def emergency_assessment(disease_name, matched_symptoms=()):
+    """
+    Forced EMERGENCY assessment for a life-threatening disease, or None.
+
+    Args:
+        disease_name: Predicted disease (any case/spacing)
+        matched_symptoms: Symptoms matched for the prediction (checked for conditional rules)
+    """
+    key = normalize_name(disease_name)
+    if key not in _EMERGENCY_LOOKUP:
+        return None
+    required = _EMERGENCY_LOOKUP[key]
+    if required is not None and required.isdisjoint(matched_symptoms):
+        return None
+    assessment = dict(_EMERGENCY_ASSESSMENT)
+    assessment['red_flags'] = [EMERGENCY_RED_FLAG]
+    return assessment
+
+
+def urgency_assessment(base_urgency):
+    """Per-prediction assessment for a knowledge base urgency label (unknown labels -> moderate)."""
+    level = _URGENCY_LOOKUP.get(normalize_name(base_urgency or DEFAULT_URGENCY), _URGENCY_LOOKUP[DEFAULT_URGENCY])
+    assessment = dict(level)
+    assessment['red_flags'] = []
+    return assessment
+
+
+def prediction_urgency(disease_name, base_urgency, matched_symptoms=()):
+    """
+    Returns:
+        (assessment, emergency_override) - the EMERGENCY assessment if the disease is
+        life-threatening, otherwise the assessment for its knowledge base urgency
+    """
+    emergency = emergency_assessment(disease_name, matched_symptoms)
+    if emergency is not None:
+        return emergency, True
+    return urgency_assessment(base_urgency), False
+
+
+def assess_symptom_urgency(symptoms):
+    """
+    Triage engine urgency from a symptom list: the most severe tier present wins.
+
+    Returns:
+        (level, reason, symptoms_found)
+    """
+    mask = symptom_mask(symptoms, normalize=True)
+    for tier_mask, level, reason in _URGENCY_TIERS:
+        found = mask & tier_mask
+        if found:
+            names = symptoms_in(found)
+            return (level, f"{reason}: {', '.join(names)}", names)
+    return ("LOW", "Routine symptoms - monitor and consult vet if worsens", [])
+
+
+def red_flags_in(symptoms):
+    """Red-flag symptoms present, in input order."""
+    return [s for s in symptoms if SYMPTOM_BITS.get(s, 0) & RED_FLAG_MASK]
+
+
+def has_blood_symptom(symptoms):
+    return bool(symptom_mask(symptoms) & BLOOD_MASK)
+
+
+def dynamic_urgency_level(score):
+    """(urgency, recommendation, timeline) for a calculate_dynamic_urgency score."""
+    for minimum, urgency, recommendation, timeline in DYNAMIC_URGENCY_LEVELS:
+        if score >= minimum:
+            return urgency, recommendation, timeline
+    return DYNAMIC_URGENCY_LEVELS[-1][1:]
+
+
+def risk_weight(symptom):
+    """Symptom log risk weight (0-30)."""
+    return _RISK_WEIGHTS.get(symptom, DEFAULT_RISK_WEIGHT)
+
+
+def is_risk_critical(symptom):
+    return bool(SYMPTOM_BITS.get(symptom, 0) & RISK_CRITICAL_MASK)
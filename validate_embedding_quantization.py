@@ -0,0 +1,87 @@
+"""
+Recall check for the quantized symptom embedding index.
+
+Encodes every alias phrase from symptom_aliases.json (the same kind of terms
+find_similar_symptoms sees in production) and compares the matches returned by
+the float16 / int8 indexes with the float32 index at the production thresholds
+(0.70 default, 0.82 for LLM terms).
+
+Usage:
+    python validate_embedding_quantization.py [--min-recall 0.99]
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from embedding_store import QuantizedEmbeddingIndex, similarity_matrix
+from smart_triage_engine import SmartTriageEngine
+
+THRESHOLDS = (0.70, 0.82)
+
+
+def match_sets(similarities, threshold):
+    return [set(np.flatnonzero(row >= threshold)) for row in similarities]
+
+
+def validate_quantization(csv_path='knowledge_base_enhanced.csv', min_recall=0.99):
+    print("\n" + "="*60)
+    print("🔬 RUNNING EMBEDDING QUANTIZATION RECALL CHECK")
+    print("="*60)
+
+    try:
+        engine = SmartTriageEngine(csv_path)
+    except Exception as e:
+        print(f"❌ Failed to load engine: {e}")
+        return False
+    if engine.symptom_vectors is None:
+        print("❌ Symptom vectors unavailable")
+        return False
+
+    float32_index = np.asarray(engine.symptom_vectors, dtype=np.float32)
+
+    with open('symptom_aliases.json', 'r', encoding='utf-8') as f:
+        queries = sorted(set(json.load(f).keys()))
+    queries += [code.replace('_', ' ') for code in engine.symptom_names]
+    print(f"📋 Encoding {len(queries)} query phrases against {len(engine.symptom_names)} symptoms...\n")
+    query_vectors = engine.encode_texts(queries)
+
+    reference = similarity_matrix(float32_index, query_vectors)
+    passed = True
+
+    for mode in ('float16', 'int8'):
+        index = QuantizedEmbeddingIndex.from_float32(float32_index, mode)
+        scores = similarity_matrix(index, query_vectors)
+        max_error = float(np.abs(scores - reference).max())
+        print(f"--- {mode}: {index.nbytes / 1024:.0f} KB vs {float32_index.nbytes / 1024:.0f} KB float32 "
+              f"({float32_index.nbytes / index.nbytes:.1f}x smaller), max score error {max_error:.5f}")
+
+        for threshold in THRESHOLDS:
+            expected = match_sets(reference, threshold)
+            actual = match_sets(scores, threshold)
+            true_positive = sum(len(e & a) for e, a in zip(expected, actual))
+            total_expected = sum(len(e) for e in expected)
+            total_actual = sum(len(a) for a in actual)
+            identical = sum(1 for e, a in zip(expected, actual) if e == a)
+
+            recall = true_positive / total_expected if total_expected else 1.0
+            precision = true_positive / total_actual if total_actual else 1.0
+            status = "✅" if recall >= min_recall else "❌"
+            print(f"   {status} threshold {threshold:.2f}: recall {recall:.4f}, precision {precision:.4f}, "
+                  f"identical match sets {identical}/{len(queries)}")
+            if recall < min_recall:
+                passed = False
+
+    print("\n" + "="*60)
+    print("✅ QUANTIZATION CHECK PASSED" if passed else f"❌ RECALL BELOW {min_recall}")
+    print("="*60)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='knowledge_base_enhanced.csv')
+    parser.add_argument('--min-recall', type=float, default=0.99)
+    args = parser.parse_args()
+    sys.exit(0 if validate_quantization(args.csv, args.min_recall) else 1)
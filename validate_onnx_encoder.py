@@ -0,0 +1,61 @@
+"""
+Parity check for the ONNX Runtime embedding backends.
+
+Encodes the probe phrases plus the whole symptom vocabulary with the PyTorch
+sentence-transformer and with each ONNX backend, and fails if any phrase's
+cosine similarity between the two drops below ONNX_COSINE_TOLERANCE.
+
+Usage:
+    python validate_onnx_encoder.py [--tolerance 0.99] [--backend onnx-int8]
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from onnx_encoder import (DEFAULT_COSINE_TOLERANCE, PARITY_PROBE_PHRASES, cosine_rows,
+                          create_encoder)
+from smart_triage_engine import SEMANTIC_MODEL_NAME, SmartTriageEngine
+
+
+def validate_onnx_parity(backends=('onnx', 'onnx-int8'), tolerance=DEFAULT_COSINE_TOLERANCE,
+                         csv_path='knowledge_base_enhanced.csv'):
+    print("\n" + "="*60)
+    print("🔬 RUNNING ONNX ENCODER PARITY CHECK")
+    print("="*60)
+
+    engine = SmartTriageEngine(csv_path, load_semantic_model=False)
+    phrases = PARITY_PROBE_PHRASES + [code.replace('_', ' ') for code in engine.symptom_names]
+
+    torch_model, _ = create_encoder(SEMANTIC_MODEL_NAME, backend='torch')
+    expected = np.asarray(torch_model.encode(phrases, convert_to_numpy=True), dtype=np.float32)
+    print(f"📋 {len(phrases)} phrases, tolerance {tolerance}\n")
+
+    passed = True
+    for backend in backends:
+        encoder, backend_used = create_encoder(SEMANTIC_MODEL_NAME, backend=backend, tolerance=0.0)
+        if backend_used != backend:
+            print(f"❌ {backend}: export failed, encoder fell back to {backend_used}")
+            passed = False
+            continue
+
+        cosines = cosine_rows(expected, encoder.encode(phrases))
+        worst = int(np.argmin(cosines))
+        ok = cosines[worst] >= tolerance
+        print(f"{'✅' if ok else '❌'} {backend}: min cosine {cosines[worst]:.5f} ('{phrases[worst]}'), "
+              f"mean {cosines.mean():.5f}")
+        passed = passed and ok
+
+    print("\n" + "="*60)
+    print("✅ ONNX PARITY CHECK PASSED" if passed else "❌ ONNX PARITY CHECK FAILED")
+    print("="*60)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', action='append', choices=['onnx', 'onnx-int8'])
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_COSINE_TOLERANCE)
+    parser.add_argument('--csv', default='knowledge_base_enhanced.csv')
+    args = parser.parse_args()
+    sys.exit(0 if validate_onnx_parity(tuple(args.backend or ('onnx', 'onnx-int8')), args.tolerance, args.csv) else 1)
@@ -5,19 +5,27 @@ Integrates vector similarity search with existing symptom checker
 
 from smart_triage_engine import SmartTriageEngine
 import logging
-import json
-import os
 import re
 import ast
 import datetime
-from chatbot.utils import get_gemini_client
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from chatbot.llm_gateway import agenerate_text, generate_text, llm_available
+from symptom_lexicon import get_symptom_lexicon
+from knowledge_base_versions import VersionedKnowledgeBase
 from modules.questionnaire.diagnosis_verifier import DiagnosisVerifier
+from utils.timing import in_context, span, timed
+from utils.triage_rules import red_flags_in
 
 logger = logging.getLogger(__name__)
 
-# Initialize engine (singleton - loads once)
-_triage_engine = None
-_diagnosis_verifier = None
+KNOWLEDGE_BASE_FILE = 'knowledge_base_enhanced.csv'
+
+# Versioned knowledge base (engine + verifier), hot-reloaded when the CSV changes
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
 
 
 def clean_name_for_matching(name):
@@ -32,65 +40,88 @@ def clean_name_for_matching(name):
     # Remove everything except alphanumeric and lowercase
     return re.sub(r'[^a-zA-Z0-9]', '', n).lower().strip()
 
-def get_triage_engine():
-    global _triage_engine
-    if _triage_engine is None:
-        try:
-            _triage_engine = SmartTriageEngine('knowledge_base_enhanced.csv')
-            logger.info("✓ Vector Similarity Engine initialized successfully")
-        except Exception as e:
-            logger.error(f"✗ Failed to initialize engine: {e}")
-            raise
-    return _triage_engine
+def _create_triage_engine(knowledge_base_file):
+    sidecar_socket = getattr(settings, 'TRIAGE_SIDECAR_SOCKET', '')
+    if sidecar_socket:
+        # Model lives in the shared sidecar; this worker only compiles the knowledge base
+        from triage_client import SidecarTriageEngine, TriageSidecarClient
+        engine = SidecarTriageEngine(
+            SmartTriageEngine(knowledge_base_file, load_semantic_model=False),
+            TriageSidecarClient(
+                sidecar_socket,
+                timeout=getattr(settings, 'TRIAGE_SIDECAR_TIMEOUT', 2.0),
+                pool_size=getattr(settings, 'TRIAGE_SIDECAR_POOL_SIZE', 8)
+            )
+        )
+        logger.info(f"✓ Vector Similarity Engine initialized (semantic matching via sidecar {sidecar_socket})")
+        return engine
+    return SmartTriageEngine(knowledge_base_file)
 
-def get_diagnosis_verifier():
-    global _diagnosis_verifier
-    if _diagnosis_verifier is None:
-        try:
-            _diagnosis_verifier = DiagnosisVerifier('knowledge_base_enhanced.csv')
-            logger.info("✓ Diagnosis Verifier initialized successfully")
-        except Exception as e:
-            logger.error(f"✗ Failed to initialize diagnosis verifier: {e}")
-            logger.warning("⚠️ Continuing without diagnosis verification (OOD detection disabled)")
-    return _diagnosis_verifier
-
-RED_FLAG_SYMPTOMS = {
-    'seizures', 'tremors', 'collapse', 'unconscious', 'respiratory_distress', 
-    'difficulty_breathing', 'pale_gums', 'blue_gums', 'cyanosis',
-    'bleeding', 'blood_in_urine', 'bloody_diarrhea', 'paralysis',
-    'shock', 'severe_dehydration', 'unresponsive', 'convulsions'
-}
-
-def extract_symptoms_from_text(user_notes, existing_symptoms=None, species='Dog'):
-    # (Keep existing implementation - no changes needed here)
-    if not user_notes or not user_notes.strip():
-        return {
-            'extracted_symptoms': [],
-            'combined_symptoms': existing_symptoms or [],
-            'red_flags_detected': [],
-            'raw_matches': {},
-            'semantic_matches': {},
-            'gemini_normalized': None
-        }
-    
-    # Load symptom aliases and all symptoms
+def _build_knowledge_base_version(knowledge_base_file, previous):
+    """
+    Build (engine, verifier) for one knowledge base version. Reloads reuse the previous
+    engine's sentence transformer and symptom vectors instead of loading them again.
+    """
     try:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        with open(os.path.join(base_dir, 'symptom_aliases.json'), 'r', encoding='utf-8') as f:
-            symptom_aliases = json.load(f)
-        with open(os.path.join(base_dir, 'all_symptoms.json'), 'r', encoding='utf-8') as f:
-            all_symptoms = json.load(f)
+        if previous is None:
+            engine = _create_triage_engine(knowledge_base_file)
+        else:
+            engine = previous.engine.with_knowledge_base(knowledge_base_file)
+        logger.info("✓ Vector Similarity Engine initialized successfully")
     except Exception as e:
-        logger.error(f"Failed to load symptom data: {e}")
-        return {
-            'extracted_symptoms': [],
-            'combined_symptoms': existing_symptoms or [],
-            'red_flags_detected': [],
-            'raw_matches': {},
-            'semantic_matches': {},
-            'gemini_normalized': None
-        }
-    
+        logger.error(f"✗ Failed to initialize engine: {e}")
+        raise
+    if not engine.knowledge_base.diseases:
+        raise ValueError(f"{knowledge_base_file} contains no diseases")
+
+    verifier = None
+    try:
+        verifier = DiagnosisVerifier(knowledge_base_file)
+        logger.info("✓ Diagnosis Verifier initialized successfully")
+    except Exception as e:
+        logger.error(f"✗ Failed to initialize diagnosis verifier: {e}")
+        logger.warning("⚠️ Continuing without diagnosis verification (OOD detection disabled)")
+    return engine, verifier
+
+def get_knowledge_base():
+    """Process-wide VersionedKnowledgeBase; checks the CSV every TRIAGE_KB_RELOAD_INTERVAL seconds."""
+    global _knowledge_base
+    if _knowledge_base is None:
+        with _knowledge_base_lock:
+            if _knowledge_base is None:
+                _knowledge_base = VersionedKnowledgeBase(
+                    KNOWLEDGE_BASE_FILE,
+                    _build_knowledge_base_version,
+                    check_interval=getattr(settings, 'TRIAGE_KB_RELOAD_INTERVAL', 30)
+                )
+    return _knowledge_base
+
+def loaded_knowledge_base():
+    """The VersionedKnowledgeBase if a request already built it, else None (never loads the model)."""
+    return _knowledge_base
+
+def get_triage_engine():
+    return get_knowledge_base().current().engine
+
+def get_diagnosis_verifier():
+    return get_knowledge_base().current().verifier
+
+# Species with question trees; everything else runs in dynamic mode on user_notes alone
+STANDARD_SPECIES = {'Dog', 'Cat', 'Rabbit'}
+
+def _empty_extraction_result(existing_symptoms=None):
+    return {
+        'extracted_symptoms': [],
+        'combined_symptoms': existing_symptoms or [],
+        'red_flags_detected': [],
+        'raw_matches': {},
+        'semantic_matches': {},
+        'gemini_normalized': None,
+        'extraction_tier': None
+    }
+
+def filter_negated_sentences(user_notes):
+    """Lowercase the notes and drop sentences containing a negation keyword."""
     user_text = user_notes.lower().strip()
     negation_keywords = {'no', 'not', 'wala', 'hindi', 'walang', "isn't", "hasn't", "doesn't", "won't"}
     sentences = re.split(r'[.!?;]', user_text)
@@ -105,40 +136,47 @@ def extract_symptoms_from_text(user_notes, existing_symptoms=None, species='Dog'
         else:
             safe_sentences.append(sentence)
     
-    filtered_text = ' '.join(safe_sentences)
-    if not filtered_text.strip():
-        return {
-            'extracted_symptoms': [],
-            'combined_symptoms': existing_symptoms or [],
-            'red_flags_detected': [],
-            'raw_matches': {},
-            'semantic_matches': {},
-            'gemini_normalized': None
-        }
-    
-    regex_extracted = set()
-    raw_matches = {}
-    search_dict = dict(symptom_aliases)
-    for symptom in all_symptoms:
-        search_dict[symptom] = symptom
-        search_dict[symptom.replace('_', ' ')] = symptom
-    
-    sorted_phrases = sorted(search_dict.keys(), key=len, reverse=True)
-    for phrase in sorted_phrases:
-        pattern = r'\b' + re.escape(phrase) + r'\b'
-        if re.search(pattern, filtered_text, re.IGNORECASE):
-            symptom_code = search_dict[phrase]
-            regex_extracted.add(symptom_code)
-            raw_matches[phrase] = symptom_code
+    return ' '.join(safe_sentences)
 
+def map_llm_terms_to_symptoms(potential_symptoms, search_dict, regex_extracted):
+    """
+    Map LLM-normalized symptom terms to symptom codes (direct lexicon hit, else
+    semantic match). Terms with no match are kept raw so the verifier can see them.
+    
+    Returns:
+        (semantic_extracted, semantic_matches)
+    """
     semantic_extracted = set()
     semantic_matches = {}
-    gemini_normalized_text = None
+    terms = [(text, text.lower().strip()) for text in potential_symptoms if text.lower().strip()]
     
-    try:
-        model = get_gemini_client()
-        if model:
-            prompt = f'''Act as a senior veterinary terminologist with expertise in {species} medicine. 
+    # Every term without a direct lexicon hit goes through one batched vector search
+    unmatched = [text for text, lower in terms if lower not in search_dict]
+    similar = {}
+    if unmatched:
+        with span('embedding_match'):
+            similar = dict(zip(unmatched, get_triage_engine().find_similar_symptoms_batch(unmatched, threshold=0.82)))
+    
+    for symptom_text, symptom_lower in terms:
+        if symptom_lower in search_dict:
+            direct_match = search_dict[symptom_lower]
+            if direct_match not in regex_extracted:
+                semantic_extracted.add(direct_match)
+                semantic_matches[direct_match] = 1.0
+        else:
+            matches = similar[symptom_text]
+            if matches:
+                for symptom_code, score in matches:
+                    if symptom_code not in regex_extracted:
+                        semantic_extracted.add(symptom_code)
+                        semantic_matches[symptom_code] = score
+            else:
+                # If no match in DB, keep the raw symptom so the verifier can see it
+                semantic_extracted.add(symptom_lower)
+    return semantic_extracted, semantic_matches
+
+def build_extraction_prompt(user_notes, species):
+    return f'''Act as a senior veterinary terminologist with expertise in {species} medicine. 
 
 Analyze this input: "{user_notes}"
 
@@ -151,35 +189,104 @@ Analyze this input: "{user_notes}"
 4. Return ONLY a comma-separated list of these terms. If none, return "None".
 
 Your response (comma-separated list only):'''
-            response = model.generate_content(prompt)
-            if hasattr(response, 'text') and response.text:
-                gemini_output = response.text.strip()
-                if gemini_output and gemini_output.lower() not in ['none', 'no symptoms', 'n/a', '']:
-                    gemini_normalized_text = gemini_output
-                    potential_symptoms = [s.strip() for s in gemini_normalized_text.split(',') if s.strip()]
-                    engine = get_triage_engine()
-                    for symptom_text in potential_symptoms:
-                        symptom_lower = symptom_text.lower().strip()
-                        if symptom_lower in search_dict:
-                            direct_match = search_dict[symptom_lower]
-                            if direct_match not in regex_extracted:
-                                semantic_extracted.add(direct_match)
-                                semantic_matches[direct_match] = 1.0
-                        else:
-                            matches = engine.find_similar_symptoms(symptom_text, threshold=0.82)
-                            if matches:
-                                for symptom_code, score in matches:
-                                    if symptom_code not in regex_extracted:
-                                        semantic_extracted.add(symptom_code)
-                                        semantic_matches[symptom_code] = score
-                            else:
-                                # If no match in DB, keep the raw symptom so the verifier can see it
-                                semantic_extracted.add(symptom_lower)
+
+def parse_llm_extraction(gemini_output, search_dict, regex_extracted):
+    """
+    Map the comma-separated terms of a Gemini extraction response to symptom codes.
+    
+    Returns:
+        (semantic_extracted, semantic_matches, gemini_normalized_text)
+    """
+    if not gemini_output or gemini_output.lower() in ['none', 'no symptoms', 'n/a', '']:
+        return set(), {}, None
+    potential_symptoms = [s.strip() for s in gemini_output.split(',') if s.strip()]
+    semantic_extracted, semantic_matches = map_llm_terms_to_symptoms(
+        potential_symptoms, search_dict, regex_extracted
+    )
+    return semantic_extracted, semantic_matches, gemini_output
+
+def extract_symptoms_with_llm(user_notes, species, search_dict, regex_extracted):
+    """
+    Gemini-assisted extraction stage: translate/normalize the notes, then map each
+    returned term to a symptom code.
+    
+    Returns:
+        (semantic_extracted, semantic_matches, gemini_normalized_text)
+    """
+    try:
+        with span('llm_extraction'):
+            gemini_output = generate_text(build_extraction_prompt(user_notes, species), 'symptom_extraction')
+        return parse_llm_extraction(gemini_output, search_dict, regex_extracted)
     except Exception as e:
         logger.warning(f"⚠️  LLM-assisted extraction failed: {e}")
+    return set(), {}, None
 
-    extracted = regex_extracted | semantic_extracted
-    red_flags_detected = [s for s in extracted if s in RED_FLAG_SYMPTOMS]
+async def aextract_symptoms_with_llm(user_notes, species, search_dict, regex_extracted):
+    """extract_symptoms_with_llm for the async path; the term mapping runs on the triage pool."""
+    try:
+        with span('llm_extraction'):
+            gemini_output = await agenerate_text(build_extraction_prompt(user_notes, species), 'symptom_extraction')
+        return await _in_triage_pool(parse_llm_extraction, gemini_output, search_dict, regex_extracted)
+    except Exception as e:
+        logger.warning(f"⚠️  LLM-assisted extraction failed: {e}")
+    return set(), {}, None
+
+def extract_symptoms_locally(filtered_text, lexicon):
+    """
+    Deterministic and embedding tiers of the extractor.
+    
+    1. deterministic: the alias lexicon matched every clause of the (negation-filtered)
+       notes and the share of unknown tokens is within TRIAGE_UNKNOWN_TOKEN_THRESHOLD.
+    2. embedding: every remaining gap resolves through SmartTriageEngine.find_similar_symptoms_batch.
+    
+    Returns:
+        (raw_matches, regex_extracted, semantic_extracted, semantic_matches, tier) where
+        tier is 'deterministic', 'embedding', or None when Gemini is still needed.
+    """
+    with span('regex_extraction'):
+        coverage = lexicon.analyze_coverage(filtered_text)
+    raw_matches = coverage['matches']
+    regex_extracted = set(raw_matches.values())
+    semantic_extracted = set()
+    semantic_matches = {}
+
+    if not getattr(settings, 'TRIAGE_TIERED_EXTRACTION', True):
+        return raw_matches, regex_extracted, semantic_extracted, semantic_matches, None
+
+    threshold = getattr(settings, 'TRIAGE_UNKNOWN_TOKEN_THRESHOLD', 0.25)
+    content_tokens = coverage['content_tokens']
+    unknown_ratio = coverage['unknown_tokens'] / content_tokens if content_tokens else 0.0
+    gaps = [
+        clause for clause in coverage['clauses']
+        if not clause['matched'] or (unknown_ratio > threshold and clause['unknown_tokens'])
+    ]
+    if not gaps:
+        return raw_matches, regex_extracted, semantic_extracted, semantic_matches, 'deterministic'
+
+    resolved_all = True
+    try:
+        phrases = [' '.join(clause['unknown_tokens']) if clause['matched'] else clause['text'] for clause in gaps]
+        with span('embedding_match'):
+            batch_matches = get_triage_engine().find_similar_symptoms_batch(phrases, threshold=0.82)
+        for matches in batch_matches:
+            if not matches:
+                resolved_all = False
+            for symptom_code, score in matches:
+                if symptom_code not in regex_extracted:
+                    semantic_extracted.add(symptom_code)
+                    semantic_matches[symptom_code] = score
+    except Exception as e:
+        logger.warning(f"⚠️  Embedding extraction tier failed: {e}")
+        resolved_all = False
+
+    tier = 'embedding' if resolved_all else None
+    return raw_matches, regex_extracted, semantic_extracted, semantic_matches, tier
+
+def _assemble_extraction_result(existing_symptoms, raw_matches, regex_extracted,
+                                semantic_extracted=(), semantic_matches=None, gemini_normalized_text=None,
+                                extraction_tier=None):
+    extracted = set(regex_extracted) | set(semantic_extracted)
+    red_flags_detected = red_flags_in(extracted)
     existing_set = set(existing_symptoms or [])
     combined = list(existing_set | extracted)
     
@@ -188,8 +295,563 @@ Your response (comma-separated list only):'''
         'combined_symptoms': combined,
         'red_flags_detected': red_flags_detected,
         'raw_matches': raw_matches,
-        'semantic_matches': semantic_matches,
-        'gemini_normalized': gemini_normalized_text
+        'semantic_matches': semantic_matches or {},
+        'gemini_normalized': gemini_normalized_text,
+        'extraction_tier': extraction_tier
+    }
+
+def extract_symptoms_from_text(user_notes, existing_symptoms=None, species='Dog', use_llm=True):
+    if not user_notes or not user_notes.strip():
+        return _empty_extraction_result(existing_symptoms)
+    
+    # Compiled alias lexicon (built once, reloaded only when the JSON files change)
+    try:
+        lexicon = get_symptom_lexicon()
+    except Exception as e:
+        logger.error(f"Failed to load symptom data: {e}")
+        return _empty_extraction_result(existing_symptoms)
+    
+    filtered_text = filter_negated_sentences(user_notes)
+    if not filtered_text.strip():
+        return _empty_extraction_result(existing_symptoms)
+    
+    # Tiered: lexicon -> local embeddings -> Gemini only as the last resort
+    raw_matches, regex_extracted, semantic_extracted, semantic_matches, tier = extract_symptoms_locally(
+        filtered_text, lexicon
+    )
+    gemini_normalized_text = None
+    if tier is None and use_llm:
+        llm_extracted, llm_matches, gemini_normalized_text = extract_symptoms_with_llm(
+            user_notes, species, lexicon.search_dict, regex_extracted
+        )
+        semantic_extracted |= llm_extracted
+        semantic_matches.update(llm_matches)
+        tier = 'llm'
+
+    return _assemble_extraction_result(
+        existing_symptoms, raw_matches, regex_extracted,
+        semantic_extracted, semantic_matches, gemini_normalized_text, tier
+    )
+
+# ============================================================================
+# CONCURRENT PIPELINE STAGES
+# ============================================================================
+
+_triage_executor = None
+_triage_executor_lock = threading.Lock()
+
+def get_triage_executor():
+    """Bounded thread pool shared by all requests for overlapping pipeline stages."""
+    global _triage_executor
+    if _triage_executor is None:
+        with _triage_executor_lock:
+            if _triage_executor is None:
+                _triage_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'TRIAGE_MAX_WORKERS', 8),
+                    thread_name_prefix='triage-stage'
+                )
+    return _triage_executor
+
+# Stages given up on at their deadline, per stage name. 'cancelled' never started;
+# the rest were already running and keep a pool thread busy until they finish.
+_abandoned_stages = {}
+_cancelled_stages = {}
+_stage_stats_lock = threading.Lock()
+
+def _count_abandoned_stage(stage, cancelled):
+    with _stage_stats_lock:
+        _abandoned_stages[stage] = _abandoned_stages.get(stage, 0) + 1
+        if cancelled:
+            _cancelled_stages[stage] = _cancelled_stages.get(stage, 0) + 1
+
+def triage_stage_stats():
+    """Pipeline stages abandoned at their deadline in this process, total and per stage."""
+    with _stage_stats_lock:
+        return {
+            'abandoned': sum(_abandoned_stages.values()),
+            'cancelled_before_start': sum(_cancelled_stages.values()),
+            'abandoned_by_stage': dict(_abandoned_stages),
+        }
+
+def _wait_for_stage(future, stage, timeout, default):
+    """Result of a pipeline stage, or `default` if it fails or exceeds its deadline."""
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        # Frees the pool slot if the stage is still queued; a running stage cannot be stopped
+        _count_abandoned_stage(stage, cancelled=future.cancel())
+        logger.warning(f"⏱️ Triage stage '{stage}' exceeded {timeout}s deadline - continuing without it")
+    except Exception as e:
+        logger.warning(f"⚠️ Triage stage '{stage}' failed: {e}")
+    return default
+
+def _with_db_cleanup(func, *args, **kwargs):
+    """Run an ORM-using stage in a pool thread and release that thread's DB connection."""
+    from django.db import connection
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connection.close()
+
+@timed('health_trend_lookup')
+def load_health_context(payload):
+    """Signalment plus the pet's latest PetHealthTrend, used as verification context."""
+    context_data = {
+        'age': payload.get('age', 'Unknown'),    
+        'breed': payload.get('breed', 'Unknown'), 
+        'sex': payload.get('sex', 'Unknown'),
+
+    }
+    pet_id = payload.get('pet_id')
+    if pet_id:
+        try:
+            from chatbot.models import PetHealthTrend
+            latest_trend = PetHealthTrend.objects.filter(pet_id=pet_id).order_by('-analysis_date').first()
+            if latest_trend:
+                context_data['medical_history'] = f"Recent Trend: {latest_trend.trend_analysis}."
+                context_data['risk_score'] = latest_trend.risk_score
+                context_data['urgency_level'] = latest_trend.urgency_level
+        except Exception:
+            pass
+    return context_data
+
+def _extract_locally_for_request(symptoms_list, user_notes):
+    """
+    Local extraction tiers for a request's notes.
+    
+    Returns:
+        (extraction_result, pending) - pending is (search_dict, raw_matches, regex_extracted,
+        semantic_extracted, semantic_matches) when only Gemini can cover the notes, else None
+    """
+    extraction_result = _empty_extraction_result(symptoms_list)
+    filtered_text = filter_negated_sentences(user_notes) if user_notes and user_notes.strip() else ''
+    if not filtered_text.strip():
+        return extraction_result, None
+    try:
+        lexicon = get_symptom_lexicon()
+    except Exception as e:
+        logger.error(f"Failed to load symptom data: {e}")
+        return extraction_result, None
+
+    raw_matches, regex_extracted, semantic_extracted, semantic_matches, tier = extract_symptoms_locally(
+        filtered_text, lexicon
+    )
+    extraction_result = _assemble_extraction_result(
+        symptoms_list, raw_matches, regex_extracted, semantic_extracted, semantic_matches,
+        extraction_tier=tier
+    )
+    pending = None
+    if tier is None:
+        pending = (lexicon.search_dict, raw_matches, regex_extracted, semantic_extracted, semantic_matches)
+    return extraction_result, pending
+
+def _merge_llm_extraction(symptoms_list, pending, llm_output, preliminary):
+    """
+    Fold a Gemini extraction into the local result. The preliminary diagnosis is
+    dropped (None) if the LLM found symptoms the local tiers did not.
+    
+    Returns:
+        (extraction_result, preliminary)
+    """
+    _, raw_matches, regex_extracted, semantic_extracted, semantic_matches = pending
+    llm_extracted, llm_matches, gemini_normalized_text = llm_output
+    if llm_extracted - regex_extracted - semantic_extracted:
+        preliminary = None
+    extraction_result = _assemble_extraction_result(
+        symptoms_list, raw_matches, regex_extracted,
+        semantic_extracted | llm_extracted, {**semantic_matches, **llm_matches},
+        gemini_normalized_text, 'llm'
+    )
+    return extraction_result, preliminary
+
+def _run_concurrent_stages(engine, payload, species, symptoms_list, user_notes, use_llm=True):
+    """
+    Overlap the independent waits of a triage request.
+    
+    The PetHealthTrend lookup runs in the shared pool. The local extraction tiers run
+    in the request thread; when they cannot cover the notes, the Gemini extraction
+    call is submitted to the pool while a preliminary diagnose runs on the locally
+    extracted symptoms. If the LLM adds nothing (or misses its deadline) the
+    preliminary diagnosis is reused as-is.
+    
+    Returns:
+        (extraction_result, preliminary_diagnosis or None, context_data)
+    """
+    executor = get_triage_executor()
+    history_future = executor.submit(in_context(_with_db_cleanup, load_health_context, payload))
+
+    extraction_result, pending = _extract_locally_for_request(symptoms_list, user_notes)
+    llm_future = None
+    if pending is not None and use_llm:
+        llm_future = executor.submit(in_context(extract_symptoms_with_llm, user_notes, species, pending[0], pending[2]))
+
+    preliminary = engine.diagnose(species=species, symptoms=extraction_result['combined_symptoms'], top_n=5)
+
+    if llm_future is not None:
+        llm_output = _wait_for_stage(
+            llm_future, 'llm_extraction',
+            getattr(settings, 'TRIAGE_LLM_EXTRACTION_TIMEOUT', 10),
+            (set(), {}, None)
+        )
+        extraction_result, preliminary = _merge_llm_extraction(symptoms_list, pending, llm_output, preliminary)
+
+    context_data = _wait_for_stage(
+        history_future, 'health_history',
+        getattr(settings, 'TRIAGE_HISTORY_TIMEOUT', 3),
+        None
+    ) or load_health_context({k: v for k, v in payload.items() if k != 'pet_id'})
+
+    return extraction_result, preliminary, context_data
+
+def get_dense_retrieval_mode(species):
+    """
+    TRIAGE_DENSE_RETRIEVAL for this species: 'off', 'fallback' (rank disease profiles
+    against the notes when Gemini extraction failed, timed out or is disabled) or
+    'always' (never call Gemini). Standard species always use the question tree path.
+    """
+    if species in STANDARD_SPECIES:
+        return 'off'
+    return getattr(settings, 'TRIAGE_DENSE_RETRIEVAL', 'fallback')
+
+def retrieve_disease_profiles(engine, species, user_notes, symptoms_list):
+    """LLM-free dense retrieval of the top disease profiles for the raw notes ([] if unavailable)."""
+    try:
+        with span('dense_retrieval'):
+            return engine.retrieve_diseases(
+                species, filter_negated_sentences(user_notes), top_n=5, user_symptoms=symptoms_list
+            )
+    except Exception as e:
+        logger.warning(f"⚠️ Dense retrieval failed: {e}")
+        return []
+
+def build_predictions(result):
+    """Convert engine top matches (>= 50%) into the prediction dicts used downstream."""
+    predictions = []
+    for match in result['top_matches']:
+        if match['match_percentage'] < 50:
+            continue
+        score = match['match_percentage']
+        if score >= 90:
+            match_label = "Strong triage alignment"
+        elif score >= 70:
+            match_label = "Consistent with presentation"
+        else:
+            match_label = "Possible consideration"
+        predictions.append({
+            'disease': match['disease'],
+            'match_level': match_label,
+            'urgency': match['base_urgency'],
+            'contagious': match['contagious'],
+            'matched_symptoms': match['matched_symptoms'],
+            'match_explanation': f"Matched {len(match['matched_symptoms'])} symptoms",
+
+            # Keep these for INTERNAL backend logic only (like sorting or flag triggers)
+            'internal_probability': match['match_percentage'] / 100, 
+            'total_symptoms': match['total_disease_symptoms'],
+            'is_external': False
+        })
+    return predictions
+
+def _prepare_combined_call(engine, payload, species, symptoms_list, user_notes):
+    """
+    Local half of the combined mode: extraction tiers, candidate ranking and health context.
+    
+    Returns:
+        dict with the state _finish_combined_call needs and 'verify_kwargs' for the
+        Gemini call, or None if the local tiers already cover the notes
+    """
+    if not user_notes or not user_notes.strip():
+        return None
+    filtered_text = filter_negated_sentences(user_notes)
+    if not filtered_text.strip():
+        return None
+    try:
+        lexicon = get_symptom_lexicon()
+    except Exception as e:
+        logger.error(f"Failed to load symptom data: {e}")
+        return None
+
+    raw_matches, regex_extracted, local_extracted, local_matches, tier = extract_symptoms_locally(
+        filtered_text, lexicon
+    )
+    if tier is not None:
+        return None
+    regex_symptoms = _assemble_extraction_result(
+        symptoms_list, raw_matches, regex_extracted, local_extracted
+    )['combined_symptoms']
+
+    result = engine.diagnose(species=species, symptoms=regex_symptoms, top_n=5)
+    if not result.get('top_matches'):
+        result['top_matches'] = engine.knowledge_base.all_species_index.match(regex_symptoms, top_n=5)
+    context_data = load_health_context(payload)
+
+    return {
+        'search_dict': lexicon.search_dict,
+        'raw_matches': raw_matches,
+        'regex_extracted': regex_extracted,
+        'local_extracted': local_extracted,
+        'local_matches': local_matches,
+        'result': result,
+        'context_data': context_data,
+        'verify_kwargs': dict(
+            user_symptoms=regex_symptoms,
+            system_predictions=build_predictions(result),
+            species=species,
+            user_notes=user_notes,
+            context_data=context_data
+        ),
+    }
+
+def _finish_combined_call(symptoms_list, prepared, combined):
+    """Merge the combined Gemini answer into (extraction_result, diagnosis, context_data, verification_result)."""
+    if combined is None:
+        logger.warning("⚠️ Combined extraction + verification call failed - falling back to two-call path")
+        return None
+
+    normalized_terms, verification_result = combined
+    semantic_extracted, semantic_matches = map_llm_terms_to_symptoms(
+        normalized_terms, prepared['search_dict'], prepared['regex_extracted']
+    )
+    extraction_result = _assemble_extraction_result(
+        symptoms_list, prepared['raw_matches'], prepared['regex_extracted'],
+        prepared['local_extracted'] | semantic_extracted, {**prepared['local_matches'], **semantic_matches},
+        ', '.join(normalized_terms) or None, 'llm'
+    )
+    return extraction_result, prepared['result'], prepared['context_data'], verification_result
+
+def _run_combined_llm_call(engine, verifier, payload, species, symptoms_list, user_notes):
+    """
+    Single-round-trip mode: rank candidates from the locally extracted symptoms first,
+    then ask Gemini once for both the normalized symptom list and the verification
+    JSON (DiagnosisVerifier.verify_with_extraction).
+    
+    Returns:
+        (extraction_result, diagnosis, context_data, verification_result), or None
+        if the local tiers already cover the notes (no extraction call needed) or the
+        combined call failed, in which case the regular path is used instead.
+    """
+    prepared = _prepare_combined_call(engine, payload, species, symptoms_list, user_notes)
+    if prepared is None:
+        return None
+    combined = verifier.verify_with_extraction(**prepared['verify_kwargs'])
+    return _finish_combined_call(symptoms_list, prepared, combined)
+
+# ============================================================================
+# TRIAGE PHASES (shared by the sync and async entry points)
+# ============================================================================
+
+def _rank_candidates(engine, payload, species, user_notes, dense_mode, llm_up,
+                     extraction_result, result, context_data):
+    """
+    Safety interceptor, dense retrieval and final candidate ranking on the merged symptom set.
+    
+    Returns:
+        (symptoms_list, result, predictions, context_data, safety_override_reason, dense_retrieval_used)
+    """
+    # === SAFETY INTERCEPTOR ===
+    safety_override_reason = []
+    if extraction_result['red_flags_detected']:
+        safety_override_reason = [s.replace('_', ' ').title() for s in extraction_result['red_flags_detected']]
+        logger.warning(f"🚨 SAFETY INTERCEPTOR ACTIVATED: {safety_override_reason}")
+
+    symptoms_list = extraction_result['combined_symptoms']
+
+    # === DENSE RETRIEVAL (dynamic-mode species without a usable Gemini extraction) ===
+    dense_retrieval_used = False
+    llm_extraction_missing = (
+        extraction_result.get('extraction_tier') == 'llm' and not extraction_result.get('gemini_normalized')
+    ) or (not llm_up and extraction_result.get('extraction_tier') is None)
+    if dense_mode == 'always' or (dense_mode == 'fallback' and llm_extraction_missing):
+        retrieved = retrieve_disease_profiles(engine, species, user_notes, symptoms_list)
+        if retrieved:
+            logger.info(f"🔎 Dense retrieval used for {species}: {[m['disease'] for m in retrieved]}")
+            if result is None:
+                result = engine.diagnose(species=species, symptoms=symptoms_list, top_n=5)
+            result['top_matches'] = retrieved
+            extraction_result['extraction_tier'] = 'dense_retrieval'
+            dense_retrieval_used = True
+
+    if result is None:
+        result = engine.diagnose(species=species, symptoms=symptoms_list, top_n=5)
+
+    if not result.get('top_matches'):
+        logger.info(f"No specific matches found for {species}. Falling back to general matching.")
+        result['top_matches'] = engine.knowledge_base.all_species_index.match(symptoms_list, top_n=5)
+
+    predictions = build_predictions(result)
+
+    # === MEMORY UPGRADE ===
+    if context_data is None:
+        context_data = load_health_context(payload)
+    
+    return symptoms_list, result, predictions, context_data, safety_override_reason, dense_retrieval_used
+
+def _apply_verification(predictions, verification_result, symptoms_list):
+    """Re-rank and enrich predictions (in place) with the Gemini verification result."""
+    # === SHARED HELPER: ENRICH SECONDARY ADVICE ===
+    # We define this helper locally to reuse it in both branches (Agreement AND Disagreement)
+    def enrich_secondary_predictions(preds, ai_result):
+        secondary_list = ai_result.get('secondary_advice', [])
+        alt_diag = ai_result.get('alternative_diagnosis') or {}
+        alt_name = clean_name_for_matching(alt_diag.get('name', ''))
+
+        # This will hold only the diseases the AI actually verified
+        filtered_preds = []
+
+        # 1. ALWAYS Keep the Top AI Correction (Index 0)
+        if preds:
+            filtered_preds.append(preds[0])
+
+        def clean_name(name): 
+            return clean_name_for_matching(name)
+
+
+        # Start from index 1 (since index 0 is the primary diagnosis)
+        for i in range(len(preds)):
+            curr = preds[i]
+            p_name_clean = clean_name(curr.get('disease', ''))
+
+            matched_advice = None
+
+            # Check 1: Is this the AI's primary correction?
+            if alt_name and (alt_name in p_name_clean or p_name_clean in alt_name):
+                curr['care_guidelines'] = ai_result.get('what_to_do_specific') or curr.get('care_guidelines')
+                curr['when_to_see_vet'] = ai_result.get('see_vet_if_specific') or curr.get('when_to_see_vet')
+                preds[i] = curr
+                continue
+            # Fuzzy match advice to disease name
+            for item in secondary_list:
+                adv_name_clean = clean_name(item.get('disease', ''))
+                if adv_name_clean and (adv_name_clean in p_name_clean or p_name_clean in adv_name_clean):
+                    matched_advice = item
+                    break
+
+            if matched_advice:
+                curr['care_guidelines'] = matched_advice.get('what_to_do', "Monitor specific symptoms.")
+                curr['when_to_see_vet'] = matched_advice.get('see_vet_if', "If symptoms persist.")
+                filtered_preds.append(curr)
+            else:
+                #curr['care_guidelines'] = "Monitor specific symptoms and keep pet comfortable."
+                #curr['when_to_see_vet'] = "If condition does not improve within 24 hours."
+                logger.info(f"🗑️ AI excluded irrelevant condition: {curr.get('disease')}")
+
+            preds[:] = filtered_preds
+    # ===============================================
+
+
+    # Reranking Logic
+    alt_diag = verification_result.get('alternative_diagnosis')
+
+    # Force "Disagreement" logic if database is empty but AI found a specific disease
+    is_db_empty = not predictions
+    ai_found_something = alt_diag and alt_diag.get('name')
+
+    if not verification_result.get('agreement') or (is_db_empty and ai_found_something):
+        if alt_diag and alt_diag.get('name'):
+            alt_disease_name = alt_diag['name']
+            found_match = False
+
+            # 1. Try to find and re-rank an existing database match
+            for idx, pred in enumerate(predictions):
+                p_name = clean_name_for_matching(pred.get('disease', ''))
+                a_name = clean_name_for_matching(alt_disease_name)
+
+                if a_name in p_name or p_name in a_name:
+                    found_match = True
+                    reranked = predictions.pop(idx)
+                    reranked['disease'] = f"⚠️ AI Potential Concern: {alt_disease_name}"
+                    reranked['care_guidelines'] = verification_result.get('what_to_do_specific')
+                    reranked['when_to_see_vet'] = verification_result.get('see_vet_if_specific')
+                    reranked['match_level'] = alt_diag.get('match_level') or alt_diag.get('matcch_level')
+                    predictions.insert(0, reranked)
+                    break
+
+            # 2. CRITICAL: If no match found (like Mange), INJECT IT AT INDEX 0
+            if not found_match:
+                ood_pred = {
+                    'disease': f"⚠️ AI Potential Concern: {alt_disease_name}",
+                    'confidence': 0.95,
+                    'match_level': alt_diag.get('match_level') or alt_diag.get('match_level') or 'Possible consideration',
+                    'urgency': verification_result.get('risk_assessment', 'MODERATE').lower(),
+                    'matched_symptoms': alt_diag.get('matched_symptoms', symptoms_list),
+                    'care_guidelines': verification_result.get('what_to_do_specific'),
+                    'when_to_see_vet': verification_result.get('see_vet_if_specific'),
+                    'match_explanation': f"AI Analysis: {verification_result['reasoning']}",
+                    'is_external': True
+                }
+                predictions.insert(0, ood_pred)
+
+        # 3. Always run secondary enrichment to fix the other items in the list
+        enrich_secondary_predictions(predictions, verification_result)
+        # ===================================================
+
+    else:
+        # === AGREEMENT BRANCH ===
+        if predictions:
+            # 1. Enrich the Top Result (Index 0)
+            top_pred = predictions[0]
+            top_pred['care_guidelines'] = verification_result.get('what_to_do_specific') or verification_result.get('care_advice', [])[0]
+            top_pred['when_to_see_vet'] = verification_result.get('see_vet_if_specific') or "If symptoms persist or worsen."
+
+            top_pred['match_explanation'] = f"AI Analysis: {verification_result['reasoning']}"
+            predictions[0] = top_pred
+
+            # 2. Enrich Secondary Results (Indices 1, 2, etc.)
+            enrich_secondary_predictions(predictions, verification_result)
+
+def _finalize_triage(kb_version, result, predictions, extraction_result, verification_result,
+                     safety_override_reason):
+    """Final urgency (safety override, vet-safe sync) and the response dict."""
+    # === SAFETY INTERCEPTOR ASSESSMENT ===
+    if safety_override_reason:
+        symptom_list_str = ', '.join(safety_override_reason)
+        dynamic_critical_message = f"🚨 CRITICAL ALERT: You reported '{symptom_list_str}'. Immediate veterinary care required."
+
+
+        result['recommendation'] = dynamic_critical_message
+        result['urgency'] = 'CRITICAL'
+    else:
+        emergency_indicators = result['urgency'] in ['CRITICAL', 'HIGH']
+        care_within = "IMMEDIATELY" if result['urgency'] == 'CRITICAL' else "24-48 hours"
+
+
+
+    # === VET-SAFE SYNC: Force overall result to match the #1 prediction ===
+    if predictions:
+        top_pred = predictions[0]
+        # Force top-level urgency to match the #1 disease
+        result['urgency'] = top_pred['urgency'].upper()
+
+        # Re-map the recommendation based on the top disease
+        rec_map = {
+            'CRITICAL': "Seek immediate emergency veterinary care",
+            'HIGH': "Contact your veterinarian urgently - same day appointment recommended",
+            'MODERATE': "Schedule veterinary appointment within 1-2 days",
+            'LOW': "Monitor symptoms and consult vet if condition worsens"
+        }
+        result['recommendation'] = rec_map.get(result['urgency'], result['recommendation'])
+
+    triage_assessment = {
+        'overall_urgency': result['urgency'].lower(),
+        'requires_immediate_care': result['urgency'] == 'CRITICAL',
+        'requires_care_within': "IMMEDIATELY" if result['urgency'] == 'CRITICAL' else "24-48 hours",
+        'urgency_reasoning': [result.get('urgency_reason', ''), result['recommendation']],
+        'red_flags': result.get('red_flags') or [],
+        'safety_override_applied': (result['urgency'] == 'CRITICAL')
+    }
+    return {
+        'success': True,
+        'predictions': predictions,
+        'triage_assessment': triage_assessment,
+        'engine': 'vector_similarity',
+        'knowledge_base_version': kb_version.version,
+        'extraction_tier': extraction_result.get('extraction_tier'),
+        'symptoms_analyzed': result['symptoms_analyzed'],
+        'recommendation': result['recommendation'],
+        'disclaimer': result['disclaimer'],
+        'overall_recommendation': result['recommendation'],
+        'urgency_level': result['urgency'].lower(),
+        'clinical_summary': verification_result.get('clinical_summary', '') if verification_result else ''
     }
 
 def predict_with_vector_similarity(payload):
@@ -197,259 +859,200 @@ def predict_with_vector_similarity(payload):
     Replace LightGBM prediction with vector similarity search
     """
     try:
-        engine = get_triage_engine()
+        # One knowledge base version for the whole request, even if a reload swaps in meanwhile
+        kb_version = get_knowledge_base().current()
+        engine = kb_version.engine
         species = payload.get('species', 'Dog')
         symptoms_list = payload.get('symptoms_list', [])
         user_notes = payload.get('user_notes', '')
+        concurrent_mode = getattr(settings, 'TRIAGE_CONCURRENT_MODE', True)
         
-        # === HYBRID TRIAGE ===
-        extraction_result = extract_symptoms_from_text(user_notes, symptoms_list, species)
+        dense_mode = get_dense_retrieval_mode(species)
         
-        # === SAFETY INTERCEPTOR ===
-        safety_override_active = False
-        safety_override_reason = []
-        if extraction_result['red_flags_detected']:
-            safety_override_active = True
-            safety_override_reason = [s.replace('_', ' ').title() for s in extraction_result['red_flags_detected']]
-            logger.warning(f"🚨 SAFETY INTERCEPTOR ACTIVATED: {safety_override_reason}")
+        # Gemini circuit open: engine-only triage instead of waiting on calls that will fail
+        llm_up = llm_available()
+        if not llm_up:
+            logger.warning("⚡ Gemini circuit open - skipping LLM extraction and verification")
         
-        symptoms_list = extraction_result['combined_symptoms']
-        result = engine.diagnose(species=species, symptoms=symptoms_list, top_n=5)
-
-        if not result.get('top_matches'):
-            logger.info(f"No specific matches found for {species}. Falling back to general matching.")
-            all_diseases = engine.knowledge_base.diseases 
-            result['top_matches'] = engine.disease_matcher.match_diseases(symptoms_list, all_diseases)
+        verifier = kb_version.verifier
+        verification_result = None
+        combined_run = None
         
-        predictions = []
-        for match in result['top_matches']:
-            if match['match_percentage'] < 50:
-                continue
-            score = match['match_percentage']
-            if score >= 90:
-                match_label = "Strong triage alignment"
-            elif score >= 70:
-                match_label = "Consistent with presentation"
-            else:
-                match_label = "Possible consideration"
-            predictions.append({
-                'disease': match['disease'],
-                'match_level': match_label,
-                'urgency': match['base_urgency'],
-                'contagious': match['contagious'],
-                'matched_symptoms': match['matched_symptoms'],
-                'match_explanation': f"Matched {len(match['matched_symptoms'])} symptoms",
-                
-                
-
-                # Keep these for INTERNAL backend logic only (like sorting or flag triggers)
-                'internal_probability': match['match_percentage'] / 100, 
-                'total_symptoms': match['total_disease_symptoms'],
-                'is_external': False
-            })
+        # === HYBRID TRIAGE ===
+        if verifier and llm_up and dense_mode != 'always' and getattr(settings, 'TRIAGE_COMBINED_LLM_CALL', False):
+            combined_run = _run_combined_llm_call(engine, verifier, payload, species, symptoms_list, user_notes)
         
-        # === MEMORY UPGRADE ===
-        context_data = {
-            'age': payload.get('age', 'Unknown'),    
-            'breed': payload.get('breed', 'Unknown'), 
-            'sex': payload.get('sex', 'Unknown'),
-
-        }
-        pet_id = payload.get('pet_id')
-        if pet_id:
-            try:
-                from chatbot.models import PetHealthTrend
-                latest_trend = PetHealthTrend.objects.filter(pet_id=pet_id).order_by('-analysis_date').first()
-                if latest_trend:
-                    context_data['medical_history'] = f"Recent Trend: {latest_trend.trend_analysis}."
-                    context_data['risk_score'] = latest_trend.risk_score
-                    context_data['urgency_level'] = latest_trend.urgency_level
-            except Exception:
-                pass
+        if dense_mode == 'always':
+            extraction_result = extract_symptoms_from_text(user_notes, symptoms_list, species, use_llm=False)
+            result = None
+            context_data = None
+        elif combined_run:
+            extraction_result, result, context_data, verification_result = combined_run
+        elif concurrent_mode:
+            extraction_result, result, context_data = _run_concurrent_stages(
+                engine, payload, species, symptoms_list, user_notes, use_llm=llm_up
+            )
+        else:
+            extraction_result = extract_symptoms_from_text(user_notes, symptoms_list, species, use_llm=llm_up)
+            result = None
+            context_data = None
         
-        # === DIAGNOSIS VERIFICATION ===
-        verification_result = None
-        ood_detected = False
-        verifier = get_diagnosis_verifier()
+        symptoms_list, result, predictions, context_data, safety_override_reason, dense_retrieval_used = _rank_candidates(
+            engine, payload, species, user_notes, dense_mode, llm_up, extraction_result, result, context_data
+        )
         
-        if verifier:
+        # === DIAGNOSIS VERIFICATION ===
+        # Skipped on the dense retrieval path, which exists to avoid waiting on Gemini, and
+        # always in 'always' mode (never calls Gemini, even when retrieval found nothing)
+        if verifier and llm_up and dense_mode != 'always' and not dense_retrieval_used:
             try:
-                verification_result = verifier.verify_diagnosis(
+                verify_kwargs = dict(
                     user_symptoms=symptoms_list,
                     system_predictions=predictions,
                     species=species,
                     user_notes=user_notes,
                     context_data=context_data if context_data else None
                 )
+                if verification_result is not None:
+                    # Already returned by the combined extraction + verification call
+                    pass
+                elif concurrent_mode:
+                    # Starts as soon as the merged symptom set is ready, bounded by its own deadline
+                    verification_result = _wait_for_stage(
+                        get_triage_executor().submit(in_context(verifier.verify_diagnosis, **verify_kwargs)),
+                        'verification',
+                        getattr(settings, 'TRIAGE_VERIFICATION_TIMEOUT', 20),
+                        None
+                    ) or verifier._default_verification_result()
+                else:
+                    verification_result = verifier.verify_diagnosis(**verify_kwargs)
                 
-                # === SHARED HELPER: ENRICH SECONDARY ADVICE ===
-                # We define this helper locally to reuse it in both branches (Agreement AND Disagreement)
-                def enrich_secondary_predictions(preds, ai_result):
-                    secondary_list = ai_result.get('secondary_advice', [])
-                    alt_diag = ai_result.get('alternative_diagnosis') or {}
-                    alt_name = clean_name_for_matching(alt_diag.get('name', ''))
-
-                    # This will hold only the diseases the AI actually verified
-                    filtered_preds = []
-
-                    # 1. ALWAYS Keep the Top AI Correction (Index 0)
-                    if preds:
-                        filtered_preds.append(preds[0])
-
-                    def clean_name(name): 
-                        return clean_name_for_matching(name)
-
-                    
-                    # Start from index 1 (since index 0 is the primary diagnosis)
-                    for i in range(len(preds)):
-                        curr = preds[i]
-                        p_name_clean = clean_name(curr.get('disease', ''))
-                        
-                        matched_advice = None
-
-                        # Check 1: Is this the AI's primary correction?
-                        if alt_name and (alt_name in p_name_clean or p_name_clean in alt_name):
-                            curr['care_guidelines'] = ai_result.get('what_to_do_specific') or curr.get('care_guidelines')
-                            curr['when_to_see_vet'] = ai_result.get('see_vet_if_specific') or curr.get('when_to_see_vet')
-                            preds[i] = curr
-                            continue
-                        # Fuzzy match advice to disease name
-                        for item in secondary_list:
-                            adv_name_clean = clean_name(item.get('disease', ''))
-                            if adv_name_clean and (adv_name_clean in p_name_clean or p_name_clean in adv_name_clean):
-                                matched_advice = item
-                                break
-                        
-                        if matched_advice:
-                            curr['care_guidelines'] = matched_advice.get('what_to_do', "Monitor specific symptoms.")
-                            curr['when_to_see_vet'] = matched_advice.get('see_vet_if', "If symptoms persist.")
-                            filtered_preds.append(curr)
-                        else:
-                            #curr['care_guidelines'] = "Monitor specific symptoms and keep pet comfortable."
-                            #curr['when_to_see_vet'] = "If condition does not improve within 24 hours."
-                            logger.info(f"🗑️ AI excluded irrelevant condition: {curr.get('disease')}")
-                        
-                        preds[:] = filtered_preds
-                # ===============================================
+                _apply_verification(predictions, verification_result, symptoms_list)
+            except Exception as e:
+                logger.error(f"✗ Diagnosis verification failed: {e}")
+        
+        return _finalize_triage(
+            kb_version, result, predictions, extraction_result, verification_result, safety_override_reason
+        )
+        
+    except Exception as e:
+        logger.error(f"Vector similarity prediction failed: {e}")
+        raise
 
-                
-                # Reranking Logic
-                alt_diag = verification_result.get('alternative_diagnosis')
-                
-                # Force "Disagreement" logic if database is empty but AI found a specific disease
-                is_db_empty = not predictions
-                ai_found_something = alt_diag and alt_diag.get('name')
-                
-                if not verification_result.get('agreement') or (is_db_empty and ai_found_something):
-                    if alt_diag and alt_diag.get('name'):
-                        alt_disease_name = alt_diag['name']
-                        found_match = False
-                        
-                        # 1. Try to find and re-rank an existing database match
-                        for idx, pred in enumerate(predictions):
-                            p_name = clean_name_for_matching(pred.get('disease', ''))
-                            a_name = clean_name_for_matching(alt_disease_name)
-                            
-                            if a_name in p_name or p_name in a_name:
-                                found_match = True
-                                reranked = predictions.pop(idx)
-                                reranked['disease'] = f"⚠️ AI Potential Concern: {alt_disease_name}"
-                                reranked['care_guidelines'] = verification_result.get('what_to_do_specific')
-                                reranked['when_to_see_vet'] = verification_result.get('see_vet_if_specific')
-                                reranked['match_level'] = alt_diag.get('match_level') or alt_diag.get('matcch_level')
-                                predictions.insert(0, reranked)
-                                break
-                        
-                        # 2. CRITICAL: If no match found (like Mange), INJECT IT AT INDEX 0
-                        if not found_match:
-                            ood_pred = {
-                                'disease': f"⚠️ AI Potential Concern: {alt_disease_name}",
-                                'confidence': 0.95,
-                                'match_level': alt_diag.get('match_level') or alt_diag.get('match_level') or 'Possible consideration',
-                                'urgency': verification_result.get('risk_assessment', 'MODERATE').lower(),
-                                'matched_symptoms': alt_diag.get('matched_symptoms', symptoms_list),
-                                'care_guidelines': verification_result.get('what_to_do_specific'),
-                                'when_to_see_vet': verification_result.get('see_vet_if_specific'),
-                                'match_explanation': f"AI Analysis: {verification_result['reasoning']}",
-                                'is_external': True
-                            }
-                            predictions.insert(0, ood_pred)
-
-                    # 3. Always run secondary enrichment to fix the other items in the list
-                    enrich_secondary_predictions(predictions, verification_result)
-                    # ===================================================
+# ============================================================================
+# ASYNC ENTRY POINT (chatbot/views_async.py)
+# ============================================================================
 
-                else:
-                    # === AGREEMENT BRANCH ===
-                    if predictions:
-                        # 1. Enrich the Top Result (Index 0)
-                        top_pred = predictions[0]
-                        top_pred['care_guidelines'] = verification_result.get('what_to_do_specific') or verification_result.get('care_advice', [])[0]
-                        top_pred['when_to_see_vet'] = verification_result.get('see_vet_if_specific') or "If symptoms persist or worsen."
-                        
-                        top_pred['match_explanation'] = f"AI Analysis: {verification_result['reasoning']}"
-                        predictions[0] = top_pred
-
-                        # 2. Enrich Secondary Results (Indices 1, 2, etc.)
-                        enrich_secondary_predictions(predictions, verification_result)
+async def _in_triage_pool(func, *args, **kwargs):
+    """Await a CPU-bound or ORM stage on the shared triage pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_triage_executor(), in_context(func, *args, **kwargs))
 
-            except Exception as e:
-                logger.error(f"✗ Diagnosis verification failed: {e}")
+async def _await_stage(awaitable, stage, timeout, default):
+    """Async _wait_for_stage: result of a stage, or `default` if it fails or exceeds its deadline."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        # wait_for cancelled the awaitable; a stage on the triage pool may still be running
+        _count_abandoned_stage(stage, cancelled=False)
+        logger.warning(f"⏱️ Triage stage '{stage}' exceeded {timeout}s deadline - continuing without it")
+    except Exception as e:
+        logger.warning(f"⚠️ Triage stage '{stage}' failed: {e}")
+    return default
 
-        # === OOD HANDLING ===
-        if ood_detected and verification_result:
-            result['urgency'] = verification_result.get('risk_assessment', 'HIGH').upper()
-            result['urgency_reason'] = f"OOD condition detected. {verification_result['reasoning']}"
+async def apredict_with_vector_similarity(payload):
+    """
+    predict_with_vector_similarity for the ASGI views: same phases and result.
+    
+    Engine work and ORM lookups run on the triage pool; Gemini calls are awaited, so a
+    request waiting on Gemini holds no thread. The history lookup, local extraction and
+    Gemini extraction always overlap (TRIAGE_CONCURRENT_MODE costs nothing here).
+    """
+    try:
+        kb_version = await _in_triage_pool(get_knowledge_base().current)
+        engine = kb_version.engine
+        species = payload.get('species', 'Dog')
+        symptoms_list = payload.get('symptoms_list', [])
+        user_notes = payload.get('user_notes', '')
         
-        # === SAFETY INTERCEPTOR ASSESSMENT ===
-        if safety_override_active:
-            symptom_list_str = ', '.join(safety_override_reason)
-            dynamic_critical_message = f"🚨 CRITICAL ALERT: You reported '{symptom_list_str}'. Immediate veterinary care required."
-            
-            
-            result['recommendation'] = dynamic_critical_message
-            result['urgency'] = 'CRITICAL'
+        dense_mode = get_dense_retrieval_mode(species)
+        
+        llm_up = llm_available()
+        if not llm_up:
+            logger.warning("⚡ Gemini circuit open - skipping LLM extraction and verification")
+        
+        verifier = kb_version.verifier
+        verification_result = None
+        combined_run = None
+        
+        # === HYBRID TRIAGE ===
+        if verifier and llm_up and dense_mode != 'always' and getattr(settings, 'TRIAGE_COMBINED_LLM_CALL', False):
+            prepared = await _in_triage_pool(
+                _with_db_cleanup, _prepare_combined_call, engine, payload, species, symptoms_list, user_notes
+            )
+            if prepared is not None:
+                combined = await verifier.averify_with_extraction(**prepared['verify_kwargs'])
+                combined_run = await _in_triage_pool(_finish_combined_call, symptoms_list, prepared, combined)
+        
+        if dense_mode == 'always':
+            extraction_result = await _in_triage_pool(
+                extract_symptoms_from_text, user_notes, symptoms_list, species, use_llm=False
+            )
+            result = None
+            context_data = None
+        elif combined_run:
+            extraction_result, result, context_data, verification_result = combined_run
         else:
-            emergency_indicators = result['urgency'] in ['CRITICAL', 'HIGH']
-            care_within = "IMMEDIATELY" if result['urgency'] == 'CRITICAL' else "24-48 hours"
-            
-            
+            history = asyncio.ensure_future(_in_triage_pool(_with_db_cleanup, load_health_context, payload))
+            extraction_result, pending = await _in_triage_pool(_extract_locally_for_request, symptoms_list, user_notes)
+            llm_extraction = None
+            if pending is not None and llm_up:
+                llm_extraction = asyncio.ensure_future(
+                    aextract_symptoms_with_llm(user_notes, species, pending[0], pending[2])
+                )
+            result = await _in_triage_pool(
+                engine.diagnose, species=species, symptoms=extraction_result['combined_symptoms'], top_n=5
+            )
+            if llm_extraction is not None:
+                llm_output = await _await_stage(
+                    llm_extraction, 'llm_extraction',
+                    getattr(settings, 'TRIAGE_LLM_EXTRACTION_TIMEOUT', 10),
+                    (set(), {}, None)
+                )
+                extraction_result, result = _merge_llm_extraction(symptoms_list, pending, llm_output, result)
+            context_data = await _await_stage(
+                history, 'health_history', getattr(settings, 'TRIAGE_HISTORY_TIMEOUT', 3), None
+            ) or load_health_context({k: v for k, v in payload.items() if k != 'pet_id'})
         
-        # === VET-SAFE SYNC: Force overall result to match the #1 prediction ===
-        if predictions:
-            top_pred = predictions[0]
-            # Force top-level urgency to match the #1 disease
-            result['urgency'] = top_pred['urgency'].upper()
-            
-            # Re-map the recommendation based on the top disease
-            rec_map = {
-                'CRITICAL': "Seek immediate emergency veterinary care",
-                'HIGH': "Contact your veterinarian urgently - same day appointment recommended",
-                'MODERATE': "Schedule veterinary appointment within 1-2 days",
-                'LOW': "Monitor symptoms and consult vet if condition worsens"
-            }
-            result['recommendation'] = rec_map.get(result['urgency'], result['recommendation'])
+        symptoms_list, result, predictions, context_data, safety_override_reason, dense_retrieval_used = await _in_triage_pool(
+            _with_db_cleanup, _rank_candidates,
+            engine, payload, species, user_notes, dense_mode, llm_up, extraction_result, result, context_data
+        )
         
-        triage_assessment = {
-            'overall_urgency': result['urgency'].lower(),
-            'requires_immediate_care': result['urgency'] == 'CRITICAL',
-            'requires_care_within': "IMMEDIATELY" if result['urgency'] == 'CRITICAL' else "24-48 hours",
-            'urgency_reasoning': [result.get('urgency_reason', ''), result['recommendation']],
-            'red_flags': result.get('red_flags') or [],
-            'safety_override_applied': (result['urgency'] == 'CRITICAL')
-        }
-        return {
-            'success': True,
-            'predictions': predictions,
-            'triage_assessment': triage_assessment,
-            'engine': 'vector_similarity',
-            'symptoms_analyzed': result['symptoms_analyzed'],
-            'recommendation': result['recommendation'],
-            'disclaimer': result['disclaimer'],
-            'overall_recommendation': result['recommendation'],
-            'urgency_level': result['urgency'].lower(),
-            'clinical_summary': verification_result.get('clinical_summary', '') if verification_result else ''
-        }
+        # === DIAGNOSIS VERIFICATION ===
+        if verifier and llm_up and dense_mode != 'always' and not dense_retrieval_used:
+            try:
+                if verification_result is None:
+                    verification_result = await _await_stage(
+                        verifier.averify_diagnosis(
+                            user_symptoms=symptoms_list,
+                            system_predictions=predictions,
+                            species=species,
+                            user_notes=user_notes,
+                            context_data=context_data if context_data else None
+                        ),
+                        'verification',
+                        getattr(settings, 'TRIAGE_VERIFICATION_TIMEOUT', 20),
+                        None
+                    ) or verifier._default_verification_result()
+                
+                _apply_verification(predictions, verification_result, symptoms_list)
+            except Exception as e:
+                logger.error(f"✗ Diagnosis verification failed: {e}")
+        
+        return _finalize_triage(
+            kb_version, result, predictions, extraction_result, verification_result, safety_override_reason
+        )
         
     except Exception as e:
         logger.error(f"Vector similarity prediction failed: {e}")
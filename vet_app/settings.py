@@ -21,6 +21,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = config('SECRET_KEY')
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+# Seconds between background re-probes of unhealthy Gemini models (0 = disabled)
+GEMINI_HEALTH_PROBE_INTERVAL = config('GEMINI_HEALTH_PROBE_INTERVAL', default=0, cast=int)
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 KAGGLE_USERNAME = config('KAGGLE_USERNAME', default='')
 KAGGLE_KEY = config('KAGGLE_KEY', default='')
@@ -83,6 +85,8 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    # First, so the Server-Timing total covers the whole middleware chain
+    'middleware.server_timing.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -92,7 +96,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'middleware.rate_limit.RateLimitMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  
+    # WhiteNoise, async-capable so ASGI requests are not forced onto a thread
+    'middleware.static_files.AsyncWhiteNoiseMiddleware',
 
     
 ]
@@ -212,6 +217,91 @@ CACHES = {
         }
     }
 }
+# Rate limiter (utils/rate_limiter.py): 'cache' (default cache, use Redis/Memcached so all
+# workers share it), 'sqlite' (RATE_LIMIT_DB_PATH, shared by the workers on one host) or
+# 'auto' (cache for Redis/Memcached, otherwise sqlite)
+RATE_LIMIT_BACKEND = config('RATE_LIMIT_BACKEND', default='auto')
+RATE_LIMIT_DB_PATH = config('RATE_LIMIT_DB_PATH', default=str(BASE_DIR / 'rate_limits.sqlite3'))
+
+# Symptom checker pipeline: overlap LLM extraction, history lookup and verification
+TRIAGE_CONCURRENT_MODE = config('TRIAGE_CONCURRENT_MODE', default=True, cast=bool)
+TRIAGE_MAX_WORKERS = config('TRIAGE_MAX_WORKERS', default=8, cast=int)
+TRIAGE_LLM_EXTRACTION_TIMEOUT = config('TRIAGE_LLM_EXTRACTION_TIMEOUT', default=10, cast=float)
+TRIAGE_HISTORY_TIMEOUT = config('TRIAGE_HISTORY_TIMEOUT', default=3, cast=float)
+TRIAGE_VERIFICATION_TIMEOUT = config('TRIAGE_VERIFICATION_TIMEOUT', default=20, cast=float)
+# Shared inference sidecar (api_backend.py --uds <socket>); empty = load the model in every worker
+TRIAGE_SIDECAR_SOCKET = config('TRIAGE_SIDECAR_SOCKET', default='')
+TRIAGE_SIDECAR_TIMEOUT = config('TRIAGE_SIDECAR_TIMEOUT', default=2.0, cast=float)
+TRIAGE_SIDECAR_POOL_SIZE = config('TRIAGE_SIDECAR_POOL_SIZE', default=8, cast=int)
+# Tiered symptom extraction: skip Gemini when the lexicon / local embeddings cover the notes
+TRIAGE_TIERED_EXTRACTION = config('TRIAGE_TIERED_EXTRACTION', default=True, cast=bool)
+TRIAGE_UNKNOWN_TOKEN_THRESHOLD = config('TRIAGE_UNKNOWN_TOKEN_THRESHOLD', default=0.25, cast=float)
+# One Gemini call for symptom normalization + verification (two-call path kept as fallback)
+TRIAGE_COMBINED_LLM_CALL = config('TRIAGE_COMBINED_LLM_CALL', default=False, cast=bool)
+# Dynamic-mode species (Bird, Fish, ...): rank disease profiles against the raw notes locally
+# 'fallback' = when Gemini extraction fails/times out/is disabled, 'always' = never call Gemini, 'off'
+TRIAGE_DENSE_RETRIEVAL = config('TRIAGE_DENSE_RETRIEVAL', default='fallback')
+# Seconds between knowledge base CSV change checks (content-hashed, rebuilt in the background); 0 = off
+TRIAGE_KB_RELOAD_INTERVAL = config('TRIAGE_KB_RELOAD_INTERVAL', default=30, cast=float)
+# Symptom embeddings. embedding_store.py, onnx_encoder.py and smart_triage_engine.py read these
+# through decouple themselves (they also run outside Django); listed here with the same defaults.
+# On-disk, memory-mapped symptom embedding cache (one file per model + vocabulary)
+EMBEDDING_CACHE_DIR = config('EMBEDDING_CACHE_DIR', default=str(BASE_DIR / '.embedding_cache'))
+# Stored index precision: 'float32', 'float16' or 'int8' (validate_embedding_quantization.py)
+EMBEDDING_QUANTIZATION = config('EMBEDDING_QUANTIZATION', default='float32')
+# Symptom encoder: 'torch', 'onnx' or 'onnx-int8' (requirements-onnx.txt). An ONNX export whose
+# probe cosine similarity to PyTorch is below ONNX_COSINE_TOLERANCE falls back to 'torch'
+EMBEDDING_BACKEND = config('EMBEDDING_BACKEND', default='torch')
+ONNX_COSINE_TOLERANCE = config('ONNX_COSINE_TOLERANCE', default=0.99, cast=float)
+# Entries per SmartTriageEngine phrase cache (phrase -> embedding, phrase -> matches); 0 = off
+PHRASE_CACHE_SIZE = config('PHRASE_CACHE_SIZE', default=4096, cast=int)
+
+# LLM response cache (SQLite, shared by all workers on the host)
+LLM_CACHE_PATH = config('LLM_CACHE_PATH', default=str(BASE_DIR / 'gemini_response_cache.sqlite3'))
+LLM_CACHE_TTL_SECONDS = config('LLM_CACHE_TTL_SECONDS', default=7 * 24 * 3600, cast=int)
+LLM_CACHE_MAX_ENTRIES = config('LLM_CACHE_MAX_ENTRIES', default=100000, cast=int)
+# Semantic near-duplicate cache for first-turn general chat questions (same SQLite file)
+SEMANTIC_CACHE_ENABLED = config('SEMANTIC_CACHE_ENABLED', default=True, cast=bool)
+SEMANTIC_CACHE_THRESHOLD = config('SEMANTIC_CACHE_THRESHOLD', default=0.93, cast=float)
+SEMANTIC_CACHE_TTL_SECONDS = config('SEMANTIC_CACHE_TTL_SECONDS', default=30 * 24 * 3600, cast=int)
+SEMANTIC_CACHE_MAX_ENTRIES = config('SEMANTIC_CACHE_MAX_ENTRIES', default=5000, cast=int)
+
+# Gemini call resilience (chatbot/llm_gateway.py). Triage calls use their TRIAGE_*_TIMEOUT as the deadline.
+LLM_CALL_DEADLINE = config('LLM_CALL_DEADLINE', default=25, cast=float)
+LLM_MAX_CONCURRENT_CALLS = config('LLM_MAX_CONCURRENT_CALLS', default=16, cast=int)
+# Awaited calls from the async views hold no thread, so they get a separate, larger cap
+LLM_MAX_CONCURRENT_ASYNC_CALLS = config('LLM_MAX_CONCURRENT_ASYNC_CALLS', default=256, cast=int)
+# Route chat, image analysis, symptom checker and daily symptom logging to chatbot/views_async.py
+# Only useful when served by an ASGI server (uvicorn vet_app.asgi:application)
+ASYNC_LLM_VIEWS = config('ASYNC_LLM_VIEWS', default=False, cast=bool)
+
+# Background job mode (chatbot/jobs.py): diagnosis, SOAP and symptom progression endpoints
+# queue an LLMJob and return 202 when the client sends "Prefer: respond-async".
+# Enable only where `python manage.py run_llm_jobs` is running.
+LLM_JOB_MODE_ENABLED = config('LLM_JOB_MODE_ENABLED', default=False, cast=bool)
+LLM_JOB_WORKERS = config('LLM_JOB_WORKERS', default=4, cast=int)
+LLM_JOB_LEASE_SECONDS = config('LLM_JOB_LEASE_SECONDS', default=300, cast=float)
+LLM_JOB_RETRY_BACKOFF_SECONDS = config('LLM_JOB_RETRY_BACKOFF_SECONDS', default=5, cast=float)
+LLM_JOB_POLL_AFTER_SECONDS = config('LLM_JOB_POLL_AFTER_SECONDS', default=2, cast=int)
+LLM_BREAKER_FAILURE_THRESHOLD = config('LLM_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+LLM_BREAKER_COOLDOWN_SECONDS = config('LLM_BREAKER_COOLDOWN_SECONDS', default=30, cast=float)
+LLM_BREAKER_QUOTA_COOLDOWN_SECONDS = config('LLM_BREAKER_QUOTA_COOLDOWN_SECONDS', default=120, cast=float)
+# Send a duplicate request once a call is slower than the observed p95 (never sooner than the min delay)
+LLM_HEDGE_ENABLED = config('LLM_HEDGE_ENABLED', default=False, cast=bool)
+LLM_HEDGE_MIN_DELAY_SECONDS = config('LLM_HEDGE_MIN_DELAY_SECONDS', default=2.0, cast=float)
+# Where LLM prompts go: 'gemini' (live), 'record' (live + append prompt/response pairs to
+# LLM_RECORDING_PATH) or 'replay' (offline: recorded or synthetic responses after a simulated latency)
+LLM_BACKEND = config('LLM_BACKEND', default='gemini')
+LLM_RECORDING_PATH = config('LLM_RECORDING_PATH', default=str(BASE_DIR / 'llm_recordings.jsonl'))
+LLM_REPLAY_LATENCY_MS = config('LLM_REPLAY_LATENCY_MS', default=800, cast=float)
+LLM_REPLAY_JITTER_MS = config('LLM_REPLAY_JITTER_MS', default=200, cast=float)
+LLM_REPLAY_ON_MISS = config('LLM_REPLAY_ON_MISS', default='synthetic')
+
+# Per-stage triage timings (utils/timing.py): Server-Timing header on instrumented
+# responses, histograms at /metrics (Prometheus). /metrics requires
+# "Authorization: Bearer <METRICS_TOKEN>"; with no token it is only served when DEBUG is on.
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
 
 # For production, use Redis or Memcached:
 # CACHES = {
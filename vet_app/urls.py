@@ -3,7 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from admin_panel.views_announcements import get_active_announcements
-from chatbot.views import symptom_checker_predict
+from chatbot.views_metrics import metrics
+if settings.ASYNC_LLM_VIEWS:
+    from chatbot.views_async import symptom_checker_predict
+else:
+    from chatbot.views import symptom_checker_predict
 from django.urls import path, include, re_path
 from django.views.static import serve
 
@@ -14,6 +18,7 @@ urlpatterns = [
     path('api/chatbot/', include('chatbot.urls')),
     path('api/symptom-checker/predict/', symptom_checker_predict, name='symptom_checker_predict'),
     path('api/pets/', include('pets.urls')),  # Add this line if missing
+    path('metrics', metrics, name='metrics'),
     path('', include('users.urls')),
     path('api/admin/', include('admin_panel.urls')), 
     